@@ -8,6 +8,8 @@ from .classes import SchoolConfig
 from .tools.db import DB
 from .tools.encoder import JSONImproved
 from .tools.logger import logger
+from .tools import metrics
+from .tools import queries
 
 login_manager = LoginManager()
 login_manager.login_view = "auth.login"
@@ -29,17 +31,31 @@ def create_app(config_name):
 
     # TODO: Add handling of different schools based on the information passed from the React frontend
     global db
-    db = DB(app.config.get("MONGO_CONNECTION_STRING"), "school1")
-
-    global school_config
-    school_config = SchoolConfig()
+    db = DB(app.config.get("MONGO_CONNECTION_STRING"),
+            "school1",
+            event_listeners=[queries.query_counter, metrics.command_metrics])
 
     global root_logger
     # Creates a logger relevant to the app environment
-    root_logger = logger[config_name]()
+    root_logger = logger[config_name](app.config["LOG_SAMPLE_RATES"])
+
+    global school_config
+    try:
+        # The stored settings, e.g. the timezone dates are shown in
+        school_config = SchoolConfig.get()
+    except Exception as e:
+        root_logger.exception("Error while loading the school settings")
+        school_config = SchoolConfig()
+
+    try:
+        db.create_indexes()
+    except Exception as e:
+        root_logger.exception("Error while creating the database indexes")
 
     login_manager.init_app(app)
     mail.init_app(app)
+    queries.init_app(app)
+    metrics.init_app(app)
 
     with app.app_context():
         from .modules.auth import auth as auth_blueprint
@@ -62,4 +78,59 @@ def create_app(config_name):
 
         app.register_blueprint(teacher_blueprint)
 
+        from .modules.files import files as files_blueprint
+
+        app.register_blueprint(files_blueprint)
+
+        from .modules.search import search as search_blueprint
+
+        app.register_blueprint(search_blueprint)
+
+        from .modules.calendar import calendar as calendar_blueprint
+
+        app.register_blueprint(calendar_blueprint)
+
+        from .modules.metrics import metrics as metrics_blueprint
+
+        app.register_blueprint(metrics_blueprint)
+
+        if app.config["PRELOAD"]:
+            # The workers start the background jobs once they are forked
+            from .tools.startup import preload
+
+            preload(app)
+        else:
+            start_background_jobs(app)
+
         return app
+
+
+def start_background_jobs(app):
+    r"""Starts the periodic background jobs of an app in this process.
+
+    Called by `create_app`, or by every worker once it is forked from a preloaded app (see
+    `gunicorn.conf.py`), since threads do not survive a fork.
+    """
+    with app.app_context():
+        if app.config["ANALYTICS_RECOMPUTE_INTERVAL"]:
+            from .tools.analytics import start_background_recompute
+
+            start_background_recompute(
+                app, app.config["ANALYTICS_RECOMPUTE_INTERVAL"])
+
+        if app.config["BLOB_GC_INTERVAL"]:
+            from .tools.blobs import start_background_gc
+
+            start_background_gc(app, app.config["BLOB_GC_INTERVAL"],
+                                app.config["BLOB_GC_GRACE_PERIOD"])
+
+        if app.config["REMINDER_INTERVAL"]:
+            from .tools.reminders import start_background_reminders
+
+            start_background_reminders(app, app.config["REMINDER_INTERVAL"],
+                                       app.config["REMINDER_LEAD_TIME"])
+
+        if app.config["MIGRATE_ON_START"]:
+            from .tools.migrations import start_background_migration
+
+            start_background_migration(app)
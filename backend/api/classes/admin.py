@@ -6,6 +6,7 @@ from typing import Optional
 
 from api import db
 from api import root_logger as logger
+from api.tools.exceptions import ScheduleConflictException
 from bson import ObjectId
 
 from . import CalendarEvent
@@ -17,6 +18,8 @@ from . import User
 
 
 class Admin(User):
+    __slots__ = ()
+
     _type = "Admin"  # Immutable
 
     def ___init__(
@@ -77,35 +80,39 @@ class Admin(User):
             return Admin(**dictionary)
         except Exception as e:
             logger.exception(
-                f"Error while generating an Admin from dictionary {dictionary}"
-            )
+                "Error while generating an Admin from dictionary %s",
+                dictionary)
             return None
 
     def add(self) -> bool:
         r"""Adds the admin to the DB."""
+        from api.tools.names import user_added
 
         try:
             self.id = db.admins.insert_one(self.to_dict()).inserted_id
         except pymongo.errors.DuplicateKeyError:
             logger.exception(
-                f"The Admin with the id {self.id} already exists, you should not be calling the add() method."
-            )
+                "The Admin with the id %s already exists, you should not be calling the add() method.",
+                self.id)
             return False
         except Exception as e:
-            logger.exception(f"Error while adding Admin {self.id}")
+            logger.exception("Error while adding Admin %s", self.id)
             return False
         else:
+            user_added(self._type, self.id, self.first_name, self.last_name)
             return True
 
     def remove(self) -> bool:
         r"""Removes this admin from the database."""
+        from api.tools.names import user_removed
 
         try:
             db.admins.delete_one({"_id": ObjectId(self.id)})
         except Exception as e:
-            logger.exception(f"Error while removing Admin {self.id}")
+            logger.exception("Error while removing Admin %s", self.id)
             return False
         else:
+            user_removed(self._type, self.id)
             return True
 
     @staticmethod
@@ -117,7 +124,7 @@ class Admin(User):
         id: str
             ObjectId in the string format.
         """
-        return Admin.from_dict(db.admins.find_one({"_id": ObjectId(id)}))
+        return Admin._from_db(db.admins.find_one({"_id": ObjectId(id)}))
 
     @staticmethod
     def get_by_email(email: str) -> Admin:
@@ -128,7 +135,7 @@ class Admin(User):
         email: str
             String containing the email of the admin
         """
-        return Admin.from_dict(db.admins.find_one({"email": email}))
+        return Admin._from_db(db.admins.find_one({"email": email}))
 
     @staticmethod
     def get_courses() -> List[Course]:
@@ -158,6 +165,8 @@ class Admin(User):
         courses : Course
             Course object
         """
+        from api.tools.fulltext import course_changed
+
         try:
             dictionary = course.to_dict()
             dictionary["_id"] = ObjectId()
@@ -165,9 +174,10 @@ class Admin(User):
             dictionary["assignments"] = list()
             dictionary["syllabus"] = list()
             db.courses.insert_one(dictionary)
+            course_changed(dictionary["_id"])
             return True
         except BaseException as e:
-            logger.exception(f"Error while adding class {course.ID}")
+            logger.exception("Error while adding class %s", course.id)
             return False
 
     @staticmethod
@@ -181,12 +191,40 @@ class Admin(User):
             The ObjectId of the specific course in string format.
         email: str
             The email of the student
+
+        Raises
+        ------
+        ScheduleConflictException
+            If the student attends another course at the same time
         """
+        from api.tools.fulltext import course_changed
+        from api.tools.schedule import student_conflicts
+
         student = Student.get_by_email(email)
-        db.courses.update_one({"_id": ObjectId(class_id)},
-                              {"$push": {
-                                  "students": ObjectId(student.ID)
-                              }})
+        conflicts = student_conflicts([student.id],
+                                      class_id).get(str(student.id))
+        if conflicts:
+            raise ScheduleConflictException(
+                f"Student {student.id} already attends a course at the time of course {class_id}",
+                [conflict.to_dict() for conflict in conflicts],
+            )
+
+        db.students.update_one({"_id": ObjectId(student.id)},
+                               {"$addToSet": {
+                                   "courses": str(class_id)
+                               }})
+        db.courses.update_one(
+            {"_id": ObjectId(class_id)},
+            {
+                "$push": {
+                    "students": ObjectId(student.id)
+                },
+                "$inc": {
+                    "revision": 1
+                }
+            },
+        )
+        course_changed(class_id)
 
     @staticmethod
     def add_teacher(class_id: str, email: str):
@@ -199,64 +237,55 @@ class Admin(User):
             The ObjectId of the specific course.
         email: str
             The email of the teacher
+
+        Raises
+        ------
+        ScheduleConflictException
+            If the teacher teaches another course at the same time
         """
+        from api.tools.fulltext import course_changed
+        from api.tools.schedule import teacher_conflicts
+
         teacher = Teacher.get_by_email(email)
+        conflicts = teacher_conflicts(teacher.id, class_id)
+        if conflicts:
+            raise ScheduleConflictException(
+                f"Teacher {teacher.id} already teaches at the time of course {class_id}",
+                [conflict.to_dict() for conflict in conflicts],
+            )
+
         db.courses.update_one({"_id": ObjectId(class_id)},
                               {"$set": {
-                                  "teacher": ObjectId(teacher.ID)
+                                  "teacher": ObjectId(teacher.id)
                               }})
+        course_changed(class_id)
 
     @staticmethod
-    def get_by_keyword(keyword: str) -> Admin:
-        r"""Returns Admin with a specified keyword.
+    def get_by_keyword(keyword: str) -> List[dict]:
+        r"""Returns the admins whose names best match a keyword, from the in-process name index.
         Parameters
         ---------
-        first_name: str
+        keyword: str
+            The beginning of a first name, last name or full name
 
         Returns
         ------
-        List[Admin]
+        List[dict]
+            At most 5 admins, as dictionaries with `id`, `type`, `first_name` and `last_name`
         """
-        try:
-            admins = db.admins.aggregate([
-                {
-                    "$search": {
-                        "autocomplete": {
-                            "query": keyword,
-                            "path": "first_name"
-                        }
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 1,
-                        "first_name": 1,
-                        "last_name": 1
-                    }
-                },
-                {
-                    "$limit": 5
-                },
-            ])
-
-            possible_admins = []
-            for admin in admins:
-                possible_admins.append(Admin.from_dict(admin))
-            return possible_admins
+        from api.tools.names import search
 
-        except BaseException as e:
-            logger.exception(f"Error while getting admin by name {id}: {e}")
+        try:
+            return search(keyword, ["Admin"])
+        except Exception as e:
+            logger.exception(
+                "Error while getting a admin by name %s: %s", keyword, e)
             return None
 
     def get_course_names(self) -> List[(str, str)]:
         r"""Returns all course ids and names for a school in a list"""
-        courses = list()
-
-        for course in db.courses.find():
-            course_id = course.get("_id")
-            courses.append((course_id, Course.get_by_id(course_id).name))
-
-        return courses
+        return [(course["_id"], course["name"])
+                for course in db.courses.find({}, {"name": 1})]
 
     def get_student_names(self) -> List[(str, str)]:
         r"""
@@ -299,11 +328,12 @@ class Admin(User):
                     "children": ObjectId(student_id)
                 }},
             )
-            logger.debug(f"Added student {student_id} to parent {parent_id}")
+            logger.debug(
+                "Added student %s to parent %s", student_id, parent_id)
             return True
         except:
             logger.error(
-                f"Error adding student {student_id} to parent {parent_id}")
+                "Error adding student %s to parent %s", student_id, parent_id)
             return False
 
     @staticmethod
@@ -322,11 +352,12 @@ class Admin(User):
                 }},
             )
             logger.debug(
-                f"Removed student {student_id} from parent {parent_id}")
+                "Removed student %s from parent %s", student_id, parent_id)
             return True
         except:
             logger.error(
-                f"Error removing student {student_id} from parent {parent_id}")
+                "Error removing student %s from parent %s",
+                student_id, parent_id)
             return False
 
         return teachers
@@ -359,6 +390,5 @@ class Admin(User):
             )
             return True
         except:
-            logger.exception(
-                f"An error occured while updating school settings")
+            logger.exception("An error occured while updating school settings")
             return False
@@ -1,26 +1,53 @@
 from __future__ import annotations
 
 from datetime import datetime
-from datetime import time
 from typing import List
+from typing import Union
 
+from api.tools.dates import clean_datetime
+from api.tools.dates import parse_stored_datetime
 from api.tools.exceptions import InvalidFormatException
 from api.tools.exceptions import InvalidTypeException
+from api.tools.hydration import Field
+from api.tools.hydration import from_db
 from bson import ObjectId
 
 from .submission import Submission
 
 
 class Assignment:
+    __slots__ = ("_id", "title", "_date_assigned", "assigned_by",
+                 "assigned_to", "_due_by", "content", "filenames",
+                 "estimated_time", "submissions", "course_name")
+
+    # The stored fields, see `api.tools.hydration`
+    FIELDS = (
+        Field("_id", "_id", convert=str),
+        Field("title", "title"),
+        Field("date_assigned", "_date_assigned", "None",
+              parse_stored_datetime),
+        Field("assigned_by", "assigned_by"),
+        Field("assigned_to", "assigned_to"),
+        Field("due_by", "_due_by", "None", parse_stored_datetime),
+        Field("content", "content"),
+        Field("filenames", "filenames", "[]"),
+        Field("estimated_time", "estimated_time"),
+        Field("submissions", "submissions", "[]"),
+    )
+    # Creates an assignment from a stored document, without validating it again
+    _from_db = from_db(FIELDS)
+
     _id: str
+    _date_assigned: datetime
+    _due_by: datetime
 
     def __init__(
             self,
             title: str,
-            date_assigned: time,
+            date_assigned: Union[datetime, str],
             assigned_by: int,
             assigned_to: str,
-            due_by: datetime,
+            due_by: Union[datetime, str],
             content: str,  # TODO: this should be represented int Deltas(JSON)
             filenames: list,
             estimated_time: int,
@@ -33,14 +60,16 @@ class Assignment:
         ----------
         title: str
             Title of the assignment
-        date_assigned: datetime.datetime
-            A UTC timestamp that specifies when this assignment was posted by a Teacher
+        date_assigned: datetime.datetime or str
+            A UTC timestamp that specifies when this assignment was posted by a Teacher (an ISO
+            8601 string is parsed, see `api.tools.dates.parse_datetime`)
         assigned_by: int
             Teacher ID that specifies who assigned this assignment
         assigned_to: int
             The class ID it was assigned to
-        due_by: datetime.datetime
-            A UTC timestamp that specifies when this assignment is due
+        due_by: datetime.datetime or str
+            A UTC timestamp that specifies when this assignment is due (an ISO 8601 string is
+            parsed too)
         subject: str
             The subject of the assignment
         content: JSON object
@@ -61,6 +90,8 @@ class Assignment:
         self.submissions = submissions or []
         # self.weight = weight
 
+        # New assignments get their id when they are added to a course
+        self._id = None
         if _id is not None:
             self.id = _id
 
@@ -90,15 +121,32 @@ class Assignment:
         return self._id
 
     @id.setter
-    def id(self, id: str):
-        if id is not str:
+    def id(self, id: Union[str, ObjectId]):
+        if not isinstance(id, (str, ObjectId)):
             raise InvalidTypeException(
-                f"The id provided is not a str (type provided is {type(id)}).")
+                f"The id provided is not a str or bson.objectid.ObjectId (type provided is {type(id)})."
+            )
 
         try:
-            ObjectId(id)
+            id = str(ObjectId(id))
         except Exception as e:
             raise InvalidFormatException(
                 f"Cannot convert provided id to bson.ObjectId")
 
         self._id = id
+
+    @property
+    def date_assigned(self) -> datetime:
+        return self._date_assigned
+
+    @date_assigned.setter
+    def date_assigned(self, date_assigned: Union[datetime, str]):
+        self._date_assigned = clean_datetime("date_assigned", date_assigned)
+
+    @property
+    def due_by(self) -> datetime:
+        return self._due_by
+
+    @due_by.setter
+    def due_by(self, due_by: Union[datetime, str]):
+        self._due_by = clean_datetime("due_by", due_by)
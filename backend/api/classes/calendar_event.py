@@ -2,8 +2,23 @@ from __future__ import annotations
 
 from typing import Optional
 
+from api.tools.hydration import Field
+from api.tools.hydration import from_db
+
 
 class CalendarEvent:
+    __slots__ = ("_title", "_start", "_end", "_color", "_url")
+
+    # The stored fields, see `api.tools.hydration`
+    FIELDS = (
+        Field("title", "_title"),
+        Field("start", "_start"),
+        Field("end", "_end"),
+        Field("color", "_color", '""'),
+        Field("url", "_url", '""'),
+    )
+    _from_db = from_db(FIELDS)
+
     _title: str
     _start: str
     _end: str
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import re
 from typing import Dict
 from typing import List
 from typing import Optional
@@ -11,10 +10,112 @@ from api import root_logger as logger
 from api.classes import Assignment
 from api.tools.exceptions import InvalidFormatException
 from api.tools.exceptions import InvalidTypeException
+from api.tools.exceptions import ScheduleConflictException
+from api.tools.hydration import Field
+from api.tools.hydration import from_db
+from api.tools.validation import Rule
+from api.tools.validation import Schema
 from bson import ObjectId
+from pymongo import ReturnDocument
+
+
+def _ids(ids: list) -> List[str]:
+    return [str(id) for id in ids]
+
+
+def _schedule_order(schedule_time: str) -> Optional[str]:
+    r"""Checks that a course starts before it ends (or goes on after midnight, from 23:xx)."""
+    start_time, finish_time = schedule_time.split("-")
+    start_time_h, start_time_m = list(map(int, start_time.split(":")))
+    finish_time_h, finish_time_m = list(map(int, finish_time.split(":")))
+    if (start_time_h * 60 + start_time_m >= finish_time_h * 60 +
+            finish_time_m) and not (start_time_h == 23 and finish_time_h == 0):
+        return f"The start time for schedule_time must be earlier than the finish time (got {schedule_time})"
+
+    return None
+
+
+def _number_range(number: int) -> Optional[str]:
+    if not 0 < number < 100000:
+        return f"The format for course number doesn't match. Expected 0 < number < 100000, got {number}"
+
+    return None
+
+
+def _teacher_id(teacher_id: str) -> Optional[str]:
+    if not ObjectId.is_valid(teacher_id):
+        return f"The teacher id {teacher_id} is not a valid ObjectId"
+
+    return None
+
+
+def _week_days(schedule_days: str) -> Optional[str]:
+    from api.tools.schedule import parse_days
+
+    try:
+        parse_days(schedule_days)
+    except ValueError as e:
+        return str(e)
+
+    return None
 
 
 class Course:
+    __slots__ = ("_id", "_department", "_number", "_name", "_teacher",
+                 "_students", "_description", "_schedule_time",
+                 "_schedule_days", "_syllabus", "assignments", "_grade_range",
+                 "_course_analytics", "_revision")
+
+    # The stored fields, see `api.tools.hydration`
+    FIELDS = (
+        Field("_id", "_id", convert=str),
+        Field("department", "_department"),
+        Field("number", "_number"),
+        Field("name", "_name"),
+        Field("teacher", "_teacher", '""', str),
+        Field("students", "_students", "[]", _ids),
+        Field("description", "_description", '"Description"'),
+        Field("schedule_time", "_schedule_time", '""'),
+        Field("schedule_days", "_schedule_days", '""'),
+        Field("syllabus", "_syllabus", "()", tuple),
+        Field("assignments", "assignments", "[]",
+              lambda assignments: list(map(Assignment._from_db, assignments))),
+        Field("grade_range", "_grade_range", "(0, 100)", tuple),
+        Field("course_analytics", "_course_analytics", "None"),
+        Field("revision", "_revision", "0"),
+    )
+    # Creates a course from a stored document, without validating it again (nor querying its
+    # teacher and students)
+    _from_db = from_db(FIELDS)
+
+    # The validated fields, see `api.tools.validation`
+    SCHEMA = Schema({
+        "department":
+        Rule(),
+        "number":
+        Rule(type=int, check=_number_range),
+        "name":
+        Rule(max_length=50,
+             pattern=r"[\w \.]{1,50}",
+             expected="only alpha characters, space, or dot",
+             required=True),
+        "description":
+        Rule(max_length=500,
+             pattern=r'[\w \.\+\(\)\[\]\{\}\?\*\&\^\%\$\#\/\'"~<>,:;!-_=@]{1,500}',
+             expected="letters, digits, spaces or punctuation"),
+        "schedule_time":
+        Rule(pattern=
+             r"([0-1][0-9]|2[0-4]):[0-5][0-9]-([0-1][0-9]|2[0-4]):[0-5][0-9]",
+             expected="'hh:mm-hh:mm'",
+             blank="",
+             check=_schedule_order),
+        "schedule_days":
+        Rule(check=_week_days),
+        # Only the format, the teacher is looked up when it is set
+        "teacher":
+        Rule(blank="", check=_teacher_id),
+    })
+
     _id: str
     _department: str
     _number: int
@@ -28,6 +129,7 @@ class Course:
     _assignments: List[Assignment]
     _grade_range: Tuple[int, int]
     _course_analytics: dict
+    _revision: int
 
     def __init__(
             self,
@@ -44,6 +146,7 @@ class Course:
             grade_range: Optional[Tuple[int, int]] = None,
             _id: str = None,
             course_analytics: Optional[dict] = None,
+            revision: Optional[int] = None,
     ):
         """Initialises the Course object
         Parameters
@@ -89,18 +192,20 @@ class Course:
             The ID of the course, by default None
             Format: string which can be converted to `bson.objectId`
         course_analytics : dict, optional
-            Dictionary of course analytics data
+            Dictionary of course analytics data, computed by `api.tools.analytics`
             Format: dictionary of {
                 total_average,
                 starting_average,
                 no_students,
-                assignment_history : {
+                assignment_history : [{
                     assignment_name,
                     assignment_scores: [
                         { student, score }
                     ]
-                }
+                }]
             }
+        revision : int, optional
+            A counter bumped on every write that changes the course's gradebook, by default 0
         """
         self.department = department
         self.number = number
@@ -112,11 +217,11 @@ class Course:
         self.schedule_days = schedule_days or ""
         self.syllabus = syllabus or tuple()
         self.assignments = assignments or list()
-        self._course_analytics = course_analytics
+        self.course_analytics = course_analytics
+        self.revision = revision or 0
         if _id is not None:
             self.id = _id
-        if grade_range is not None:
-            self.grade_range = grade_range or (0, 100)
+        self.grade_range = tuple(grade_range or (0, 100))
 
     def __repr__(self):
         return f"<Course {self.id}>"
@@ -149,12 +254,7 @@ class Course:
 
     @department.setter
     def department(self, department: str):
-        if not isinstance(department, str):
-            raise InvalidTypeException(
-                f"The department provided is not a string (type provided is {type(department)})."
-            )
-
-        self._department = department
+        self._department = self.SCHEMA.clean("department", department)
 
     @property
     def number(self) -> int:
@@ -162,17 +262,7 @@ class Course:
 
     @number.setter
     def number(self, number: int):
-        if not isinstance(number, int):
-            raise InvalidTypeException(
-                f"The course number provided is not an int (type provided is {type(number)})."
-            )
-
-        if not 0 < number < 100000:
-            raise InvalidFormatException(
-                f"The format for course number doesn't match. Expected 0 < number < 100000, got {number}"
-            )
-
-        self._number = number
+        self._number = self.SCHEMA.clean("number", number)
 
     @property
     def name(self) -> str:
@@ -180,22 +270,7 @@ class Course:
 
     @name.setter
     def name(self, name: str):
-        if not isinstance(name, str):
-            raise InvalidTypeException(
-                f"The name provided is not a str (type provided is {type(name)})."
-            )
-
-        if not 0 < len(name) <= 50:
-            raise InvalidFormatException(
-                f"The length of the name should not exceed 50 characters (currently: {len(name)})"
-            )
-
-        if not re.match("[\w \.]{1,50}", name, flags=re.UNICODE):
-            raise InvalidFormatException(
-                f"The format for the name doesn't match. Expected only alpha characters, space, or dot, got {name}"
-            )
-
-        self._name = name
+        self._name = self.SCHEMA.clean("name", name)
 
     @property
     def teacher(self) -> str:
@@ -220,7 +295,8 @@ class Course:
         try:
             ObjectId(teacher_id)
         except Exception as e:
-            logger.exception(f"Error while validating teacher id {teacher_id}")
+            logger.exception(
+                "Error while validating teacher id %s", teacher_id)
             raise e
 
         try:
@@ -229,8 +305,8 @@ class Course:
                     f"The teacher with id {teacher_id} does not exist.")
         except Exception as e:
             logger.exception(
-                f"Error while validating the existence of teacher {teacher_id}"
-            )
+                "Error while validating the existence of teacher %s",
+                teacher_id)
             raise e
 
         self._teacher = teacher_id
@@ -265,7 +341,7 @@ class Course:
                 ObjectId(student_id)
             except Exception as e:
                 logger.exception(
-                    f"Error while validating student id {student_id}")
+                    "Error while validating student id %s", student_id)
                 raise e
 
             try:
@@ -274,8 +350,8 @@ class Course:
                         f"The student with id {student_id} does not exist.")
             except Exception as e:
                 logger.exception(
-                    f"Error while validating the existence of student {student_id}"
-                )
+                    "Error while validating the existence of student %s",
+                    student_id)
                 raise e
 
         self._students = students
@@ -286,26 +362,7 @@ class Course:
 
     @description.setter
     def description(self, description: str):
-        if not isinstance(description, str):
-            raise InvalidTypeException(
-                f"The description provided is not a str (type provided is {type(description)})"
-            )
-
-        if not 0 < len(description) <= 500:
-            raise InvalidFormatException(
-                f"The string provided is too long. The description should not exceed 500 characters. (currently: {len(description)})"
-            )
-
-        if not re.match(
-                r'[\w \.\+\(\)\[\]\{\}\?\*\&\^\%\$\#\/\'"~<>,:;!-_=@]{1,500}',
-                description,
-                flags=re.UNICODE,
-        ):
-            raise InvalidFormatException(
-                r"The format for description doesn't match. Expected '[\w \.\+\(\)\[\]\{\}\?\*\&\^\%\$\#\/\'\"~<>,:;!-_=@]{1, 500}', got {description}"
-                .format(description=description))
-
-        self._description = description
+        self._description = self.SCHEMA.clean("description", description)
 
     @property
     def schedule_time(self) -> str:
@@ -313,34 +370,7 @@ class Course:
 
     @schedule_time.setter
     def schedule_time(self, schedule_time: str):
-        if not isinstance(schedule_time, str):
-            raise InvalidTypeException(
-                f"The schedule_time provided is not a str (type provided is {type(schedule_time)}"
-            )
-
-        if schedule_time == "":
-            self._schedule_time = ""
-            return
-
-        if not re.match(
-                r"([0-1][0-9]|2[0-4]):[0-5][0-9]-([0-1][0-9]|2[0-4]):[0-5][0-9]",
-                schedule_time,
-        ):
-            raise InvalidFormatException(
-                f"The format for schedule_time doesn't match. Expected '([0-1][0-9] | 2[0-4]):[0-5][0-9]-([0-1][0-9] | 2[0-4]):[0-5][0-9]', got {schedule_time}"
-            )
-
-        start_time, finish_time = schedule_time.split("-")
-        start_time_h, start_time_m = list(map(int, start_time.split(":")))
-        finish_time_h, finish_time_m = list(map(int, finish_time.split(":")))
-        if (start_time_h * 60 + start_time_m >= finish_time_h * 60 +
-                finish_time_m) and not (start_time_h == 23
-                                        and finish_time_h == 0):
-            raise InvalidFormatException(
-                f"The start time for schedule_time must be earlier than the finish time (got {schedule_time})"
-            )
-
-        self._schedule_time = schedule_time
+        self._schedule_time = self.SCHEMA.clean("schedule_time", schedule_time)
 
     @property
     def schedule_days(self) -> str:
@@ -348,9 +378,7 @@ class Course:
 
     @schedule_days.setter
     def schedule_days(self, schedule_days: str):
-        # TODO: make schedule days a list of weekdays abbreviated as ['Mo', 'Tu', 'We', 'Th', 'Fr', 'Sa', 'Su']
-        # TODO: check for type and re match
-        self._schedule_days = schedule_days
+        self._schedule_days = self.SCHEMA.clean("schedule_days", schedule_days)
 
     @property
     def syllabus(self) -> Tuple[str, str]:
@@ -385,19 +413,41 @@ class Course:
     @grade_range.setter
     def grade_range(self, grade_range: Tuple[int, int]):
         if type(grade_range) == tuple and len(grade_range) == 2:
-            if grade_range[1] >= grade_range[0]:
+            if grade_range[0] >= grade_range[1]:
                 raise ValueError(
                     "Max value must be larger than min value for grade range")
             self._grade_range = grade_range
         else:
             raise ValueError("Grade range is not tuple or of length 2")
 
+    @property
+    def revision(self) -> int:
+        return self._revision
+
+    @revision.setter
+    def revision(self, revision: int):
+        if not isinstance(revision, int):
+            raise InvalidTypeException(
+                f"The revision provided is not an int (type provided is {type(revision)})."
+            )
+
+        self._revision = revision
+
     @property
     def course_analytics(self) -> dict:
         return self._course_analytics
 
     @course_analytics.setter
-    def course_analytics(self, analyticsDict: dict):
+    def course_analytics(self, analyticsDict: Optional[dict]):
+        if analyticsDict is None:
+            self._course_analytics = None
+            return
+
+        if not isinstance(analyticsDict, dict):
+            raise InvalidTypeException(
+                f"The analyticsDict provided is not a dict (type provided is {type(analyticsDict)})."
+            )
+
         dictKeys = [
             "total_average",
             "starting_average",
@@ -412,12 +462,15 @@ class Course:
                     f"The analyticsDict {analyticsDict} is missing the key: {key}"
                 )
 
+        for entry in analyticsDict["assignment_history"]:
             for key in assignmentHistoryKeys:
-                if key not in dictKeys["assignment_history"]:
+                if key not in entry:
                     raise InvalidFormatException(
                         f"The assignment_history dictionary in analyticsDict {analyticsDict} is missing the key: {key}"
                     )
 
+        self._course_analytics = analyticsDict
+
     def to_dict(self) -> dict:
         dict_course = {
             "department": self.department,
@@ -431,6 +484,8 @@ class Course:
             "syllabus": self.syllabus,
             "assignments": self.assignments,
             "grade_range": list(self.grade_range),
+            "revision": self.revision,
+            "course_analytics": self.course_analytics,
         }
 
         try:
@@ -465,29 +520,37 @@ class Course:
             grade_range=dictionary["grade_range"]
             if "grade_range" in dictionary else None,
             _id=dictionary["_id"],
+            revision=dictionary.get("revision"),
+            course_analytics=dictionary.get("course_analytics"),
         )
 
     def add(self) -> bool:
         """Add this course to the database"""
+        from api.tools.fulltext import course_changed
+
         try:
             self.id = db.courses.insert_one(self.to_dict()).inserted_id
+            course_changed(self.id)
             return True
         except pymongo.errors.DuplicateKeyError:
             logger.exception(
-                f"The Course with the id {self.id} already exists, you should not be calling the add() method."
-            )
+                "The Course with the id %s already exists, you should not be calling the add() method.",
+                self.id)
             return False
         except Exception as e:
-            logger.exception(f"Error while adding course {self.to_dict()}")
+            logger.exception("Error while adding course %r", self)
             return False
 
     def remove(self) -> bool:
         """Remove this course from the database"""
+        from api.tools.fulltext import course_removed
+
         try:
-            db.courses.remove({"_id": self.id})
+            db.courses.delete_one({"_id": ObjectId(self.id)})
+            course_removed(self.id)
             return True
         except Exception as e:
-            logger.exception(f"Error while deleting course {_id}")
+            logger.exception("Error while deleting course %s", _id)
             return False
 
     def update_department(self, department: str) -> bool:
@@ -501,20 +564,23 @@ class Course:
         bool
             `True` if the update operation was successful, `False` otherwise
         """
+        from api.tools.fulltext import course_changed
+
         try:
             self.department = department
-            db.courses.find_one_and_update({
-                "_id": self.id,
-                "$set": {
+            db.courses.find_one_and_update(
+                {"_id": ObjectId(self.id)},
+                {"$set": {
                     "department": self.department
-                }
-            })
+                }})
+
+            course_changed(self.id)
 
             return True
         except Exception as e:
             logger.exception(
-                f"Error while updating department {department} in class {self.id}"
-            )
+                "Error while updating department %s in class %s",
+                department, self.id)
 
             return False
 
@@ -529,17 +595,21 @@ class Course:
         bool
             `True` if the update operation was successful, `False` otherwise
         """
+        from api.tools.fulltext import course_changed
+
         try:
             self.number = number
-            db.courses.find_one_and_update({"_id": self.id},
+            db.courses.find_one_and_update({"_id": ObjectId(self.id)},
                                            {"$set": {
                                                "number": self.number
                                            }})
 
+            course_changed(self.id)
+
             return True
         except Exception as e:
             logger.exception(
-                f"Error while updating number {number} in class {self.id}")
+                "Error while updating number %s in class %s", number, self.id)
 
             return False
 
@@ -554,17 +624,28 @@ class Course:
         bool
             `True` if the update operation was successful, `False` otherwise
         """
+        from api.tools.fulltext import course_changed
+
         try:
             self.name = name
-            db.courses.find_one_and_update({"_id": self.id},
-                                           {"$set": {
-                                               "name": self.name
-                                           }})
+            db.courses.find_one_and_update(
+                {"_id": ObjectId(self.id)},
+                {
+                    "$set": {
+                        "name": self.name
+                    },
+                    "$inc": {
+                        "calendar_revision": 1
+                    },
+                },
+            )
+
+            course_changed(self.id)
 
             return True
         except Exception as e:
             logger.exception(
-                f"Error while updating name {name} in class {self.id}")
+                "Error while updating name %s in class %s", name, self.id)
 
             return False
 
@@ -578,20 +659,36 @@ class Course:
         -------
         bool
             `True` if the update operation was successful, `False` otherwise
+        Raises
+        ------
+        ScheduleConflictException
+            If the teacher teaches another course at the same time
         """
+        from api.tools.fulltext import course_changed
+        from api.tools.schedule import teacher_conflicts
+
+        conflicts = teacher_conflicts(teacher_id, self.id)
+        if conflicts:
+            raise ScheduleConflictException(
+                f"Teacher {teacher_id} already teaches at the time of course {self.id}",
+                [conflict.to_dict() for conflict in conflicts],
+            )
+
         try:
             self.teacher = teacher_id
             db.courses.find_one_and_update(
-                {"_id": self.id},
+                {"_id": ObjectId(self.id)},
                 {"$set": {
                     "teacher": ObjectId(self.teacher)
                 }})
 
+            course_changed(self.id)
+
             return True
         except Exception as e:
             logger.exception(
-                f"Error while updating teacher {teacher_id} in class {self.id}"
-            )
+                "Error while updating teacher %s in class %s",
+                teacher_id, self.id)
 
             return False
 
@@ -608,25 +705,52 @@ class Course:
         -------
         bool
             `True` if the update operation was successful, `False` otherwise
+
+        Raises
+        ------
+        ScheduleConflictException
+            If one of the students attends another course at the same time, nobody is enrolled then
         """
+        from api.tools.fulltext import course_changed
+        from api.tools.schedule import student_conflicts
+
+        conflicts = student_conflicts(student_ids, self.id)
+        if conflicts:
+            raise ScheduleConflictException(
+                f"{len(conflicts)} students already attend a course at the time of course {self.id}",
+                [
+                    dict(conflict.to_dict(), student=student_id)
+                    for student_id, found in conflicts.items()
+                    for conflict in found
+                ],
+            )
 
         for _id in student_ids:
             try:
-                db.students.find_one({"_id": ObjectId(_id)},
-                                     {"$push": {
-                                         "courses": self.id
-                                     }})
-                db.courses.find_one({"_id": self.id},
-                                    {"$push": {
-                                        "students": ObjectId(_id)
-                                    }})
+                db.students.update_one({"_id": ObjectId(_id)},
+                                       {"$push": {
+                                           "courses": self.id
+                                       }})
+                db.courses.update_one(
+                    {"_id": ObjectId(self.id)},
+                    {
+                        "$push": {
+                            "students": ObjectId(_id)
+                        },
+                        "$inc": {
+                            "revision": 1
+                        },
+                    },
+                )
 
             except Exception as e:
                 logger.exception(
-                    f"Error while updating student {_id} in class {self.id}: {e}"
-                )
+                    "Error while updating student %s in class %s: %s",
+                    _id, self.id, e)
 
                 return False
+
+        course_changed(self.id)
         return True
 
     def update_description(self, description: str) -> bool:
@@ -640,18 +764,22 @@ class Course:
         bool
             `True` if the update operation was successful, `False` otherwise
         """
+        from api.tools.fulltext import course_changed
+
         try:
             self.description = description
             db.courses.find_one_and_update(
-                {"_id": self.id}, {"$set": {
+                {"_id": ObjectId(self.id)}, {"$set": {
                     "description": self.description
                 }})
 
+            course_changed(self.id)
+
             return True
         except Exception as e:
             logger.exception(
-                f"Error while updating description {description} in class {self.id}"
-            )
+                "Error while updating description %s in class %s",
+                description, self.id)
 
             return False
 
@@ -669,16 +797,22 @@ class Course:
         try:
             self.schedule_time = schedule_time
             db.courses.find_one_and_update(
-                {"_id": self.id},
-                {"$set": {
-                    "schedule_time": self.schedule_time
-                }})
+                {"_id": ObjectId(self.id)},
+                {
+                    "$set": {
+                        "schedule_time": self.schedule_time
+                    },
+                    "$inc": {
+                        "calendar_revision": 1
+                    },
+                },
+            )
 
             return True
         except Exception as e:
             logger.exception(
-                f"Error while updating schedule_time {schedule_time} in class {self.id}"
-            )
+                "Error while updating schedule_time %s in class %s",
+                schedule_time, self.id)
 
             return False
 
@@ -696,16 +830,22 @@ class Course:
         try:
             self.schedule_days = schedule_days
             db.courses.find_one_and_update(
-                {"_id": self.id},
-                {"$set": {
-                    "schedule_days": self.schedule_days
-                }})
+                {"_id": ObjectId(self.id)},
+                {
+                    "$set": {
+                        "schedule_days": self.schedule_days
+                    },
+                    "$inc": {
+                        "calendar_revision": 1
+                    },
+                },
+            )
 
             return True
         except Exception as e:
             logger.exception(
-                f"Error while updating schedule_days {schedule_days} in class {self.id}"
-            )
+                "Error while updating schedule_days %s in class %s",
+                schedule_days, self.id)
 
             return False
 
@@ -721,18 +861,31 @@ class Course:
         bool
             `True` if the update operation was successful, `False` otherwise
         """
+        from api.tools.blobs import add_refs
+        from api.tools.blobs import remove_refs
+
         try:
             self.syllabus = syllabus
 
-            db.courses.find_one_and_update(
-                {"_id": self._id}, {"$set": {
+            previous = db.courses.find_one_and_update(
+                {"_id": ObjectId(self.id)},
+                {"$set": {
                     "syllabus": self.syllabus
-                }})
+                }},
+                projection={"syllabus": 1},
+            )
+
+            add_refs(self.syllabus[:1], f"syllabus:{self.id}")
+            if previous and previous.get("syllabus"):
+                old_syllabus = previous["syllabus"][0]
+                if old_syllabus not in self.syllabus[:1]:
+                    remove_refs([old_syllabus], f"syllabus:{self.id}")
 
             return True
         except:
             logger.exception(
-                f"Error while updating syllabus {syllabus} in class {self.id}")
+                "Error while updating syllabus %s in class %s",
+                syllabus, self.id)
 
             return False
 
@@ -751,15 +904,23 @@ class Course:
             self.grade_range = grade_range
 
             db.courses.find_one_and_update(
-                {"_id": self._id}, {"$set": {
-                    "grade_range": self.grade_range
-                }})
+                {"_id": ObjectId(self.id)},
+                {
+                    "$set": {
+                        "grade_range": self.grade_range
+                    },
+                    # The gradebooks and grade distributions depend on it
+                    "$inc": {
+                        "revision": 1
+                    },
+                },
+            )
 
             return True
-        except:
+        except Exception as e:
             logger.exception(
-                f"Error while updating grade_range {grade_range} in class {self.id}: {e}"
-            )
+                "Error while updating grade_range %s in class %s: %s",
+                grade_range, self.id, e)
 
             return False
 
@@ -768,7 +929,7 @@ class Course:
         Parameters
         ----------
         department : str, optional
-        number : str, optional
+        number : int, optional
         name : str, optional
         teacher : str, optional
         description : str, optional
@@ -793,12 +954,29 @@ class Course:
                     f"The course with id {self.id} does not exist.")
         except AttributeError:
             logger.exception(
-                f"The property `id` does not exist for this course")
+                "The property `id` does not exist for this course")
             return False
         except Exception as e:
-            logger.exception(f"Error while updating a course")
+            logger.exception("Error while updating a course")
+            return False
+
+        # Checks the whole payload first, so that an invalid field does not leave the course half
+        # updated
+        errors = self.SCHEMA.errors([kwargs], partial=True)
+        if errors:
+            logger.info("Invalid update of course %s: %s", self.id,
+                        [error.message for error in errors])
             return False
 
+        if kwargs.get("teacher"):
+            from api.classes import Teacher
+
+            if Teacher.get_by_id(kwargs["teacher"]) is None:
+                logger.info(
+                    "Invalid update of course %s: teacher %s does not exist",
+                    self.id, kwargs["teacher"])
+                return False
+
         PARAMETER_TO_METHOD = {
             "department": self.update_department,
             "number": self.update_number,
@@ -817,8 +995,8 @@ class Course:
             response = PARAMETER_TO_METHOD[key](value)
             if not response:
                 logger.exception(
-                    f"Error while updating course:{self.id} attribute: {key} value: {value}"
-                )
+                    "Error while updating course:%s attribute: %s value: %s",
+                    self.id, key, value)
                 return False
 
         return True
@@ -848,17 +1026,35 @@ class Course:
         assignment : Assignment
             The assignment to add
         """
+        from api.tools.blobs import add_refs
+        from api.tools.fulltext import course_changed
+        from api.tools.reminders import assignment_scheduled
+
         try:
             dictionary = assignment.to_dict()
             dictionary["_id"] = ObjectId()
             db.courses.find_one_and_update(
-                {"_id": self._id}, {"$push": {
-                    "assignments": dictionary
-                }})
+                {"_id": ObjectId(self._id)},
+                {
+                    "$push": {
+                        "assignments": dictionary
+                    },
+                    "$inc": {
+                        "revision": 1,
+                        "calendar_revision": 1
+                    },
+                },
+            )
+
+            add_refs([file_[0] for file_ in assignment.filenames or []],
+                     f"assignment:{dictionary['_id']}")
+            course_changed(self.id)
+            assignment_scheduled(self.id, dictionary["_id"],
+                                 assignment.due_by)
         except:
             logger.exception(
-                f"Error while adding assignment {assignment._id} to course {self._id}"
-            )
+                "Error while adding assignment %s to course %s",
+                assignment._id, self._id)
 
     def edit_assignment(self, assignment: Assignment):
         """Edits an assignment in this course
@@ -867,22 +1063,55 @@ class Course:
         assignment : Assignment
             The assignment to edit
         """
+        from api.tools.blobs import add_refs
+        from api.tools.blobs import remove_refs
+        from api.tools.fulltext import course_changed
+        from api.tools.reminders import assignment_scheduled
+
         try:
             dictionary = assignment.to_dict()
-            dictionary["_id"] = ObjectId(assignment.ID)
-            db.classes.update_one(
+            dictionary["_id"] = ObjectId(assignment.id)
+            previous = db.courses.find_one_and_update(
                 {
-                    "_id": self.ID,
+                    "_id": ObjectId(self.id),
                     "assignments._id": dictionary["_id"]
                 },
-                {"$set": {
-                    "assignments.$": dictionary
-                }},
+                {
+                    "$set": {
+                        "assignments.$": dictionary
+                    },
+                    "$inc": {
+                        "revision": 1,
+                        "calendar_revision": 1
+                    },
+                },
+                projection={
+                    "assignments": {
+                        "$elemMatch": {
+                            "_id": dictionary["_id"]
+                        }
+                    }
+                },
             )
+
+            if previous is not None:
+                ref = f"assignment:{dictionary['_id']}"
+                names = {file_[0] for file_ in assignment.filenames or []}
+                old_names = {
+                    file_[0]
+                    for file_ in previous["assignments"][0].get("filenames")
+                    or []
+                }
+
+                add_refs(names - old_names, ref)
+                remove_refs(old_names - names, ref)
+                course_changed(self.id)
+                assignment_scheduled(self.id, dictionary["_id"],
+                                     assignment.due_by)
         except:
             logger.exception(
-                f"Error while updating assignment {assignment._id} from course {self._id}"
-            )
+                "Error while updating assignment %s from course %s",
+                assignment._id, self._id)
 
     def delete_assignment(self, assignment_id: str):
         """Delete an assignment from this course
@@ -891,19 +1120,134 @@ class Course:
         assignment_id : str
             The ID of the assignment
         """
+        from api.tools.blobs import remove_refs
+        from api.tools.fulltext import course_changed
+
         try:
-            db.courses.update(
-                {"_id": self._id},
-                {"$pull": {
+            previous = db.courses.find_one_and_update(
+                {"_id": ObjectId(self._id)},
+                {
+                    "$pull": {
+                        "assignments": {
+                            "_id": ObjectId(assignment_id)
+                        }
+                    },
+                    "$inc": {
+                        "revision": 1,
+                        "calendar_revision": 1
+                    },
+                },
+                projection={
                     "assignments": {
-                        "_id": assignment_id
+                        "$elemMatch": {
+                            "_id": ObjectId(assignment_id)
+                        }
                     }
-                }})
+                },
+            )
+
+            # The files of the assignment and of its submissions are no longer referenced
+            for assignment in (previous or {}).get("assignments", []):
+                remove_refs(
+                    [file_[0] for file_ in assignment.get("filenames") or []],
+                    f"assignment:{assignment_id}",
+                )
+                for submission in assignment.get("submissions", []):
+                    remove_refs(
+                        [file_[0] for file_ in submission.get("filenames") or []],
+                        f"submission:{submission['_id']}",
+                    )
+
+            course_changed(self._id)
         except:
             logger.exception(
-                f"Error while deleting assignment {assignment_id} from class {self._id}"
+                "Error while deleting assignment %s from class %s",
+                assignment_id, self._id)
+
+    def update_submission_grade(self, assignment_id: str, submission_id: str,
+                                grade: str) -> bool:
+        r"""Updates the grade of a single submission in this course.
+
+        Bumps the course and assignment revisions in the same write, patches the cached
+        gradebook cell (see `api.tools.gradebook`) and refreshes the course analytics.
+
+        Parameters
+        ----------
+        assignment_id : str
+        submission_id : str
+        grade : str
+
+        Returns
+        -------
+        bool
+            `True` if the update operation was successful, `False` otherwise
+        """
+        from api.tools import analytics
+        from api.tools import gradebook
+
+        try:
+            dictionary = db.courses.find_one_and_update(
+                {
+                    "_id": ObjectId(self.id),
+                    # Unknown ids match no course, so the revisions are left alone
+                    "assignments": {
+                        "$elemMatch": {
+                            "_id": ObjectId(assignment_id),
+                            "submissions._id": ObjectId(submission_id),
+                        }
+                    },
+                },
+                {
+                    "$set": {
+                        "assignments.$[a].submissions.$[s].grade": grade
+                    },
+                    "$inc": {
+                        "revision": 1,
+                        "assignments.$[a].revision": 1
+                    },
+                },
+                projection={
+                    "revision": 1,
+                    "assignments": {
+                        "$elemMatch": {
+                            "_id": ObjectId(assignment_id)
+                        }
+                    },
+                },
+                array_filters=[
+                    {
+                        "a._id": ObjectId(assignment_id)
+                    },
+                    {
+                        "s._id": ObjectId(submission_id)
+                    },
+                ],
+                return_document=ReturnDocument.AFTER,
             )
 
+            if dictionary is None or not dictionary.get("assignments"):
+                raise Exception(
+                    f"The submission {submission_id} of assignment {assignment_id} does not exist in course {self.id}."
+                )
+
+            submission = next(
+                s for s in dictionary["assignments"][0].get("submissions", [])
+                if str(s["_id"]) == submission_id)
+
+            self.revision = dictionary["revision"]
+            patched = gradebook.record_grade(self.id, self.revision,
+                                             submission["student_id"],
+                                             assignment_id, grade)
+            analytics.update_course_analytics(self.id, patched, assignment_id)
+
+            return True
+        except Exception as e:
+            logger.exception(
+                "Error while updating grade of submission %s in class %s",
+                submission_id, self.id)
+
+            return False
+
     @staticmethod
     def get_by_id(_id: str) -> Course:
         """Get a course by its ID
@@ -916,7 +1260,7 @@ class Course:
         Course
             The course that was found
         """
-        return Course.from_dict(db.courses.find_one({"_id": ObjectId(_id)}))
+        return Course._from_db(db.courses.find_one({"_id": ObjectId(_id)}))
 
     @staticmethod
     def get_by_department_number(department: str, number: int) -> Course:
@@ -933,7 +1277,7 @@ class Course:
         Course
             The course that was found
         """
-        return Course.from_dict(
+        return Course._from_db(
             db.courses.find_one({
                 "department": department,
                 "number": number
@@ -6,6 +6,8 @@ from typing import Tuple
 
 from api import db
 from api import root_logger as logger
+from api.tools.hydration import Field
+from api.tools.hydration import from_db
 from bson import ObjectId
 
 from . import Student
@@ -13,6 +15,11 @@ from . import User
 
 
 class Parent(User):
+    __slots__ = ("children", )
+
+    FIELDS = User.FIELDS + (Field("children", "children", "[]"), )
+    _from_db = from_db(FIELDS)
+
     _type = "Parent"  # Immutable
 
     def __init__(
@@ -44,9 +51,10 @@ class Parent(User):
             email=email,
             first_name=first_name,
             last_name=last_name,
-            id=_id,
+            _id=_id,
             calendar=calendar,
         )
+        self.children = children or []
 
     def __repr__(self):
         return f"<Parent {self._id}>"
@@ -80,8 +88,8 @@ class Parent(User):
             return Parent(**dictionary)
         except Exception as e:
             logger.exception(
-                f"Error while generating a Parent from dictionary {dictionary}"
-            )
+                "Error while generating a Parent from dictionary %s",
+                dictionary)
             return None
 
     @staticmethod
@@ -97,9 +105,9 @@ class Parent(User):
         Parent
         """
         try:
-            return Parent.from_dict(db.parents.find_one({"_id": ObjectId(id)}))
+            return Parent._from_db(db.parents.find_one({"_id": ObjectId(id)}))
         except:
-            logger.exception(f"Error when returning Parent by id {id}")
+            logger.exception("Error when returning Parent by id %s", id)
             return None
 
     @staticmethod
@@ -115,7 +123,7 @@ class Parent(User):
         Parent
         """
         try:
-            return Parent.from_dict(db.parents.find_one({"email": email}))
+            return Parent._from_db(db.parents.find_one({"email": email}))
         except:
-            logger.exception(f"Error when returning Parent by email {email}")
+            logger.exception("Error when returning Parent by email %s", email)
             return None
@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import re
 from typing import List
 from typing import Optional
 from typing import Union
@@ -8,11 +7,37 @@ from typing import Union
 from api import db
 from api import root_logger as logger
 from api.tools.exceptions import InvalidFormatException
+from api.tools.dates import get_timezone
 from api.tools.exceptions import InvalidTypeException
+from api.tools.validation import Rule
+from api.tools.validation import Schema
 from bson import ObjectId
+from pytz import UnknownTimeZoneError
 
 
 class SchoolConfig:
+    # The validated fields, see `api.tools.validation`. They are empty until the school sets them
+    SCHEMA = Schema({
+        "school_name":
+        Rule(max_length=100,
+             pattern=r"[\w \.]{1,50}",
+             expected="only alpha characters, space, or dot",
+             blank=""),
+        "school_email":
+        Rule(pattern=r"^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$",
+             expected="an email address",
+             blank=""),
+        "principal":
+        Rule(max_length=100,
+             pattern=r"[\w \.]{1,50}",
+             expected="only alpha characters, space, or dot",
+             blank=""),
+        "principal_email":
+        Rule(pattern=r"^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$",
+             expected="an email address",
+             blank=""),
+    })
+
     _school_name: str
     _school_address: str
     _phone_number: str
@@ -23,6 +48,7 @@ class SchoolConfig:
     _department_description: list
     _grade_weights: bool
     _grading: list
+    _timezone: str
     _id: str
 
     def __init__(
@@ -37,6 +63,7 @@ class SchoolConfig:
             department_description: Optional[list] = None,
             grade_weights: Optional[bool] = None,
             grading: Optional[list] = None,
+            timezone: Optional[str] = None,
             _id: str = None,
     ):
         """
@@ -73,16 +100,22 @@ class SchoolConfig:
 
         grading: List[str], optional
             Grading System for the school(Can be Letter Grades(A-F))
+
+        timezone: str, optional
+            The IANA name of the timezone of the school, e.g. "America/New_York", in which dates
+            are shown and typed. Defaults to "UTC" (dates are always stored in UTC)
         """
         self.school_name = school_name or ""
         self.school_address = school_address or ""
         self.phone_number = phone_number or ""
         self.school_email = school_email or ""
         self.principal = principal or ""
+        self.principal_email = principal_email or ""
         self.departments = departments or list()
         self.department_description = department_description or list()
         self.grade_weights = grade_weights or False
         self.grading = grading or list()
+        self.timezone = timezone or "UTC"
         if _id is not None:
             self.id = _id
 
@@ -114,22 +147,7 @@ class SchoolConfig:
 
     @school_name.setter
     def school_name(self, school_name: str):
-        if not isinstance(school_name, str):
-            raise InvalidTypeException(
-                f"The school name provided is not a str (type provided is {type(school_name)})."
-            )
-
-        if not 0 < len(school_name) <= 100:
-            raise InvalidFormatException(
-                f"The length of the school name should not exceed 100 characters (currently: {len(school_name)})"
-            )
-
-        if not re.match("[\w \.]{1,50}", school_name, flags=re.UNICODE):
-            raise InvalidFormatException(
-                f"The format for the name doesn't match. Expected only alpha characters, space, or dot, got {school_name}"
-            )
-
-        self._school_name = school_name
+        self._school_name = self.SCHEMA.clean("school_name", school_name)
 
     @property
     def school_address(self) -> str:
@@ -149,7 +167,7 @@ class SchoolConfig:
         return self._phone_number
 
     @phone_number.setter
-    def school_name(self, phone_number: str):
+    def phone_number(self, phone_number: str):
         if not isinstance(phone_number, str):
             raise InvalidTypeException(
                 f"The phone number provided is not a str (type provided is {type(phone_number)})."
@@ -162,18 +180,8 @@ class SchoolConfig:
         return self._school_email
 
     @school_email.setter
-    def school_name(self, school_email: str):
-        if not isinstance(school_email, str):
-            raise InvalidTypeException(
-                f"The school email provided is not a str (type provided is {type(school_email)})."
-            )
-
-        if not re.match(r"^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$",
-                        school_email):
-            raise InvalidTypeException(
-                f"The school email provided is not a valid email.")
-
-        self._school_email = school_email
+    def school_email(self, school_email: str):
+        self._school_email = self.SCHEMA.clean("school_email", school_email)
 
     @property
     def principal(self) -> str:
@@ -181,40 +189,16 @@ class SchoolConfig:
 
     @principal.setter
     def principal(self, principal: str):
-        if not isinstance(principal, str):
-            raise InvalidTypeException(
-                f"The principal name provided is not a str (type provided is {type(principal)})."
-            )
-
-        if not 0 < len(principal) <= 100:
-            raise InvalidFormatException(
-                f"The length of the name should not exceed 100 characters (currently: {len(principal)})"
-            )
-
-        if not re.match("[\w \.]{1,50}", name, flags=re.UNICODE):
-            raise InvalidFormatException(
-                f"The format for the name doesn't match. Expected only alpha characters, space, or dot, got {principal}"
-            )
-
-        self._principal = principal
+        self._principal = self.SCHEMA.clean("principal", principal)
 
     @property
     def principal_email(self) -> str:
         return self._principal_email
 
     @principal_email.setter
-    def school_name(self, principal_email: str):
-        if not isinstance(principal_email, str):
-            raise InvalidTypeException(
-                f"The principal's email provided is not a str (type provided is {type(principal_email)})."
-            )
-
-        if not re.match(r"^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$",
-                        principal_email):
-            raise InvalidTypeException(
-                "The principal's email provided is not a valid email.")
-
-        self._principal_email = principal_email
+    def principal_email(self, principal_email: str):
+        self._principal_email = self.SCHEMA.clean("principal_email",
+                                                  principal_email)
 
     @property
     def departments(self) -> List:
@@ -248,9 +232,9 @@ class SchoolConfig:
 
     @grade_weights.setter
     def grade_weights(self, grade_weights: bool):
-        if not isinstance(self, grade_weights, bool):
+        if not isinstance(grade_weights, bool):
             raise InvalidTypeException(
-                f"The grade weights provided is not a boolean (type provided is {type(department_description)})."
+                f"The grade weights provided is not a boolean (type provided is {type(grade_weights)})."
             )
 
         self._grade_weights = grade_weights
@@ -268,6 +252,31 @@ class SchoolConfig:
 
         self._grading = grading
 
+    @property
+    def timezone(self) -> str:
+        return self._timezone
+
+    @timezone.setter
+    def timezone(self, timezone: str):
+        if not isinstance(timezone, str):
+            raise InvalidTypeException(
+                f"The timezone provided is not a str (type provided is {type(timezone)})."
+            )
+
+        try:
+            self._tzinfo = get_timezone(timezone)
+        except UnknownTimeZoneError:
+            raise InvalidFormatException(
+                f"The timezone provided is not a valid IANA timezone name (got {timezone})"
+            )
+
+        self._timezone = timezone
+
+    @property
+    def tzinfo(self):
+        r"""The timezone of the school, see :mod:`api.tools.dates`."""
+        return self._tzinfo
+
     def to_dict(self) -> dict:
         """
         Converts the general information to a dictionary.
@@ -283,6 +292,7 @@ class SchoolConfig:
             "department_description": self.department_description,
             "grade_weights": self.grade_weights,
             "grading": self.grading,
+            "timezone": self.timezone,
         }
 
         return dict_school
@@ -294,6 +304,15 @@ class SchoolConfig:
         """
         return cls(**dictionary)
 
+    @classmethod
+    def get(cls) -> SchoolConfig:
+        r"""Returns the stored settings of the school, or the defaults if there are none."""
+        dictionary = db.general_info.find_one({})
+        if dictionary is None:
+            return cls()
+
+        return cls.from_dict(dictionary)
+
     def update_school_name(self, school_name: str) -> bool:
         r"""Updates the school's name.
 
@@ -319,7 +338,7 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating school name {school_name}: {e}")
+                "Error while updating school name %s: %s", school_name, e)
 
             return False
 
@@ -348,7 +367,8 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating school adresss {school_address}: {e}")
+                "Error while updating school adresss %s: %s",
+                school_address, e)
 
             return False
 
@@ -377,8 +397,8 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating school phone number {phone_number}: {e}"
-            )
+                "Error while updating school phone number %s: %s",
+                phone_number, e)
 
             return False
 
@@ -407,7 +427,7 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating school email {school_email}: {e}")
+                "Error while updating school email %s: %s", school_email, e)
 
             return False
 
@@ -436,7 +456,7 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating principal {principal}: {e}")
+                "Error while updating principal %s: %s", principal, e)
 
             return False
 
@@ -465,8 +485,8 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating principal's email {principal_email}: {e}"
-            )
+                "Error while updating principal's email %s: %s",
+                principal_email, e)
 
             return False
 
@@ -495,7 +515,7 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating departments {departments}: {e}")
+                "Error while updating departments %s: %s", departments, e)
 
             return False
 
@@ -525,8 +545,8 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating department descriptions {department_description}: {e}"
-            )
+                "Error while updating department descriptions %s: %s",
+                department_description, e)
 
             return False
 
@@ -555,7 +575,7 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating grade weights {grade_weights}: {e}")
+                "Error while updating grade weights %s: %s", grade_weights, e)
 
             return False
 
@@ -584,7 +604,35 @@ class SchoolConfig:
 
         except Exception as e:
             logger.exception(
-                f"Error while updating grading system {grading}: {e}")
+                "Error while updating grading system %s: %s", grading, e)
+
+            return False
+
+    def update_timezone(self, timezone: str) -> bool:
+        r"""Updates the school's timezone.
+
+        Parameters
+        ----------
+        timezone : str
+
+        Returns
+        -------
+        bool
+            `True` if the update operation was successful, `False` otherwise
+        """
+        try:
+            self.timezone = timezone
+            db.general_info.update_one({},
+                                       {"$set": {
+                                           "timezone": self.timezone
+                                       }},
+                                       upsert=True)
+
+            return True
+
+        except Exception as e:
+            logger.exception("Error while updating timezone %s: %s",
+                             timezone, e)
 
             return False
 
@@ -603,6 +651,7 @@ class SchoolConfig:
         department_description: List[str], optional
         grade_weights: bool, optional
         grading: List[str], optional
+        timezone: str, optional
 
         Returns
         -------
@@ -616,9 +665,17 @@ class SchoolConfig:
         **Important**: to avoid confusion, we suggest to avoid using positional parameters when calling this method.
         """
 
+        # Checks the whole payload first, so that an invalid field does not leave the settings half
+        # updated
+        errors = self.SCHEMA.errors([kwargs], partial=True)
+        if errors:
+            logger.info("Invalid update of the school settings: %s",
+                        [error.message for error in errors])
+            return False
+
         PARAMETER_TO_METHOD = {
             "school_name": self.update_school_name,
-            "school_adress": self.update_school_address,
+            "school_address": self.update_school_address,
             "phone_number": self.update_phone_number,
             "school_email": self.update_school_email,
             "principal": self.update_principal,
@@ -627,6 +684,7 @@ class SchoolConfig:
             "department_description": self.update_department_description,
             "grade_weights": self.update_grade_weights,
             "grading": self.update_grading,
+            "timezone": self.update_timezone,
         }
 
         # Go through all the parameters that are None
@@ -634,8 +692,8 @@ class SchoolConfig:
             response = PARAMETER_TO_METHOD[key](value)
             if not response:
                 logger.exception(
-                    f"Error while updating school information attribute:{parameter} value:{value}"
-                )
+                    "Error while updating school information attribute:%s value:%s",
+                    key, value)
                 return False
 
         return True
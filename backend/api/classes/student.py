@@ -7,6 +7,8 @@ from typing import Tuple
 from api import db
 from api import root_logger as logger
 from bcrypt import hashpw
+from api.tools.hydration import Field
+from api.tools.hydration import from_db
 from bson import ObjectId
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 
@@ -17,6 +19,15 @@ from .user import User
 
 
 class Student(User):
+    __slots__ = ("courses", "assignments", "parents")
+
+    FIELDS = User.FIELDS + (
+        Field("courses", "courses", "[]"),
+        Field("assignments", "assignments", "[]"),
+        Field("parents", "parents", "[]"),
+    )
+    _from_db = from_db(FIELDS)
+
     _type = "Student"  # Immutable
 
     def __init__(
@@ -58,10 +69,12 @@ class Student(User):
             _id=_id,
             password=password,
             calendar=calendar,
+            activated=activated,
         )
 
         self.courses = courses or []
         self.assignments = assignments or []
+        self.parents = parents or []
 
     def __repr__(self):
         return f"<Student {self.id}>"
@@ -79,6 +92,7 @@ class Student(User):
             "password": "",
             "courses": self.courses,
             "assignments": self.assignments,
+            "parents": self.parents,
             "activated": self.activated,
         }
 
@@ -96,10 +110,10 @@ class Student(User):
         Student
         """
         try:
-            return Student.from_dict(
+            return Student._from_db(
                 db.students.find_one({"_id": ObjectId(id)}))
         except BaseException as e:
-            logger.exception(f"Error while getting a student by id {id}")
+            logger.exception("Error while getting a student by id %s", id)
             return None
 
     @staticmethod
@@ -114,52 +128,31 @@ class Student(User):
         Student
         """
         try:
-            return Student.from_dict(db.students.find_one({"email": email}))
+            return Student._from_db(db.students.find_one({"email": email}))
         except BaseException as e:
-            logger.exception(f"Error while getting a student by email {id}")
+            logger.exception("Error while getting a student by email %s", id)
             return None
 
     @staticmethod
-    def get_by_keyword(keyword: str) -> Student:
-        r"""Returns Student with a specified keyword.
+    def get_by_keyword(keyword: str) -> List[dict]:
+        r"""Returns the students whose names best match a keyword, from the in-process name index.
         Parameters
         ---------
         keyword: str
+            The beginning of a first name, last name or full name
 
         Returns
         ------
-        List[Student]
+        List[dict]
+            At most 5 students, as dictionaries with `id`, `type`, `first_name` and `last_name`
         """
-        try:
-            students = db.students.aggregate([
-                {
-                    "$search": {
-                        "autocomplete": {
-                            "query": keyword,
-                            "path": "first_name"
-                        }
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 1,
-                        "first_name": 1,
-                        "last_name": 1
-                    }
-                },
-                {
-                    "$limit": 5
-                },
-            ])
-
-            possible_students = []
-            for student in students:
-                possible_students.append(Student.from_dict(student))
-            return possible_students
+        from api.tools.names import search
 
-        except BaseException as e:
+        try:
+            return search(keyword, ["Student"])
+        except Exception as e:
             logger.exception(
-                f"Error while getting a student by name {id}: {e}")
+                "Error while getting a student by name %s: %s", keyword, e)
             return None
 
     @staticmethod
@@ -181,42 +174,57 @@ class Student(User):
             return Student(**dictionary)
         except Exception as e:
             logger.exception(
-                f"Error while generating a Student from dictionary {dictionary}"
-            )
+                "Error while generating a Student from dictionary %s",
+                dictionary)
             return None
 
     def add(self) -> bool:
         r"""Adds the student to the DB."""
+        from api.tools.names import user_added
 
         try:
             self.id = db.students.insert_one(self.to_dict()).inserted_id
         except Exception as e:
-            logger.exception(f"Error while adding Student {self.id}")
+            logger.exception("Error while adding Student %s", self.id)
             return False
         else:
+            user_added(self._type, self.id, self.first_name, self.last_name)
             return True
 
     def remove(self) -> bool:
         r"""Removes this student from the database."""
+        from api.tools.names import user_removed
 
         try:
             db.students.delete_one({"_id": ObjectId(self.id)})
         except pymongo.errors.DuplicateKeyError:
             logger.exception(
-                f"The Student with the id {self.id} already exists, you should not be calling the add() method."
-            )
+                "The Student with the id %s already exists, you should not be calling the add() method.",
+                self.id)
             return False
         except Exception as e:
-            logger.exception(f"Error while removing Student {self.id}")
+            logger.exception("Error while removing Student %s", self.id)
             return False
         else:
+            user_removed(self._type, self.id)
             return True
 
     def get_assignments(self) -> List[Assignment]:
         """Gets a list of assignments from the database for this student"""
+        # All the courses in a single query, in the order of `self.courses`
+        courses = {
+            str(course["_id"]): Course._from_db(course)
+            for course in db.courses.find({
+                "_id": {
+                    "$in": [ObjectId(course_id) for course_id in self.courses]
+                }
+            })
+        } if self.courses else dict()
+
         assignments = list()
         for course_id in self.courses:
-            assignments.extend(Course.get_by_id(course_id).get_assignments())
+            if str(course_id) in courses:
+                assignments.extend(courses[str(course_id)].get_assignments())
 
         # TODO: add logger
 
@@ -258,11 +266,21 @@ class Student(User):
                 "_id": ObjectId(course_id),
                 "assignments._id": ObjectId(submission.assignment_id),
             },
-            {"$push": {
-                "assignments.$.submissions": dictionary
-            }},
+            {
+                "$push": {
+                    "assignments.$.submissions": dictionary
+                },
+                "$inc": {
+                    "revision": 1
+                },
+            },
         )
 
+        from api.tools.blobs import add_refs
+
+        add_refs([file_[0] for file_ in submission.files or []],
+                 f"submission:{submission.id}")
+
         # TODO: add logger
 
         unique_submission_string = (course_id + "_" +
@@ -292,7 +310,7 @@ class Student(User):
             Token for activation
         """
         s = Serializer(current_app.config["SECRET_KEY"], expires_sec)
-        return s.dumps({"student_id": self.ID}).decode("utf-8")
+        return s.dumps({"student_id": self.id}).decode("utf-8")
 
     @staticmethod
     def verify_activation_token(token: str):
@@ -1,17 +1,39 @@
 from __future__ import annotations
 
 from datetime import datetime
-from datetime import time
+from typing import Optional
 from typing import Union
 
 from api import db
+from api import root_logger as logger
+from api.tools.dates import clean_datetime
+from api.tools.dates import parse_stored_datetime
 from api.tools.exceptions import InvalidFormatException
+from api.tools.hydration import Field
+from api.tools.hydration import from_db
+from bson import ObjectId
 
 
 class Submission:
+    __slots__ = ("_assignment_id", "_student_id", "_date_time_submitted",
+                 "_content", "_files", "_grade", "_id")
+
+    # The stored fields, see `api.tools.hydration`: the assignment is the one they are stored in
+    FIELDS = (
+        Field("_id", "_id", convert=str),
+        Field("assignment_id", "_assignment_id", '""'),
+        Field("student_id", "_student_id"),
+        Field("date_submitted", "_date_time_submitted", "None",
+              parse_stored_datetime),
+        Field("content", "_content", '""'),
+        Field("filenames", "_files", "[]"),
+        Field("grade", "_grade", '""'),
+    )
+    _from_db = from_db(FIELDS)
+
     _assignment_id: str
     _student_id: str
-    _date_time_submitted: str
+    _date_time_submitted: datetime
     _content: str
     _files: list  # TODO: determine what type exactly
     _grade: str
@@ -36,7 +58,7 @@ class Submission:
         student_id: str ot bson.objectid.ObjectId
             The id of a student that created this Submission
         date_time_submitted: str or datetime.datetime
-            The exact time and date when an assignment was submitted (stored in utc, timezones are modified in school settings)
+            The exact time and date when an assignment was submitted (stored in utc, timezones are modified in school settings). An ISO 8601 string is parsed, see `api.tools.dates.parse_datetime`
         content: str #TODO: determine what format it is
             Content of an assignment stored in Delta format from Quill.js
         files: list, optional
@@ -56,16 +78,16 @@ class Submission:
 
     def to_dict(self) -> dict:
         dict_object = {
-            "date_submitted": str(self.date_submitted),
+            "date_submitted": self.date_time_submitted,
             "content": str(self.content),
-            "filenames": self.filenames,
+            "filenames": self.files,
             "student_id": self.student_id,
             "grade": self.grade,
         }
         try:
             dict_object["_id"] = ObjectId(self.id)
         except KeyError:
-            logger.exception(f"The attribute 'id' does not exist yet.")
+            logger.exception("The attribute 'id' does not exist yet.")
 
         return dict_object
 
@@ -96,8 +118,8 @@ class Submission:
                 assignment_id = str(assignment_id)
         except Exception as e:
             logger.exception(
-                f"The assignment_id {id} is not of valid format (has to be either bson.objectid.ObjectId or convertible to bson.objectid.ObjectId)"
-            )
+                "The assignment_id %s is not of valid format (has to be either bson.objectid.ObjectId or convertible to bson.objectid.ObjectId)",
+                id)
             raise InvalidFormatException(
                 f"The assignment_id {id} is not of valid format (has to be either bson.objectid.ObjectId or convertible to bson.objectid.ObjectId)"
             )
@@ -107,11 +129,11 @@ class Submission:
                 raise InvalidFormatException(
                     f"The assignment with provided id {id} does not exist")
         except InvalidFormatException as e:
-            logger.exception(f"Assignment with id {id} does not exist")
+            logger.exception("Assignment with id %s does not exist", id)
             raise e from InvalidFormatException
         except Exception as e:
             logger.exception(
-                f"Error while retrieving Assignment with id {id}: {e}")
+                "Error while retrieving Assignment with id %s: %s", id, e)
 
         self._assignment_id = assignment_id
 
@@ -130,8 +152,8 @@ class Submission:
                 student_id = str(student_id)
         except Exception as e:
             logger.exception(
-                f"The student_id {id} is not of valid format (has to be either bson.objectid.ObjectId or convertible to bson.objectid.ObjectId)"
-            )
+                "The student_id %s is not of valid format (has to be either bson.objectid.ObjectId or convertible to bson.objectid.ObjectId)",
+                id)
             raise InvalidFormatException(
                 f"The student_id {id} is not of valid format (has to be either bson.objectid.ObjectId or convertible to bson.objectid.ObjectId)"
             )
@@ -141,34 +163,22 @@ class Submission:
                 raise InvalidFormatException(
                     f"The Student with provided id {id} does not exist")
         except InvalidFormatException as e:
-            logger.exception(f"Student with id {id} does not exist")
+            logger.exception("Student with id %s does not exist", id)
             raise InvalidFormatException from e
         except Exception as e:
             logger.exception(
-                f"Error while retrieving Student with id {id}: {e}")
+                "Error while retrieving Student with id %s: %s", id, e)
 
         self._student_id = student_id
 
     @property
-    def date_time_submitted(self) -> str:
+    def date_time_submitted(self) -> datetime:
         return self._date_time_submitted
 
     @date_time_submitted.setter
     def date_time_submitted(self, date_time_submitted: Union[datetime, str]):
-        try:
-            if isinstance(date_time_submitted, str):
-                datetime(date_time_submitted)
-            else:
-                date_time_submitted = str(date_time_submitted)
-        except Exception as e:
-            logger.exception(
-                f"date_time_submitted provided is not of a valid datetime.datetime format (got {date_time_submitted})"
-            )
-            raise InvalidFormatException(
-                f"date_time_submitted provided is not of a valid datetime.datetime format (got {date_time_submitted})"
-            )
-
-        self._date_time_submitted = date_time_submitted
+        self._date_time_submitted = clean_datetime("date_time_submitted",
+                                                   date_time_submitted)
 
     @property
     def content(self) -> str:
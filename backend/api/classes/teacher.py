@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from datetime import datetime
+from datetime import timedelta
 from typing import Dict
 from typing import List
 from typing import Optional
@@ -9,13 +11,27 @@ from typing import Union
 import pymongo
 from api import db
 from api import root_logger as logger
+from api.tools.hydration import Field
+from api.tools.hydration import from_db
 from bson import ObjectId
 
 from . import CalendarEvent
 from . import User
 
+# The default range of `Teacher.get_calendar`, in days before and after today
+CALENDAR_DAYS_BEFORE = 30
+CALENDAR_DAYS_AFTER = 180
+
 
 class Teacher(User):
+    __slots__ = ("courses", "calendar")
+
+    FIELDS = User.FIELDS + (
+        Field("courses", "courses", "[]"),
+        Field("calendar", "calendar", "[]"),
+    )
+    _from_db = from_db(FIELDS)
+
     _type = "Teacher"  # Immutable
 
     def __init__(
@@ -91,35 +107,39 @@ class Teacher(User):
             return Teacher(**dictionary)
         except Exception as e:
             logger.exception(
-                f"Error while generating a Teacher from dictionary {dictionary}"
-            )
+                "Error while generating a Teacher from dictionary %s",
+                dictionary)
             return None
 
     def add(self) -> bool:
         r"""Adds the teacher to the DB."""
+        from api.tools.names import user_added
 
         try:
             self.id = db.teachers.insert_one(self.to_dict()).inserted_id
         except pymongo.errors.DuplicateKeyError:
             logger.exception(
-                f"The Teacher with the id {self.id} already exists, you should not be calling the add() method."
-            )
+                "The Teacher with the id %s already exists, you should not be calling the add() method.",
+                self.id)
             return False
         except:
-            logger.exception(f"Error while adding Teacher {self.id}")
+            logger.exception("Error while adding Teacher %s", self.id)
             return False
         else:
+            user_added(self._type, self.id, self.first_name, self.last_name)
             return True
 
     def remove(self) -> bool:
         r"""Removes this teacher from the database."""
+        from api.tools.names import user_removed
 
         try:
             db.teachers.delete_one({"_id": ObjectId(self.id)})
         except:
-            logger.exception(f"Error while removing Teacher {self.id}")
+            logger.exception("Error while removing Teacher %s", self.id)
             return False
         else:
+            user_removed(self._type, self.id)
             return True
 
     @staticmethod
@@ -136,10 +156,10 @@ class Teacher(User):
         Teacher
         """
         try:
-            return Teacher.from_dict(
+            return Teacher._from_db(
                 db.teachers.find_one({"_id": ObjectId(id)}))
         except:
-            logger.info(f"Error when returning Teacher by id {id}")
+            logger.info("Error when returning Teacher by id %s", id)
 
     @staticmethod
     def get_by_email(email: str) -> Teacher:
@@ -154,51 +174,30 @@ class Teacher(User):
         Teacher
         """
         try:
-            return Teacher.from_dict(db.teachers.find_one({"email": email}))
+            return Teacher._from_db(db.teachers.find_one({"email": email}))
         except:
-            logger.info(f"Error when returning Teacher by email {email}")
+            logger.info("Error when returning Teacher by email %s", email)
 
     @staticmethod
-    def get_by_keyword(keyword: str) -> Teacher:
-        r"""Returns Teacher with a specified keyword.
+    def get_by_keyword(keyword: str) -> List[dict]:
+        r"""Returns the teachers whose names best match a keyword, from the in-process name index.
         Parameters
         ---------
-        first_name: str
+        keyword: str
+            The beginning of a first name, last name or full name
 
         Returns
         ------
-        List[Teacher]
+        List[dict]
+            At most 5 teachers, as dictionaries with `id`, `type`, `first_name` and `last_name`
         """
+        from api.tools.names import search
+
         try:
-            teachers = db.teachers.aggregate([
-                {
-                    "$search": {
-                        "autocomplete": {
-                            "query": keyword,
-                            "path": "first_name"
-                        }
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 1,
-                        "first_name": 1,
-                        "last_name": 1
-                    }
-                },
-                {
-                    "$limit": 5
-                },
-            ])
-
-            possible_teachers = []
-            for teacher in teachers:
-                possible_teachers.append(Teacher.from_dict(teacher))
-            return possible_teachers
-
-        except BaseException as e:
+            return search(keyword, ["Teacher"])
+        except Exception as e:
             logger.exception(
-                f"Error while getting a teacher by name {id}: {e}")
+                "Error while getting a teacher by name %s: %s", keyword, e)
             return None
 
     def get_course_names(self) -> List[Tuple[str, str]]:
@@ -216,29 +215,33 @@ class Teacher(User):
 
         return courses
 
-    def get_calendar(self) -> List[object]:
-        r"""Returns a list of the Teacher's events
+    def get_calendar(self, start=None, end=None) -> List[dict]:
+        r"""Returns the Teacher's events between two dates
+
+        Parameters
+        ---------
+        start : str or datetime.datetime, optional
+            The start of the range, by default `CALENDAR_DAYS_BEFORE` days ago
+        end : str or datetime.datetime, optional
+            The end of the range, by default `CALENDAR_DAYS_AFTER` days from now
 
         Returns
         ------
-        List[object]
-            A list of a teacher's events: [title, start, end, background_color, url].
+        List[dict]
+            A list of a teacher's events: [id, title, start, end, color, url].
         """
+        from api.tools.calendar import EVENT
+        from api.tools.calendar import get_feed
+        from api.tools.dates import parse_datetime
 
-        events = list()
-        for event in self.calendar:
-            addEvent = {
-                "title": event["title"],
-                "start": event["start"],
-                "end": event["end"],
-                "color": event["color"],
-                "url": event["url"],
-            }
-            events.append(addEvent)
+        now = datetime.utcnow()
+        start = parse_datetime(start) or now - timedelta(
+            days=CALENDAR_DAYS_BEFORE)
+        end = parse_datetime(end) or now + timedelta(days=CALENDAR_DAYS_AFTER)
 
-        return events
+        return get_feed(self, start, end, [EVENT])
 
-    def add_calendar_event(self, teacher_id: str, event: dict):
+    def add_calendar_event(self, teacher_id: str, event: dict) -> dict:
         """Adds an event to the Teacher's calendar
 
         Parameters
@@ -247,32 +250,40 @@ class Teacher(User):
             ID of teacher adding the event
         event : dict
             Dictionary representation of event to be added {title, start, end, color, url}
+
+        Returns
+        ------
+        dict
+            The event added, with its id
         """
+        from api.tools.calendar import add_event
 
-        db.teachers.find_one_and_update(
-            {"_id": ObjectId(teacher_id)},
-            {"$push": {
-                "calendar": event
-            }},
-        )
+        return add_event(teacher_id, event.get("title"), event.get("start"),
+                         event.get("end"), event.get("color"),
+                         event.get("url"))
 
-    def remove_calendar_event(self, teacher_id: str, title: str):
+    def remove_calendar_event(self,
+                              teacher_id: str,
+                              title: Optional[str] = None,
+                              event_id: Optional[str] = None):
         """Removes an event from the Teacher's calendar
 
         Parameters
         ---------
         teacher_id : str
             ID of teacher removing the event
-        event : dict
-            Dictionary representation of event to be removed {title, start, end, color, url}
+        title : str, optional
+            Removes every event with this title, if `event_id` is not given
+        event_id : str, optional
+            ID of the event to remove
         """
+        from api.tools.calendar import remove_event
+        from api.tools.calendar import remove_events_titled
 
-        db.teachers.update({"_id": teacher_id},
-                           {"$pull": {
-                               "calendar": {
-                                   "title": title
-                               }
-                           }})
+        if event_id is not None:
+            remove_event(teacher_id, event_id)
+        elif title is not None:
+            remove_events_titled(teacher_id, title)
 
     def activate(self):
         r"""Activates the user
@@ -1,25 +1,28 @@
 from __future__ import annotations
 
 import datetime
-import re
 from typing import Dict
 from typing import List
 from typing import Optional
 from typing import Union
 
 from api import root_logger as logger
+from api.tools import metrics
 from api.tools.exceptions import InvalidFormatException
 from api.tools.exceptions import InvalidTypeException
+from api.tools.hydration import Field
+from api.tools.hydration import from_db
+from api.tools.validation import Rule
+from api.tools.validation import Schema
 from bcrypt import checkpw
 from bcrypt import gensalt
 from bcrypt import hashpw
 from bson import ObjectId
-from flask_login import UserMixin
 
 from . import CalendarEvent
 
 
-class User(UserMixin):
+class User:
     r"""The generic User class to be inherited by the others.
 
     Attributes
@@ -29,7 +32,42 @@ class User(UserMixin):
     Notes
     -----
     Do not use a User object directly, this is a generic object that should be inherited by more specific user classes.
+
+    Implements the interface of `flask_login` users itself, since `flask_login.UserMixin` has no
+    `__slots__`.
     """
+    __slots__ = ("_id", "_password", "_email", "_first_name", "_last_name",
+                 "_bio", "_date_of_birth", "_profile_picture", "_activated")
+
+    # The stored fields, see `_from_db`
+    FIELDS = (
+        Field("_id", "_id", convert=str),
+        Field("email", "_email"),
+        Field("first_name", "_first_name"),
+        Field("last_name", "_last_name"),
+        Field("password", "_password", '""'),
+        Field("bio", "_bio", '"A short bio."'),
+        Field("date_of_birth", "_date_of_birth", '"14-03-1879"'),
+        Field("profile_picture", "_profile_picture", '""'),
+        Field("activated", "_activated", "False"),
+    )
+    # Creates a user from a stored document, without validating it again
+    _from_db = from_db(FIELDS)
+
+    # The validated fields, see `api.tools.validation`
+    SCHEMA = Schema({
+        "email":
+        Rule(pattern=
+             r"^([a-zA-Z0-9_\-\.]+)@([a-zA-Z0-9_\-\.]+)\.([a-zA-Z]{2,5})$",
+             expected="an email address",
+             required=True),
+        "bio":
+        Rule(max_length=100,
+             pattern=r'[\w \.\+\(\)\[\]\{\}\?\*\&\^\%\$\#\/\'"~<>,:;!-_=@]{1,100}',
+             expected="letters, digits, spaces or punctuation",
+             blank="A short bio."),
+    })
+
     _type: str = None
 
     _id: str
@@ -86,6 +124,36 @@ class User(UserMixin):
     def __repr__(self):
         return f"<User {self.id}>"
 
+    # The interface of `flask_login` users
+
+    @property
+    def is_active(self) -> bool:
+        return True
+
+    @property
+    def is_authenticated(self) -> bool:
+        return True
+
+    @property
+    def is_anonymous(self) -> bool:
+        return False
+
+    def get_id(self) -> str:
+        return str(self.id)
+
+    def __eq__(self, other):
+        if isinstance(other, User):
+            return self.get_id() == other.get_id()
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return NotImplemented
+        return not equal
+
+    __hash__ = object.__hash__
+
     def to_dict(self) -> Dict[str, str]:
         r"""Converts the object to a dictionary."""
         dictionary = {
@@ -119,19 +187,7 @@ class User(UserMixin):
 
     @email.setter
     def email(self, email: str):
-        if not isinstance(email, str):
-            raise InvalidTypeException(
-                f"The email provided is not a str (type provided is {type(email)})."
-            )
-
-        if not re.match(
-                r"^([a-zA-Z0-9_\-\.]+)@([a-zA-Z0-9_\-\.]+)\.([a-zA-Z]{2,5})$",
-                email):
-            raise InvalidFormatException(
-                f"The email given is not in a valid email format (got {email})"
-            )
-
-        self._email = email
+        self._email = self.SCHEMA.clean("email", email)
 
     @property
     def first_name(self) -> str:
@@ -178,7 +234,9 @@ class User(UserMixin):
         # than sorry :D
         if not (isinstance(password, bytes) and password.startswith(
             (b"$2a$", b"$2b$", b"$2y$")) and len(password) == 60):
-            password = hashpw(password.encode("utf-8"), gensalt(prefix=b"2b"))
+            with metrics.PASSWORD_HASH_DURATION.time("hash"):
+                password = hashpw(password.encode("utf-8"),
+                                  gensalt(prefix=b"2b"))
 
         self._password = password
 
@@ -230,7 +288,8 @@ class User(UserMixin):
         bool
             `True` if the password is valid, `False` otherwise.
         """
-        return checkpw(password.encode("utf-8"), self.password)
+        with metrics.PASSWORD_HASH_DURATION.time("verify"):
+            return checkpw(password.encode("utf-8"), self.password)
 
     @property
     def bio(self) -> str:
@@ -238,30 +297,7 @@ class User(UserMixin):
 
     @bio.setter
     def bio(self, bio: str):
-        if not isinstance(bio, str):
-            raise InvalidTypeException(
-                f"The bio provided is not a str (type provided is {type(bio)})."
-            )
-
-        if bio == "":
-            self._bio = "A short bio."
-            return
-
-        if not 0 < len(bio) <= 100:
-            raise InvalidFormatException(
-                f"The string provided is too long. The bio should not exceed 100 characters. (currently: {len(bio)})"
-            )
-
-        if not re.match(
-                r'[\w \.\+\(\)\[\]\{\}\?\*\&\^\%\$\#\/\'"~<>,:;!-_=@]{1,100}',
-                bio,
-                flags=re.UNICODE,
-        ):
-            raise InvalidFormatException(
-                r"The format for bio doesn't match. Expected '[\w \.\+\(\)\[\]\{\}\?\*\&\^\%\$\#\/\'\"~<>,:;!-_=@]{1, 500}', got {bio}"
-                .format(bio=bio))
-
-        self._bio = bio
+        self._bio = self.SCHEMA.clean("bio", bio)
 
     @property
     def date_of_birth(self) -> str:
@@ -305,6 +341,45 @@ class User(UserMixin):
 
         self._profile_picture = profile_picture
 
+    def update_name(self, first_name: str, last_name: str) -> bool:
+        r"""Renames this user.
+        Method should only be called on the users that are already initialized and pushed to the DB.
+
+        Parameters
+        ----------
+        first_name : str
+        last_name : str
+
+        Returns
+        -------
+        bool
+            `True` if the update operation was successful, `False` otherwise
+        """
+        from api import db
+        from api.tools.names import USER_COLLECTIONS
+        from api.tools.names import user_added
+
+        try:
+            self.first_name = first_name
+            self.last_name = last_name
+
+            getattr(db, USER_COLLECTIONS[self._type]).update_one(
+                {"_id": ObjectId(self.id)},
+                {
+                    "$set": {
+                        "first_name": self.first_name,
+                        "last_name": self.last_name
+                    }
+                },
+            )
+            user_added(self._type, self.id, self.first_name, self.last_name)
+
+            return True
+        except:
+            logger.exception("Error while renaming user %s", self.id)
+
+            return False
+
     @staticmethod
     def get_activation_token(expires_sec=1800):
         """Gets an activation token for a user
@@ -320,7 +395,7 @@ class User(UserMixin):
             Token for activation
         """
         s = Serializer(current_app.config["SECRET_KEY"], expires_sec)
-        return s.dumps({"user_id": self.ID}).decode("utf-8")
+        return s.dumps({"user_id": self.id}).decode("utf-8")
 
     @staticmethod
     def verify_activation_token(token: str):
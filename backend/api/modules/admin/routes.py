@@ -7,9 +7,11 @@ from api.classes import Course
 from api.classes import Student
 from api.classes import Teacher
 from api.tools.decorators import required_access
+from api.tools.exceptions import ScheduleConflictException
 from api.tools.factory import error
 from api.tools.factory import response
 from api.tools.google_storage import upload_blob
+from api.tools.schedule import conflict_report
 from flask import current_app
 from flask import request
 from flask import url_for
@@ -49,7 +51,7 @@ def add_teacher():
 
     if teacher.add():
         flashes.append("Teacher added!")
-        logger.info(f"Teacher {teacher.email} added")
+        logger.info("Teacher %s added", teacher.email)
         token = teacher.get_activation_token()
         app = current_app._get_current_object()
         msg = Message(
@@ -65,7 +67,7 @@ def add_teacher():
         mail.send(msg)
         return response(flashes), 200
     else:
-        logger.info(f"Error adding teacher {teacher.email}")
+        logger.info("Error adding teacher %s", teacher.email)
         flashes.append("There was a problem adding this account")
         return response(flashes), 400
 
@@ -94,7 +96,7 @@ def add_student():
 
     if student.add():
         flashes.append("Student added!")
-        logger.info(f"Student {student.email} added")
+        logger.info("Student %s added", student.email)
         token = current_user.get_activation_token()
         app = current_app._get_current_object()
         msg = Message(
@@ -110,7 +112,7 @@ def add_student():
         mail.send(msg)
         return response(flashes), 200
     else:
-        logger.info(f"Error adding Student {student.email}")
+        logger.info("Error adding Student %s", student.email)
         flashes.append("There was a problem adding this account"), 400
         return response(flashes), 400
 
@@ -136,7 +138,7 @@ def register_courses():
         return error("Not all fields satisfied."), 400
 
     if Admin.add_course(course=course):
-        logger.info(f"Course {request.form['number']} added")
+        logger.info("Course %s added", request.form['number'])
         flashes.append("Course added!")
         return response(flashes), 200
     else:
@@ -200,6 +202,11 @@ def add_student_to_course():
 
     except KeyError:
         return response(flashes), 400
+    except ScheduleConflictException as e:
+        return response([str(e)], data={"conflicts": e.conflicts}), 409
+
+    flashes.append("Student added to the course!")
+    return response(flashes), 200
 
 
 @admin.route("/add-teacher-to-course", methods=["GET", "POST"])
@@ -225,6 +232,11 @@ def add_teacher_to_course():
 
     except KeyError:
         return response(flashes), 400
+    except ScheduleConflictException as e:
+        return response([str(e)], data={"conflicts": e.conflicts}), 409
+
+    flashes.append("Teacher added to the course!")
+    return response(flashes), 200
 
 
 @admin.route("/course", methods=["GET"])
@@ -261,25 +273,49 @@ def manage_courses_by_id(course_id: str):
             )
             syllabus = (blob.name, filename)
             course.update_syllabus(syllabus)
-            logger.info(f"Course {course._id} updated")
-        Course.update(
-            request.form.get("department"),
-            request.form.get("number"),
-            request.form.get("name"),
-            request.form.get("teacher"),
-            request.form.get("teacher"),
-            request.form.get("description"),
-            request.form.get("schedule_time"),
-            request.form.get("schedule_days"),
-            request.form.get("syllabus"),
-            request.form.get("student"),
-        )
+            logger.info("Course %s updated", course._id)
+        # Only the fields that were filled, all checked at once
+        payload = {
+            field: request.form[field]
+            for field in ("department", "number", "name", "teacher",
+                          "description", "schedule_time", "schedule_days")
+            if request.form.get(field)
+        }
+        if "number" in payload:
+            try:
+                payload["number"] = int(payload["number"])
+            except ValueError:
+                message = f"The course number should be a number, got {payload['number']}"
+                return response([message], errors={"number": message}), 400
+
+        errors = Course.SCHEMA.errors([payload], partial=True)
+        if errors:
+            return response([problem.message for problem in errors],
+                            errors={
+                                problem.field: problem.message
+                                for problem in errors
+                            }), 400
+
+        if not course.update(**payload):
+            return error("There was a problem updating the course"), 400
+
         flashes.append("Course information successfully updated!")
         return response(flashes), 200
     else:
         return error("Course does not exist"), 404
 
 
+@admin.route("/schedule-conflicts", methods=["GET"])
+def get_schedule_conflicts():
+    """Finds every student and teacher who has two courses at the same time.
+    Returns
+    -------
+    dict
+        The students and teachers with conflicts, and their conflicting courses
+    """
+    return response(data=conflict_report()), 200
+
+
 @admin.route("/add_student_to_parent", methods=["GET", "POST"])
 def add_student_to_parent():
     r"""Adds a student to a parent.
@@ -340,11 +376,13 @@ def get_names_by_search():
         Admin names
     """
     try:
-        admins = Admin.get_by_keyword(request.form["first_name"])
+        # Served from the in-process name index, without querying the database
+        admins = Admin.get_by_keyword(request.values["first_name"])
         possible_admins = list()
         for admin in admins:
             admin_data = {
-                "full_name": admin.first_name + " " + admin.last_name,
+                "id": admin["id"],
+                "full_name": admin["first_name"] + " " + admin["last_name"],
             }
             possible_admins.append(admin_data)
         return response(data={"possible_admins": possible_admins}), 200
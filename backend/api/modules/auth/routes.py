@@ -7,7 +7,6 @@ from api.classes import Parent
 from api.classes import Student
 from api.classes import Teacher
 from api.classes import User
-from api.tools.dictionaries import TYPE_DICTIONARY
 from api.tools.factory import error
 from api.tools.factory import response
 from flask import current_app
@@ -37,14 +36,10 @@ def load_user(id: str) -> Union[Teacher, Student, Parent, Admin]:
     Union[Teacher, Student, Parent, Admin]
         The user object that was retrieved from the database. Will return None if no users with a specified ID can be found.
     """
-    user = None
     for scope in [Teacher, Student, Admin, Parent]:
         user = scope.get_by_id(id)
         if user is not None:
-            break
-
-    if user is not None:
-        return TYPE_DICTIONARY[user._type].from_dict(user.to_dict())
+            return user
 
     return None
 
@@ -60,7 +55,7 @@ def login():
     """
 
     if current_user.is_authenticated:
-        logger.info(f"The user {current_user.id} is already authenticated.")
+        logger.info("The user %s is already authenticated.", current_user.id)
         # TODO: this should definitely be a method in a class
         current_user_info = {
             "userName": current_user.first_name + " " + current_user.last_name,
@@ -82,15 +77,15 @@ def login():
 
         for scope in [Student, Teacher, Admin, Parent]:
             logger.info(
-                f"Trying to find {scope.__name__} with email {email}...")
+                "Trying to find %s with email %s...", scope.__name__, email)
             user = scope.get_by_email(email)
             if user is not None:
-                logger.info(f"User: {user.first_name}")
+                logger.info("User: %s", user.first_name)
                 if user.validate_password(password):
                     login_user(user, remember_me)
                     logger.info(
-                        f"LOGGED IN: {user.first_name} {user.last_name} - ACCESS: {user._type}"
-                    )
+                        "LOGGED IN: %s %s - ACCESS: %s",
+                        user.first_name, user.last_name, user._type)
 
                     current_user_info = {
                         "userName":
@@ -110,13 +105,13 @@ def login():
                     )
 
                 logger.info(
-                    f"Failed to validate the password for the {scope.__name__} with email {email}"
-                )
+                    "Failed to validate the password for the %s with email %s",
+                    scope.__name__, email)
                 return error("Invalid password,"), 400
 
-            logger.info(f"Could not find {str(scope)} with email {email}")
+            logger.info("Could not find %s with email %s", scope, email)
 
-        logger.info(f"Could not find any users with email {email}")
+        logger.info("Could not find any users with email %s", email)
         return error("The user with this email does not exist."), 400
     except (KeyError, TypeError):
         logger.info("Not all fields satisfied")
@@ -133,8 +128,8 @@ def logout():
     dict
         The view response
     """
-    logger.info("LOGGED OUT: {} {} - ACCESS: {}".format(
-        current_user.first_name, current_user.last_name, current_user._type))
+    logger.info("LOGGED OUT: %s %s - ACCESS: %s", current_user.first_name,
+                current_user.last_name, current_user._type)
     logout_user()
     return response(["You have been logged out"]), 200
 
@@ -0,0 +1,12 @@
+r"""The blueprint that handles the calendars of every user.
+This includes personal events, assignment due dates and course meetings.
+"""
+from flask import Blueprint
+
+calendar = Blueprint(
+    "calendar",
+    __name__,
+    url_prefix="/api/calendar",
+)
+
+from . import routes
@@ -0,0 +1,187 @@
+from api.tools import calendar as calendars
+from api.tools import ical
+from api.tools.dates import parse_datetime
+from api.tools.decorators import required_access
+from api.tools.factory import error
+from api.tools.factory import response
+from flask import abort
+from flask import request
+from flask import Response
+from flask import url_for
+from flask_login import current_user
+
+from . import calendar
+
+# Seconds calendar apps may use a feed for before checking it again
+FEED_MAX_AGE = 900
+
+
+@required_access(["Student", "Teacher", "Admin", "Parent"])
+def verify_user():
+    # Required_access decorator already handled it
+    pass
+
+
+@calendar.before_request
+def calendar_verification():
+    # Calendar apps cannot log in, subscription feeds are only protected by their secret token
+    if request.endpoint != "calendar.subscription_feed":
+        verify_user()
+
+
+@calendar.route("/", methods=["GET"])
+def get_feed():
+    """Gets everything in the user's calendar between two dates
+
+    Parameters
+    -------
+    start: str
+        The start of the range (included), as an ISO 8601 date or datetime
+    end: str
+        The end of the range (excluded), at most a year after the start
+    type: str, optional
+        Only return entries of this type ("event", "assignment" or "class"), can be repeated
+
+    Returns
+    -------
+    dict
+        The entries of the calendar, sorted by start
+    """
+    types = request.args.getlist("type") or None
+    if types is not None and not set(types) <= set(calendars.TYPES):
+        return error(
+            f"The type should be one of {', '.join(calendars.TYPES)}"), 400
+
+    try:
+        start = parse_datetime(request.args.get("start"))
+        end = parse_datetime(request.args.get("end"))
+        if start is None or end is None:
+            return error("Both the start and the end are required"), 400
+
+        events = calendars.get_feed(current_user, start, end, types)
+    except ValueError as e:
+        return error(str(e)), 400
+
+    return response(data={"events": events}), 200
+
+
+@calendar.route("/events", methods=["POST"])
+def add_event():
+    """Adds an event to the user's calendar
+
+    Parameters
+    -------
+    title: str
+    start: str
+        An ISO 8601 date or datetime
+    end: str, optional
+        Same as start, by default the event has no duration
+    color: str, optional
+    url: str, optional
+
+    Returns
+    -------
+    dict
+        The new event, with its id
+    """
+    data = request.get_json() or dict()
+
+    try:
+        event = calendars.add_event(
+            current_user.id,
+            data.get("title"),
+            data.get("start"),
+            data.get("end"),
+            data.get("color"),
+            data.get("url"),
+        )
+    except (ValueError, TypeError) as e:
+        return error(str(e)), 400
+
+    return response(data={
+        "event": calendars.serialize(calendars.to_feed(event))
+    }), 201
+
+
+@calendar.route("/events/<string:event_id>", methods=["PATCH"])
+def edit_event(event_id: str):
+    """Edits some of the fields of an event of the user's calendar
+
+    Returns
+    -------
+    dict
+        The edited event
+    """
+    data = request.get_json() or dict()
+
+    try:
+        event = calendars.update_event(current_user.id, event_id, data)
+    except (ValueError, TypeError) as e:
+        return error(str(e)), 400
+
+    if event is None:
+        return error("Event not found"), 404
+
+    return response(data={
+        "event": calendars.serialize(calendars.to_feed(event))
+    }), 200
+
+
+@calendar.route("/events/<string:event_id>", methods=["DELETE"])
+def delete_event(event_id: str):
+    """Removes an event from the user's calendar
+
+    Returns
+    -------
+    dict
+        The view response
+    """
+    if not calendars.remove_event(current_user.id, event_id):
+        return error("Event not found"), 404
+
+    return response(["Event removed"]), 200
+
+
+@calendar.route("/subscription", methods=["GET", "POST"])
+def subscription():
+    """Gets the URL of the user's iCalendar feed, or replaces it with a new one (POST)
+
+    Returns
+    -------
+    dict
+        The URL to subscribe to from calendar apps
+    """
+    if request.method == "POST":
+        token = ical.rotate_token(current_user)
+    else:
+        token = ical.get_token(current_user)
+
+    return response(data={
+        "url": url_for("calendar.subscription_feed", token=token, _external=True)
+    }), 200
+
+
+@calendar.route("/feed/<string:token>.ics", methods=["GET"])
+def subscription_feed(token: str):
+    """Serves an iCalendar feed, conditionally on its ETag and Last-Modified date
+
+    Returns
+    -------
+    flask.Response
+        The feed, or an empty 304 response if the client's copy is up to date
+    """
+    feed = ical.get_feed(token, request.if_none_match)
+    if feed is None:
+        abort(404)
+
+    resp = Response(feed.body or b"", mimetype="text/calendar")
+    resp.set_etag(feed.etag)
+    resp.last_modified = feed.last_modified
+    resp.cache_control.private = True
+    resp.cache_control.max_age = FEED_MAX_AGE
+
+    if feed.body is None:
+        resp.status_code = 304
+        return resp
+
+    return resp.make_conditional(request)
@@ -0,0 +1,12 @@
+r"""The blueprint that serves the files stored on the local filesystem.
+This is only used with the "local" storage backend, GCS serves its own signed URLs.
+"""
+from flask import Blueprint
+
+files = Blueprint(
+    "files",
+    __name__,
+    url_prefix="/api/files",
+)
+
+from . import routes
@@ -0,0 +1,35 @@
+from api.tools.exceptions import InvalidFormatException
+from api.tools.storage import get_storage
+from api.tools.storage import LocalStorage
+from flask import abort
+from flask import request
+from flask import send_file
+
+from . import files
+
+
+@files.route("/<path:filename>", methods=["GET"])
+def download(filename: str):
+    r"""Serves a stored file through a signed URL.
+
+    Range requests and conditional requests are supported, and the file is streamed with the
+    server's `wsgi.file_wrapper` (`sendfile` under gunicorn) instead of being read in Python.
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        abort(404)
+
+    expires = request.args.get("expires", type=int)
+    signature = request.args.get("signature", "")
+    if expires is None or not storage.verify(filename, expires, signature):
+        abort(403)
+
+    try:
+        path = storage.path(filename)
+    except InvalidFormatException:
+        abort(404)
+
+    if not storage.exists(filename):
+        abort(404)
+
+    return send_file(path, conditional=True)
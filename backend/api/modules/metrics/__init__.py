@@ -0,0 +1,6 @@
+r"""The blueprint that exposes the metrics of the server to Prometheus."""
+from flask import Blueprint
+
+metrics = Blueprint("metrics", __name__)
+
+from . import routes
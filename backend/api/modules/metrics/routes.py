@@ -0,0 +1,24 @@
+import hmac
+
+from api.tools import metrics as registry
+from flask import abort
+from flask import current_app
+from flask import request
+from flask import Response
+
+from . import metrics
+
+
+@metrics.route("/metrics", methods=["GET"])
+def scrape():
+    r"""The metrics of every worker, in the Prometheus text format.
+
+    Requires an `Authorization: Bearer <METRICS_TOKEN>` header if `METRICS_TOKEN` is set.
+    """
+    token = current_app.config["METRICS_TOKEN"]
+    if token and not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(401)
+
+    return Response(registry.render(current_app.config["METRICS_DIR"]),
+                    content_type=registry.CONTENT_TYPE)
@@ -0,0 +1,12 @@
+r"""The blueprint that handles the school-wide search.
+This includes searching people, courses and assignments at once.
+"""
+from flask import Blueprint
+
+search = Blueprint(
+    "search",
+    __name__,
+    url_prefix="/api/search",
+)
+
+from . import routes
@@ -0,0 +1,54 @@
+from api.tools.decorators import required_access
+from api.tools.factory import error
+from api.tools.factory import response
+from api.tools.fulltext import search as search_index
+from api.tools.fulltext import TYPES
+from flask import request
+from flask_login import current_user
+
+from . import search
+
+# The maximum number of results returned at once
+MAX_LIMIT = 100
+
+
+@search.before_request
+@required_access(["Student", "Teacher", "Admin", "Parent"])
+def search_verification():
+    # Required_access decorator already handled it
+    pass
+
+
+@search.route("/", methods=["GET"])
+def search_everything():
+    """Searches the people, courses and assignments the user can see
+
+    Parameters
+    -------
+    q: str
+        The search query
+    type: str, optional
+        Only return results of this type ("person", "course" or "assignment"), can be repeated
+    limit: int, optional
+        The maximum number of results, by default 20
+    offset: int, optional
+        The number of results to skip, by default 0
+
+    Returns
+    -------
+    dict
+        The results (best first), their total number and the number of results of each type
+    """
+    query = request.args.get("q", "")
+    types = request.args.getlist("type") or None
+    limit = request.args.get("limit", 20, type=int)
+    offset = request.args.get("offset", 0, type=int)
+
+    if types is not None and not set(types) <= set(TYPES):
+        return error(f"The type should be one of {', '.join(TYPES)}"), 400
+
+    if not 1 <= limit <= MAX_LIMIT or offset < 0:
+        return error(f"The limit should be between 1 and {MAX_LIMIT}"), 400
+
+    return response(data=search_index(query, current_user, types, limit,
+                                      offset)), 200
@@ -6,10 +6,13 @@ from api import root_logger as logger
 from api.classes import Course
 from api.classes import Student
 from api.classes import Submission
+from api.tools.dashboard import get_dashboard
 from api.tools.decorators import required_access
 from api.tools.factory import error
 from api.tools.factory import response
+from api.tools.google_storage import get_file_urls
 from api.tools.google_storage import upload_blob
+from api.tools.google_storage import upload_files
 from api.tools.search import get
 from api.tools.search import get_all
 from bson import ObjectId
@@ -56,33 +59,22 @@ def submit(course_id: str, assignment_id: str):
 
     if assignment is not None and course_id in current_user.courses:
         try:
-            file_list = []
-            files = request.files.getlist("files")
-            if files[0].filename:
-                for file_ in files:
-                    filename = file_.filename
-                    blob = upload_blob(
-                        uuid.uuid4().hex + "." +
-                        file_.content_type.split("/")[-1],
-                        file_,
-                    )
-                    file_list.append((blob.name, filename))
+            # All the files are uploaded in parallel
+            file_list = upload_files(request.files.getlist("files"))
 
             submission = Submission(
-                date_submitted=datetime.utcnow(),
+                date_time_submitted=datetime.utcnow(),
                 content=request.form["content"],
-                filenames=file_list,
+                files=file_list,
                 student_id=current_user.id,
                 assignment_id=assignment_id,
             )
 
-            current_user.add_submission(current_user.id,
-                                        course_id,
-                                        submission=submission)
+            current_user.add_submission(course_id, submission=submission)
         except KeyError:
             return error("Not all fields satisfied"), 400
         else:
-            logger.info(f"Submission {submission.id} made")
+            logger.info("Submission %s made", submission.id)
             return response(["Submission was a success"]), 200
     else:
         return error("No assignment found"), 404
@@ -97,7 +89,11 @@ def assignments():
         The view response
     """
     logger.info("Accessed all assignments")
-    return response(data={"assignments": current_user.get_assignments()})
+    assignments = current_user.get_assignments()
+    return response(data={
+        "assignments": assignments,
+        "file_urls": get_file_urls(assignments)
+    })
 
 
 @student.route("/assignments/<string:course_id>/", methods=["GET"])
@@ -114,8 +110,12 @@ def assignments_by_class(course_id: str):
     """
 
     course_assignments = Course.get_by_id(course_id).get_assignments()
-    logger.info(f"All assignments from {course_id}.")
-    return response(data={"assignments": course_assignments})
+    logger.info("All assignments from %s.", course_id)
+    return response(
+        data={
+            "assignments": course_assignments,
+            "file_urls": get_file_urls(course_assignments),
+        })
 
 
 @student.route("/assignments/<string:assignment_id>/", methods=["GET"])
@@ -135,8 +135,8 @@ def assignment_by_id(course_id: str, assignment_id: str):
     assignments = current_user.get_assignments()
     assignment = get(assignments, id=assignment_id)
     logger.info(
-        f"All assignments from {course_id} with assignment id {assignment_id}."
-    )
+        "All assignments from %s with assignment id %s.",
+        course_id, assignment_id)
     return response(data={"assignment": assignment})
 
 
@@ -168,16 +168,22 @@ def get_schedule_assignments():
         }
         events.append(assignment_data)
 
-    # Dummy event for testing
-    dummy_data = [{
-        "title": "Test assignment",
-        "date": "2020-08-09",
-    }]
-    events.append(dummy_data)
-
     return response(data={"events": events})
 
 
+@student.route("/dashboard", methods=["GET"])
+def dashboard():
+    """Gets everything shown on the home page at once
+
+    Returns
+    -------
+    dict
+        The upcoming assignments, today's classes, the recent grades and the number of
+        submissions waiting for a grade
+    """
+    return response(data=get_dashboard(current_user)), 200
+
+
 @student.route("/class-schedule", methods=["GET"])
 def get_schedule_classes():
     """Gets name, dates, and times for classes
@@ -223,7 +229,7 @@ def activate_account(token: str):
         if request.form["password_confirmation"] == request.form["password"]:
             if student.activate() and student.set_password(
                     request.form["password"]):
-                logger.info(f"Student {student._id} activated their account")
+                logger.info("Student %s activated their account", student._id)
                 return response(["Account activated!", "Password set!"]), 200
             else:
                 return error("Unknown error while activating account"), 400
@@ -251,7 +257,7 @@ def enter_info():
     user = Student.get_by_id(current_user.id)
 
     if request.form.get("description"):
-        user.description = request.form["description"]
+        user.bio = request.form["description"]
         flashes.append("Description updated")
 
     if request.form.get("date_of_birth"):
@@ -274,7 +280,7 @@ def enter_info():
     user.profile_picture = profile_picture
     flashes.append("Profile picture updated")
 
-    logger.info(f"User info {user.id} updated")
+    logger.info("User info %s updated", user.id)
     return response(flashes), 200
 
 
@@ -287,11 +293,13 @@ def get_names_by_search():
         Student names
     """
     try:
-        students = Student.get_by_keyword(request.form["first_name"])
+        # Served from the in-process name index, without querying the database
+        students = Student.get_by_keyword(request.values["first_name"])
         possible_students = list()
         for student in students:
             student_data = {
-                "full_name": student.first_name + " " + student.last_name,
+                "id": student["id"],
+                "full_name": student["first_name"] + " " + student["last_name"],
             }
             possible_students.append(student_data)
         return response(data={"possible_students": possible_students}), 200
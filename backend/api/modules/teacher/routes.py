@@ -1,3 +1,4 @@
+import math
 import uuid
 from datetime import datetime
 
@@ -7,9 +8,18 @@ from api.classes import Course
 from api.classes import Student
 from api.classes import Teacher
 from api.tools.decorators import required_access
+from api.tools.analytics import get_grade_distribution
+from api.tools.dates import parse_datetime
+from api.tools.dates import school_timezone
 from api.tools.factory import error
 from api.tools.factory import response
+from api.tools.google_storage import get_file_urls
+from api.tools.google_storage import store_file
 from api.tools.google_storage import upload_blob
+from api.tools.google_storage import upload_files
+from api.tools.gradebook import get_gradebook
+from api.tools.gradebook import parse_grade
+from api.tools.gradebook import to_list
 from api.tools.search import get
 from flask import request
 from flask_login import current_user
@@ -18,18 +28,13 @@ from . import teacher
 
 
 def get_existing_assignment_files():
-    """Helper function to get existing assignment files"""
-    file_list = []
-    files = request.files.getlist(request.form["files"].name)
-    if files[0].filename:
-        for file_ in files:
-            filename = file_.filename
-            blob = upload_blob(
-                uuid.uuid4().hex + "." + file_.content_type.split("/")[-1],
-                file_)
-            file_list.append((blob.name, filename))
+    """Helper function to upload the files attached to an assignment, in parallel"""
+    return upload_files(request.files.getlist("files"))
 
-    return file_list
+
+def teaches(course_id: str) -> bool:
+    """Helper function to check that the current teacher teaches a course"""
+    return course_id in map(str, current_user.courses)
 
 
 @teacher.before_request
@@ -55,9 +60,10 @@ def add_assignment():
 
         new_assignment = Assignment(
             date_assigned=datetime.utcnow(),
-            assigned_by=current_user.ID,
+            assigned_by=current_user.id,
             assigned_to=request.form["assigned_to"],
-            due_by=request.form["due_by"],
+            # Typed in the timezone of the school
+            due_by=parse_datetime(request.form["due_by"], school_timezone()),
             title=request.form["title"],
             content=request.form["content"],
             filenames=file_list,
@@ -68,11 +74,13 @@ def add_assignment():
         Course.get_by_id(
             request.form["assigned_to"]).add_assignment(new_assignment)
 
-        logger.info(f"Assignment {request.form['title']} added")
+        logger.info("Assignment %s added", request.form['title'])
         return response(flashes=["Assignment sent!"])
 
     except KeyError:
         return error("Not all fields satisfied"), 400
+    except ValueError:
+        return error("The due date is not a valid date"), 400
 
 
 @teacher.route("/courses", methods=["GET"])
@@ -85,9 +93,13 @@ def view_assignments():
     """
 
     courses = []
+    all_assignments = []
+    syllabi = []
     for course_id in current_user.courses:
         course = Course.get_by_id(course_id)
         course_assignments = course.get_assignments()
+        all_assignments.extend(course_assignments)
+        syllabi.append(course.syllabus)
         course_data = {
             "id":
             str(course_id),
@@ -107,11 +119,15 @@ def view_assignments():
             "_syllabus":
             course._syllabus,
             "course_analytics":
-            course._course_analytics,
+            course.course_analytics,
         }
         courses.append(course_data)
 
-    return response(data={"courses": courses})
+    # The files of every course are signed in a single batch
+    return response(data={
+        "courses": courses,
+        "file_urls": get_file_urls(all_assignments, syllabi)
+    })
 
 
 @teacher.route("/assignments/<string:course_id>", methods=["GET"])
@@ -132,7 +148,9 @@ def view_assignment_by_class_id(course_id: str):
 
     return response(
         data={
-            "assignments": list(map(lambda a: a.to_dict(), course_assignments))
+            "assignments": list(map(lambda a: a.to_dict(),
+                                    course_assignments)),
+            "file_urls": get_file_urls(course_assignments),
         })
 
 
@@ -158,8 +176,7 @@ def edit_assignment(course_id: str, assignment_id: str):
     course = Course.get_by_id(course_id)
     assignments = course.get_assignments()
 
-    assignment: Assignment = list(
-        filter(lambda a: str(a.id) == assignment_id, assignments))[0]
+    assignment: Assignment = get(assignments, id=assignment_id)
 
     if assignment is None:
         return error("Could not find assignment"), 400
@@ -171,7 +188,8 @@ def edit_assignment(course_id: str, assignment_id: str):
             date_assigned=assignment.date_assigned,
             assigned_by=assignment.assigned_by,
             assigned_to=request.form["assigned_to"],
-            due_by=request.form["due_by"],
+            # Typed in the timezone of the school
+            due_by=parse_datetime(request.form["due_by"], school_timezone()),
             title=request.form["title"],
             content=request.form["content"],
             filenames=file_list,
@@ -185,6 +203,8 @@ def edit_assignment(course_id: str, assignment_id: str):
 
     except KeyError:
         return error("Not all fields satisfied"), 400
+    except ValueError:
+        return error("The due date is not a valid date"), 400
 
     # Set default values for form.
     request.form["assigned_to"].default = assignment.assigned_to
@@ -225,17 +245,13 @@ def manage_classes_by_id(course_id: str):
 
             if syllabus_file is not None:
 
-                blob = upload_blob(
-                    uuid.uuid4().hex + "." +
-                    syllabus_file.content_type.split("/")[-1],
-                    syllabus_file,
-                )
-                syllabus = [blob.name, syllabus_name]
+                blob = store_file(syllabus_file)
+                syllabus = (blob.name, syllabus_name)
 
                 course.update_description(description)
                 course.update_syllabus(syllabus)
 
-                logger.info(f"Syllabus updated")
+                logger.info("Syllabus updated")
                 return response(
                     flashes=["Course information successfully updated!"])
 
@@ -285,7 +301,7 @@ def activate_account(token: str):
         if request.form["password_confirmation"] == request.form["password"]:
             if teacher.activate() and teacher.set_password(
                     request.form["password"]):
-                logger.info(f"Student {student._id} activated their account")
+                logger.info("Student %s activated their account", student._id)
                 return response(["Account activated!", "Password set!"]), 200
             else:
                 return error("Unknown error while activating account"), 400
@@ -317,8 +333,7 @@ def view_submissions_by_assignment(course_id: str, assignment_id: str):
     course = Course.get_by_id(course_id)
     assignments = course.get_assignments()
 
-    assignment: Assignment = list(
-        filter(lambda a: str(a.id) == assignment_id, assignments))[0]
+    assignment: Assignment = get(assignments, id=assignment_id)
 
     if assignment is None:
         return error("Could not find assignment"), 400
@@ -332,20 +347,177 @@ def view_submissions_by_assignment(course_id: str, assignment_id: str):
     methods=["POST"],
 )
 def mark_submission(course_id: str, assignment_id: str, submission_id: str):
+    """Grades a submission
+
+    Parameters
+    -------
+    course_id: str
+        The course ID to look up in the database
+
+    assignment_id: str
+        The assignment ID to look up in the database
+
+    submission_id: str
+        The submission ID to look up in the database
+
+    Returns
+    -------
+    dict
+        The view response
+    """
     flashes = []
 
+    if not teaches(course_id):
+        return error("Could not find course"), 404
+
+    try:
+        grade = request.form["grade"]
+    except KeyError:
+        return error("Not all fields satisfied"), 400
+
     course = Course.get_by_id(course_id)
-    assignments = course.get_assignments()
-    assignment: Assignment = get(assignments, id=assignment_id)
-    submission: Submission = get(assignment.submissions, id=submission_id)
 
+    # Grades that are not numbers (e.g. letter grades) are stored as given
+    score = parse_grade(grade)
     min_, max_ = course.grade_range
-    if min_ < request.form["grade"] < max_:
-        submission.update_grade(request.form["grade"])
-        flashes.append("Grade updated!")
-        return response(flashes), 200
+    if not math.isnan(score) and not min_ <= score <= max_:
+        return error("Grade outside course grade boundary"), 400
+
+    if not course.update_submission_grade(assignment_id, submission_id,
+                                          grade):
+        return error("Could not find submission"), 404
+
+    flashes.append("Grade updated!")
+    return response(flashes), 200
+
+
+@teacher.route("/course/<string:course_id>/gradebook", methods=["GET"])
+def view_gradebook(course_id: str):
+    """Returns the gradebook of a course: a students × assignments matrix of scores
+
+    Parameters
+    -------
+    course_id: str
+        The course ID to look up in the database
+
+    Returns
+    -------
+    dict
+        Student ids (rows), assignments (columns) and scores, `None` where there is no grade
+    """
+    gradebook = get_gradebook(course_id) if teaches(course_id) else None
+    if gradebook is None:
+        return error("Could not find course"), 404
+
+    return response(data={"gradebook": gradebook.to_dict()})
+
+
+@teacher.route(
+    "/course/<string:course_id>/gradebook/students/<string:student_id>",
+    methods=["GET"],
+)
+def view_gradebook_row(course_id: str, student_id: str):
+    """Returns a student's scores for every assignment of a course
+
+    Parameters
+    -------
+    course_id: str
+        The course ID to look up in the database
+
+    student_id: str
+        The student ID to look up in the gradebook
+
+    Returns
+    -------
+    dict
+        Assignments and the student's score for each of them
+    """
+    gradebook = get_gradebook(course_id) if teaches(course_id) else None
+    if gradebook is None:
+        return error("Could not find course"), 404
+
+    try:
+        scores = gradebook.row(student_id)
+    except KeyError:
+        return error("Could not find student"), 404
+
+    return response(
+        data={
+            "assignments": gradebook.assignment_ids,
+            "scores": to_list(scores)
+        })
+
+
+@teacher.route(
+    "/course/<string:course_id>/gradebook/assignments/<string:assignment_id>",
+    methods=["GET"],
+)
+def view_gradebook_column(course_id: str, assignment_id: str):
+    """Returns every student's score for an assignment of a course
+
+    Parameters
+    -------
+    course_id: str
+        The course ID to look up in the database
+
+    assignment_id: str
+        The assignment ID to look up in the gradebook
+
+    Returns
+    -------
+    dict
+        Students and their score for the assignment
+    """
+    gradebook = get_gradebook(course_id) if teaches(course_id) else None
+    if gradebook is None:
+        return error("Could not find course"), 404
+
+    try:
+        scores = gradebook.column(assignment_id)
+    except KeyError:
+        return error("Could not find assignment"), 404
 
-    return error("Grade outside course grade boundary")
+    return response(data={
+        "students": gradebook.student_ids,
+        "scores": to_list(scores)
+    })
+
+
+@teacher.route(
+    "/course/<string:course_id>/assignments/<string:assignment_id>/distribution",
+    methods=["GET"],
+)
+def view_grade_distribution(course_id: str, assignment_id: str):
+    """Returns the grade distribution of an assignment
+
+    Parameters
+    -------
+    course_id: str
+        The course ID to look up in the database
+
+    assignment_id: str
+        The assignment ID to look up in the gradebook
+
+    Returns
+    -------
+    dict
+        Bucketed counts, mean, standard deviation, percentiles and percentile ranks
+    """
+    buckets = request.args.get("buckets", 10, type=int)
+    if not 0 < buckets <= 100:
+        return error("The number of buckets should be between 1 and 100"), 400
+
+    gradebook = get_gradebook(course_id) if teaches(course_id) else None
+    if gradebook is None:
+        return error("Could not find course"), 404
+
+    try:
+        distribution = get_grade_distribution(gradebook, assignment_id,
+                                              buckets)
+    except KeyError:
+        return error("Could not find assignment"), 404
+
+    return response(data={"distribution": distribution})
 
 
 @teacher.route("/enter_info", methods=["POST"])
@@ -362,7 +534,7 @@ def enter_info():
     user = Teacher.get_by_id(current_user.id)
 
     if request.form.get("description"):
-        user.description = request.form["description"]
+        user.bio = request.form["description"]
         flashes.append("Description updated")
 
     if request.form.get("date_of_birth"):
@@ -385,13 +557,20 @@ def enter_info():
     user.profile_picture = profile_picture
     flashes.append("Profile picture updated")
 
-    logger.info(f"User info {user.id} updated")
+    logger.info("User info %s updated", user.id)
     return response(flashes), 200
 
 
 @teacher.route("/calendar", methods=["GET", "POST"])
 def get_calendar_events():
-    """Gets dictionary of calendar events for teacher
+    """Gets dictionary of calendar events for teacher, adding the event posted if any
+
+    Parameters
+    -------
+    start: str, optional
+        The start of the range of events, as an ISO 8601 date or datetime
+    end: str, optional
+        The end of the range of events
 
     Returns
     -------
@@ -399,33 +578,22 @@ def get_calendar_events():
         The view response
     """
 
-    req_data = request.get_json()
-    if req_data:
-        title = req_data["title"]
-        start = req_data["start"]
-        end = req_data["end"]
-        color = req_data["color"]
-        url = req_data["url"]
-
-        newEvent = {
-            "title": title,
-            "start": start,
-            "end": end,
-            "color": color,
-            "url": url,
-        }
+    try:
+        req_data = request.get_json(silent=True)
+        if req_data:
+            current_user.add_calendar_event(current_user.id, req_data)
 
-        teacherDict = current_user.to_dict()
-        teacher = Teacher.get_by_email(teacherDict["email"])
-        current_user.add_calendar_event(teacher.id, newEvent)
+        events = current_user.get_calendar(request.args.get("start"),
+                                           request.args.get("end"))
+    except ValueError as e:
+        return error(str(e)), 400
 
-    events = current_user.get_calendar()
     return response(data={"events": events})
 
 
 @teacher.route("/delete-calendar", methods=["POST"])
 def delete_calendar_events():
-    """Gets dictionary of calendar events for teacher
+    """Removes an event from the teacher's calendar, by id (or every event with a title)
 
     Returns
     -------
@@ -433,15 +601,15 @@ def delete_calendar_events():
         The view response
     """
 
-    req_data = request.get_json()
+    req_data = request.get_json(silent=True)
 
     if req_data:
-        title = req_data["title"]
-        teacherDict = current_user.to_dict()
-        teacher = Teacher.get_by_email(teacherDict["email"])
-        current_user.remove_calendar_event(teacher.id, title)
+        current_user.remove_calendar_event(current_user.id,
+                                           title=req_data.get("title"),
+                                           event_id=req_data.get("id"))
 
-    events = current_user.get_calendar()
+    events = current_user.get_calendar(request.args.get("start"),
+                                       request.args.get("end"))
     return response(data={"events": events})
 
 
@@ -454,11 +622,13 @@ def get_names_by_search():
         Teacher names
     """
     try:
-        teachers = Teacher.get_by_keyword(request.form["first_name"])
+        # Served from the in-process name index, without querying the database
+        teachers = Teacher.get_by_keyword(request.values["first_name"])
         possible_teachers = list()
         for teacher in teachers:
             teacher_data = {
-                "full_name": teacher.first_name + " " + teacher.last_name,
+                "id": teacher["id"],
+                "full_name": teacher["first_name"] + " " + teacher["last_name"],
             }
             possible_teachers.append(teacher_data)
         return response(data={"possible_teachers": possible_teachers}), 200
@@ -0,0 +1,348 @@
+r"""Course analytics, computed from gradebooks and stored back on the course documents.
+
+Analytics are refreshed incrementally after every grade change (only the aggregates and the
+history entry of the changed assignment are rewritten), and fully recomputed for every course by
+a background thread, so that dashboards only ever read precomputed numbers.
+
+Per-assignment grade distributions are computed on demand and cached by assignment revision.
+"""
+from datetime import datetime
+from threading import Lock
+from threading import Thread
+from typing import Optional
+
+import numpy as np
+from api import db
+from api import root_logger as logger
+from api.tools.gradebook import get_gradebook
+from api.tools.gradebook import Gradebook
+from api.tools.gradebook import GRADEBOOK_PROJECTION
+from bson import ObjectId
+from cachetools import LRUCache
+from pymongo import UpdateOne
+
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def _mean(sums: np.ndarray, counts: np.ndarray) -> Optional[float]:
+    r"""Mean of the per-item averages `sums / counts`, ignoring the items with no grades."""
+    graded = counts > 0
+    if not graded.any():
+        return None
+
+    return round(float(np.mean(sums[graded] / counts[graded])), 2)
+
+
+def total_average(gradebook: Gradebook) -> Optional[float]:
+    r"""The average of every student's average grade in the course."""
+    return _mean(gradebook.row_sums, gradebook.row_counts)
+
+
+def starting_average(gradebook: Gradebook) -> Optional[float]:
+    r"""The average grade on the first assignment of the course that has been graded."""
+    graded = np.flatnonzero(gradebook.column_counts)
+    if not len(graded):
+        return None
+
+    return _mean(gradebook.column_sums[graded[:1]],
+                 gradebook.column_counts[graded[:1]])
+
+
+def assignment_entry(gradebook: Gradebook, column: int) -> dict:
+    r"""The `assignment_history` entry of a single assignment (a column of the gradebook)."""
+    scores = gradebook.scores[:, column]
+    graded = np.flatnonzero(~np.isnan(scores))
+
+    return {
+        "assignment_id":
+        gradebook.assignment_ids[column],
+        "assignment_name":
+        gradebook.assignment_titles[column],
+        "average":
+        _mean(gradebook.column_sums[column:column + 1],
+              gradebook.column_counts[column:column + 1]),
+        "assignment_scores": [{
+            "student": gradebook.student_ids[row],
+            "score": score
+        } for row, score in zip(
+            graded.tolist(),
+            np.round(scores[graded].astype(np.float64), 4).tolist())],
+    }
+
+
+def compute(gradebook: Gradebook) -> dict:
+    r"""Computes the full analytics of a course.
+
+    Parameters
+    ----------
+    gradebook : Gradebook
+
+    Returns
+    -------
+    dict
+        The analytics in the format of `Course.course_analytics`
+    """
+    return {
+        "total_average":
+        total_average(gradebook),
+        "starting_average":
+        starting_average(gradebook),
+        "no_students":
+        len(gradebook.student_ids),
+        "assignment_history": [
+            assignment_entry(gradebook, column)
+            for column in range(len(gradebook.assignment_ids))
+        ],
+        "updated_at":
+        datetime.utcnow(),
+    }
+
+
+def grade_distribution(gradebook: Gradebook,
+                       assignment_id: str,
+                       buckets: int = 10) -> dict:
+    r"""Computes the distribution of the grades of an assignment.
+
+    Parameters
+    ----------
+    gradebook : Gradebook
+    assignment_id : str
+    buckets : int, optional
+        The number of equal-width histogram buckets over the course's grade range, by default 10
+
+    Returns
+    -------
+    dict
+        The number of grades, their mean, standard deviation, minimum, maximum and percentiles,
+        the histogram, and the percentile rank of every graded student
+    """
+    column = gradebook.column(assignment_id)
+    graded = np.flatnonzero(~np.isnan(column))
+    scores = column[graded].astype(np.float64)
+
+    low, high = gradebook.grade_range
+    # Grades outside of the range (e.g. extra credit) are counted in the edge buckets
+    counts, edges = np.histogram(np.clip(scores, low, high),
+                                 bins=buckets,
+                                 range=(low, high))
+
+    distribution = {
+        "count":
+        int(scores.size),
+        "buckets": [{
+            "low": low_,
+            "high": high_,
+            "count": count
+        } for low_, high_, count in zip(
+            np.round(edges[:-1], 4).tolist(),
+            np.round(edges[1:], 4).tolist(), counts.tolist())],
+        "mean":
+        None,
+        "stddev":
+        None,
+        "min":
+        None,
+        "max":
+        None,
+        "percentiles":
+        dict(),
+        "percentile_ranks":
+        list(),
+    }
+
+    if not scores.size:
+        return distribution
+
+    # Percentile rank: the share of grades lower than or equal to the student's
+    ranks = np.searchsorted(np.sort(scores), scores,
+                            side="right") * 100 / scores.size
+
+    distribution.update({
+        "mean":
+        round(float(scores.mean()), 4),
+        "stddev":
+        round(float(scores.std()), 4),
+        "min":
+        round(float(scores.min()), 4),
+        "max":
+        round(float(scores.max()), 4),
+        "percentiles":
+        dict(
+            zip(
+                map(str, PERCENTILES),
+                np.round(np.percentile(scores, PERCENTILES), 4).tolist(),
+            )),
+        "percentile_ranks": [{
+            "student": gradebook.student_ids[row],
+            "percentile": rank
+        } for row, rank in zip(graded.tolist(),
+                               np.round(ranks, 2).tolist())],
+    })
+
+    return distribution
+
+
+# Distributions cached by this worker, keyed by (course, assignment, buckets)
+_distributions = LRUCache(maxsize=1024)
+_distributions_lock = Lock()
+
+
+def get_grade_distribution(gradebook: Gradebook,
+                           assignment_id: str,
+                           buckets: int = 10) -> dict:
+    r"""Like :func:`grade_distribution`, but cached until a grade of the assignment changes.
+
+    The cache is keyed by the assignment's revision and the course's roster, so repeated views are
+    free until a grade changes or a student joins or leaves the course.
+    """
+    key = (gradebook.course_id, str(assignment_id), buckets)
+    version = (gradebook.assignment_revision(assignment_id),
+               gradebook.roster_key, gradebook.grade_range)
+
+    with _distributions_lock:
+        cached = _distributions.get(key)
+
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    distribution = grade_distribution(gradebook, assignment_id, buckets)
+    with _distributions_lock:
+        _distributions[key] = (version, distribution)
+
+    return distribution
+
+
+def update_course_analytics(course_id: str,
+                            gradebook: Optional[Gradebook] = None,
+                            assignment_id: Optional[str] = None) -> bool:
+    r"""Refreshes the stored analytics of a course after a change.
+
+    If a gradebook and the id of the changed assignment are given, and the stored analytics have
+    the same shape as the gradebook, only the aggregates and that assignment's history entry are
+    rewritten. Otherwise the analytics are recomputed and stored as a whole.
+
+    Parameters
+    ----------
+    course_id : str
+    gradebook : Gradebook, optional
+        An up-to-date gradebook of the course, fetched with `get_gradebook` if not given
+    assignment_id : str, optional
+        The assignment whose grades changed
+
+    Returns
+    -------
+    bool
+        `True` if the analytics were stored, `False` otherwise
+    """
+    try:
+        if gradebook is None:
+            gradebook = get_gradebook(course_id)
+            if gradebook is None:
+                return False
+
+        columns = len(gradebook.assignment_ids)
+        if assignment_id is not None and columns:
+            column = gradebook.assignment_index(assignment_id)
+            result = db.courses.update_one(
+                {
+                    "_id": ObjectId(course_id),
+                    "course_analytics.no_students":
+                    len(gradebook.student_ids),
+                    f"course_analytics.assignment_history.{columns - 1}": {
+                        "$exists": True
+                    },
+                    f"course_analytics.assignment_history.{columns}": {
+                        "$exists": False
+                    },
+                },
+                {
+                    "$set": {
+                        "course_analytics.total_average":
+                        total_average(gradebook),
+                        "course_analytics.starting_average":
+                        starting_average(gradebook),
+                        f"course_analytics.assignment_history.{column}":
+                        assignment_entry(gradebook, column),
+                        "course_analytics.updated_at":
+                        datetime.utcnow(),
+                    }
+                },
+            )
+
+            if result.matched_count:
+                return True
+
+        db.courses.update_one({"_id": ObjectId(course_id)},
+                              {"$set": {
+                                  "course_analytics": compute(gradebook)
+                              }})
+
+        return True
+    except Exception as e:
+        logger.exception(
+            "Error while updating the analytics of course %s", course_id)
+
+        return False
+
+
+def recompute_all(batch_size: int = 100) -> int:
+    r"""Recomputes and stores the analytics of every course.
+
+    A course is skipped if it was written to while its analytics were being computed, since the
+    incremental update of that write is more recent.
+
+    Parameters
+    ----------
+    batch_size : int, optional
+        The number of course updates sent to the database at once, by default 100
+
+    Returns
+    -------
+    int
+        The number of courses updated
+    """
+    updated = 0
+    requests = list()
+
+    for dictionary in db.courses.find({}, GRADEBOOK_PROJECTION):
+        requests.append(
+            UpdateOne(
+                {
+                    "_id": dictionary["_id"],
+                    "revision": dictionary.get("revision")
+                },
+                {
+                    "$set": {
+                        "course_analytics":
+                        compute(Gradebook.from_dict(dictionary))
+                    }
+                },
+            ))
+
+        if len(requests) >= batch_size:
+            updated += db.courses.bulk_write(requests,
+                                             ordered=False).modified_count
+            requests = list()
+
+    if requests:
+        updated += db.courses.bulk_write(requests,
+                                         ordered=False).modified_count
+
+    return updated
+
+
+def start_background_recompute(app, interval: int) -> Thread:
+    r"""Starts a daemon thread that recomputes the analytics of every course periodically.
+
+    Parameters
+    ----------
+    app : A Flask app instance
+    interval : int
+        Seconds between two recomputations
+    """
+
+    def recompute():
+        logger.info("Recomputed the analytics of %s courses", recompute_all())
+
+    return db.run_periodically(app, "course_analytics", interval, recompute,
+                               "course-analytics")
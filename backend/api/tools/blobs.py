@@ -0,0 +1,212 @@
+r"""Content-addressed, reference-counted storage of uploaded files.
+
+Uploaded files are stored under the SHA-256 digest of their content, so identical files (the
+same syllabus uploaded to several sections, an unchanged file in a resubmission) are stored only
+once. Every stored file has a document in `db.blobs` holding the set of things that point to it,
+as "<kind>:<id>" strings (e.g. "assignment:5f3...", "submission:5f4...", "syllabus:5f2...").
+
+Files nothing points to anymore are deleted by a background garbage collector once they have been
+unreferenced for a grace period, which also protects files uploaded by requests that have not
+saved their references yet. The collector first marks the document of a file as `deleting`, then
+deletes the file and only then the document: a file being deleted cannot be claimed again until it
+is gone, so an upload of the same content never races with its deletion.
+"""
+import hashlib
+import time
+from datetime import datetime
+from datetime import timedelta
+from threading import Thread
+from typing import Iterable
+from typing import Optional
+
+from api import db
+from api import root_logger as logger
+from api.tools.storage import get_storage
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# The size of the chunks read while hashing a file
+HASH_CHUNK_SIZE = 1024 * 1024
+# How long to wait for the deletion of a file claimed while it is being deleted
+DELETION_WAIT = 0.05
+DELETION_RETRIES = 100
+
+
+def digest(file_obj) -> str:
+    r"""Returns the SHA-256 hex digest of a file object, from its current position to the end.
+
+    The file is read in chunks, then rewound to where it was, so it can be uploaded afterwards.
+    """
+    stream = getattr(file_obj, "stream", file_obj)
+    position = stream.tell()
+
+    sha256 = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+        sha256.update(chunk)
+
+    stream.seek(position)
+
+    return sha256.hexdigest()
+
+
+def blob_name(sha256: str, content_type: str) -> str:
+    r"""The storage name of a file with the given digest and content type."""
+    return sha256 + "." + content_type.split("/")[-1]
+
+
+def claim(name: str, content_type: str) -> Optional[dict]:
+    r"""Registers a file about to be stored, and resets the grace period of an existing one.
+
+    A file that is being deleted by the garbage collector is only claimed once it is deleted, so
+    that it is stored again instead of being deleted after the upload.
+
+    Returns
+    -------
+    dict or None
+        The previous document of the file (with `stored` and `size`), or `None` if it is new
+    """
+    for attempt in range(DELETION_RETRIES):
+        try:
+            return db.blobs.find_one_and_update(
+                {
+                    "_id": name,
+                    "deleting": {
+                        "$ne": True
+                    }
+                },
+                {
+                    "$setOnInsert": {
+                        "content_type": content_type,
+                        "refs": [],
+                        "stored": False,
+                        "created_at": datetime.utcnow(),
+                    },
+                    "$set": {
+                        "touched_at": datetime.utcnow()
+                    },
+                },
+                projection={
+                    "stored": 1,
+                    "size": 1
+                },
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            # The document exists but is marked as `deleting`
+            if attempt == DELETION_RETRIES - 1:
+                raise
+            time.sleep(DELETION_WAIT)
+
+
+def mark_stored(name: str, size: int):
+    r"""Records that a claimed file has been written to storage."""
+    db.blobs.update_one({"_id": name},
+                        {"$set": {
+                            "stored": True,
+                            "size": size
+                        }})
+
+
+def add_refs(names: Iterable[str], ref: str):
+    r"""Records that `ref` (e.g. "assignment:<id>") points to the stored files `names`."""
+    names = list(set(names))
+    if names:
+        db.blobs.update_many({"_id": {
+            "$in": names
+        }}, {"$addToSet": {
+            "refs": ref
+        }})
+
+
+def remove_refs(names: Iterable[str], ref: str):
+    r"""Records that `ref` no longer points to the stored files `names`."""
+    names = list(set(names))
+    if names:
+        db.blobs.update_many(
+            {"_id": {
+                "$in": names
+            }},
+            {
+                "$pull": {
+                    "refs": ref
+                },
+                "$set": {
+                    "touched_at": datetime.utcnow()
+                }
+            },
+        )
+
+
+def collect_garbage(grace_period: int) -> int:
+    r"""Deletes the stored files that nothing has pointed to for at least `grace_period` seconds.
+
+    Returns
+    -------
+    int
+        The number of files deleted
+    """
+    storage = get_storage()
+    cutoff = datetime.utcnow() - timedelta(seconds=grace_period)
+    unreferenced = {
+        "refs": {
+            "$size": 0
+        },
+        "touched_at": {
+            "$lt": cutoff
+        }
+    }
+
+    deleted = 0
+    for blob in db.blobs.find(unreferenced, {"_id": 1, "stored": 1}):
+        # Marked only if it was not reused since it was found, `claim` waits for it from now on
+        if not db.blobs.update_one(
+            {
+                "_id": blob["_id"],
+                "deleting": {
+                    "$ne": True
+                },
+                **unreferenced
+            }, {
+                "$set": {
+                    "deleting": True
+                }
+            }).modified_count:
+            continue
+
+        try:
+            # Claimed but never stored, e.g. the upload failed
+            if blob.get("stored"):
+                storage.delete(blob["_id"])
+        except Exception as e:
+            logger.exception("Error while deleting file %s", blob['_id'])
+            # Collected again later
+            db.blobs.update_one({"_id": blob["_id"]},
+                                {"$unset": {
+                                    "deleting": ""
+                                }})
+            continue
+
+        db.blobs.delete_one({"_id": blob["_id"], "deleting": True})
+        deleted += 1
+
+    return deleted
+
+
+def start_background_gc(app, interval: int, grace_period: int) -> Thread:
+    r"""Starts a daemon thread that deletes unreferenced files periodically.
+
+    Parameters
+    ----------
+    app : A Flask app instance
+    interval : int
+        Seconds between two collections
+    grace_period : int
+        Seconds a file must have been unreferenced for before it is deleted
+    """
+
+    def collect():
+        logger.info("Deleted %s unreferenced files",
+                    collect_garbage(grace_period))
+
+    return db.run_periodically(app, "blob_gc", interval, collect, "blob-gc")
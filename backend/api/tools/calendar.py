@@ -0,0 +1,537 @@
+r"""Calendars: personal events, assignment due dates and course meetings in a single feed.
+
+Personal events are documents of `db.events`, each with a stable id, an owner and a `start` and
+`end` datetime. Every worker keeps an interval index of the events of its recently active users, so
+"the events between `start` and `end`" is answered with two binary searches instead of loading the
+whole calendar. A per-owner counter in `db.counters` tells the workers when an index is stale.
+
+Due dates and course meetings are not stored as events: they are read from the courses of the user
+and expanded over the requested range only.
+"""
+import threading
+from bisect import bisect_left
+from bisect import bisect_right
+from datetime import datetime
+from datetime import timedelta
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from api import db
+from api import root_logger as logger
+from api.tools import schedule as schedules
+from api.tools.dates import format_datetime
+from api.tools.dates import parse_datetime
+from api.tools.per_process import PerProcess
+from bson import ObjectId
+from bson.errors import InvalidId
+from cachetools import LRUCache
+from pymongo import ReturnDocument
+
+# The kinds of entries in a calendar feed
+EVENT = "event"
+ASSIGNMENT = "assignment"
+CLASS = "class"
+TYPES = [EVENT, ASSIGNMENT, CLASS]
+
+# The longest range a feed can be requested for
+MAX_RANGE = timedelta(days=366)
+
+# The number of calendars whose index is kept by each worker
+MAX_INDEXES = 2048
+
+# The fields of an event that can be edited
+EDITABLE_FIELDS = ("title", "start", "end", "color", "url")
+
+COURSE_PROJECTION = {
+    "name": 1,
+    "schedule_time": 1,
+    "schedule_days": 1,
+    "assignments._id": 1,
+    "assignments.title": 1,
+    "assignments.due_by": 1,
+}
+
+
+class IntervalIndex:
+    r"""The events of a calendar, sorted by start, with the running maximum of their ends.
+
+    Since the running maximum never decreases, the first event that can still be going on at a
+    given time is found with a binary search, like the last event starting before another time,
+    and only the events in between are looked at.
+    """
+
+    def __init__(self, events: Iterable[dict] = ()):
+        self._events = sorted(events, key=_sort_key)
+        self._keys = [_sort_key(event) for event in self._events]
+        self._by_id = {
+            event["_id"]: key
+            for event, key in zip(self._events, self._keys)
+        }
+        self._max_ends: List[datetime] = list()
+        self._recompute(0)
+
+    def __len__(self):
+        return len(self._events)
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def _recompute(self, position: int):
+        r"""Recomputes the running maximum of the ends from a position on."""
+        del self._max_ends[position:]
+        latest = self._max_ends[-1] if self._max_ends else datetime.min
+        for event in self._events[position:]:
+            latest = max(latest, event["end"])
+            self._max_ends.append(latest)
+
+    def add(self, event: dict):
+        r"""Adds an event, or replaces the event with the same id."""
+        self.remove(event["_id"])
+
+        key = _sort_key(event)
+        position = bisect_left(self._keys, key)
+        self._by_id[event["_id"]] = key
+        self._keys.insert(position, key)
+        self._events.insert(position, event)
+        self._recompute(position)
+
+    def remove(self, event_id) -> Optional[dict]:
+        r"""Removes an event by id, returning it if it was in the index."""
+        key = self._by_id.pop(event_id, None)
+        if key is None:
+            return None
+
+        position = bisect_left(self._keys, key)
+        del self._keys[position]
+        event = self._events.pop(position)
+        self._recompute(position)
+
+        return event
+
+    def overlapping(self, start: datetime, end: datetime) -> List[dict]:
+        r"""Returns the events that overlap the range from `start` (included) to `end` (excluded).
+
+        Events without a duration are returned if they happen within the range.
+        """
+        last = bisect_left(self._keys, (end, ))
+        first = min(bisect_right(self._max_ends, start),
+                    bisect_left(self._keys, (start, )))
+
+        return [
+            event for event in self._events[first:last]
+            if event["end"] > start or event["start"] >= start
+        ]
+
+
+def _sort_key(event: dict) -> Tuple[datetime, str]:
+    return event["start"], str(event["_id"])
+
+
+# The indexes of this worker, as {owner id: (version, index)}
+_indexes: PerProcess[LRUCache] = PerProcess(
+    lambda: LRUCache(maxsize=MAX_INDEXES))
+_lock = threading.Lock()
+
+
+def _counter(owner_id: str) -> str:
+    return f"calendar:{owner_id}"
+
+
+def get_version(owner_id: str) -> int:
+    r"""Returns the version of a calendar, incremented whenever one of its events changes."""
+    counter = db.counters.find_one({"_id": _counter(owner_id)}, {"value": 1})
+    return counter["value"] if counter else 0
+
+
+def _changed(owner_id: str) -> int:
+    r"""Tells every worker that a calendar changed, returning its new version."""
+    counter = db.counters.find_one_and_update(
+        {"_id": _counter(owner_id)},
+        {"$inc": {
+            "value": 1
+        }},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    return counter["value"]
+
+
+def get_index(owner_id: str) -> IntervalIndex:
+    r"""Returns the interval index of a calendar, loading it if it is missing or stale."""
+    owner_id = str(owner_id)
+    indexes = _indexes.get()
+    version = get_version(owner_id)
+
+    with _lock:
+        cached = indexes.get(owner_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    index = IntervalIndex(db.events.find({"owner_id": owner_id}))
+    with _lock:
+        indexes[owner_id] = (version, index)
+
+    return index
+
+
+def _update_index(owner_id: str, version: int, event_id, event=None):
+    r"""Applies a change made by this worker to its index, if it was up to date."""
+    indexes = _indexes.get()
+
+    with _lock:
+        cached = indexes.get(owner_id)
+        if cached is None or cached[0] != version - 1:
+            # Stale anyway, it will be reloaded on next use
+            indexes.pop(owner_id, None)
+            return
+
+        if event is None:
+            cached[1].remove(event_id)
+        else:
+            cached[1].add(event)
+        indexes[owner_id] = (version, cached[1])
+
+
+def _validate(fields: dict) -> dict:
+    r"""Parses the dates of an event, raising a `ValueError` if they are invalid."""
+    for key in ("start", "end"):
+        if key in fields:
+            fields[key] = parse_datetime(fields[key])
+
+    if "title" in fields and not (fields["title"] or "").strip():
+        raise ValueError("The title of an event cannot be empty")
+
+    return fields
+
+
+def add_event(owner_id: str,
+              title: str,
+              start,
+              end=None,
+              color: Optional[str] = None,
+              url: Optional[str] = None) -> dict:
+    r"""Adds an event to a calendar.
+
+    Parameters
+    ----------
+    owner_id : str
+        The id of the user whose calendar it is
+    title : str
+    start : str or datetime.datetime
+        An ISO 8601 date or datetime, in UTC unless it has an offset
+    end : str or datetime.datetime, optional
+        Same as `start`, by default the event has no duration
+    color : str, optional
+    url : str, optional
+
+    Returns
+    -------
+    dict
+        The new event, with its id (see :func:`to_feed`)
+
+    Raises
+    ------
+    ValueError
+        If a date is invalid, the event ends before it starts or has no title
+    """
+    owner_id = str(owner_id)
+    event = _validate({"title": title, "start": start, "end": end})
+    if event["start"] is None:
+        raise ValueError("An event must have a start")
+
+    event["end"] = event["end"] or event["start"]
+    if event["end"] < event["start"]:
+        raise ValueError("An event cannot end before it starts")
+
+    event.update(_id=ObjectId(),
+                 owner_id=owner_id,
+                 color=color or "",
+                 url=url or "")
+    db.events.insert_one(event)
+    _update_index(owner_id, _changed(owner_id), event["_id"], event)
+
+    return event
+
+
+def update_event(owner_id: str, event_id: str, fields: dict) -> Optional[dict]:
+    r"""Edits some of the fields of an event.
+
+    Parameters
+    ----------
+    owner_id : str
+        The id of the user whose calendar it is
+    event_id : str
+    fields : dict
+        The new values, only the `EDITABLE_FIELDS` are used
+
+    Returns
+    -------
+    dict or None
+        The edited event, or `None` if the calendar has no such event
+
+    Raises
+    ------
+    ValueError
+        If a date is invalid, the event would end before it starts or have no title
+    """
+    owner_id = str(owner_id)
+    fields = _validate({
+        key: value
+        for key, value in fields.items() if key in EDITABLE_FIELDS
+    })
+    if fields.get("start", True) is None:
+        raise ValueError("An event must have a start")
+
+    event_id = _object_id(event_id)
+    event = db.events.find_one({"_id": event_id, "owner_id": owner_id})
+    if event is None:
+        return None
+
+    event.update(fields)
+    event["end"] = event["end"] or event["start"]
+    if event["end"] < event["start"]:
+        raise ValueError("An event cannot end before it starts")
+    # A cleared end is stored as the start, like in `add_event`
+    fields["end"] = event["end"]
+
+    db.events.update_one({"_id": event_id}, {"$set": fields})
+    _update_index(owner_id, _changed(owner_id), event_id, event)
+
+    return event
+
+
+def remove_event(owner_id: str, event_id: str) -> bool:
+    r"""Removes an event from a calendar, returning whether it was there."""
+    owner_id = str(owner_id)
+    event_id = _object_id(event_id)
+    if not db.events.delete_one({
+            "_id": event_id,
+            "owner_id": owner_id
+    }).deleted_count:
+        return False
+
+    _update_index(owner_id, _changed(owner_id), event_id)
+
+    return True
+
+
+def remove_events_titled(owner_id: str, title: str) -> int:
+    r"""Removes every event of a calendar with the given title, returning how many there were."""
+    owner_id = str(owner_id)
+    deleted = db.events.delete_many({
+        "owner_id": owner_id,
+        "title": title
+    }).deleted_count
+    if deleted:
+        _changed(owner_id)
+
+    return deleted
+
+
+def _object_id(event_id) -> Optional[ObjectId]:
+    try:
+        return ObjectId(event_id)
+    except (InvalidId, TypeError):
+        return None
+
+
+def import_embedded_events(user_type: str, user_id: str):
+    r"""Moves the events of the old embedded `calendar` array of a user to `db.events`.
+
+    The array is removed atomically before its events are inserted, so they are moved only once
+    even if several requests do it at the same time.
+    """
+    from api.tools.names import USER_COLLECTIONS
+
+    collection = getattr(db, USER_COLLECTIONS[user_type])
+    user = collection.find_one_and_update(
+        {
+            "_id": ObjectId(user_id),
+            "calendar": {
+                "$exists": True
+            }
+        },
+        {"$unset": {
+            "calendar": ""
+        }},
+        projection={"calendar": 1},
+    )
+    if not user or not user.get("calendar"):
+        return
+
+    events = list()
+    for event in user["calendar"]:
+        try:
+            start = parse_datetime(event.get("start"))
+            end = parse_datetime(event.get("end")) or start
+        except ValueError:
+            logger.warning(
+                "Event %s of user %s has invalid dates, dropped",
+                event.get('title'), user_id)
+            continue
+
+        if start is not None:
+            events.append({
+                "_id": ObjectId(),
+                "owner_id": str(user_id),
+                "title": event.get("title") or "",
+                "start": start,
+                "end": max(start, end),
+                "color": event.get("color") or "",
+                "url": event.get("url") or "",
+            })
+
+    if events:
+        db.events.insert_many(events)
+        _changed(str(user_id))
+        logger.info(
+            "Moved %s calendar events of user %s", len(events), user_id)
+
+
+def course_ids_of(user) -> List[str]:
+    r"""The ids of the courses a user teaches or attends (their children's for parents)."""
+    if getattr(user, "children", None):
+        children = db.students.find(
+            {"_id": {
+                "$in": [ObjectId(child) for child in user.children]
+            }}, {"courses": 1})
+        return sorted({
+            str(course_id)
+            for child in children for course_id in child.get("courses", [])
+        })
+
+    return [str(course_id) for course_id in getattr(user, "courses", None) or []]
+
+
+def _meetings(course: dict, start: datetime, end: datetime) -> List[dict]:
+    r"""The meetings of a course that overlap a range."""
+    schedule = schedules.of(course)
+    if schedule is None:
+        return list()
+
+    course_id = str(course["_id"])
+
+    return [{
+        "id": f"{course_id}@{meeting_start:%Y%m%d}",
+        "type": CLASS,
+        "title": course.get("name", ""),
+        "start": meeting_start,
+        "end": meeting_end,
+        "course_id": course_id,
+    } for meeting_start, meeting_end in schedule.occurrences(start, end)]
+
+
+def _due_dates(course: dict, start: datetime, end: datetime) -> List[dict]:
+    r"""The assignments of a course due within a range."""
+    course_id = str(course["_id"])
+    due_dates = list()
+
+    for assignment in course.get("assignments") or []:
+        try:
+            due_by = parse_datetime(assignment.get("due_by"))
+        except (ValueError, TypeError):
+            continue
+
+        if due_by is not None and start <= due_by < end:
+            due_dates.append({
+                "id": str(assignment["_id"]),
+                "type": ASSIGNMENT,
+                "title": assignment.get("title", ""),
+                "start": due_by,
+                "end": due_by,
+                "course_id": course_id,
+                "course_name": course.get("name", ""),
+            })
+
+    return due_dates
+
+
+def to_feed(event: dict) -> dict:
+    r"""Converts a personal event to a feed entry."""
+    return {
+        "id": str(event["_id"]),
+        "type": EVENT,
+        "title": event["title"],
+        "start": event["start"],
+        "end": event["end"],
+        "color": event.get("color", ""),
+        "url": event.get("url", ""),
+    }
+
+
+def serialize(entry: dict) -> dict:
+    r"""Formats the dates of a feed entry as ISO 8601 strings."""
+    entry["start"] = format_datetime(entry["start"])
+    entry["end"] = format_datetime(entry["end"])
+    return entry
+
+
+def get_feed(user,
+             start: datetime,
+             end: datetime,
+             types: Optional[Iterable[str]] = None) -> List[dict]:
+    r"""Returns everything in the calendar of a user between two dates.
+
+    Parameters
+    ----------
+    user : User
+        A student, teacher, parent or admin
+    start : datetime.datetime
+        The start of the range, included
+    end : datetime.datetime
+        The end of the range, excluded
+    types : Iterable[str], optional
+        Only return these kinds of entries (see `TYPES`), by default all of them
+
+    Returns
+    -------
+    List[dict]
+        The entries of the calendar sorted by start, with their `id`, `type`, `title`, and
+        `start` and `end` as ISO 8601 strings; personal events also have a `color` and a `url`,
+        due dates and meetings a `course_id`
+
+    Raises
+    ------
+    ValueError
+        If the range is empty or longer than `MAX_RANGE`
+    """
+    if not start < end or end - start > MAX_RANGE:
+        raise ValueError(
+            f"The range should be between 0 and {MAX_RANGE.days} days long")
+
+    types = set(types or TYPES)
+    entries = list()
+
+    if EVENT in types:
+        if getattr(user, "calendar", None):
+            import_embedded_events(user._type, user.id)
+            user.calendar = list()
+
+        entries.extend(
+            to_feed(event)
+            for event in get_index(user.id).overlapping(start, end))
+
+    if types & {ASSIGNMENT, CLASS}:
+        course_ids = course_ids_of(user)
+        projection = COURSE_PROJECTION if ASSIGNMENT in types else {
+            key: value
+            for key, value in COURSE_PROJECTION.items()
+            if not key.startswith("assignments")
+        }
+        courses = db.courses.find(
+            {"_id": {
+                "$in": [ObjectId(course_id) for course_id in course_ids]
+            }}, projection) if course_ids else []
+
+        for course in courses:
+            if ASSIGNMENT in types:
+                entries.extend(_due_dates(course, start, end))
+            if CLASS in types:
+                entries.extend(_meetings(course, start, end))
+
+    entries.sort(key=lambda entry: (entry["start"], entry["id"]))
+
+    return [serialize(entry) for entry in entries]
@@ -0,0 +1,241 @@
+r"""The summary shown on the home page of a student.
+
+Everything is computed from a single aggregation over the student's courses. The aggregation
+keeps only the fields the dashboard needs and only the student's own submissions, instead of
+hydrating every course with every submission of the class.
+
+The aggregated courses are cached per student by every worker, and reused for as long as the
+`revision` and the `calendar_revision` of every course are unchanged: assignment, enrollment,
+submission and grade changes bump the former, and changes to the name or schedule of a course the
+latter. The time-dependent parts (what is upcoming, today's classes) are computed on every call.
+"""
+import threading
+from datetime import datetime
+from datetime import timedelta
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from api import db
+from api.tools import schedule as schedules
+from api.tools.dates import format_datetime
+from api.tools.dates import from_local
+from api.tools.dates import parse_datetime
+from api.tools.dates import school_timezone
+from api.tools.dates import to_local
+from api.tools.per_process import PerProcess
+from bson import ObjectId
+from cachetools import LRUCache
+
+# How far ahead assignments are shown as upcoming
+UPCOMING_DAYS = 14
+# The maximum number of upcoming assignments and recent grades
+UPCOMING_LIMIT = 10
+RECENT_GRADES_LIMIT = 5
+
+# The number of students whose courses are cached by each worker
+MAX_STUDENTS = 4096
+
+
+def pipeline(course_ids: List[ObjectId], student_ids: list) -> List[dict]:
+    r"""The aggregation pipeline of the courses of a student, with their submissions only."""
+    return [
+        {
+            "$match": {
+                "_id": {
+                    "$in": course_ids
+                }
+            }
+        },
+        {
+            "$project": {
+                "name": 1,
+                "revision": 1,
+                "schedule_days": 1,
+                "schedule_time": 1,
+                "assignments": {
+                    "$map": {
+                        "input": {
+                            "$ifNull": ["$assignments", []]
+                        },
+                        "as": "assignment",
+                        "in": {
+                            "_id": "$$assignment._id",
+                            "title": "$$assignment.title",
+                            "due_by": "$$assignment.due_by",
+                            "estimated_time": "$$assignment.estimated_time",
+                            "submissions": {
+                                "$filter": {
+                                    "input": {
+                                        "$ifNull":
+                                        ["$$assignment.submissions", []]
+                                    },
+                                    "as": "submission",
+                                    "cond": {
+                                        "$in": [
+                                            "$$submission.student_id",
+                                            student_ids
+                                        ]
+                                    },
+                                }
+                            },
+                        },
+                    }
+                },
+            }
+        },
+    ]
+
+
+# The aggregated courses of the students, as {student id: (version, courses)}
+_courses: PerProcess[LRUCache] = PerProcess(
+    lambda: LRUCache(maxsize=MAX_STUDENTS))
+_lock = threading.Lock()
+
+
+def _version(course_ids: List[ObjectId]) -> Tuple:
+    revisions = {
+        course["_id"]: (course.get("revision", 0),
+                        course.get("calendar_revision", 0))
+        for course in db.courses.find({"_id": {
+            "$in": course_ids
+        }}, {
+            "revision": 1,
+            "calendar_revision": 1
+        })
+    }
+
+    return tuple((course_id, revisions.get(course_id))
+                 for course_id in sorted(course_ids))
+
+
+def get_courses(student) -> List[dict]:
+    r"""Returns the aggregated courses of a student, from the cache if they did not change."""
+    course_ids = sorted({ObjectId(course_id) for course_id in student.courses})
+    if not course_ids:
+        return list()
+
+    cache = _courses.get()
+    student_id = str(student.id)
+    version = _version(course_ids)
+
+    with _lock:
+        cached = cache.get(student_id)
+    if cached is not None and cached[0] == version:
+        courses = cached[1]
+    else:
+        courses = list(
+            db.courses.aggregate(
+                pipeline(course_ids, [student_id, ObjectId(student_id)])))
+        with _lock:
+            cache[student_id] = (version, courses)
+
+    return courses
+
+
+def _parse(value) -> Optional[datetime]:
+    try:
+        return parse_datetime(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def summarize(courses: List[dict], now: Optional[datetime] = None) -> dict:
+    r"""Computes the dashboard of a student from their aggregated courses.
+
+    Parameters
+    ----------
+    courses : List[dict]
+        The courses, as returned by :func:`pipeline`
+    now : datetime.datetime, optional
+        The current UTC time, by default `datetime.utcnow()`
+
+    Returns
+    -------
+    dict
+        `upcoming`: the assignments not submitted yet, due in the next `UPCOMING_DAYS` days
+        (soonest first); `today`: the classes of the day, in order; `recent_grades`: the last
+        graded submissions (latest first); `ungraded`: the number of submissions waiting for a
+        grade, in `total` and per course in `courses`
+    """
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(days=UPCOMING_DAYS)
+    # Today, in the school's timezone
+    tz = school_timezone()
+    local = to_local(now, tz)
+    day = datetime(local.year, local.month, local.day)
+    midnight = from_local(day, tz)
+    next_midnight = from_local(day + timedelta(days=1), tz)
+
+    upcoming = list()
+    today = list()
+    grades = list()
+    ungraded = dict()
+
+    for course in courses:
+        course_id = str(course["_id"])
+        name = course.get("name", "")
+
+        schedule = schedules.of(course)
+        if schedule is not None:
+            today.extend({
+                "course_id": course_id,
+                "name": name,
+                "start": start,
+                "end": end,
+            } for start, end in schedule.occurrences(midnight, next_midnight, tz)
+                         if start >= midnight)
+
+        for assignment in course.get("assignments") or []:
+            submissions = assignment.get("submissions") or []
+            entry = {
+                "id": str(assignment["_id"]),
+                "title": assignment.get("title", ""),
+                "course_id": course_id,
+                "course_name": name,
+            }
+
+            due_by = _parse(assignment.get("due_by"))
+            if not submissions and due_by is not None and now <= due_by < horizon:
+                upcoming.append(
+                    dict(entry,
+                         due_by=due_by,
+                         estimated_time=assignment.get("estimated_time")))
+
+            for submission in submissions:
+                if submission.get("grade") in (None, ""):
+                    ungraded[course_id] = ungraded.get(course_id, 0) + 1
+                else:
+                    grades.append(
+                        dict(entry,
+                             grade=submission["grade"],
+                             date_submitted=_parse(
+                                 submission.get("date_submitted"))))
+
+    upcoming.sort(key=lambda entry: entry["due_by"])
+    today.sort(key=lambda entry: entry["start"])
+    grades.sort(key=lambda entry: entry["date_submitted"] or datetime.min,
+                reverse=True)
+
+    for entry in upcoming:
+        entry["due_by"] = format_datetime(entry["due_by"])
+    for entry in today:
+        entry["start"] = format_datetime(entry["start"])
+        entry["end"] = format_datetime(entry["end"])
+    for entry in grades:
+        entry["date_submitted"] = format_datetime(entry["date_submitted"])
+
+    return {
+        "upcoming": upcoming[:UPCOMING_LIMIT],
+        "today": today,
+        "recent_grades": grades[:RECENT_GRADES_LIMIT],
+        "ungraded": {
+            "total": sum(ungraded.values()),
+            "courses": ungraded
+        },
+    }
+
+
+def get_dashboard(student) -> dict:
+    r"""Returns the dashboard of a student, see :func:`summarize`."""
+    return summarize(get_courses(student))
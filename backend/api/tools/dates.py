@@ -0,0 +1,148 @@
+r"""Parsing and formatting of the dates sent by the frontend and stored in the database.
+
+Every datetime handled by the backend is a naive datetime in UTC, like the ones returned by
+`datetime.utcnow()` and by pymongo, and is stored as a BSON date. Dates are only shown in the
+timezone of the school (`SchoolConfig.timezone`) when they are rendered, and the dates typed in a
+form without an offset are read in that timezone.
+"""
+from datetime import date
+from datetime import datetime
+from datetime import timezone
+from typing import Optional
+from typing import Union
+
+import pytz
+from api.tools.exceptions import InvalidFormatException
+from api.tools.exceptions import InvalidTypeException
+
+
+def parse_datetime(value: Union[str, date, datetime, None],
+                   tz: Optional[pytz.BaseTzInfo] = None) -> Optional[datetime]:
+    r"""Parses an ISO 8601 date or datetime into a naive UTC datetime.
+
+    Accepts datetimes (converted to UTC if they are aware), dates (midnight) and strings like
+    "2020-08-09", "2020-08-09T10:30:00", "2020-08-09T10:30:00Z" or "2020-08-09T10:30:00+02:00".
+
+    Parameters
+    ----------
+    value : str, datetime.date or datetime.datetime
+    tz : pytz timezone, optional
+        The timezone of the strings and dates without an offset, e.g. the school's for the dates
+        typed in a form. UTC by default (naive datetimes are always UTC)
+
+    Returns
+    -------
+    datetime.datetime or None
+        The naive UTC datetime, or `None` if `value` is empty
+
+    Raises
+    ------
+    ValueError
+        If `value` is not a valid ISO 8601 date
+    """
+    if value is None or value == "":
+        return None
+
+    if isinstance(value, str):
+        value = value.strip()
+        if value.endswith(("Z", "z")):
+            value = value[:-1] + "+00:00"
+        value = datetime.fromisoformat(value)
+        if tz is not None and value.tzinfo is None:
+            value = tz.localize(value)
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+        if tz is not None:
+            value = tz.localize(value)
+
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return value
+
+
+def clean_datetime(name: str, value: Union[str, datetime, None]) -> Optional[datetime]:
+    r"""Validates a date given to a setter, and returns the naive UTC datetime to store.
+
+    Raises
+    ------
+    InvalidTypeException
+        If the value is not a str nor a datetime
+    InvalidFormatException
+        If the string is not a valid ISO 8601 date
+    """
+    if value is not None and not isinstance(value, (datetime, str)):
+        raise InvalidTypeException(
+            f"The {name} provided is not a str or datetime.datetime (type provided is {type(value)})."
+        )
+
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        raise InvalidFormatException(
+            f"The {name} provided is not a valid ISO 8601 date (got {value})")
+
+
+def parse_stored_datetime(value) -> Optional[datetime]:
+    r"""Reads a stored date, or `None` if it is missing or not a valid one.
+
+    Dates saved before they were stored as BSON dates are ISO 8601 strings, in UTC (until they are
+    migrated, see :func:`api.tools.migrations.migrate_dates`).
+    """
+    if isinstance(value, datetime):
+        return value
+
+    try:
+        return parse_datetime(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def format_datetime(value: Optional[datetime],
+                    tz: Optional[pytz.BaseTzInfo] = None) -> Optional[str]:
+    r"""Formats a naive UTC datetime as an ISO 8601 string.
+
+    With a "Z" suffix, or in a timezone with its offset, e.g. "2020-08-09T12:30:00+02:00".
+    """
+    if value is None:
+        return None
+
+    value = value.replace(microsecond=0)
+    if tz is None:
+        return value.isoformat() + "Z"
+
+    return pytz.utc.localize(value).astimezone(tz).isoformat()
+
+
+def to_local(value: datetime, tz: pytz.BaseTzInfo) -> datetime:
+    r"""Converts a naive UTC datetime to the (naive) wall-clock time of a timezone."""
+    return pytz.utc.localize(value).astimezone(tz).replace(tzinfo=None)
+
+
+def from_local(value: datetime, tz: pytz.BaseTzInfo) -> datetime:
+    r"""Converts a (naive) wall-clock time of a timezone to a naive UTC datetime.
+
+    Times skipped or repeated when the clocks change are read with the offset of standard time.
+    """
+    return tz.localize(value).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def get_timezone(name: str) -> pytz.BaseTzInfo:
+    r"""The timezone with an IANA name, e.g. "America/New_York".
+
+    Raises
+    ------
+    pytz.UnknownTimeZoneError
+        If there is no such timezone
+    """
+    return pytz.timezone(name)
+
+
+def school_timezone() -> pytz.BaseTzInfo:
+    r"""The timezone of the school, in which dates are shown (UTC before the app is created)."""
+    import api
+
+    if api.school_config is None:
+        return pytz.utc
+
+    return api.school_config.tzinfo
@@ -1,10 +1,68 @@
+import os
+import time
+import weakref
+from datetime import datetime
+from datetime import timedelta
+from threading import Thread
+from typing import Callable
+
 from flask import current_app
+from pymongo import ASCENDING
 from pymongo import MongoClient
+from pymongo.errors import CollectionInvalid
+from pymongo.errors import DuplicateKeyError
+
+# Every database connected to its own client, to connect them again in forked processes
+_connected = weakref.WeakSet()
+
+
+def _reconnect_after_fork():
+    for db in list(_connected):
+        db.connect()
+
+
+# The number of recent changes of the in-process indexes kept, see api.tools.versioned
+INDEX_CHANGES = 10000
+
+# A client is not fork-safe: e.g. the gunicorn workers forked from a preloaded app need their own
+os.register_at_fork(after_in_child=_reconnect_after_fork)
 
 
 class DB:
-    def __init__(self, connection_string: str, database: str):
-        self.db = MongoClient(connection_string).get_database(database)
+    def __init__(self,
+                 connection_string: str,
+                 database: str,
+                 event_listeners: list = None):
+        self.connection_string = connection_string
+        self.database_name = database
+        self.event_listeners = event_listeners or []
+        self.connect()
+
+    def connect(self):
+        r"""Connects to the database with a new client.
+
+        The client only connects on its first command, so this is cheap in a forked process that
+        never uses the database.
+        """
+        self.client = MongoClient(self.connection_string,
+                                  connect=False,
+                                  event_listeners=self.event_listeners)
+        self.bind(self.client.get_database(self.database_name))
+        _connected.add(self)
+
+    def bind(self, database):
+        r"""Uses the collections of a database, e.g. an in-memory one in the benchmarks.
+
+        Parameters
+        ----------
+        database : pymongo.database.Database
+            Or any object with the same interface
+        """
+        if database.client is not getattr(self, "client", None):
+            # Not connected again after a fork anymore
+            _connected.discard(self)
+
+        self.db = database
 
         # All the collection initializations go here
         self.courses = self.db.courses
@@ -13,6 +71,132 @@ class DB:
         self.students = self.db.students
         self.parents = self.db.parents
         self.general_info = self.db.general_info
+        self.locks = self.db.locks
+        self.blobs = self.db.blobs
+        self.counters = self.db.counters
+        self.events = self.db.events
+        self.feeds = self.db.feeds
+        self.reminders = self.db.reminders
+        self.index_changes = self.db.index_changes
 
     def __repr__(self):
         return "<MongoDB database>"
+
+    def create_indexes(self):
+        r"""Creates the indexes of the collections, if they do not exist yet."""
+        # The events of a calendar, by start
+        self.events.create_index([("owner_id", ASCENDING),
+                                  ("start", ASCENDING)])
+        # The calendar feed of a user
+        self.feeds.create_index("user_id", unique=True)
+        # The range queries on due dates (e.g. the due date reminders) and submission times, see
+        # api.tools.deadlines
+        self.courses.create_index("assignments.due_by")
+        self.courses.create_index("assignments.submissions.date_submitted")
+        # Sent reminders are only remembered until their assignments are long past due
+        self.reminders.create_index("sent_at",
+                                    expireAfterSeconds=30 * 24 * 3600)
+        # Only the latest changes of the in-process indexes are replayed, older ones are dropped
+        if "index_changes" not in self.db.list_collection_names():
+            try:
+                self.db.create_collection("index_changes",
+                                          capped=True,
+                                          size=INDEX_CHANGES * 256,
+                                          max=INDEX_CHANGES)
+            except CollectionInvalid:
+                # Created by another worker in between
+                pass
+        self.index_changes.create_index([("index", ASCENDING),
+                                         ("seq", ASCENDING)])
+
+    def acquire_lease(self, name: str, seconds: int) -> bool:
+        r"""Acquires a named lease shared by all the workers, if nobody else holds it.
+
+        Used to make sure that periodic background jobs run in one worker only.
+
+        Parameters
+        ----------
+        name : str
+            The name of the lease
+        seconds : int
+            For how long the lease is held (it is never released early)
+
+        Returns
+        -------
+        bool
+            `True` if the lease was acquired, `False` if it is currently held by someone else
+        """
+        now = datetime.utcnow()
+        try:
+            self.locks.find_one_and_update(
+                {
+                    "_id": name,
+                    "expires_at": {
+                        "$lte": now
+                    }
+                },
+                {"$set": {
+                    "expires_at": now + timedelta(seconds=seconds)
+                }},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # The lease exists and has not expired yet, so the upsert tried to insert a duplicate
+            return False
+
+        return True
+
+    def run_periodically(self,
+                         app,
+                         lease: str,
+                         interval: int,
+                         job: Callable[[], None],
+                         name: str,
+                         repeat: bool = True) -> Thread:
+        r"""Starts a daemon thread that runs a background job every `interval` seconds.
+
+        Only one worker runs the job at a time: the others skip it while the lease is held.
+
+        Parameters
+        ----------
+        app : A Flask app instance
+        lease : str
+            The name of the lease held by the worker running the job
+        interval : int
+            Seconds between two runs, for which the lease is held
+        job : Callable[[], None]
+            Runs the job within an app context
+        name : str
+            The name of the thread, also used in the logs
+        repeat : bool
+            If `False`, the job only runs once, right away
+
+        Returns
+        -------
+        threading.Thread
+            The started thread
+        """
+
+        def run_once():
+            from api import root_logger as logger
+
+            with app.app_context():
+                try:
+                    if self.acquire_lease(lease, interval):
+                        job()
+                except Exception as e:
+                    logger.exception("Error while running the %s job", name)
+
+        def run():
+            if not repeat:
+                run_once()
+                return
+
+            while True:
+                time.sleep(interval)
+                run_once()
+
+        thread = Thread(target=run, name=name, daemon=True)
+        thread.start()
+
+        return thread
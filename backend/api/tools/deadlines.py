@@ -0,0 +1,180 @@
+r"""Range queries on due dates and submission times, e.g. what is due this week or was submitted late.
+
+Due dates (`assignments.due_by`) and submission times (`assignments.submissions.date_submitted`)
+are stored as BSON dates in UTC, and both are indexed (see :meth:`api.tools.db.DB.create_indexes`),
+so the courses with something in a range are found with an index scan. The aggregations then
+unwind only the assignments (and submissions) of those courses, and keep the ones in the range.
+"""
+from datetime import datetime
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from api import db
+from bson import ObjectId
+
+
+def _range(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    bounds = dict()
+    if start is not None:
+        bounds["$gte"] = start
+    if end is not None:
+        bounds["$lt"] = end
+
+    return bounds
+
+
+def _match(path: str, start: Optional[datetime], end: Optional[datetime],
+           course_ids: Optional[Iterable[str]]) -> dict:
+    match = dict()
+    if start is not None or end is not None:
+        match[path] = _range(start, end)
+    if course_ids is not None:
+        match["_id"] = {
+            "$in": [ObjectId(course_id) for course_id in course_ids]
+        }
+
+    return match
+
+
+def due_between(start: Optional[datetime],
+                end: Optional[datetime],
+                course_ids: Optional[Iterable[str]] = None) -> List[dict]:
+    r"""The assignments due in a range, by due date.
+
+    Parameters
+    ----------
+    start, end : datetime.datetime, optional
+        The range, in UTC (`end` excluded). Unbounded on a side if `None`
+    course_ids : Iterable[str], optional
+        Only the assignments of these courses
+
+    Returns
+    -------
+    List[dict]
+        The assignments, as {"_id", "course_id", "course", "title", "due_by"}
+    """
+    match = _match("assignments.due_by", start, end, course_ids)
+
+    return list(
+        db.courses.aggregate([
+            {
+                "$match": match
+            },
+            {
+                "$project": {
+                    "name": 1,
+                    "assignments._id": 1,
+                    "assignments.title": 1,
+                    "assignments.due_by": 1,
+                }
+            },
+            {
+                "$unwind": "$assignments"
+            },
+            {
+                "$match": _match("assignments.due_by", start, end, None)
+            },
+            {
+                "$sort": {
+                    "assignments.due_by": 1
+                }
+            },
+            {
+                "$project": {
+                    "_id": "$assignments._id",
+                    "course_id": "$_id",
+                    "course": "$name",
+                    "title": "$assignments.title",
+                    "due_by": "$assignments.due_by",
+                }
+            },
+        ]))
+
+
+def submitted_between(start: Optional[datetime],
+                      end: Optional[datetime],
+                      course_ids: Optional[Iterable[str]] = None,
+                      late: bool = False) -> List[dict]:
+    r"""The submissions made in a range, by submission time.
+
+    Parameters
+    ----------
+    start, end : datetime.datetime, optional
+        The range, in UTC (`end` excluded). Unbounded on a side if `None`
+    course_ids : Iterable[str], optional
+        Only the submissions to the assignments of these courses
+    late : bool
+        Only the submissions made after their assignment was due
+
+    Returns
+    -------
+    List[dict]
+        The submissions, as {"_id", "course_id", "assignment_id", "student_id", "date_submitted",
+        "due_by", "grade"}
+    """
+    match = _match("assignments.submissions.date_submitted", start, end,
+                   course_ids)
+
+    pipeline = [
+        {
+            "$match": match
+        },
+        {
+            "$project": {
+                "assignments._id": 1,
+                "assignments.due_by": 1,
+                "assignments.submissions._id": 1,
+                "assignments.submissions.student_id": 1,
+                "assignments.submissions.date_submitted": 1,
+                "assignments.submissions.grade": 1,
+            }
+        },
+        {
+            "$unwind": "$assignments"
+        },
+        {
+            "$unwind": "$assignments.submissions"
+        },
+        {
+            "$match":
+            _match("assignments.submissions.date_submitted", start, end, None)
+        },
+    ]
+
+    if late:
+        pipeline.append({
+            "$match": {
+                # Assignments without a due date are never late
+                "assignments.due_by": {
+                    "$type": "date"
+                },
+                "$expr": {
+                    "$gt": [
+                        "$assignments.submissions.date_submitted",
+                        "$assignments.due_by"
+                    ]
+                },
+            }
+        })
+
+    pipeline.extend([
+        {
+            "$sort": {
+                "assignments.submissions.date_submitted": 1
+            }
+        },
+        {
+            "$project": {
+                "_id": "$assignments.submissions._id",
+                "course_id": "$_id",
+                "assignment_id": "$assignments._id",
+                "student_id": "$assignments.submissions.student_id",
+                "date_submitted": "$assignments.submissions.date_submitted",
+                "due_by": "$assignments.due_by",
+                "grade": "$assignments.submissions.grade",
+            }
+        },
+    ])
+
+    return list(db.courses.aggregate(pipeline))
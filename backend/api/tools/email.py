@@ -3,6 +3,7 @@ from typing import List
 from typing import Tuple
 
 from api import mail
+from api.tools import metrics
 from flask import current_app
 from flask import render_template
 from flask_mail import Message
@@ -20,8 +21,40 @@ def send_email(app, msg: Message):
     msg : flask_mail.Message
         Defines a message to be sent.
     """
-    with app.app_context():
-        mail.send(msg)
+    try:
+        with app.app_context():
+            mail.send(msg)
+    except Exception:
+        metrics.EMAILS_SENT.inc("failed")
+        raise
+    else:
+        metrics.EMAILS_SENT.inc("sent")
+    finally:
+        metrics.EMAIL_OUTBOX.dec()
+
+
+def build_message(to: List[str],
+                  subject: str,
+                  template: str,
+                  files: fileList = None,
+                  **kwargs) -> Message:
+    r"""Compiles a flask_mail.Message object, see `send_async_email` for the parameters."""
+    app = current_app._get_current_object()
+
+    msg = Message(
+        app.config["MAIL_SUBJECT_PREFIX"] + " " + subject,
+        sender=app.config["MAIL_SENDER"],
+        recipients=to,
+    )
+    # msg.body is used if html cannot be rendered properly
+    msg.body = render_template(template + ".txt", **kwargs)
+    msg.html = render_template(template + ".html", **kwargs)
+
+    if files is not None:
+        for filename, file_content in files:
+            msg.attach(filename, "application/octect-stream", file_content)
+
+    return msg
 
 
 def send_async_email(to: List[str],
@@ -45,21 +78,30 @@ def send_async_email(to: List[str],
         Keyword arguments that would be passed to the html/txt template and would be rendered in there.
     """
     app = current_app._get_current_object()
+    msg = build_message(to, subject, template, files, **kwargs)
 
-    msg = Message(
-        app.config["MAIL_SUBJECT_PREFIX"] + " " + subject,
-        sender=app.config["MAIL_SENDER"],
-        recipients=to,
-    )
-    # msg.body is used if html cannot be rendered properly
-    msg.body = render_template(template + ".txt", **kwargs)
-    msg.html = render_template(template + ".html", **kwargs)
-
-    if files is not None:
-        for filename, file_content in files:
-            msg.attach(filename, "application/octect-stream", file_content)
-
+    # Until `send_email` is done with it
+    metrics.EMAIL_OUTBOX.inc()
     thr = Thread(target=send_email, args=[app, msg])
     thr.start()
 
     return thr
+
+
+def send_email_now(to: List[str],
+                   subject: str,
+                   template: str,
+                   files: fileList = None,
+                   **kwargs):
+    r"""Sends an email from the current thread, see `send_async_email` for the parameters.
+
+    Raises
+    ------
+    Exception
+        If the email could not be sent
+    """
+    app = current_app._get_current_object()
+    msg = build_message(to, subject, template, files, **kwargs)
+
+    metrics.EMAIL_OUTBOX.inc()
+    send_email(app, msg)
@@ -1,3 +1,7 @@
+from datetime import datetime
+
+from api.tools.dates import format_datetime
+from api.tools.dates import school_timezone
 from bson import ObjectId
 from flask.json import JSONEncoder
 
@@ -18,6 +22,9 @@ class JSONImproved(JSONEncoder):
         """
         if isinstance(obj, ObjectId):
             return str(obj)
+        elif isinstance(obj, datetime):
+            # Stored in UTC, shown in the timezone of the school
+            return format_datetime(obj, school_timezone())
         elif hasattr(obj, "to_dict"):
             return obj.to_dict()
         else:
@@ -10,3 +10,24 @@ class InvalidTypeException(Exception):
 class InvalidFormatException(Exception):
     r"""Raised when an argument to a setter does not match the expected format"""
     pass
+
+
+class ScheduleConflictException(Exception):
+    r"""Raised when an enrollment would make someone attend two courses at the same time"""
+
+    def __init__(self, message: str, conflicts: list):
+        super().__init__(message)
+        self.conflicts = conflicts
+
+
+class QueryBudgetException(Exception):
+    r"""Raised when a request issues too many database commands, or too many similar ones"""
+    pass
+
+
+class ValidationException(Exception):
+    r"""Raised when a batch of documents (e.g. an import or an update) has invalid fields"""
+
+    def __init__(self, message: str, errors: list):
+        super().__init__(message)
+        self.errors = errors
@@ -0,0 +1,428 @@
+r"""A school-wide full-text search index over people, courses and assignments.
+
+Every worker keeps an inverted index (term -> {document: weighted term frequency}) over:
+
+- people: first and last names
+- courses: department and number, name, description
+- assignments: title, content
+
+Results are ranked with BM25, counted per type (facets), and filtered by what the user can see:
+admins see everything, other users see the courses (and their assignments) they teach, attend,
+or whose students are their children, and every person.
+
+The index is updated from the model write methods through `course_changed`, `course_removed`,
+`person_changed` and `person_removed`, and the other workers replay the changes from a shared log
+(see :mod:`api.tools.versioned`), so searches never query the database.
+"""
+import heapq
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from api import db
+from api import root_logger as logger
+from api.tools.names import normalize
+from api.tools.names import USER_COLLECTIONS
+from api.tools.versioned import VersionedIndex
+from bson import ObjectId
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# How much a term counts in each field
+TITLE_WEIGHT = 3.0
+TEXT_WEIGHT = 1.0
+
+# The last term of a query also matches up to this many longer terms starting with it,
+# with their score multiplied by PREFIX_DISCOUNT
+MAX_PREFIX_TERMS = 50
+PREFIX_DISCOUNT = 0.8
+
+TYPES = ["person", "course", "assignment"]
+
+# The fields of a course document needed to index it and its assignments
+COURSE_PROJECTION = {
+    "department": 1,
+    "number": 1,
+    "name": 1,
+    "description": 1,
+    "teacher": 1,
+    "students": 1,
+    "assignments._id": 1,
+    "assignments.title": 1,
+    "assignments.content": 1,
+    "assignments.due_by": 1,
+}
+
+_TOKENS = re.compile(r"\w+")
+
+Key = Tuple[str, str]
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKENS.findall(normalize(text))
+
+
+def _text(value) -> str:
+    r"""Flattens a field to plain text, including rich text stored as JSON (e.g. Quill deltas)."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return " ".join(_text(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(_text(item) for item in value)
+
+    return str(value)
+
+
+class SearchIndex:
+    r"""An inverted index with BM25 ranking."""
+
+    def __init__(self):
+        # term -> {(type, id): weighted term frequency}
+        self._postings: Dict[str, Dict[Key, float]] = dict()
+        # (type, id) -> the document's display fields and terms, and its length
+        self._documents: Dict[Key, dict] = dict()
+        self._lengths: Dict[Key, float] = dict()
+        # course id -> the ids of its assignments
+        self._assignments: Dict[str, Set[str]] = dict()
+        self._total_length = 0.0
+        # The sorted terms, rebuilt on the next search after new terms are added
+        self._vocabulary: List[str] = list()
+        self._vocabulary_dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, type_: str, id_: str, fields: Iterable[Tuple[str, float]],
+            **document):
+        r"""Adds a document, or replaces it if it is already in the index.
+
+        Parameters
+        ----------
+        type_ : str
+            "person", "course" or "assignment"
+        id_ : str
+        fields : Iterable[Tuple[str, float]]
+            The text of the document, as (text, weight) pairs
+        **document
+            The fields returned with search results
+        """
+        terms = Counter()
+        for text, weight in fields:
+            for term in tokenize(text):
+                terms[term] += weight
+
+        key = (type_, str(id_))
+        with self._lock:
+            self._remove(key)
+
+            for term, frequency in terms.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = dict()
+                    self._vocabulary_dirty = True
+                postings[key] = frequency
+
+            length = self._lengths[key] = sum(terms.values())
+            self._documents[key] = {
+                **document,
+                "type": type_,
+                "id": key[1],
+                "_terms": list(terms),
+            }
+            self._total_length += length
+
+    def remove(self, type_: str, id_: str):
+        with self._lock:
+            self._remove((type_, str(id_)))
+
+    def _remove(self, key: Key):
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+
+        for term in document["_terms"]:
+            postings = self._postings[term]
+            del postings[key]
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_dirty = True
+
+        self._total_length -= self._lengths.pop(key)
+
+    def add_course(self, course: dict):
+        r"""Indexes a course document (see `COURSE_PROJECTION`) and all of its assignments."""
+        course_id = str(course["_id"])
+        title = " ".join(
+            str(course.get(field) or "")
+            for field in ("department", "number", "name")).strip()
+
+        with self._lock:
+            self.add(
+                "course",
+                course_id,
+                [(title, TITLE_WEIGHT),
+                 (_text(course.get("description")), TEXT_WEIGHT)],
+                title=title,
+                course_id=course_id,
+                teacher=str(course.get("teacher")),
+                students={
+                    str(student)
+                    for student in course.get("students") or []
+                },
+            )
+
+            assignment_ids = set()
+            for assignment in course.get("assignments") or []:
+                assignment_id = str(assignment["_id"])
+                assignment_ids.add(assignment_id)
+                self.add(
+                    "assignment",
+                    assignment_id,
+                    [(_text(assignment.get("title")), TITLE_WEIGHT),
+                     (_text(assignment.get("content")), TEXT_WEIGHT)],
+                    title=assignment.get("title"),
+                    course_id=course_id,
+                    course=title,
+                    due_by=assignment.get("due_by"),
+                )
+
+            # Assignments deleted since the course was last indexed
+            for assignment_id in self._assignments.get(course_id,
+                                                       set()) - assignment_ids:
+                self._remove(("assignment", assignment_id))
+            self._assignments[course_id] = assignment_ids
+
+    def remove_course(self, course_id: str):
+        r"""Removes a course and all of its assignments."""
+        course_id = str(course_id)
+
+        with self._lock:
+            self._remove(("course", course_id))
+            for assignment_id in self._assignments.pop(course_id, set()):
+                self._remove(("assignment", assignment_id))
+
+    def add_person(self, user_type: str, user_id: str, first_name: str,
+                   last_name: str):
+        name = f"{first_name or ''} {last_name or ''}".strip()
+        self.add("person",
+                 user_id,
+                 [(name, TITLE_WEIGHT)],
+                 title=name,
+                 user_type=user_type)
+
+    def _terms(self, query: str) -> Dict[str, float]:
+        r"""The terms of a query and their weights, the last one expanded by prefix."""
+        tokens = tokenize(query)
+        terms = {term: 1.0 for term in tokens}
+        if not terms:
+            return terms
+
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+
+        last = tokens[-1]
+        position = bisect_left(self._vocabulary, last)
+        for term in self._vocabulary[position:position + MAX_PREFIX_TERMS + 1]:
+            if not term.startswith(last):
+                break
+            terms.setdefault(term, PREFIX_DISCOUNT)
+
+        return terms
+
+    def _visible(self, document: dict, viewer: Optional[Set[str]]) -> bool:
+        if viewer is None or document["type"] == "person":
+            return True
+
+        course = self._documents.get(("course", document["course_id"]))
+        return course is not None and (
+            course["teacher"] in viewer
+            or not viewer.isdisjoint(course["students"]))
+
+    def search(self,
+               query: str,
+               viewer: Optional[Set[str]] = None,
+               types: Optional[Iterable[str]] = None,
+               limit: int = 20,
+               offset: int = 0) -> dict:
+        r"""Searches the index.
+
+        Parameters
+        ----------
+        query : str
+        viewer : Set[str], optional
+            The ids of the people whose courses can be seen (e.g. a user and their children), by
+            default everything can be seen
+        types : Iterable[str], optional
+            Only return documents of these types, by default all of them
+        limit : int, optional
+            The maximum number of results, by default 20
+        offset : int, optional
+            The number of results to skip, by default 0
+
+        Returns
+        -------
+        dict
+            The `results` (best first, with their `score`), the `total` number of results and the
+            number of matches of each type (`facets`, regardless of `types`)
+        """
+        types = set(types or TYPES)
+
+        with self._lock:
+            terms = self._terms(query)
+            count = len(self._documents) or 1
+            average_length = self._total_length / count or 1.0
+
+            # BM25 with the document length normalization folded into a per-document constant
+            k = K1 * (1 - B)
+            kb = K1 * B / average_length
+            lengths = self._lengths
+
+            scores: Dict[Key, float] = dict()
+            for term, weight in terms.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+
+                boost = weight * (K1 + 1) * math.log(
+                    1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    scores[key] = scores.get(key, 0.0) + boost * frequency / (
+                        frequency + k + kb * lengths[key])
+
+            facets = dict.fromkeys(TYPES, 0)
+            matches = list()
+            for key, score in scores.items():
+                if not self._visible(self._documents[key], viewer):
+                    continue
+
+                facets[key[0]] += 1
+                if key[0] in types:
+                    matches.append((score, key))
+
+            best = heapq.nsmallest(offset + limit,
+                                   matches,
+                                   key=lambda match: (-match[0], match[1]))
+            results = [{
+                **{
+                    name: value
+                    for name, value in self._documents[key].items()
+                    if not name.startswith("_") and name != "students"
+                },
+                "score": round(score, 4),
+            } for score, key in best[offset:]]
+
+        return {"results": results, "total": len(matches), "facets": facets}
+
+
+def _build() -> SearchIndex:
+    index = SearchIndex()
+
+    for course in db.courses.find({}, COURSE_PROJECTION):
+        index.add_course(course)
+
+    for user_type, collection in USER_COLLECTIONS.items():
+        for user in getattr(db, collection).find({}, {
+                "first_name": 1,
+                "last_name": 1
+        }):
+            index.add_person(user_type, str(user["_id"]),
+                             user.get("first_name"), user.get("last_name"))
+
+    return index
+
+
+def _replay(index: SearchIndex, kind: str, key: str):
+    r"""Updates a course or a person in the index from the database, after it was changed."""
+    if kind == "course":
+        course = db.courses.find_one({"_id": ObjectId(key)}, COURSE_PROJECTION)
+        if course is None:
+            index.remove_course(key)
+        else:
+            index.add_course(course)
+        return
+
+    collection = getattr(db, USER_COLLECTIONS[kind])
+    user = collection.find_one({"_id": ObjectId(key)}, {
+        "first_name": 1,
+        "last_name": 1
+    })
+    if user is None:
+        index.remove("person", key)
+    else:
+        index.add_person(kind, key, user.get("first_name"),
+                         user.get("last_name"))
+
+
+# The index of this worker, kept up to date with the changes made by the other workers
+_search = VersionedIndex("search", _build, _replay)
+
+
+def get_index() -> SearchIndex:
+    r"""Returns the search index of this worker, built on first use."""
+    return _search.get()
+
+
+def course_changed(course_id: str):
+    r"""Reindexes a course and its assignments after it was added or changed."""
+    try:
+        _search.changed("course", str(course_id))
+    except Exception as e:
+        logger.exception("Error while indexing course %s", course_id)
+
+
+def course_removed(course_id: str):
+    try:
+        _search.changed("course", str(course_id),
+                        lambda index: index.remove_course(course_id))
+    except Exception as e:
+        logger.exception(
+            "Error while removing course %s from the search index", course_id)
+
+
+def person_changed(user_type: str, user_id: str, first_name: str,
+                   last_name: str):
+    try:
+        _search.changed(
+            user_type, str(user_id), lambda index: index.add_person(
+                user_type, user_id, first_name, last_name))
+    except Exception as e:
+        logger.exception("Error while indexing user %s", user_id)
+
+
+def person_removed(user_type: str, user_id: str):
+    try:
+        _search.changed(user_type, str(user_id),
+                        lambda index: index.remove("person", user_id))
+    except Exception as e:
+        logger.exception(
+            "Error while removing user %s from the search index", user_id)
+
+
+def viewer_of(user) -> Optional[Set[str]]:
+    r"""The ids whose courses a user can see, or `None` if the user can see everything."""
+    if user._type == "Admin":
+        return None
+
+    children = getattr(user, "children", None) or []
+    return {str(user.id)} | {str(child) for child in children}
+
+
+def search(query: str, user, types: Optional[Iterable[str]] = None,
+           limit: int = 20, offset: int = 0) -> dict:
+    r"""Searches everything `user` can see, see :meth:`SearchIndex.search`."""
+    return get_index().search(query, viewer_of(user), types, limit, offset)
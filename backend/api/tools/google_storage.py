@@ -1,36 +1,208 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
 
 from api import root_logger as logger
-from google.cloud import storage
+from api.tools import metrics
+from api.tools.blobs import blob_name
+from api.tools.blobs import claim
+from api.tools.blobs import digest
+from api.tools.blobs import mark_stored
+from api.tools.per_process import PerProcess
+from api.tools.storage import Blob
+from api.tools.storage import get_storage
+from api.tools.storage import StorageBackend
+from cachetools import TTLCache
 
+# The maximum number of files uploaded at the same time by a single worker
+MAX_UPLOAD_THREADS = 8
 
-def upload_blob(filename: str, file_obj):
-    storage_client = storage.Client()
-    bucket = storage_client.bucket("gradder-storage")
-    blob = bucket.blob(filename)
-    blob.upload_from_file(file_obj, content_type=file_obj.content_type)
+# For how long signed URLs are valid, in seconds
+SIGNED_URL_EXPIRATION = 3600
+# Cached signed URLs are handed out until this many seconds before they expire
+SIGNED_URL_MARGIN = 300
 
-    logger.info(f"File {filename} uploaded")
+# Signed URLs cached by this worker, keyed by blob name
+_signed_urls = TTLCache(maxsize=10000,
+                        ttl=SIGNED_URL_EXPIRATION - SIGNED_URL_MARGIN)
+_signed_urls_lock = threading.Lock()
+
+# The upload pool shared by all the threads of this worker
+_executor: PerProcess[ThreadPoolExecutor] = PerProcess(
+    lambda: ThreadPoolExecutor(max_workers=MAX_UPLOAD_THREADS,
+                               thread_name_prefix="upload"))
+
+
+def _size(file_obj) -> int:
+    r"""Returns the number of bytes left in a file object, without reading it."""
+    stream = getattr(file_obj, "stream", file_obj)
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell() - position
+    stream.seek(position)
+
+    return size
+
+
+def upload_blob(filename: str,
+                file_obj,
+                storage: Optional[StorageBackend] = None) -> Blob:
+    storage = storage or get_storage()
+    blob = Blob(filename, _size(file_obj), file_obj.content_type)
+    backend = type(storage).__name__
+    with metrics.STORAGE_UPLOAD_DURATION.time(backend):
+        storage.upload(blob.name, file_obj, blob.size, blob.content_type)
+    metrics.STORAGE_UPLOAD_BYTES.inc(backend, amount=blob.size)
+
+    logger.info("File %s uploaded", filename)
+
+    return blob
+
+
+def store_file(file_obj, storage: Optional[StorageBackend] = None) -> Blob:
+    r"""Stores a file under its content digest, skipping the upload if it is already stored.
+
+    Parameters
+    ----------
+    file_obj : werkzeug.datastructures.FileStorage or file object
+        The file, it should have a `content_type`
+    storage : StorageBackend, optional
+        The storage engine to use, by default the one of the current app
+
+    Returns
+    -------
+    Blob
+        The stored file, not referenced by anything yet (see `api.tools.blobs.add_refs`)
+    """
+    name = blob_name(digest(file_obj), file_obj.content_type)
+
+    existing = claim(name, file_obj.content_type)
+    if existing is not None and existing.get("stored"):
+        logger.info("File %s already stored, upload skipped", name)
+        return Blob(name, existing.get("size"), file_obj.content_type)
+
+    # Writing the same content twice under the same name is harmless, so concurrent uploads of
+    # an identical new file are not coordinated
+    blob = upload_blob(name, file_obj, storage=storage)
+    mark_stored(name, blob.size)
 
     return blob
 
 
-def download_blob(filename, actual_filename):
-    storage_client = storage.Client()
-    bucket = storage_client.bucket("gradder-storage")
-    blob = bucket.blob(filename)
-    blob.download_to_filename(actual_filename)
+def upload_files(files: list) -> List[Tuple[str, str]]:
+    r"""Stores files received in a request, in parallel, under their content digests.
+
+    Parameters
+    ----------
+    files : List[werkzeug.datastructures.FileStorage]
+
+    Returns
+    -------
+    List[Tuple[str, str]]
+        The stored files, as (blob name, original filename)
+    """
+    files = [file_ for file_ in files if file_.filename]
+    # Resolved here, since the upload threads have no app context
+    storage = get_storage()
+
+    if len(files) == 1:
+        # Not worth a thread hop
+        blobs = [store_file(files[0], storage=storage)]
+    else:
+        futures = [
+            _executor.get().submit(store_file, file_, storage=storage)
+            for file_ in files
+        ]
+        blobs = [future.result() for future in futures]
 
-    logger.info(f"File {actual_filename} - {filename}  downloaded")
+    return [(blob.name, file_.filename) for blob, file_ in zip(blobs, files)]
+
+
+def download_blob(filename: str,
+                  actual_filename: str,
+                  start: Optional[int] = None,
+                  end: Optional[int] = None):
+    r"""Downloads a file, or only the bytes from `start` to `end` (inclusive), to a local path."""
+    get_storage().download(filename, actual_filename, start=start, end=end)
+
+    logger.info("File %s - %s  downloaded", actual_filename, filename)
 
 
 def get_signed_url(filename):
-    storage_client = storage.Client()
-    bucket = storage_client.get_bucket("gradder-storage")
-    blob = bucket.get_blob(filename)
+    return get_signed_urls([filename])[filename]
+
+
+def get_signed_urls(filenames: Iterable[str]) -> Dict[str, str]:
+    r"""Returns signed URLs for several blobs at once.
+
+    URLs are cached until shortly before they expire. The missing ones are signed locally by the
+    storage engine, without fetching the blobs' metadata.
+
+    Parameters
+    ----------
+    filenames : Iterable[str]
+        The names of the blobs
+
+    Returns
+    -------
+    Dict[str, str]
+        The signed URL of every blob, keyed by blob name
+    """
+    urls = dict()
+    missing = list()
+
+    with _signed_urls_lock:
+        for filename in filenames:
+            url = _signed_urls.get(filename)
+            if url is None:
+                missing.append(filename)
+            else:
+                urls[filename] = url
+
+    if not missing:
+        return urls
+
+    storage = get_storage()
+    expiration = datetime.utcnow() + timedelta(seconds=SIGNED_URL_EXPIRATION)
+    signed = {
+        filename: storage.sign_url(filename, expiration)
+        for filename in missing
+    }
+
+    with _signed_urls_lock:
+        _signed_urls.update(signed)
+
+    logger.info("Signed URLs generated for %s files", len(signed))
+
+    urls.update(signed)
+    return urls
+
+
+def get_file_urls(assignments: list = (), syllabi: list = ()) -> Dict[str, str]:
+    r"""Signs the files of assignments and course syllabi in a single batch.
+
+    Parameters
+    ----------
+    assignments : List[Assignment], optional
+    syllabi : List[Tuple[str, str]], optional
+        The syllabi of courses, as (blob name, syllabus filename)
 
-    logger.info(f"File {filename} opened from assignment")
+    Returns
+    -------
+    Dict[str, str]
+        The signed URL of every file, keyed by blob name
+    """
+    filenames = {
+        file_[0]
+        for assignment in assignments for file_ in assignment.filenames or []
+    }
+    filenames.update(syllabus[0] for syllabus in syllabi if syllabus)
 
-    return blob.generate_signed_url(expiration=datetime.utcnow() +
-                                    timedelta(seconds=3600))
+    return get_signed_urls(filenames)
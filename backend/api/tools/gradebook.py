@@ -0,0 +1,352 @@
+r"""In-memory gradebooks: a students × assignments score matrix per course.
+
+A gradebook is built in one pass over a course's embedded submissions and kept per worker.
+Every write that changes a course's gradebook bumps the course's `revision` in the database, so
+a cached gradebook is reused for as long as its revision matches, and a single grade change only
+touches a single cell.
+"""
+from __future__ import annotations
+
+import math
+import re
+import threading
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+from api import db
+from bson import ObjectId
+
+# Only the fields needed to build the matrix are pulled from the course document
+GRADEBOOK_PROJECTION = {
+    "students": 1,
+    "revision": 1,
+    "grade_range": 1,
+    "assignments._id": 1,
+    "assignments.title": 1,
+    "assignments.revision": 1,
+    "assignments.submissions.student_id": 1,
+    "assignments.submissions.grade": 1,
+}
+
+_FRACTION = re.compile(r"^(-?\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)$")
+
+
+def parse_grade(grade) -> float:
+    r"""Converts a free-form grade to a numeric score.
+
+    Accepts plain numbers ("87", "87.5"), percentages ("87%") and fractions ("17/20", converted
+    to a percentage).
+
+    Parameters
+    ----------
+    grade : str or int or float
+        The grade as stored on a submission
+
+    Returns
+    -------
+    float
+        The score, or `nan` if the grade is empty or cannot be interpreted
+    """
+    if isinstance(grade, bool):
+        return math.nan
+
+    if isinstance(grade, (int, float)):
+        return float(grade)
+
+    if not isinstance(grade, str):
+        return math.nan
+
+    text = grade.strip().rstrip("%").strip()
+    if not text:
+        return math.nan
+
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    match = _FRACTION.match(text)
+    if match is not None and float(match.group(2)) != 0:
+        return 100 * float(match.group(1)) / float(match.group(2))
+
+    return math.nan
+
+
+def to_list(array: np.ndarray) -> list:
+    r"""Converts a score array to a JSON-friendly (nested) list, with `None` for missing grades."""
+    rounded = np.round(array.astype(np.float64), 4)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+class Gradebook:
+    r"""A students × assignments score matrix for a single course.
+
+    Attributes
+    ----------
+    course_id : str
+    student_ids : List[str]
+        Row labels, in the order of the course's `students`
+    assignment_ids : List[str]
+        Column labels, in the order of the course's `assignments`
+    assignment_titles : List[str]
+    assignment_revisions : numpy.ndarray
+        Per-assignment revision counters, bumped whenever a grade in that column changes
+    scores : numpy.ndarray
+        A float32 matrix of shape (len(student_ids), len(assignment_ids)), `nan` where there is no grade
+    row_sums, row_counts : numpy.ndarray
+        Running sum and count of the graded cells of every student
+    column_sums, column_counts : numpy.ndarray
+        Running sum and count of the graded cells of every assignment
+    grade_range : Tuple[int, int]
+        The course's grade range
+    revision : int
+        The course revision this gradebook reflects
+    roster_key : int
+        A hash of the students of the course, changes whenever the rows change
+
+    Notes
+    -----
+    The running sums are kept up to date by `update_grade`, so aggregates such as averages can be
+    read in O(students + assignments) without rescanning the matrix.
+    """
+
+    def __init__(
+            self,
+            course_id: str,
+            student_ids: List[str],
+            assignment_ids: List[str],
+            assignment_titles: Optional[List[str]] = None,
+            assignment_revisions: Optional[List[int]] = None,
+            scores: Optional[np.ndarray] = None,
+            grade_range: Optional[Tuple[int, int]] = None,
+            revision: int = 0,
+    ):
+        self.course_id = str(course_id)
+        self.student_ids = [str(i) for i in student_ids]
+        self.assignment_ids = [str(i) for i in assignment_ids]
+        self.assignment_titles = assignment_titles or [""] * len(
+            self.assignment_ids)
+        self.assignment_revisions = np.array(
+            assignment_revisions or [0] * len(self.assignment_ids),
+            dtype=np.int64)
+        self.grade_range = tuple(grade_range or (0, 100))
+        self.revision = revision
+        self.roster_key = hash(tuple(self.student_ids))
+
+        self._student_index = {
+            student_id: i
+            for i, student_id in enumerate(self.student_ids)
+        }
+        self._assignment_index = {
+            assignment_id: i
+            for i, assignment_id in enumerate(self.assignment_ids)
+        }
+
+        shape = (len(self.student_ids), len(self.assignment_ids))
+        if scores is None:
+            scores = np.full(shape, np.nan, dtype=np.float32)
+        elif scores.shape != shape:
+            raise ValueError(
+                f"The scores matrix should be of shape {shape}, got {scores.shape}"
+            )
+
+        self.scores = scores
+        self.recount()
+
+    def __repr__(self):
+        return f"<Gradebook {self.course_id} {self.scores.shape}>"
+
+    @classmethod
+    def from_dict(cls, dictionary: dict) -> Gradebook:
+        r"""Builds a gradebook from a course document in a single pass over its submissions.
+
+        If a student has several graded submissions for the same assignment, the latest one wins.
+
+        Parameters
+        ----------
+        dictionary : dict
+            A course document, at least with the fields from `GRADEBOOK_PROJECTION`
+        """
+        assignments = dictionary.get("assignments") or []
+        gradebook = cls(
+            course_id=dictionary["_id"],
+            student_ids=[i for i in dictionary.get("students") or [] if i],
+            assignment_ids=[a["_id"] for a in assignments],
+            assignment_titles=[a.get("title", "") for a in assignments],
+            assignment_revisions=[a.get("revision", 0) for a in assignments],
+            grade_range=dictionary.get("grade_range"),
+            revision=dictionary.get("revision", 0),
+        )
+
+        cells = dict()
+        for column, assignment in enumerate(assignments):
+            for submission in assignment.get("submissions") or []:
+                row = gradebook._student_index.get(
+                    str(submission.get("student_id")))
+                score = parse_grade(submission.get("grade"))
+                if row is not None and not math.isnan(score):
+                    cells[row, column] = score
+
+        if cells:
+            rows, columns = zip(*cells.keys())
+            gradebook.scores[list(rows), list(columns)] = list(cells.values())
+            gradebook.recount()
+
+        return gradebook
+
+    def to_dict(self) -> dict:
+        return {
+            "course_id": self.course_id,
+            "students": self.student_ids,
+            "assignments": [{
+                "id": assignment_id,
+                "title": title
+            } for assignment_id, title in zip(self.assignment_ids,
+                                              self.assignment_titles)],
+            "scores": to_list(self.scores),
+        }
+
+    def recount(self):
+        r"""Recomputes the running row and column sums from the whole matrix."""
+        graded = ~np.isnan(self.scores)
+        values = np.where(graded, self.scores, 0).astype(np.float64)
+
+        self.row_sums = values.sum(axis=1)
+        self.row_counts = graded.sum(axis=1)
+        self.column_sums = values.sum(axis=0)
+        self.column_counts = graded.sum(axis=0)
+
+    def assignment_index(self, assignment_id: str) -> int:
+        return self._assignment_index[str(assignment_id)]
+
+    def has_cell(self, student_id: str, assignment_id: str) -> bool:
+        return (str(student_id) in self._student_index
+                and str(assignment_id) in self._assignment_index)
+
+    def update_grade(self, student_id: str, assignment_id: str, grade):
+        r"""Updates a single cell of the matrix.
+
+        Parameters
+        ----------
+        student_id : str
+        assignment_id : str
+        grade : str or int or float
+            The new grade, parsed with `parse_grade`
+        """
+        row = self._student_index[str(student_id)]
+        column = self._assignment_index[str(assignment_id)]
+
+        old, new = float(self.scores[row, column]), parse_grade(grade)
+        self.scores[row, column] = new
+        # Read back so the running sums see the same float32 value as the matrix
+        new = float(self.scores[row, column])
+
+        for value, sign in ((old, -1), (new, 1)):
+            if not math.isnan(value):
+                self.row_sums[row] += sign * value
+                self.row_counts[row] += sign
+                self.column_sums[column] += sign * value
+                self.column_counts[column] += sign
+
+        self.assignment_revisions[column] += 1
+
+    def row(self, student_id: str) -> np.ndarray:
+        r"""Returns the scores of a single student across all the assignments."""
+        return self.scores[self._student_index[str(student_id)]]
+
+    def column(self, assignment_id: str) -> np.ndarray:
+        r"""Returns the scores of all the students for a single assignment."""
+        return self.scores[:, self._assignment_index[str(assignment_id)]]
+
+    def assignment_revision(self, assignment_id: str) -> int:
+        return int(self.assignment_revisions[self._assignment_index[str(
+            assignment_id)]])
+
+
+# Gradebooks cached by this worker, keyed by course id
+_gradebooks: Dict[str, Gradebook] = dict()
+_lock = threading.Lock()
+
+
+def get_gradebook(course_id: str) -> Optional[Gradebook]:
+    r"""Returns the gradebook for a course, rebuilding it only if the course has changed since.
+
+    Parameters
+    ----------
+    course_id : str
+
+    Returns
+    -------
+    Gradebook
+        The gradebook, or `None` if the course does not exist
+    """
+    course_id = str(course_id)
+
+    gradebook = _gradebooks.get(course_id)
+    if gradebook is not None:
+        current = db.courses.find_one({"_id": ObjectId(course_id)},
+                                      {"revision": 1})
+        if current is not None and current.get("revision",
+                                               0) == gradebook.revision:
+            return gradebook
+
+    dictionary = db.courses.find_one({"_id": ObjectId(course_id)},
+                                     GRADEBOOK_PROJECTION)
+    if dictionary is None:
+        invalidate(course_id)
+        return None
+
+    gradebook = Gradebook.from_dict(dictionary)
+    with _lock:
+        _gradebooks[course_id] = gradebook
+
+    return gradebook
+
+
+def record_grade(course_id: str, revision: int, student_id: str,
+                 assignment_id: str, grade) -> Optional[Gradebook]:
+    r"""Applies a grade change to the cached gradebook of a course, if there is one.
+
+    The cell is only patched in place if the cached gradebook was exactly one revision behind,
+    i.e. no other worker has written to the course in between. Otherwise the gradebook is dropped
+    and will be rebuilt on the next read.
+
+    Parameters
+    ----------
+    course_id : str
+    revision : int
+        The course revision after the grade change
+    student_id : str
+    assignment_id : str
+    grade : str or int or float
+
+    Returns
+    -------
+    Gradebook
+        The patched gradebook, or `None` if there was no up-to-date gradebook to patch
+    """
+    course_id = str(course_id)
+
+    with _lock:
+        gradebook = _gradebooks.get(course_id)
+        if gradebook is None:
+            return None
+
+        if (gradebook.revision != revision - 1
+                or not gradebook.has_cell(student_id, assignment_id)):
+            del _gradebooks[course_id]
+            return None
+
+        gradebook.update_grade(student_id, assignment_id, grade)
+        gradebook.revision = revision
+
+    return gradebook
+
+
+def invalidate(course_id: str):
+    r"""Drops the cached gradebook of a course."""
+    with _lock:
+        _gradebooks.pop(str(course_id), None)
@@ -0,0 +1,73 @@
+r"""Constructors that build models straight from the documents of the database.
+
+The setters of the models validate what they are given, which is needed for user input but wasted
+on documents that were validated when they were written: they run regexes, parse ids and dates and
+some of them even query the database (e.g. `Course.teacher` checks that the teacher exists).
+
+`from_db(fields)` generates a `_from_db(cls, document)` class method that creates the object without
+calling `__init__` and assigns every field to its slot directly, with the code written out for the
+fields of the model (like `dataclasses` does), so that hydrating thousands of objects per request
+is cheap. Use it only on documents read from the database, never on user input.
+"""
+from typing import Callable
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+
+
+class Field(NamedTuple):
+    r"""A field of a stored document, and where it goes in a model.
+
+    Attributes
+    ----------
+    key : str
+        The key in the document
+    attribute : str
+        The attribute (slot) of the model, e.g. the one behind a property
+    default : str, optional
+        The Python expression of the value when the document does not have the field, or it is
+        empty, e.g. `"[]"` (evaluated every time). The field is required if `None`
+    convert : Callable, optional
+        Applied to the stored value, when there is one, e.g. `str` for ids
+    """
+
+    key: str
+    attribute: str
+    default: Optional[str] = None
+    convert: Optional[Callable] = None
+
+
+def from_db(fields: Sequence[Field]) -> classmethod:
+    r"""Generates the `_from_db(cls, document)` constructor of a model with these fields.
+
+    The constructor returns `None` for a `None` document, and raises a `KeyError` if the document
+    is missing a required field.
+    """
+    namespace = {"new": object.__new__}
+    lines = [
+        "def _from_db(cls, document):",
+        "    if document is None:",
+        "        return None",
+        "    self = new(cls)",
+    ]
+
+    for i, field in enumerate(fields):
+        convert = None
+        if field.convert is not None:
+            convert = f"convert_{i}"
+            namespace[convert] = field.convert
+
+        if field.default is None:
+            value = f"document[{field.key!r}]"
+            lines.append(f"    self.{field.attribute} = " +
+                         (f"{convert}({value})" if convert else value))
+        else:
+            lines.append(f"    value = document.get({field.key!r})")
+            lines.append(f"    self.{field.attribute} = " +
+                         (f"{convert}(value) if value else {field.default}"
+                          if convert else f"value or {field.default}"))
+
+    lines.append("    return self")
+    exec("\n".join(lines), namespace)
+
+    return classmethod(namespace["_from_db"])
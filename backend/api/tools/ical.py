@@ -0,0 +1,353 @@
+r"""iCalendar (RFC 5545) subscription feeds of the calendars of users.
+
+Every user can get a secret feed URL to subscribe to from a calendar app. The feed holds the
+meetings of their courses as weekly recurrence rules, the due dates of their assignments and their
+personal events (their children's courses and assignments for parents).
+
+Calendar apps poll feeds every few minutes, so feeds are cached by every worker and revalidated
+with their ETag, computed from the revisions of the courses and of the personal calendar only.
+A feed is only rendered again when one of them changed, and not at all when the app already
+has the current version.
+"""
+import hashlib
+import secrets
+import threading
+from datetime import datetime
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Iterable
+from typing import Iterator
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import pytz
+from api import db
+from api.tools.calendar import course_ids_of
+from api.tools.calendar import COURSE_PROJECTION
+from api.tools.calendar import get_index
+from api.tools.calendar import get_version
+from api.tools import schedule as schedules
+from api.tools.dates import parse_datetime
+from api.tools.dates import school_timezone
+from api.tools.per_process import PerProcess
+from bson import ObjectId
+from cachetools import LRUCache
+from cachetools import TTLCache
+from pymongo import ReturnDocument
+
+# Changed whenever the content of the feeds changes, to invalidate the ones already cached
+FORMAT_VERSION = 1
+
+PRODID = "-//Gradder//Calendar//EN"
+UID_DOMAIN = "gradder.io"
+
+# How far in the past the due dates and events in a feed go
+FEED_PAST = timedelta(days=90)
+# The clock changes of the school's timezone described in a feed, around now
+TIMEZONE_PAST = timedelta(days=2 * 365)
+TIMEZONE_FUTURE = timedelta(days=3 * 365)
+
+# Seconds a worker serves a feed without checking that it is still up to date
+CHECK_INTERVAL = 60
+
+# The number of feeds cached by each worker
+MAX_FEEDS = 4096
+
+# The longest line in a feed, in octets, before it is folded
+MAX_LINE_LENGTH = 75
+
+class Feed(NamedTuple):
+    etag: str
+    last_modified: datetime
+    # `None` when the client already has this version
+    body: Optional[bytes]
+
+
+# The feeds cached by this worker, keyed by token: the recently checked ones, and all of them
+_caches: PerProcess[Tuple[TTLCache, LRUCache]] = PerProcess(lambda: (
+    TTLCache(maxsize=MAX_FEEDS, ttl=CHECK_INTERVAL),
+    LRUCache(maxsize=MAX_FEEDS),
+))
+_lock = threading.Lock()
+
+
+def get_token(user) -> str:
+    r"""Returns the feed token of a user, creating it on first use."""
+    subscription = db.feeds.find_one_and_update(
+        {"user_id": str(user.id)},
+        {
+            "$setOnInsert": {
+                "_id": secrets.token_urlsafe(24),
+                "user_type": user._type,
+                "created_at": datetime.utcnow(),
+            }
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    return subscription["_id"]
+
+
+def rotate_token(user) -> str:
+    r"""Replaces the feed token of a user, so the previous feed URL stops working.
+
+    Workers that recently served the previous feed may keep serving it for `CHECK_INTERVAL`
+    seconds.
+    """
+    db.feeds.delete_many({"user_id": str(user.id)})
+
+    return get_token(user)
+
+
+def _etag(subscription: dict):
+    r"""Computes the current ETag of a feed, returning it with the courses it depends on."""
+    from api.tools.names import USER_COLLECTIONS
+
+    user = getattr(db, USER_COLLECTIONS[subscription["user_type"]]).find_one(
+        {"_id": ObjectId(subscription["user_id"])}, {
+            "courses": 1,
+            "children": 1
+        }) or dict()
+    course_ids = course_ids_of(
+        SimpleNamespace(courses=user.get("courses"),
+                        children=user.get("children")))
+
+    courses = list(
+        db.courses.find(
+            {"_id": {
+                "$in": [ObjectId(course_id) for course_id in course_ids]
+            }}, {"calendar_revision": 1})) if course_ids else []
+    version = get_version(subscription["user_id"])
+
+    sha1 = hashlib.sha1(
+        f"{FORMAT_VERSION}:{subscription['user_id']}:{version}:{school_timezone().zone}"
+        .encode())
+    for course in sorted(courses, key=lambda course: str(course["_id"])):
+        sha1.update(
+            f":{course['_id']}@{course.get('calendar_revision', 0)}".encode())
+
+    return sha1.hexdigest(), [course["_id"] for course in courses]
+
+
+def _escape(text: str) -> str:
+    return (str(text or "").replace("\\", "\\\\").replace(";", "\\;").replace(
+        ",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _format(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def _format_local(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def _format_offset(offset: timedelta) -> str:
+    minutes = int(offset.total_seconds()) // 60
+    sign = "-" if minutes < 0 else "+"
+    return f"{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+
+
+def _clock(tz, moment: datetime):
+    r"""The (UTC offset, DST offset, abbreviation) of a timezone at a UTC moment."""
+    local = pytz.utc.localize(moment).astimezone(tz)
+    return local.utcoffset(), local.dst(), local.tzname()
+
+
+def _timezone(tz, start: datetime, end: datetime) -> Iterator[str]:
+    r"""Yields the VTIMEZONE of a timezone, with its clock changes in a (UTC) range."""
+    yield "BEGIN:VTIMEZONE"
+    yield f"TZID:{tz.zone}"
+
+    day = datetime(start.year, start.month, start.day)
+    previous = _clock(tz, day)
+    # (UTC moment, clock before, clock after) of every change, from the clock at the start
+    changes = [(day, previous, previous)]
+    while day < end:
+        current = _clock(tz, day + timedelta(days=1))
+        if current != previous:
+            # Found to the minute
+            low, high = 0, 24 * 60
+            while high - low > 1:
+                middle = (low + high) // 2
+                if _clock(tz, day + timedelta(minutes=middle)) == previous:
+                    low = middle
+                else:
+                    high = middle
+            changes.append((day + timedelta(minutes=high), previous, current))
+            previous = current
+        day += timedelta(days=1)
+
+    for moment, before, after in changes:
+        kind = "DAYLIGHT" if after[1] else "STANDARD"
+        yield f"BEGIN:{kind}"
+        # In the local time before the change
+        yield f"DTSTART:{_format_local(moment + before[0])}"
+        yield f"TZOFFSETFROM:{_format_offset(before[0])}"
+        yield f"TZOFFSETTO:{_format_offset(after[0])}"
+        yield f"TZNAME:{_escape(after[2])}"
+        yield f"END:{kind}"
+
+    yield "END:VTIMEZONE"
+
+
+def _fold(line: str) -> Iterator[str]:
+    r"""Splits a content line into lines of at most `MAX_LINE_LENGTH` octets."""
+    length = 0
+    start = 0
+    for position, character in enumerate(line):
+        size = len(character.encode())
+        # Continuation lines start with a space
+        if length + size > MAX_LINE_LENGTH - (1 if start else 0):
+            yield (" " if start else "") + line[start:position]
+            start, length = position, 0
+        length += size
+
+    yield (" " if start else "") + line[start:]
+
+
+def _event(uid: str,
+           stamp: datetime,
+           start: datetime,
+           end: Optional[datetime],
+           summary: str,
+           *properties: str,
+           tzid: Optional[str] = None):
+    r"""Yields the lines of an event, whose dates are in UTC, or in the local time of `tzid`."""
+    if tzid is None:
+        parameters, format_ = "", _format
+    else:
+        parameters, format_ = f";TZID={tzid}", _format_local
+
+    yield "BEGIN:VEVENT"
+    yield f"UID:{uid}@{UID_DOMAIN}"
+    yield f"DTSTAMP:{_format(stamp)}"
+    yield f"DTSTART{parameters}:{format_(start)}"
+    if end is not None and end > start:
+        yield f"DTEND{parameters}:{format_(end)}"
+    yield f"SUMMARY:{_escape(summary)}"
+    yield from properties
+    yield "END:VEVENT"
+
+
+def _lines(user_id: str, courses: Iterable[dict],
+           stamp: datetime) -> Iterator[str]:
+    r"""Yields the (unfolded) content lines of a feed."""
+    now = datetime.utcnow()
+    since = now - FEED_PAST
+    tz = school_timezone()
+
+    yield "BEGIN:VCALENDAR"
+    yield "VERSION:2.0"
+    yield f"PRODID:{PRODID}"
+    yield "CALSCALE:GREGORIAN"
+    yield "METHOD:PUBLISH"
+    yield "X-WR-CALNAME:Gradder"
+    # The meetings of the courses repeat at the same local time, whatever the clock changes
+    yield from _timezone(tz, now - TIMEZONE_PAST, now + TIMEZONE_FUTURE)
+
+    for course in courses:
+        course_id = str(course["_id"])
+        schedule = schedules.of(course)
+        if schedule is not None:
+            # From the week the course was created, in local time
+            start = schedule.first_after(
+                course["_id"].generation_time.replace(tzinfo=None), tz)
+
+            yield from _event(f"course-{course_id}",
+                              stamp,
+                              start,
+                              start + schedule.duration,
+                              course.get("name", ""),
+                              f"RRULE:FREQ=WEEKLY;BYDAY={schedule.by_day()}",
+                              tzid=tz.zone)
+
+        for assignment in course.get("assignments") or []:
+            try:
+                due_by = parse_datetime(assignment.get("due_by"))
+            except (ValueError, TypeError):
+                continue
+
+            if due_by is not None and due_by >= since:
+                yield from _event(
+                    f"assignment-{assignment['_id']}", stamp, due_by, None,
+                    f"{assignment.get('title', '')} due",
+                    f"DESCRIPTION:{_escape(course.get('name', ''))}")
+
+    for event in get_index(user_id).overlapping(since, datetime.max):
+        properties = [f"URL:{event['url']}"] if event.get("url") else []
+        yield from _event(f"event-{event['_id']}", stamp, event["start"],
+                          event["end"], event["title"], *properties)
+
+    yield "END:VCALENDAR"
+
+
+def render(user_id: str, course_ids: Iterable, stamp: datetime) -> bytes:
+    r"""Renders the feed of a user."""
+    course_ids = list(course_ids)
+    courses = db.courses.find({"_id": {
+        "$in": course_ids
+    }}, COURSE_PROJECTION).sort("_id") if course_ids else []
+
+    return "".join(folded + "\r\n"
+                   for line in _lines(user_id, courses, stamp)
+                   for folded in _fold(line)).encode()
+
+
+def get_feed(token: str, known_etags: Iterable[str] = ()) -> Optional[Feed]:
+    r"""Returns the current feed of a token, rendering it only if needed.
+
+    Parameters
+    ----------
+    token : str
+        The secret token of the feed
+    known_etags : Iterable[str], optional
+        The ETags of the versions the client has, if any: the body is not rendered if the
+        current version is one of them
+
+    Returns
+    -------
+    Feed or None
+        The feed, or `None` if there is no feed with this token
+    """
+    fresh, feeds = _caches.get()
+    known_etags = set(known_etags)
+
+    with _lock:
+        feed = fresh.get(token)
+    if feed is not None:
+        return feed._replace(body=None) if feed.etag in known_etags else feed
+
+    subscription = db.feeds.find_one({"_id": token})
+    if subscription is None:
+        return None
+
+    etag, course_ids = _etag(subscription)
+
+    # Shared by the workers, so they all give the same date to the same version
+    if subscription.get("etag") == etag:
+        last_modified = subscription["last_modified"]
+    else:
+        last_modified = datetime.utcnow().replace(microsecond=0)
+        db.feeds.update_one(
+            {"_id": token},
+            {"$set": {
+                "etag": etag,
+                "last_modified": last_modified
+            }})
+
+    with _lock:
+        feed = feeds.get(token)
+    if feed is None or feed.etag != etag:
+        if etag in known_etags:
+            return Feed(etag, last_modified, None)
+
+        feed = Feed(etag, last_modified,
+                    render(subscription["user_id"], course_ids, last_modified))
+
+    with _lock:
+        fresh[token] = feeds[token] = feed
+
+    return feed._replace(body=None) if etag in known_etags else feed
@@ -1,10 +1,163 @@
+r"""The loggers of the app environments.
+
+Request threads never write the logs themselves: their records are put in a queue, and written
+by a background thread with the actual handlers (files, the console, Google Cloud Logging). When
+the queue is full (the handlers cannot keep up), new records are dropped instead of blocking.
+
+The INFO and DEBUG records of some loggers or modules can be sampled, e.g. `{"routes": 10}` only
+keeps one in every 10 records of the `routes` modules. Warnings and errors are always kept.
+
+Creating a logger again (e.g. on every `create_app` of the tests) replaces the handlers installed
+the previous time instead of adding more, so every line is written once.
+
+Google Cloud Logging is only imported and connected to when the first record is written, by every
+process: starting the app does not pay for the SDK, and forked workers get their own client.
+"""
 import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+from typing import Callable
+from typing import Dict
+from typing import List
 
 FORMAT = logging.Formatter(
     "%(asctime)s - %(levelname)s : %(filename)s - %(funcName)s : %(message)s")
 
+# The most records waiting to be written, beyond which new ones are dropped
+QUEUE_SIZE = 10000
+
+
+class SamplingFilter(logging.Filter):
+    r"""Keeps one in every `n` INFO or DEBUG records of some loggers or modules.
+
+    Parameters
+    ----------
+    rates : Dict[str, int]
+        How many records of every logger or module (file name without extension) there are
+        for every one that is kept
+    """
+
+    def __init__(self, rates: Dict[str, int]):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._counts: Dict[str, int] = dict()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+
+        key = record.name if record.name in self.rates else record.module
+        every = self.rates.get(key)
+        if not every or every <= 1:
+            return True
+
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+
+        return count % every == 0
+
+
+class AsyncHandler(QueueHandler):
+    r"""Hands the records over to a background thread that writes them with other handlers.
+
+    The thread is started once per process, so that forked workers get their own.
+    """
+
+    def __init__(self, handlers: List[logging.Handler]):
+        super().__init__(queue.Queue(QUEUE_SIZE))
+        self.handlers = handlers
+        self.dropped = 0
+        self._listener: QueueListener = None
+        self._pid: int = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            # The queue of the parent process may have been locked by one of its other threads
+            self.queue = queue.Queue(QUEUE_SIZE)
+            self._listener = QueueListener(self.queue,
+                                           *self.handlers,
+                                           respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._pid != os.getpid():
+            self._start()
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # Also called by `logging.shutdown` on exit: what is left in the queue is written first
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+class LazyHandler(logging.Handler):
+    r"""Creates the handler that writes the records on the first record of every process.
+
+    Parameters
+    ----------
+    factory : Callable[[], logging.Handler]
+        Creates the actual handler, e.g. importing a heavy SDK
+    """
+
+    def __init__(self, factory: Callable[[], logging.Handler]):
+        super().__init__()
+        self.factory = factory
+        self._handler: logging.Handler = None
+        self._pid: int = None
+
+    def emit(self, record: logging.LogRecord):
+        # Only called with the lock of the handler held
+        if self._pid != os.getpid():
+            self._handler = self.factory()
+            self._pid = os.getpid()
+
+        self._handler.handle(record)
+
+    def close(self):
+        if self._handler is not None and self._pid == os.getpid():
+            self._handler.close()
+        self._handler = None
+        self._pid = None
+        super().close()
+
+
+def _install(logger: logging.Logger, handlers: List[logging.Handler],
+             sample_rates: Dict[str, int]) -> logging.Logger:
+    r"""Replaces the handlers installed on a logger before, if any, with new ones."""
+    for handler in list(logger.handlers):
+        if isinstance(handler, AsyncHandler):
+            logger.removeHandler(handler)
+            handler.close()
+
+    handler = AsyncHandler(handlers)
+    handler.addFilter(SamplingFilter(sample_rates))
+    logger.addHandler(handler)
+
+    return logger
+
 
-def DevelopmentLogger():
+def DevelopmentLogger(sample_rates: Dict[str, int] = None):
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
 
@@ -12,18 +165,14 @@ def DevelopmentLogger():
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(FORMAT)
 
-    logger.addHandler(file_handler)
-
     stream_handler = logging.StreamHandler()
     stream_handler.setLevel(logging.ERROR)
     stream_handler.setFormatter(FORMAT)
 
-    logger.addHandler(stream_handler)
-
-    return logger
+    return _install(logger, [file_handler, stream_handler], sample_rates)
 
 
-def TestingLogger():
+def TestingLogger(sample_rates: Dict[str, int] = None):
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
 
@@ -31,23 +180,22 @@ def TestingLogger():
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(FORMAT)
 
-    logger.addHandler(file_handler)
-
-    return logger
+    return _install(logger, [file_handler], sample_rates)
 
 
-def ProductionLogger():
+def _cloud_logging_handler() -> logging.Handler:
     import google.cloud.logging
     from google.cloud.logging.handlers import CloudLoggingHandler
 
-    client = google.cloud.logging.Client()
-    handler = CloudLoggingHandler(client)
+    return CloudLoggingHandler(google.cloud.logging.Client())
+
 
+def ProductionLogger(sample_rates: Dict[str, int] = None):
     cloud_logger = logging.getLogger("cloudLogger")
     cloud_logger.setLevel(logging.INFO)
-    cloud_logger.addHandler(handler)
 
-    return cloud_logger
+    return _install(cloud_logger, [LazyHandler(_cloud_logging_handler)],
+                    sample_rates)
 
 
 logger = {
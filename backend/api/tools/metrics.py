@@ -0,0 +1,485 @@
+r"""Metrics of the API, exposed at `/metrics` in the Prometheus text format.
+
+Every worker records its own counters, gauges and histograms in memory: an observation is a
+bisection in the buckets and two additions under a lock, about a microsecond.
+
+With `METRICS_DIR` set, every worker writes its values to its own file in that directory every
+`METRICS_FLUSH_INTERVAL` seconds, and the worker that is scraped adds up the files of all the
+workers, so the metrics cover the whole server whichever worker answers. The counters and
+histograms of workers that exited are folded into a single archive file, so that they never go
+back while the files of short-lived workers do not pile up; their gauges are dropped. Without it
+(e.g. with the development server), only the metrics of the worker that is scraped are exposed.
+"""
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from flask import g
+from flask import request
+from pymongo import monitoring
+
+# The default buckets of histograms, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+           5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    r"""A metric, with a value per combination of its labels."""
+
+    kind: str = None
+
+    def __init__(self, name: str, documentation: str, labels: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, object] = dict()
+        self._lock = threading.Lock()
+
+        REGISTRY[name] = self
+
+    def snapshot(self) -> List[list]:
+        r"""The current values, as [labels, value] pairs."""
+        with self._lock:
+            return [[list(labels), self._copy(value)]
+                    for labels, value in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def merge(first, second):
+        r"""Adds up the values of the same labels in two workers."""
+        return first + second
+
+    def samples(self, labels: Labels,
+                value) -> Iterator[Tuple[str, Labels, Labels, float]]:
+        r"""Yields the (suffix, label names, label values, value) samples of a value."""
+        yield "", self.labels, labels, value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+class Histogram(Metric):
+    r"""The distribution of some values, in buckets.
+
+    Every value is stored as the count of every bucket (not cumulative, the last one for the
+    values above every bound), followed by the sum of the observations.
+    """
+
+    kind = "histogram"
+
+    def __init__(self,
+                 name: str,
+                 documentation: str,
+                 labels: Labels = (),
+                 buckets: Tuple[float, ...] = BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, *labels: str) -> _Timer:
+        r"""A context manager that observes how long its block took, in seconds."""
+        return _Timer(self, labels)
+
+    @staticmethod
+    def _copy(value):
+        return list(value)
+
+    @staticmethod
+    def merge(first, second):
+        return [a + b for a, b in zip(first, second)]
+
+    def samples(self, labels: Labels, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"), ), value):
+            cumulative += count
+            yield "_bucket", self.labels + ("le", ), labels + (
+                _format_value(bound), ), cumulative
+        yield "_sum", self.labels, labels, value[-1]
+        yield "_count", self.labels, labels, cumulative
+
+
+# Every metric, by name
+REGISTRY: Dict[str, Metric] = dict()
+
+REQUEST_DURATION = Histogram(
+    "gradder_http_request_duration_seconds",
+    "Time spent handling requests, by endpoint",
+    ("endpoint", "method", "status"),
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "gradder_mongo_command_duration_seconds",
+    "Duration of database commands, by collection and command",
+    ("collection", "command"),
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "gradder_mongo_command_failures_total",
+    "Database commands that failed, by collection and command",
+    ("collection", "command"),
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "gradder_password_hash_duration_seconds",
+    "Time spent hashing and verifying passwords with bcrypt",
+    ("operation", ),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0),
+)
+EMAIL_OUTBOX = Gauge(
+    "gradder_email_outbox",
+    "Emails waiting to be sent",
+)
+EMAILS_SENT = Counter(
+    "gradder_emails_sent_total",
+    "Emails handed to the mail server, by outcome",
+    ("outcome", ),
+)
+STORAGE_UPLOAD_BYTES = Counter(
+    "gradder_storage_upload_bytes_total",
+    "Bytes uploaded to the file storage, by backend",
+    ("backend", ),
+)
+STORAGE_UPLOAD_DURATION = Histogram(
+    "gradder_storage_upload_duration_seconds",
+    "Duration of the uploads to the file storage, by backend",
+    ("backend", ),
+)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    r"""Records the duration of every database command, by collection and command."""
+
+    def __init__(self):
+        # The (collection, command) of the commands in progress, by request id (unique per command)
+        self._pending: Dict[int, Labels] = dict()
+
+    def started(self, event):
+        # `getMore` names its collection separately
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get("collection")
+        self._pending[event.request_id] = (collection if isinstance(
+            collection, str) else "", event.command_name)
+
+    def succeeded(self, event):
+        labels = self._pending.pop(event.request_id, None)
+        if labels is not None:
+            MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6,
+                                           *labels)
+
+    def failed(self, event):
+        labels = self._pending.pop(event.request_id, None)
+        if labels is not None:
+            MONGO_COMMAND_DURATION.observe(event.duration_micros / 1e6,
+                                           *labels)
+            MONGO_COMMAND_FAILURES.inc(*labels)
+
+
+# The listener of the database client, see `DB`
+command_metrics = CommandMetrics()
+
+# The file the values of the workers that exited are added up in, and the lock of its updates
+ARCHIVE = "archive.json"
+ARCHIVE_LOCK = "archive.lock"
+
+# The file of this worker, if the metrics are shared
+_path: Optional[str] = None
+_pid: int = None
+_lock = threading.Lock()
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"",
+                                                    "\\\"").replace("\n", "\\n")
+
+
+def snapshot() -> Dict[str, List[list]]:
+    r"""The current values of every metric of this worker."""
+    return {name: metric.snapshot() for name, metric in REGISTRY.items()}
+
+
+def _write(path: str, values):
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(values, f)
+    # Readers never see a partially written file
+    os.replace(temporary, path)
+
+
+def _read(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def flush(directory: str):
+    r"""Writes the values of this worker to its file in a shared directory."""
+    global _path
+
+    if _path is None:
+        _path = os.path.join(directory, f"{os.getpid()}-{time.time_ns()}.json")
+
+    _write(_path, snapshot())
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def _merge(merged: Dict[str, Dict[Labels, object]],
+           values: Dict[str, List[list]], alive: bool):
+    r"""Adds the values of a worker (as in its file) to `merged`, in place."""
+    for name, pairs in values.items():
+        metric = REGISTRY.get(name)
+        if metric is None or (metric.kind == "gauge" and not alive):
+            continue
+
+        merged.setdefault(name, dict())
+        for labels, value in pairs:
+            labels = tuple(labels)
+            if labels in merged[name]:
+                merged[name][labels] = metric.merge(merged[name][labels],
+                                                    value)
+            else:
+                merged[name][labels] = value
+
+
+def _archive(directory: str) -> dict:
+    r"""Folds the files of the workers that exited into the archive, and deletes them.
+
+    The archive lists the files it already holds the values of until they are deleted, so that
+    they are not counted twice if a scrape is interrupted in between.
+
+    Returns
+    -------
+    dict
+        The archive, as {"files": [...], "values": {name: [[labels, value], ...]}}
+    """
+    path = os.path.join(directory, ARCHIVE)
+
+    with open(os.path.join(directory, ARCHIVE_LOCK), "w") as lock:
+        # Held until the file is closed, by one worker of the server at a time
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        archive = _read(path) or {"files": [], "values": {}}
+        archived = set(archive["files"])
+        dead = [
+            filename for filename in os.listdir(directory)
+            if filename.endswith(".json") and filename != ARCHIVE
+            and filename not in archived
+            and not _alive(int(filename.split("-")[0]))
+        ]
+
+        if dead:
+            merged: Dict[str, Dict[Labels, object]] = dict()
+            _merge(merged, archive["values"], False)
+            for filename in dead:
+                values = _read(os.path.join(directory, filename))
+                if values is not None:
+                    _merge(merged, values, False)
+
+            archive = {
+                "files": sorted(archived | set(dead)),
+                "values": {
+                    name: [[list(labels), value]
+                           for labels, value in values.items()]
+                    for name, values in merged.items()
+                },
+            }
+            _write(path, archive)
+
+        if archive["files"]:
+            for filename in archive["files"]:
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    pass
+
+            archive["files"] = list()
+            _write(path, archive)
+
+    return archive
+
+
+def collect(directory: Optional[str] = None) -> Dict[str, Dict[Labels, object]]:
+    r"""Adds up the values of every worker, or only returns this worker's without a directory."""
+    if directory is None:
+        snapshots = [(True, snapshot())]
+    else:
+        flush(directory)
+        snapshots = [(False, _archive(directory)["values"])]
+        for filename in os.listdir(directory):
+            if not filename.endswith(".json") or filename == ARCHIVE:
+                continue
+            values = _read(os.path.join(directory, filename))
+            if values is not None:
+                snapshots.append(
+                    (_alive(int(filename.split("-")[0])), values))
+
+    merged: Dict[str, Dict[Labels, object]] = {
+        name: dict()
+        for name in REGISTRY
+    }
+    for alive, values in snapshots:
+        _merge(merged, values, alive)
+
+    return merged
+
+
+def render(directory: Optional[str] = None) -> str:
+    r"""The metrics of the server, in the Prometheus text format."""
+    lines = list()
+    for name, values in collect(directory).items():
+        metric = REGISTRY[name]
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+
+        for labels, value in sorted(values.items()):
+            for suffix, names, label_values, sample in metric.samples(
+                    labels, value):
+                if names:
+                    pairs = ",".join(
+                        f'{label}="{_escape(label_value)}"'
+                        for label, label_value in zip(names, label_values))
+                    lines.append(
+                        f"{name}{suffix}{{{pairs}}} {_format_value(sample)}")
+                else:
+                    lines.append(f"{name}{suffix} {_format_value(sample)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _start_worker(app):
+    r"""Starts recording the metrics of this worker, once per worker process.
+
+    The values inherited from the parent process are discarded, and the flushes are started.
+    """
+    global _path, _pid
+
+    if _pid == os.getpid():
+        return
+
+    with _lock:
+        if _pid == os.getpid():
+            return
+
+        if _pid is not None:
+            for metric in REGISTRY.values():
+                metric.reset()
+        _path = None
+        _pid = os.getpid()
+
+    directory = app.config["METRICS_DIR"]
+    if not directory:
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    interval = app.config["METRICS_FLUSH_INTERVAL"]
+
+    def run():
+        from api import root_logger as logger
+
+        while True:
+            time.sleep(interval)
+            try:
+                flush(directory)
+            except Exception as e:
+                logger.exception("Error while writing the metrics")
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+
+
+def init_app(app):
+    r"""Records the duration of every request of an app."""
+
+    @app.before_request
+    def start_timer():
+        _start_worker(app)
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            REQUEST_DURATION.observe(time.perf_counter() - start,
+                                     request.endpoint or "", request.method,
+                                     str(response.status_code))
+
+        return response
@@ -0,0 +1,166 @@
+r"""In place migrations of the stored documents.
+
+`migrate_dates` converts the dates saved as strings, before they were stored as BSON dates, to
+BSON dates in UTC: the due dates and assignment dates of the assignments, and the submission times
+of their submissions. It only reads the courses that still have such a string (found with the
+indexes on `assignments.due_by` and `assignments.submissions.date_submitted`), and sends the
+conversions to the database in batches.
+
+Every conversion only applies to the element it was computed for (matched by `_id`, with array
+filters), and only if it still holds the same string, so the migration is safe to run while the
+app is writing and can be interrupted and run again: nothing is converted twice, nor overwritten.
+"""
+from threading import Thread
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from api import db
+from api import root_logger as logger
+from api.tools.dates import parse_datetime
+from pymongo import UpdateOne
+
+# The courses that still have a date stored as a string
+STRING_DATES = {
+    "$or": [
+        {
+            "assignments.due_by": {
+                "$type": "string"
+            }
+        },
+        {
+            "assignments.date_assigned": {
+                "$type": "string"
+            }
+        },
+        {
+            "assignments.submissions.date_submitted": {
+                "$type": "string"
+            }
+        },
+    ]
+}
+
+DATES_PROJECTION = {
+    "assignments._id": 1,
+    "assignments.due_by": 1,
+    "assignments.date_assigned": 1,
+    "assignments.submissions._id": 1,
+    "assignments.submissions.date_submitted": 1,
+}
+
+
+def _convert(value):
+    r"""The date stored as a string, or `None` if it is not one (or not a valid one)."""
+    if not isinstance(value, str):
+        return None
+
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        logger.warning("Could not migrate the date %r", value)
+        return None
+
+
+def date_updates(course: dict) -> Tuple[Dict, List[Dict]]:
+    r"""The `$set` and the array filters that convert the string dates of a course.
+
+    Returns
+    -------
+    Tuple[Dict, List[Dict]]
+        Empty if there is nothing to convert
+    """
+    updates = dict()
+    array_filters = list()
+
+    for i, assignment in enumerate(course.get("assignments") or []):
+        if "_id" not in assignment:
+            continue
+
+        for name, field in ((f"due{i}", "due_by"), (f"assigned{i}",
+                                                    "date_assigned")):
+            converted = _convert(assignment.get(field))
+            if converted is not None:
+                updates[f"assignments.$[{name}].{field}"] = converted
+                array_filters.append({
+                    f"{name}._id": assignment["_id"],
+                    f"{name}.{field}": assignment[field]
+                })
+
+        submissions = 0
+        for j, submission in enumerate(assignment.get("submissions") or []):
+            converted = _convert(submission.get("date_submitted"))
+            if converted is None or "_id" not in submission:
+                continue
+
+            name = f"s{i}x{j}"
+            path = f"assignments.$[a{i}].submissions.$[{name}].date_submitted"
+            updates[path] = converted
+            array_filters.append({
+                f"{name}._id": submission["_id"],
+                f"{name}.date_submitted": submission["date_submitted"]
+            })
+            submissions += 1
+
+        if submissions:
+            array_filters.append({f"a{i}._id": assignment["_id"]})
+
+    return updates, array_filters
+
+
+def migrate_dates(batch_size: int = 100) -> int:
+    r"""Converts the dates stored as strings to BSON dates, in place.
+
+    Parameters
+    ----------
+    batch_size : int, optional
+        The number of course updates sent to the database at once, by default 100
+
+    Returns
+    -------
+    int
+        The number of courses updated
+    """
+    updated = 0
+    requests = list()
+
+    for course in db.courses.find(STRING_DATES,
+                                  DATES_PROJECTION,
+                                  batch_size=batch_size):
+        updates, array_filters = date_updates(course)
+        if not updates:
+            continue
+
+        requests.append(
+            UpdateOne({"_id": course["_id"]}, {"$set": updates},
+                      array_filters=array_filters))
+
+        if len(requests) >= batch_size:
+            updated += db.courses.bulk_write(requests,
+                                             ordered=False).modified_count
+            requests = list()
+
+    if requests:
+        updated += db.courses.bulk_write(requests,
+                                         ordered=False).modified_count
+
+    return updated
+
+
+def start_background_migration(app) -> Thread:
+    r"""Starts a daemon thread that runs the migrations once, in one worker only.
+
+    Parameters
+    ----------
+    app : A Flask app instance
+    """
+
+    def migrate():
+        logger.info("Migrated the dates of %s courses", migrate_dates())
+
+    return db.run_periodically(app,
+                               "migrations",
+                               3600,
+                               migrate,
+                               "migrations",
+                               repeat=False)
@@ -0,0 +1,276 @@
+r"""An in-process autocomplete index over the names of every user.
+
+Every worker keeps a sorted array of normalized names (first name, last name, "first last" and
+"last first") for students, teachers, admins and parents, so searching by name prefix is a binary
+search instead of a database query.
+
+The index is updated in place when a user is added, removed or renamed by this worker, and the
+other workers replay the change from a shared log (see :mod:`api.tools.versioned`).
+"""
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from api import db
+from api import root_logger as logger
+from api.tools.versioned import VersionedIndex
+from bson import ObjectId
+
+# The collection of every user type
+USER_COLLECTIONS = {
+    "Student": "students",
+    "Teacher": "teachers",
+    "Admin": "admins",
+    "Parent": "parents",
+}
+
+# The names a user is indexed under, in the order their matches are ranked
+FIRST_NAME = 0
+LAST_NAME = 1
+FULL_NAME = 2
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(name: str) -> str:
+    r"""Lowercases a name, strips its accents and collapses its whitespace."""
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(c for c in name if not unicodedata.combining(c))
+
+    return _SPACES.sub(" ", name).strip().casefold()
+
+
+def _keys(first_name: str, last_name: str) -> List[Tuple[int, str]]:
+    r"""The (kind, key) pairs a user is indexed under."""
+    first, last = normalize(first_name), normalize(last_name)
+
+    keys = [(FIRST_NAME, first), (LAST_NAME, last)]
+    if first and last:
+        keys += [(FULL_NAME, f"{first} {last}"), (FULL_NAME, f"{last} {first}")]
+
+    return [key for key in keys if key[1]]
+
+
+class NameIndex:
+    r"""Sorted arrays of name keys, searched by prefix with binary search.
+
+    There is a pair of parallel arrays (keys, user ids) per user type and kind of name, so a
+    search only walks as many entries as it returns, whatever the number of users.
+    """
+
+    def __init__(self):
+        # (user type, kind) -> (sorted keys, user ids)
+        self._arrays: Dict[Tuple[str, int], Tuple[List[str],
+                                                  List[str]]] = dict()
+        # (user type, user id) -> (first name, last name)
+        self._users: Dict[Tuple[str, str], Tuple[str, str]] = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    @classmethod
+    def build(cls, users: Iterable[Tuple[str, dict]]):
+        r"""Builds an index at once from (user type, user document) pairs."""
+        index = cls()
+        rows = dict()
+
+        for user_type, user in users:
+            user_id = str(user["_id"])
+            first_name = user.get("first_name") or ""
+            last_name = user.get("last_name") or ""
+
+            index._users[(user_type, user_id)] = (first_name, last_name)
+            for kind, key in _keys(first_name, last_name):
+                rows.setdefault((user_type, kind), list()).append(
+                    (key, user_id))
+
+        for array, pairs in rows.items():
+            pairs.sort()
+            index._arrays[array] = ([key for key, _ in pairs],
+                                    [user_id for _, user_id in pairs])
+
+        return index
+
+    def add(self, user_type: str, user_id: str, first_name: str,
+            last_name: str):
+        r"""Adds a user, or updates the name of a user already in the index."""
+        user_id = str(user_id)
+
+        with self._lock:
+            self._remove(user_type, user_id)
+            self._users[(user_type, user_id)] = (first_name or "",
+                                                 last_name or "")
+
+            for kind, key in _keys(first_name, last_name):
+                keys, ids = self._arrays.setdefault((user_type, kind),
+                                                    (list(), list()))
+                position = bisect_left(keys, key)
+                while (position < len(keys) and keys[position] == key
+                       and ids[position] < user_id):
+                    position += 1
+
+                keys.insert(position, key)
+                ids.insert(position, user_id)
+
+    def remove(self, user_type: str, user_id: str):
+        with self._lock:
+            self._remove(user_type, str(user_id))
+
+    def _remove(self, user_type: str, user_id: str):
+        names = self._users.pop((user_type, user_id), None)
+        if names is None:
+            return
+
+        for kind, key in _keys(*names):
+            keys, ids = self._arrays[(user_type, kind)]
+            position = bisect_left(keys, key)
+            while position < len(keys) and keys[position] == key:
+                if ids[position] == user_id:
+                    del keys[position]
+                    del ids[position]
+                    break
+                position += 1
+
+    def _range(self, user_type: str, kind: int, query: str, exact: bool):
+        r"""Yields the (key, user type, user id) entries of an array that match a query, in order."""
+        keys, ids = self._arrays.get((user_type, kind), ((), ()))
+        position = bisect_left(keys, query)
+
+        while position < len(keys) and keys[position].startswith(query):
+            if exact and keys[position] != query:
+                return
+
+            yield keys[position], user_type, ids[position]
+            position += 1
+
+    def search(self,
+               query: str,
+               user_types: Optional[Iterable[str]] = None,
+               limit: int = 5) -> List[dict]:
+        r"""Returns the users whose names best match a prefix.
+
+        Exact matches come first, then first name prefixes, last name prefixes and full name
+        prefixes (e.g. "jo sm" or "smith j"), each of them in alphabetical order, so the shorter
+        names come first.
+
+        Parameters
+        ----------
+        query : str
+        user_types : Iterable[str], optional
+            Only return users of these types ("Student", "Teacher", "Admin", "Parent"), by
+            default all of them
+        limit : int, optional
+            The maximum number of results, by default 5
+
+        Returns
+        -------
+        List[dict]
+            The matching users, as dictionaries with `id`, `type`, `first_name` and `last_name`
+        """
+        query = normalize(query)
+        if not query:
+            return list()
+
+        user_types = list(user_types or USER_COLLECTIONS)
+        results = list()
+        seen = set()
+
+        with self._lock:
+            for exact in (True, False):
+                for kind in (FIRST_NAME, LAST_NAME, FULL_NAME):
+                    for _, user_type, user_id in heapq.merge(*(
+                            self._range(user_type, kind, query, exact)
+                            for user_type in user_types)):
+                        if (user_type, user_id) in seen:
+                            continue
+
+                        seen.add((user_type, user_id))
+                        first_name, last_name = self._users[(user_type,
+                                                             user_id)]
+                        results.append({
+                            "id": user_id,
+                            "type": user_type,
+                            "first_name": first_name,
+                            "last_name": last_name,
+                        })
+
+                        if len(results) >= limit:
+                            return results
+
+        return results
+
+
+def _build() -> NameIndex:
+    return NameIndex.build(
+        (user_type, user) for user_type, collection in USER_COLLECTIONS.items()
+        for user in getattr(db, collection).find({}, {
+            "first_name": 1,
+            "last_name": 1
+        }))
+
+
+def _replay(index: NameIndex, user_type: str, user_id: str):
+    r"""Updates the name of a user in the index from the database, after another worker changed it."""
+    user = getattr(db, USER_COLLECTIONS[user_type]).find_one(
+        {"_id": ObjectId(user_id)}, {
+            "first_name": 1,
+            "last_name": 1
+        })
+    if user is None:
+        index.remove(user_type, user_id)
+    else:
+        index.add(user_type, user_id, user.get("first_name"),
+                  user.get("last_name"))
+
+
+# The index of this worker, kept up to date with the changes made by the other workers
+_names = VersionedIndex("names", _build, _replay)
+
+
+def get_index() -> NameIndex:
+    r"""Returns the name index of this worker, built on first use."""
+    return _names.get()
+
+
+def user_added(user_type: str, user_id: str, first_name: str,
+               last_name: str):
+    r"""Adds a new or renamed user to the index, and to the search index."""
+    from api.tools.fulltext import person_changed
+
+    person_changed(user_type, user_id, first_name, last_name)
+
+    try:
+        _names.changed(
+            user_type, str(user_id),
+            lambda index: index.add(user_type, user_id, first_name, last_name))
+    except Exception as e:
+        logger.exception("Error while indexing the name of user %s", user_id)
+
+
+def user_removed(user_type: str, user_id: str):
+    r"""Removes a user from the index, and from the search index."""
+    from api.tools.fulltext import person_removed
+
+    person_removed(user_type, user_id)
+
+    try:
+        _names.changed(user_type, str(user_id),
+                       lambda index: index.remove(user_type, user_id))
+    except Exception as e:
+        logger.exception(
+            "Error while removing user %s from the name index", user_id)
+
+
+def search(query: str,
+           user_types: Optional[Iterable[str]] = None,
+           limit: int = 5) -> List[dict]:
+    r"""Searches the users by name prefix, see :meth:`NameIndex.search`."""
+    return get_index().search(query, user_types, limit)
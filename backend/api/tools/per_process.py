@@ -0,0 +1,42 @@
+r"""Values created lazily once per worker process.
+
+Caches, thread pools and clients must not be shared with the workers forked from a preloaded app
+(e.g. by gunicorn): the threads of a pool are not copied by `fork`, and a cache filled by the
+parent would never see the invalidations made in the child. A :class:`PerProcess` value is created
+on first use in every process instead, by comparing the pid it was created in with the current one.
+"""
+import os
+import threading
+from typing import Callable
+from typing import Generic
+from typing import Optional
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class PerProcess(Generic[T]):
+    r"""A value created on first use in every process.
+
+    Parameters
+    ----------
+    factory : Callable[[], T]
+        Creates the value, called at most once per process
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+
+        self._value: Optional[T] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        r"""Returns the value of this process, creating it on first use."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._value = self.factory()
+                    self._pid = os.getpid()
+
+        return self._value
@@ -0,0 +1,188 @@
+r"""Counts the database commands issued by every request, to catch N+1 query patterns.
+
+A pymongo command listener, given to the client of `DB`, counts the commands of the request being
+handled by the current thread and their total time, and groups them by shape: the command, its
+collection and the structure of its filter, without the values. A request that issues the same
+shape many times is most likely running a query per item of a list (e.g. a `Course.get_by_id`
+per course of a student) instead of a single query for all of them.
+
+After every request, its commands are checked against the `QUERY_BUDGET` and `QUERY_REPEAT_LIMIT`
+of the app config: going over either is logged as a warning, or raises a
+:class:`QueryBudgetException` if `QUERY_BUDGET_STRICT` is set (as in the tests). With
+`QUERY_STATS_HEADER` set (in development), the counts are sent in an `X-Query-Stats` header.
+
+Commands issued outside of requests (e.g. by the background jobs) are not counted.
+"""
+import threading
+from collections import Counter
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from api.tools.exceptions import QueryBudgetException
+from flask import request
+from pymongo import monitoring
+
+HEADER = "X-Query-Stats"
+
+# Where the filter of every command is
+FILTERS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+# Commands that continue or clean up after another one, not queries by themselves
+FOLLOW_UPS = {"getMore", "killCursors", "endSessions"}
+
+
+def _skeleton(value):
+    r"""The structure of a filter: its keys and operators, with every value replaced by "?"."""
+    if isinstance(value, dict):
+        return tuple(
+            sorted((key, _skeleton(item)) for key, item in value.items()))
+
+    # Lists of conditions (e.g. `$or`), not lists of values (e.g. `$in`)
+    if isinstance(value, list) and any(
+            isinstance(item, dict) for item in value):
+        return tuple(_skeleton(item) for item in value)
+
+    return "?"
+
+
+def shape(command_name: str, command: dict) -> Tuple:
+    r"""The shape of a command: its name, its collection and the skeleton of its filter.
+
+    Two commands have the same shape when they only differ by the values they look for.
+    """
+    collection = command.get(command_name)
+    if not isinstance(collection, str):
+        collection = None
+
+    query = command.get(FILTERS.get(command_name))
+    if command_name in ("update", "delete"):
+        query = [statement.get("q") for statement in query or []]
+
+    return command_name, collection, _skeleton(query)
+
+
+class RequestStats:
+    r"""The database commands issued while handling a request."""
+
+    def __init__(self):
+        self.commands = 0
+        self.duration_micros = 0
+        self.shapes = Counter()
+
+    def most_repeated(self) -> Optional[Tuple[Tuple, int]]:
+        r"""The shape issued the most times, with its count, `None` if there were no queries."""
+        repeated = self.shapes.most_common(1)
+        return repeated[0] if repeated else None
+
+    def problems(self, budget: int, repeat_limit: int) -> List[str]:
+        r"""Describes how the request went over the query budget or the repeat limit, if it did."""
+        problems = list()
+
+        if budget and self.commands > budget:
+            problems.append(
+                f"{self.commands} database commands (budget: {budget})")
+
+        repeated = self.most_repeated()
+        if repeat_limit and repeated is not None and repeated[1] > repeat_limit:
+            (command_name, collection, skeleton), count = repeated
+            problems.append(
+                f"{count} {command_name} commands on {collection} with the filter {skeleton} "
+                f"(limit: {repeat_limit}), probably an N+1 query")
+
+        return problems
+
+    def summary(self) -> str:
+        return (f"commands={self.commands}; "
+                f"time={self.duration_micros / 1000:.1f}ms; "
+                f"shapes={len(self.shapes)}")
+
+
+class QueryCounter(monitoring.CommandListener):
+    r"""Counts the commands of the request handled by the current thread, if any.
+
+    pymongo calls the listener in the thread that issues the command.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def stats(self) -> Optional[RequestStats]:
+        return getattr(self._local, "stats", None)
+
+    def start(self):
+        r"""Starts counting the commands of the current thread."""
+        self._local.stats = RequestStats()
+
+    def stop(self) -> Optional[RequestStats]:
+        r"""Stops counting the commands of the current thread, returning what was counted."""
+        stats = self.stats
+        self._local.stats = None
+        return stats
+
+    def started(self, event):
+        stats = self.stats
+        if stats is None:
+            return
+
+        stats.commands += 1
+        if event.command_name not in FOLLOW_UPS:
+            stats.shapes[shape(event.command_name, event.command)] += 1
+
+    def succeeded(self, event):
+        stats = self.stats
+        if stats is not None:
+            stats.duration_micros += event.duration_micros
+
+    def failed(self, event):
+        stats = self.stats
+        if stats is not None:
+            stats.duration_micros += event.duration_micros
+
+
+# The listener of the database client, see `DB`
+query_counter = QueryCounter()
+
+
+def init_app(app):
+    r"""Counts the database commands of every request of an app, and checks them."""
+
+    @app.before_request
+    def start_counting():
+        query_counter.start()
+
+    @app.after_request
+    def check_queries(response):
+        from api import root_logger as logger
+
+        stats = query_counter.stop()
+        if stats is None:
+            return response
+
+        problems = stats.problems(app.config["QUERY_BUDGET"],
+                                  app.config["QUERY_REPEAT_LIMIT"])
+        if problems:
+            message = f"{request.method} {request.path}: " + "; ".join(
+                problems)
+            if app.config["QUERY_BUDGET_STRICT"]:
+                raise QueryBudgetException(message)
+            logger.warning(message)
+
+        if app.config["QUERY_STATS_HEADER"]:
+            response.headers[HEADER] = stats.summary()
+
+        return response
+
+    @app.teardown_request
+    def stop_counting(exception=None):
+        # When the request failed before `after_request`
+        query_counter.stop()
@@ -0,0 +1,358 @@
+r"""Email reminders for the assignments that are due soon.
+
+The worker that holds the "due_reminders" lease keeps a min-heap of the upcoming deadlines,
+loaded with a range query on the (indexed) `assignments.due_by` of the courses, and sends the
+reminders whose time has come. Assignments added or edited by this worker are pushed onto the
+heap directly; a shared counter tells the worker to reload when another worker changed one.
+
+Every reminder is claimed in `db.reminders` (keyed by assignment, student and due date) before
+it is sent, so it is sent once even if several workers run the scheduler at the same time, and
+a student gets a single email for all their assignments due at about the same time. If the email
+cannot be sent, its claims are released and its deadlines pushed back onto the heap, so it is
+tried again at the next check.
+"""
+import heapq
+import os
+import threading
+from datetime import datetime
+from datetime import timedelta
+from threading import Thread
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from api import db
+from api import root_logger as logger
+from api.tools.dates import format_datetime
+from api.tools.dates import parse_datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+# The code of the write errors of a key that is already taken
+DUPLICATE_KEY = 11000
+
+# How far beyond the reminders of the moment deadlines are loaded
+HORIZON = timedelta(hours=6)
+
+REMINDER_PROJECTION = {
+    "name": 1,
+    "students": 1,
+    "assignments._id": 1,
+    "assignments.title": 1,
+    "assignments.due_by": 1,
+    "assignments.submissions.student_id": 1,
+}
+
+# (reminder time, due date, course id, assignment id)
+Entry = Tuple[datetime, datetime, str, str]
+
+
+class ReminderQueue:
+    r"""A min-heap of the deadlines of assignments, by the time their reminders are due.
+
+    An assignment can be pushed again when its due date changes: the entries of its previous
+    due dates are skipped when they are popped.
+    """
+
+    def __init__(self, lead: timedelta):
+        self.lead = lead
+        self._heap: List[Entry] = list()
+        # The latest due date of every assignment in the heap
+        self._due_dates: Dict[str, datetime] = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._due_dates)
+
+    def push(self, course_id: str, assignment_id: str, due_by: datetime):
+        course_id, assignment_id = str(course_id), str(assignment_id)
+
+        with self._lock:
+            if self._due_dates.get(assignment_id) == due_by:
+                return
+
+            self._due_dates[assignment_id] = due_by
+            heapq.heappush(self._heap,
+                           (due_by - self.lead, due_by, course_id,
+                            assignment_id))
+
+    def pop_due(self, now: datetime) -> List[Entry]:
+        r"""Pops the deadlines whose reminders are due at `now`."""
+        due = list()
+
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                entry = heapq.heappop(self._heap)
+                if self._due_dates.get(entry[3]) == entry[1]:
+                    del self._due_dates[entry[3]]
+                    due.append(entry)
+
+        return due
+
+
+# The queue of this worker, the version of the assignments it was loaded from, and until when
+_queue: ReminderQueue = None
+_version: int = None
+_loaded_until: datetime = None
+_pid: int = None
+_lock = threading.Lock()
+
+
+def _get_version() -> int:
+    counter = db.counters.find_one({"_id": "reminders"}, {"value": 1})
+    return counter["value"] if counter else 0
+
+
+def _deadlines(start: datetime, end: datetime):
+    r"""Yields the (course id, assignment id, due date) of the assignments due in a range."""
+    # Due dates saved before they were stored as dates are ISO 8601 strings, until they are migrated
+    # (see api.tools.migrations)
+    query = {
+        "$or": [{
+            "assignments.due_by": {
+                "$gt": start,
+                "$lte": end
+            }
+        }, {
+            "assignments.due_by": {
+                "$gt": start.isoformat(),
+                "$lte": end.isoformat()
+            }
+        }]
+    }
+
+    for course in db.courses.find(query, {
+            "assignments._id": 1,
+            "assignments.due_by": 1
+    }):
+        for assignment in course.get("assignments") or []:
+            due_by = _parse(assignment.get("due_by"))
+            if due_by is not None and start < due_by <= end:
+                yield course["_id"], assignment["_id"], due_by
+
+
+def _parse(value) -> Optional[datetime]:
+    try:
+        return parse_datetime(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _load(lead: timedelta, now: datetime):
+    r"""(Re)loads the queue of this worker with the deadlines of the next `lead + HORIZON`."""
+    global _queue, _version, _loaded_until, _pid
+
+    version = _get_version()
+    queue = ReminderQueue(lead)
+    until = now + lead + HORIZON
+    for course_id, assignment_id, due_by in _deadlines(now, until):
+        queue.push(course_id, assignment_id, due_by)
+
+    with _lock:
+        _queue, _version, _loaded_until = queue, version, until
+        _pid = os.getpid()
+
+    logger.info("Loaded %s upcoming deadlines", len(queue))
+
+
+def assignment_scheduled(course_id: str, assignment_id: str, due_by):
+    r"""Schedules the reminders of a new or edited assignment."""
+    global _version
+
+    try:
+        due_by = _parse(due_by)
+
+        counter = db.counters.find_one_and_update(
+            {"_id": "reminders"},
+            {"$inc": {
+                "value": 1
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        with _lock:
+            if _pid != os.getpid() or _queue is None:
+                return
+
+            # This worker's queue is still up to date, unless someone else changed it in between
+            if _version is not None and counter["value"] == _version + 1:
+                _version = counter["value"]
+            loaded_until = _loaded_until
+
+        if due_by is not None and due_by <= loaded_until:
+            _queue.push(course_id, assignment_id, due_by)
+    except Exception as e:
+        logger.exception(
+            "Error while scheduling the reminders of assignment %s",
+            assignment_id)
+
+
+def _reminder_id(assignment_id: str, student_id: str, due_by: datetime) -> str:
+    return f"{assignment_id}:{student_id}:{format_datetime(due_by)}"
+
+
+def _claim(pairs: List[Tuple[str, str, datetime]]) -> List[int]:
+    r"""Claims (assignment id, student id, due date) reminders, returning the indexes of the new ones."""
+    if not pairs:
+        return list()
+
+    documents = [{
+        "_id": _reminder_id(*pair),
+        "sent_at": datetime.utcnow(),
+    } for pair in pairs]
+
+    try:
+        db.reminders.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        failed = set()
+        for error in e.details["writeErrors"]:
+            failed.add(error["index"])
+            # Anything but a duplicate key (claimed by someone else already) is not a claim either,
+            # but is worth knowing about
+            if error.get("code") != DUPLICATE_KEY:
+                logger.error("Could not claim the reminder %s: %s",
+                             documents[error["index"]]["_id"],
+                             error.get("errmsg"))
+        return [i for i in range(len(documents)) if i not in failed]
+
+    return list(range(len(documents)))
+
+
+def _release(pairs: List[Tuple[str, str, datetime]]):
+    r"""Releases claimed reminders that could not be sent, so that they are sent again."""
+    db.reminders.delete_many(
+        {"_id": {
+            "$in": [_reminder_id(*pair) for pair in pairs]
+        }})
+
+
+def send_due(now: Optional[datetime] = None) -> int:
+    r"""Sends the reminders due at `now`, in one email per student.
+
+    Reminders are only sent to the students of the course who have not submitted anything for the
+    assignment yet, and not at all if the assignment was deleted, its due date changed or passed.
+
+    Returns
+    -------
+    int
+        The number of emails sent
+    """
+    from api.tools.email import send_email_now
+
+    now = now or datetime.utcnow()
+    due = _queue.pop_due(now) if _queue is not None else []
+    if not due:
+        return 0
+
+    courses = {
+        course["_id"]: course
+        for course in db.courses.find(
+            {"_id": {
+                "$in": list({ObjectId(entry[2])
+                             for entry in due})
+            }}, REMINDER_PROJECTION)
+    }
+
+    pairs = list()
+    details = list()
+    course_ids = list()
+    for _, due_by, course_id, assignment_id in due:
+        course = courses.get(ObjectId(course_id))
+        assignment = next((assignment
+                           for assignment in (course or {}).get("assignments")
+                           or [] if str(assignment["_id"]) == assignment_id),
+                          None)
+        if (assignment is None or due_by <= now
+                or _parse(assignment.get("due_by")) != due_by):
+            continue
+
+        submitted = {
+            str(submission.get("student_id"))
+            for submission in assignment.get("submissions") or []
+        }
+        for student_id in course.get("students") or []:
+            if str(student_id) not in submitted:
+                pairs.append((assignment_id, str(student_id), due_by))
+                course_ids.append(course_id)
+                details.append({
+                    "title": assignment.get("title", ""),
+                    "course": course.get("name", ""),
+                    "due_by": due_by,
+                })
+
+    # Batched per student, as indexes in `pairs`
+    reminders: Dict[str, List[int]] = dict()
+    for i in _claim(pairs):
+        reminders.setdefault(pairs[i][1], list()).append(i)
+
+    if not reminders:
+        return 0
+
+    students = db.students.find(
+        {"_id": {
+            "$in": [ObjectId(student_id) for student_id in reminders]
+        }}, {
+            "email": 1,
+            "first_name": 1
+        })
+    sent = 0
+    for student in students:
+        claimed = reminders[str(student["_id"])]
+        assignments = sorted((details[i] for i in claimed),
+                             key=lambda assignment: assignment["due_by"])
+        try:
+            # Sent from this thread, to know whether it failed
+            send_email_now(
+                [student["email"]],
+                "Assignments due soon",
+                "mail/due_reminder",
+                first_name=student.get("first_name", ""),
+                assignments=assignments,
+            )
+        except Exception as e:
+            logger.exception("Error while sending the reminders of student %s",
+                             student["_id"])
+            _release([pairs[i] for i in claimed])
+            for i in claimed:
+                _queue.push(course_ids[i], pairs[i][0], pairs[i][2])
+            continue
+
+        sent += 1
+
+    return sent
+
+
+def run_once(lead: timedelta, now: Optional[datetime] = None) -> int:
+    r"""Reloads the deadlines if they are stale, then sends the reminders that are due."""
+    now = now or datetime.utcnow()
+
+    if (_pid != os.getpid() or _queue is None or _queue.lead != lead
+            or _get_version() != _version
+            or now + lead + HORIZON / 2 > _loaded_until):
+        _load(lead, now)
+
+    return send_due(now)
+
+
+def start_background_reminders(app, interval: int, lead: int) -> Thread:
+    r"""Starts a daemon thread that sends the reminders of assignments due soon.
+
+    Parameters
+    ----------
+    app : A Flask app instance
+    interval : int
+        Seconds between two checks for reminders to send
+    lead : int
+        Seconds before its due date a reminder of an assignment is sent
+    """
+
+    def send():
+        sent = run_once(timedelta(seconds=lead))
+        if sent:
+            logger.info("Sent %s due date reminders", sent)
+
+    return db.run_periodically(app, "due_reminders", interval, send,
+                               "due-reminders")
@@ -0,0 +1,400 @@
+r"""Weekly course schedules: parsing, expansion and conflict detection.
+
+A course meets on some week days (`schedule_days`, e.g. "MoWeFr") at the same time
+(`schedule_time`, e.g. "09:00-10:15", the wall-clock time of the school's timezone). Both strings
+are parsed once into a :class:`Schedule`, which is a set of intervals over the week, in minutes
+since Monday 00:00. The meetings are only converted to UTC when they are expanded into dates, one
+by one, so they stay at the same local time when the clocks change.
+
+Two courses conflict when one of their intervals overlap. The conflicts in a timetable are found
+by sorting its intervals by start and sweeping over them, keeping a heap of the meetings still
+going on, so checking the whole school is O(n log n) in the number of enrollments (plus the
+number of conflicts found).
+"""
+import heapq
+import re
+from datetime import datetime
+from datetime import timedelta
+from functools import lru_cache
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import pytz
+from api import db
+from api import root_logger as logger
+from api.tools.dates import from_local
+from api.tools.dates import school_timezone
+from api.tools.dates import to_local
+from bson import ObjectId
+
+# The week days of `Course.schedule_days`, in the order of `datetime.weekday()`
+WEEK_DAYS = ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+_DAYS = re.compile(r"(?:Mo|Tu|We|Th|Fr|Sa|Su)*")
+_TIME = re.compile(r"([01][0-9]|2[0-4]):([0-5][0-9])")
+
+
+class Schedule(NamedTuple):
+    r"""The weekly meetings of a course."""
+
+    # Week days, as in `datetime.weekday()`, sorted
+    days: Tuple[int, ...]
+    # Minutes after midnight (local time), `end` is more than a day if the meetings go on after
+    # midnight
+    start: int
+    end: int
+
+    @property
+    def duration(self) -> timedelta:
+        return timedelta(minutes=self.end - self.start)
+
+    def intervals(self) -> List[Tuple[int, int]]:
+        r"""The meetings of a week, as (start, end) minutes since Monday 00:00.
+
+        Meetings going on after the end of the week are split in two.
+        """
+        intervals = list()
+        for day in self.days:
+            start = day * MINUTES_PER_DAY + self.start
+            end = day * MINUTES_PER_DAY + self.end
+
+            if end > MINUTES_PER_WEEK:
+                intervals.append((start, MINUTES_PER_WEEK))
+                intervals.append((0, end - MINUTES_PER_WEEK))
+            else:
+                intervals.append((start, end))
+
+        return intervals
+
+    def occurrences(
+            self,
+            start: datetime,
+            end: datetime,
+            tz: Optional[pytz.BaseTzInfo] = None
+    ) -> Iterator[Tuple[datetime, datetime]]:
+        r"""Yields the (start, end) of the meetings that overlap a range, in order.
+
+        Parameters
+        ----------
+        start, end : datetime.datetime
+            The range, in UTC
+        tz : pytz timezone, optional
+            The timezone of the schedule, by default the school's
+
+        Returns
+        -------
+        Iterator[Tuple[datetime.datetime, datetime.datetime]]
+            The meetings, in UTC
+        """
+        tz = tz or school_timezone()
+        first = to_local(start, tz)
+        last = to_local(end, tz)
+
+        # From the day before, for meetings that go on after midnight
+        day = datetime(first.year, first.month, first.day) - timedelta(days=1)
+        while day <= last:
+            if day.weekday() in self.days:
+                meeting_start = from_local(day + timedelta(minutes=self.start),
+                                           tz)
+                meeting_end = from_local(day + timedelta(minutes=self.end), tz)
+                if meeting_start < end and meeting_end > start:
+                    yield meeting_start, meeting_end
+            day += timedelta(days=1)
+
+    def first_after(self, moment: datetime,
+                    tz: Optional[pytz.BaseTzInfo] = None) -> datetime:
+        r"""The start of the first meeting on or after the day of `moment` (in UTC).
+
+        Returns
+        -------
+        datetime.datetime
+            The start, in the local time of `tz` (by default the school's timezone)
+        """
+        moment = to_local(moment, tz or school_timezone())
+        day = datetime(moment.year, moment.month, moment.day)
+        while day.weekday() not in self.days:
+            day += timedelta(days=1)
+
+        return day + timedelta(minutes=self.start)
+
+    def by_day(self) -> str:
+        r"""The days of the meetings as an iCalendar BYDAY list, e.g. "MO,WE,FR"."""
+        return ",".join(WEEK_DAYS[day].upper() for day in self.days)
+
+
+def parse_days(schedule_days: str) -> Tuple[int, ...]:
+    r"""Parses week days like "MoWeFr" into sorted `datetime.weekday()` numbers.
+
+    Raises
+    ------
+    ValueError
+        If the string is not made of `WEEK_DAYS` abbreviations
+    """
+    if not _DAYS.fullmatch(schedule_days):
+        raise ValueError(
+            f"The schedule days should be abbreviations from {WEEK_DAYS}, got {schedule_days!r}"
+        )
+
+    return tuple(
+        sorted({
+            WEEK_DAYS.index(schedule_days[i:i + 2])
+            for i in range(0, len(schedule_days), 2)
+        }))
+
+
+def parse_time(schedule_time: str) -> Tuple[int, int]:
+    r"""Parses a time range like "09:00-10:15" into minutes after midnight.
+
+    A range that ends before it starts (e.g. "23:00-00:30") ends on the next day.
+
+    Raises
+    ------
+    ValueError
+        If the string is not a `HH:MM-HH:MM` range
+    """
+    try:
+        start, end = (_TIME.fullmatch(part.strip())
+                      for part in schedule_time.split("-"))
+        start = int(start.group(1)) * 60 + int(start.group(2))
+        end = int(end.group(1)) * 60 + int(end.group(2))
+    except (ValueError, AttributeError):
+        raise ValueError(
+            f"The schedule time should be formatted as HH:MM-HH:MM, got {schedule_time!r}"
+        )
+
+    if start > MINUTES_PER_DAY or end > MINUTES_PER_DAY or start == end:
+        raise ValueError(f"The schedule time {schedule_time!r} is invalid")
+
+    if end < start:
+        end += MINUTES_PER_DAY
+
+    return start, end
+
+
+@lru_cache(maxsize=4096)
+def parse(schedule_days: str, schedule_time: str) -> Optional[Schedule]:
+    r"""Parses the schedule strings of a course.
+
+    Returns
+    -------
+    Schedule or None
+        The schedule, or `None` if the course has no days or no time
+
+    Raises
+    ------
+    ValueError
+        If one of the strings is invalid
+    """
+    if not schedule_days or not schedule_time:
+        return None
+
+    days = parse_days(schedule_days)
+    start, end = parse_time(schedule_time)
+
+    return Schedule(days, start, end) if days else None
+
+
+def of(course) -> Optional[Schedule]:
+    r"""The schedule of a course document or `Course`, `None` if it has none or an invalid one."""
+    if isinstance(course, dict):
+        days, time = course.get("schedule_days"), course.get("schedule_time")
+    else:
+        days, time = course.schedule_days, course.schedule_time
+
+    try:
+        return parse(days or "", time or "")
+    except ValueError as e:
+        logger.warning("Invalid course schedule: %s", e)
+        return None
+
+
+def _format(minutes: int) -> str:
+    minutes %= MINUTES_PER_DAY
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class Conflict(NamedTuple):
+    r"""Two courses that meet at the same time, and when."""
+
+    first: str
+    second: str
+    # The first overlap, in minutes since Monday 00:00
+    start: int
+    end: int
+
+    def to_dict(self) -> dict:
+        return {
+            "courses": [self.first, self.second],
+            "day": WEEK_DAYS[self.start // MINUTES_PER_DAY],
+            "start": _format(self.start),
+            "end": _format(self.end),
+        }
+
+
+def find_conflicts(
+        schedules: Iterable[Tuple[str, Optional[Schedule]]]) -> List[Conflict]:
+    r"""Finds the pairs of courses of a timetable that meet at the same time.
+
+    Parameters
+    ----------
+    schedules : Iterable[Tuple[str, Schedule]]
+        The (course id, schedule) pairs of a timetable, courses without a schedule are ignored
+
+    Returns
+    -------
+    List[Conflict]
+        A conflict per pair of courses, with their first overlap in the week
+    """
+    intervals = sorted((start, end, course_id)
+                       for course_id, schedule in schedules if schedule
+                       for start, end in schedule.intervals())
+
+    conflicts = dict()
+    # The meetings going on, as (end, course id)
+    ongoing: List[Tuple[int, str]] = list()
+    for start, end, course_id in intervals:
+        while ongoing and ongoing[0][0] <= start:
+            heapq.heappop(ongoing)
+
+        for other_end, other_id in ongoing:
+            pair = tuple(sorted((course_id, other_id)))
+            if other_id != course_id and pair not in conflicts:
+                conflicts[pair] = Conflict(*pair, start, min(end, other_end))
+
+        heapq.heappush(ongoing, (end, course_id))
+
+    return sorted(conflicts.values(), key=lambda conflict: conflict.start)
+
+
+def _schedules(course_ids: Iterable) -> List[Tuple[str, Optional[Schedule]]]:
+    course_ids = [ObjectId(course_id) for course_id in course_ids]
+    if not course_ids:
+        return list()
+
+    return [(str(course["_id"]), of(course))
+            for course in db.courses.find({"_id": {
+                "$in": course_ids
+            }}, {
+                "schedule_days": 1,
+                "schedule_time": 1
+            })]
+
+
+def enrollment_conflicts(course_id: str,
+                         course_ids: Iterable) -> List[Conflict]:
+    r"""The conflicts a course would create in a timetable made of other courses."""
+    course_id = str(course_id)
+    course_ids = {str(other) for other in course_ids} - {course_id}
+    if not course_ids:
+        return list()
+
+    return [
+        conflict for conflict in find_conflicts(
+            _schedules(course_ids | {course_id}))
+        if course_id in (conflict.first, conflict.second)
+    ]
+
+
+def student_conflicts(student_ids: Iterable[str],
+                      course_id: str) -> Dict[str, List[Conflict]]:
+    r"""The conflicts enrolling students in a course would create in their timetables.
+
+    Returns
+    -------
+    Dict[str, List[Conflict]]
+        The conflicts of the students who have some, keyed by student id
+    """
+    course_id = str(course_id)
+    students = list(
+        db.students.find(
+            {"_id": {
+                "$in": [ObjectId(student_id) for student_id in student_ids]
+            }}, {"courses": 1}))
+
+    # Every course involved is read once
+    course_ids = {str(other) for student in students
+                  for other in student.get("courses") or []} | {course_id}
+    schedules = dict(_schedules(course_ids))
+    if schedules.get(course_id) is None:
+        return dict()
+
+    conflicts = dict()
+    for student in students:
+        timetable = {str(other)
+                     for other in student.get("courses") or []} - {course_id}
+        found = [
+            conflict for conflict in find_conflicts(
+                (other, schedules.get(other))
+                for other in timetable | {course_id})
+            if course_id in (conflict.first, conflict.second)
+        ]
+        if found:
+            conflicts[str(student["_id"])] = found
+
+    return conflicts
+
+
+def teacher_conflicts(teacher_id: str, course_id: str) -> List[Conflict]:
+    r"""The conflicts assigning a teacher to a course would create in their timetable."""
+    courses = db.courses.find({"teacher": {
+        "$in": [ObjectId(teacher_id), str(teacher_id)]
+    }}, {"_id": 1})
+    return enrollment_conflicts(course_id,
+                                [course["_id"] for course in courses])
+
+
+def conflict_report() -> Dict[str, List[dict]]:
+    r"""Finds every schedule conflict in the school, for students and teachers.
+
+    Every course is read once, then the timetable of every person is swept once, so this is
+    O(n log n) in the total number of enrollments.
+
+    Returns
+    -------
+    Dict[str, List[dict]]
+        The people with conflicts, as {"students": [...], "teachers": [...]}, each of them a
+        dictionary with an `id` and their `conflicts` (see :meth:`Conflict.to_dict`)
+    """
+    timetables = {"students": dict(), "teachers": dict()}
+
+    for course in db.courses.find({}, {
+            "schedule_days": 1,
+            "schedule_time": 1,
+            "students": 1,
+            "teacher": 1
+    }):
+        schedule = of(course)
+        if schedule is None:
+            continue
+
+        entry = (str(course["_id"]), schedule)
+        for student_id in course.get("students") or []:
+            timetables["students"].setdefault(str(student_id),
+                                              list()).append(entry)
+        if course.get("teacher"):
+            timetables["teachers"].setdefault(str(course["teacher"]),
+                                              list()).append(entry)
+
+    report = dict()
+    for role, people in timetables.items():
+        report[role] = list()
+        for person_id, schedules in people.items():
+            if len(schedules) < 2:
+                continue
+
+            conflicts = find_conflicts(schedules)
+            if conflicts:
+                report[role].append({
+                    "id": person_id,
+                    "conflicts": [conflict.to_dict() for conflict in conflicts],
+                })
+
+    return report
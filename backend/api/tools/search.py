@@ -1,4 +1,120 @@
+r"""Queries over in-memory collections of models (or dictionaries).
+
+Lookups are written as keyword arguments, Django-style: nested attributes are separated with
+``__``, and a trailing operator (``ne``, ``lt``, ``lte``, ``gt``, ``gte``, ``in``, ``range``)
+compares instead of testing for equality. Predicates are compiled once per query, and every query
+is a single pass over the collection.
+"""
+from collections.abc import Mapping
 from operator import attrgetter
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+# Returned by getters when an element has no such attribute or key
+_MISSING = object()
+
+OPERATORS = {
+    "ne": lambda value, other: value != other,
+    "lt": lambda value, other: value < other,
+    "lte": lambda value, other: value <= other,
+    "gt": lambda value, other: value > other,
+    "gte": lambda value, other: value >= other,
+    "in": lambda value, other: value in other,
+    "range": lambda value, other: other[0] <= value <= other[1],
+}
+
+
+def getter(path: str) -> Callable[[Any], Any]:
+    r"""Compiles a getter for a (``__``-separated) nested attribute or dictionary key.
+
+    Elements that do not have it give a sentinel that never matches any predicate.
+    """
+    parts = path.split("__")
+
+    if len(parts) == 1:
+        # The most common case, without the loop
+        name = parts[0]
+        attribute = attrgetter(name)
+
+        def get_(element):
+            if type(element) is dict:
+                return element.get(name, _MISSING)
+
+            try:
+                return attribute(element)
+            except AttributeError:
+                if isinstance(element, Mapping) and name in element:
+                    return element[name]
+                return _MISSING
+
+        return get_
+
+    def get_(element):
+        for part in parts:
+            # Documents straight from the database are plain dictionaries
+            if type(element) is dict:
+                element = element.get(part, _MISSING)
+                if element is _MISSING:
+                    return _MISSING
+                continue
+
+            try:
+                element = getattr(element, part)
+            except AttributeError:
+                if not isinstance(element, Mapping) or part not in element:
+                    return _MISSING
+                element = element[part]
+
+        return element
+
+    return get_
+
+
+def _split(lookup: str):
+    r"""Splits a lookup into its path and operator ("eq" if there is none)."""
+    path, _, operator = lookup.rpartition("__")
+    if path and operator in OPERATORS:
+        return path, operator
+
+    return lookup, "eq"
+
+
+def compile_predicate(**kwargs) -> Callable[[Any], bool]:
+    r"""Compiles keyword lookups into a single predicate.
+
+    For example::
+
+        overdue = compile_predicate(due_by__lt=now, submissions__ne=[])
+    """
+    tests = list()
+    for lookup, other in kwargs.items():
+        path, operator = _split(lookup)
+        tests.append((getter(path), OPERATORS.get(operator), other))
+
+    if len(tests) == 1 and tests[0][1] is None:
+        # The most common case: a single equality
+        get_, _, other = tests[0]
+        return lambda element: get_(element) == other
+
+    def predicate(element) -> bool:
+        for get_, compare, other in tests:
+            value = get_(element)
+            if value is _MISSING:
+                return False
+
+            try:
+                if not (value == other
+                        if compare is None else compare(value, other)):
+                    return False
+            except TypeError:
+                # Values that cannot be compared (e.g. None < 3) do not match
+                return False
+
+        return True
+
+    return predicate
 
 
 def get(iterable, **kwargs: dict):
@@ -7,51 +123,72 @@ def get(iterable, **kwargs: dict):
 
         get(assignments, id='an id here') # >>> <Assignment...>
 
-    Also supports nested attributes:
+    Also supports nested attributes and operators:
 
-        # Get assignments that last 100 minutes
+        # Get an assignment that lasts 100 minutes
         get(assignments, due_by__total_seconds=100*60)
+        # Get an assignment due in the next 2 days
+        get(assignments, due_by__range=(now, now + timedelta(days=2)))
 
     Parameters
     ----------
     iterable : any
         An iterable to search through
     """
-    if len(kwargs) == 1:
-        # Most common use case
-        k, v = kwargs.popitem()
-        pred = attrgetter(k.replace("__", "."))
-        for element in iterable:
-            if pred(element) == v:
-                return element
-    else:
-        # More complicated use case
-        # Convert nested attributes to dotted attributes
-        converted = [(attrgetter(kwarg.replace("__", ".")), value)
-                     for kwarg, value in kwargs.items()]
-
-        for element in iterable:
-            if all(pred2(element) == value for pred2, value in converted):
-                return element
+    predicate = compile_predicate(**kwargs)
+    for element in iterable:
+        if predicate(element):
+            return element
 
     # Oops, nothing was found :c
     return None
 
 
-def get_all(iterable, **kwargs: dict):
+def get_all(iterable, order_by: Optional[Iterable[str]] = None,
+            **kwargs: dict) -> list:
     """Like :func:`get`, but to get all instances, not just the first.
 
     Parameters
     ----------
     iterable : any
         An iterable to search through
+    order_by : Iterable[str], optional
+        Sorts the results, see :func:`sort`
+    """
+    predicate = compile_predicate(**kwargs)
+    results = [element for element in iterable if predicate(element)]
+
+    if order_by:
+        return sort(results, *order_by)
+
+    return results
+
+
+def sort(iterable, *keys: str) -> list:
+    r"""Sorts elements by several keys, a key prefixed with "-" sorting in descending order.
+
+    Elements missing a key, or with a `None` value, come last.
+
+    For example::
+
+        sort(submissions, "-grade", "date_submitted")
     """
-    results = []
-    copy = iterable[:]
-    current = get(copy, **kwargs)
-    while current is not None:
-        copy.remove(current)
-        results.append(current)
-        current = get(copy, **kwargs)
+    results = list(iterable)
+
+    # Stable sorts, from the least to the most significant key
+    for key in reversed(keys):
+        descending = key.startswith("-")
+        get_ = getter(key.lstrip("-"))
+
+        present = list()
+        missing = list()
+        for element in results:
+            value = get_(element)
+            (missing if value is _MISSING or value is None else
+             present).append(element)
+
+        present.sort(key=get_, reverse=descending)
+        results = present + missing
 
     return results
+
@@ -0,0 +1,43 @@
+r"""Preloading the app in the gunicorn master, before the workers are forked (`PRELOAD`).
+
+The heavy SDKs are imported on first use by every process (see :class:`api.tools.storage.GCSStorage`
+and :class:`api.tools.logger.LazyHandler`), so that starting a worker does not pay for them. When
+the app is preloaded, they are imported once in the master instead: forked workers share those
+modules, and everything else built by `create_app`, copy-on-write (see `gunicorn.conf.py`).
+
+Nothing that is not fork-safe is created in the master: the database client is replaced in every
+forked process (see :class:`api.tools.db.DB`), the SDK clients, the logging thread and the
+metrics are created by every worker on first use, and the background jobs are started by
+:func:`api.start_background_jobs` after the fork.
+"""
+import importlib
+from typing import List
+
+from api import root_logger as logger
+
+
+def preload_modules(app) -> List[str]:
+    r"""The modules that the workers of an app would import on first use."""
+    modules = list()
+
+    if app.config["STORAGE_BACKEND"] == "gcs":
+        modules.append("google.cloud.storage")
+
+    # Only the production logger writes to Google Cloud Logging
+    if not app.debug and not app.testing:
+        modules.extend(
+            ["google.cloud.logging", "google.cloud.logging.handlers"])
+
+    return modules
+
+
+def preload(app):
+    r"""Imports the modules that the workers of an app would import on first use.
+
+    Only the modules: creating clients is left to the workers.
+    """
+    for module in preload_modules(app):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            logger.exception("Could not preload %s", module)
@@ -0,0 +1,265 @@
+r"""Storage engines for uploaded files.
+
+All the file operations of `api.tools.google_storage` go through a `StorageBackend`, chosen with
+the `STORAGE_BACKEND` config:
+
+- "gcs": a Google Cloud Storage bucket (`STORAGE_BUCKET`)
+- "local": a directory on the local filesystem (`LOCAL_STORAGE_PATH`), served by the `files`
+  blueprint with locally signed expiring URLs, Range requests and zero-copy `sendfile` streaming
+"""
+import hashlib
+import hmac
+import os
+import shutil
+import uuid
+from abc import ABC
+from abc import abstractmethod
+from datetime import datetime
+from datetime import timezone
+from typing import NamedTuple
+from typing import Optional
+
+from api.tools.exceptions import InvalidFormatException
+from api.tools.per_process import PerProcess
+from flask import current_app
+from flask import url_for
+from werkzeug.security import safe_join
+
+# Files larger than this are streamed to the bucket in chunks with a resumable upload,
+# instead of being sent in a single request (must be a multiple of 256 KB)
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# The buffer size used when copying files on the local filesystem
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _sendfile(source, target, offset: int, count: int):
+    r"""Copies `count` bytes of `source` from `offset` to `target`, within the kernel."""
+    while count > 0:
+        sent = os.sendfile(target.fileno(), source.fileno(), offset,
+                           min(count, COPY_BUFFER_SIZE))
+        if sent == 0:
+            break
+        offset += sent
+        count -= sent
+
+
+class Blob(NamedTuple):
+    r"""A stored file"""
+    name: str
+    size: int
+    content_type: str
+
+
+class StorageBackend(ABC):
+    r"""The interface of a storage engine.
+
+    Notes
+    -----
+    Do not use a StorageBackend directly, use `get_storage` to get the engine configured for the app.
+    """
+
+    @abstractmethod
+    def upload(self, name: str, file_obj, size: int, content_type: str):
+        r"""Stores a file.
+
+        Parameters
+        ----------
+        name : str
+            The name to store the file under
+        file_obj : file object
+            The file, read from its current position to the end
+        size : int
+            The number of bytes to read from `file_obj`
+        content_type : str
+        """
+        pass
+
+    @abstractmethod
+    def download(self,
+                 name: str,
+                 destination: str,
+                 start: Optional[int] = None,
+                 end: Optional[int] = None):
+        r"""Downloads a stored file, or a byte range of it, to the local filesystem.
+
+        Parameters
+        ----------
+        name : str
+        destination : str
+            The local path to write to
+        start : int, optional
+            The first byte to download, by default the start of the file
+        end : int, optional
+            The last byte to download (inclusive), by default the end of the file
+        """
+        pass
+
+    @abstractmethod
+    def sign_url(self, name: str, expiration: datetime) -> str:
+        r"""Returns a URL that gives read access to a stored file until `expiration` (UTC)."""
+        pass
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete(self, name: str):
+        pass
+
+
+class GCSStorage(StorageBackend):
+    r"""Stores files in a Google Cloud Storage bucket."""
+
+    def __init__(self, bucket_name: str, chunk_size: int = CHUNK_SIZE):
+        from google.cloud import storage
+
+        self.client = storage.Client()
+        self.bucket = self.client.bucket(bucket_name)
+        self.chunk_size = chunk_size
+
+    def __repr__(self):
+        return f"<GCSStorage {self.bucket.name}>"
+
+    def upload(self, name: str, file_obj, size: int, content_type: str):
+        blob = self.bucket.blob(
+            name,
+            chunk_size=self.chunk_size if size > self.chunk_size else None)
+        blob.upload_from_file(file_obj, size=size, content_type=content_type)
+
+    def download(self,
+                 name: str,
+                 destination: str,
+                 start: Optional[int] = None,
+                 end: Optional[int] = None):
+        self.bucket.blob(name).download_to_filename(destination,
+                                                    start=start,
+                                                    end=end)
+
+    def sign_url(self, name: str, expiration: datetime) -> str:
+        # Signed locally with the client's credentials, the blob's metadata is not fetched
+        return self.bucket.blob(name).generate_signed_url(
+            expiration=expiration)
+
+    def exists(self, name: str) -> bool:
+        return self.bucket.blob(name).exists()
+
+    def delete(self, name: str):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(name).delete()
+        except NotFound:
+            pass
+
+
+class LocalStorage(StorageBackend):
+    r"""Stores files in a directory on the local filesystem.
+
+    Signed URLs point to the `files` blueprint and carry an HMAC of the file name and expiration
+    time, made with the app's secret key.
+    """
+
+    def __init__(self, root: str, secret_key: str):
+        self.root = os.path.abspath(root)
+        self.secret_key = secret_key.encode("utf-8")
+        os.makedirs(self.root, exist_ok=True)
+
+    def __repr__(self):
+        return f"<LocalStorage {self.root}>"
+
+    def path(self, name: str) -> str:
+        r"""Returns the local path of a stored file, refusing names that escape the root."""
+        path = safe_join(self.root, name)
+        if path is None:
+            raise InvalidFormatException(
+                f"The file name {name} is not a valid storage name")
+
+        return path
+
+    def upload(self, name: str, file_obj, size: int, content_type: str):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Written to a temporary file first, so a half-written file is never served
+        temporary = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(temporary, "wb") as target:
+                shutil.copyfileobj(file_obj, target, COPY_BUFFER_SIZE)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def download(self,
+                 name: str,
+                 destination: str,
+                 start: Optional[int] = None,
+                 end: Optional[int] = None):
+        path = self.path(name)
+        start = start or 0
+        end = os.path.getsize(path) - 1 if end is None else end
+
+        with open(path, "rb") as source, open(destination, "wb") as target:
+            try:
+                _sendfile(source, target, start, end - start + 1)
+            except OSError:
+                # Some platforms can only sendfile to sockets
+                source.seek(start)
+                target.seek(0)
+                target.truncate(0)
+                target.write(source.read(end - start + 1))
+
+    def signature(self, name: str, expires: int) -> str:
+        return hmac.new(self.secret_key, f"{name}:{expires}".encode("utf-8"),
+                        hashlib.sha256).hexdigest()
+
+    def verify(self, name: str, expires: int, signature: str) -> bool:
+        r"""Checks that a signed URL is authentic and has not expired."""
+        return expires >= datetime.now(
+            timezone.utc).timestamp() and hmac.compare_digest(
+                self.signature(name, expires), signature)
+
+    def sign_url(self, name: str, expiration: datetime) -> str:
+        expires = int(expiration.replace(tzinfo=timezone.utc).timestamp())
+        return url_for(
+            "files.download",
+            filename=name,
+            expires=expires,
+            signature=self.signature(name, expires),
+            _external=True,
+        )
+
+    def exists(self, name: str) -> bool:
+        return os.path.isfile(self.path(name))
+
+    def delete(self, name: str):
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+
+def _create_storage() -> StorageBackend:
+    config = current_app.config
+    if config["STORAGE_BACKEND"] == "local":
+        return LocalStorage(config["LOCAL_STORAGE_PATH"], config["SECRET_KEY"])
+    if config["STORAGE_BACKEND"] == "gcs":
+        return GCSStorage(config["STORAGE_BUCKET"])
+
+    raise InvalidFormatException(
+        f"Unknown storage backend {config['STORAGE_BACKEND']}, expected 'gcs' or 'local'"
+    )
+
+
+# The storage engine of this worker
+_backend: PerProcess[StorageBackend] = PerProcess(_create_storage)
+
+
+def get_storage() -> StorageBackend:
+    r"""Returns the storage engine configured for the current app, created once per worker process.
+
+    Must be called within an app context.
+    """
+    return _backend.get()
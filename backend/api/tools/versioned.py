@@ -0,0 +1,204 @@
+r"""In-process indexes kept in sync across the workers with a shared log of their changes.
+
+Every worker builds its own index from the database on first use. Writers update the index of
+their worker in place, bump a counter in `db.counters`, and log what they changed (a kind and an
+id, e.g. ("course", "5f3...")) in `db.index_changes` under the new value of the counter. A daemon
+thread of every worker replays the changes made by the other workers since its version, reading
+only the changed documents again, and only rebuilds its whole index when it has fallen too far
+behind (the log is capped, so the oldest changes are dropped).
+"""
+import os
+import threading
+import time
+from typing import Callable
+from typing import Generic
+from typing import Optional
+from typing import TypeVar
+
+from api import db
+from api import root_logger as logger
+from pymongo import ASCENDING
+from pymongo import ReturnDocument
+
+T = TypeVar("T")
+
+# Seconds between two checks for changes made by other workers
+REFRESH_INTERVAL = 5
+
+# The most changes replayed at once, the index is rebuilt when it is further behind
+MAX_REPLAY = 1000
+
+
+class VersionedIndex(Generic[T]):
+    r"""An index of this worker, and the version of the data it was built from.
+
+    Parameters
+    ----------
+    counter_id : str
+        The `_id` of the counter of the data in `db.counters`
+    build : Callable[[], T]
+        Builds the index from the database
+    replay : Callable[[T, str, str], None]
+        Updates the index in place from the database after a change, given its kind and id
+    refresh_interval : int
+        Seconds between two checks for changes made by other workers
+    """
+
+    def __init__(self,
+                 counter_id: str,
+                 build: Callable[[], T],
+                 replay: Callable[[T, str, str], None],
+                 refresh_interval: int = REFRESH_INTERVAL):
+        self.counter_id = counter_id
+        self.build = build
+        self.replay = replay
+        self.refresh_interval = refresh_interval
+
+        self._index: Optional[T] = None
+        self._version: Optional[int] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _get_version(self) -> int:
+        counter = db.counters.find_one({"_id": self.counter_id}, {"value": 1})
+        return counter["value"] if counter else 0
+
+    def _load(self):
+        # Read first, so that a change made while building triggers another build
+        version = self._get_version()
+        return self.build(), version
+
+    def _rebuild(self):
+        index, version = self._load()
+        with self._lock:
+            self._index, self._version = index, version
+
+    def catch_up(self) -> bool:
+        r"""Replays the changes logged since the version of the index, in order.
+
+        The replay stops at the first change missing from the log: either its writer has not
+        logged it yet, and it is continued on the next call, or it was dropped from the log.
+
+        Returns
+        -------
+        bool
+            `False` if there are too many changes to replay
+        """
+        with self._lock:
+            version = self._version
+        latest = self._get_version()
+        if latest == version:
+            return True
+        if latest - version > MAX_REPLAY:
+            return False
+
+        changes = db.index_changes.find(
+            {
+                "index": self.counter_id,
+                "seq": {
+                    "$gt": version,
+                    "$lte": latest
+                }
+            }, {
+                "seq": 1,
+                "kind": 1,
+                "key": 1
+            }).sort("seq", ASCENDING)
+
+        for change in changes:
+            if change["seq"] != version + 1:
+                break
+
+            with self._lock:
+                if self._version != version:
+                    # Rebuilt, or caught up by a change of this worker in between
+                    break
+                self.replay(self._index, change["kind"], change["key"])
+                self._version = version = change["seq"]
+
+        return True
+
+    def _refresh(self):
+        pid = os.getpid()
+        # How many checks in a row could not replay anything while behind
+        stalled = 0
+        while self._pid == pid:
+            time.sleep(self.refresh_interval)
+            try:
+                with self._lock:
+                    version = self._version
+                if not self.catch_up():
+                    self._rebuild()
+                    stalled = 0
+                    continue
+
+                with self._lock:
+                    stuck = self._version == version
+                if stuck and self._get_version() != version:
+                    stalled += 1
+                else:
+                    stalled = 0
+
+                # A change still missing after a whole interval was dropped from the log (or its
+                # writer died before logging it)
+                if stalled > 1:
+                    self._rebuild()
+                    stalled = 0
+            except Exception as e:
+                logger.exception("Error while refreshing the %s index",
+                                 self.counter_id)
+
+    def get(self) -> T:
+        r"""Returns the index of this worker, built on first use."""
+        if self._pid == os.getpid():
+            return self._index
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._index, self._version = self._load()
+                self._pid = os.getpid()
+                threading.Thread(target=self._refresh,
+                                 name=f"{self.counter_id}-index",
+                                 daemon=True).start()
+
+        return self._index
+
+    def changed(self,
+                kind: str,
+                key: str,
+                update: Optional[Callable[[T], None]] = None):
+        r"""Applies a change to the index of this worker, and logs it for the other workers.
+
+        Parameters
+        ----------
+        kind, key : str
+            What changed, as passed to `replay` (e.g. "course" and its id)
+        update : Callable[[T], None], optional
+            Updates the index of this worker in place, by default with `replay`
+        """
+        with self._lock:
+            applied = self._pid == os.getpid()
+            if applied:
+                if update is None:
+                    self.replay(self._index, kind, key)
+                else:
+                    update(self._index)
+
+            counter = db.counters.find_one_and_update(
+                {"_id": self.counter_id},
+                {"$inc": {
+                    "value": 1
+                }},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            db.index_changes.insert_one({
+                "index": self.counter_id,
+                "seq": counter["value"],
+                "kind": kind,
+                "key": key,
+            })
+
+            # This worker's index is already up to date, unless someone else changed it in between
+            if applied and counter["value"] == self._version + 1:
+                self._version = counter["value"]
@@ -0,0 +1,4 @@
+r"""Benchmarks of the model layer and of the hot endpoints of the API.
+
+Run them with ``python -m benchmarks.run`` from the backend directory, see :mod:`benchmarks.run`.
+"""
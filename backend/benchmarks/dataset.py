@@ -0,0 +1,424 @@
+r"""Generates a synthetic school of production-like size, straight into a database.
+
+Usage, from the backend directory::
+
+    python -m benchmarks.dataset --mongo URI [--database gradder_scale] [--drop]
+                                 [--students 10000] [--teachers 600] [--courses 1500]
+                                 [--admins 2]
+                                 [--assignments 50] [--submissions 200000] [--seed 0]
+                                 [--now 2021-01-15T12:00:00]
+
+The same arguments always give the same school (ids and dates included, the term being centered on
+`--now`, a fixed date by default), written with unordered bulk inserts. Its shape follows what a school looks like rather than uniform randomness:
+
+- every teacher gives a few courses of their department, at different times;
+- students take 4 to 8 courses (6 on average), more often the popular ones, never two at the
+  same time;
+- students come in families of 1 to 3 children, with 1 or 2 parents (a few have none);
+- assignments are spread over the term, and only the ones already due have submissions, a few
+  of them late. Grades depend on the student, the difficulty of the course and some noise;
+- teachers and some students have a few personal calendar events;
+- a few admins manage the school.
+
+Every user has the password of the benchmark school, `benchmarks.fixtures.PASSWORD`.
+"""
+import argparse
+import math
+import random
+import sys
+from datetime import datetime
+from datetime import timedelta
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+from bcrypt import gensalt
+from bcrypt import hashpw
+from bson import ObjectId
+
+from benchmarks.fixtures import PASSWORD
+
+DEPARTMENTS = ["MAT", "SCI", "ENG", "HIS", "ART", "LAN", "CS", "PE"]
+# Meetings of the week, as (days, time): courses in different slots never overlap
+SLOTS = [(days, time) for days in ("MoWeFr", "TuTh")
+         for time in ("08:00-08:50", "09:00-09:50", "10:00-10:50",
+                      "11:00-11:50", "13:00-13:50", "14:00-14:50",
+                      "15:00-15:50")]
+
+# How many courses students take
+COURSES_PER_STUDENT = (4, 6, 8)
+# How many children families have, and how likely each is
+FAMILY_SIZES = ((1, 0.6), (2, 0.3), (3, 0.1))
+# How likely families are to have 0, 1 or 2 parents with an account
+PARENTS = ((0, 0.05), (1, 0.35), (2, 0.6))
+
+# The share of submissions that are graded, and that are late
+GRADED = 0.85
+LATE = 0.08
+
+# How many personal events teachers and students have on average, and how many students use it
+EVENTS_PER_USER = 3
+STUDENTS_WITH_EVENTS = 0.3
+
+# The length of the term, centered on now
+TERM = timedelta(days=120)
+# The default now (UTC), fixed so that a seed always gives the same school
+EPOCH = datetime(2021, 1, 15, 12)
+
+BATCH_SIZE = 1000
+
+FIRST_NAMES = [
+    "Alex", "Sam", "Jordan", "Taylor", "Morgan", "Casey", "Riley", "Jamie",
+    "Avery", "Quinn", "Charlie", "Drew", "Emerson", "Finley", "Harper",
+    "Hayden", "Kai", "Logan", "Parker", "Reese", "Rowan", "Sage", "Skyler"
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Lee", "Garcia", "Brown", "Nguyen", "Martin",
+    "Davis", "Lopez", "Wilson", "Anderson", "Thomas", "Moore", "Jackson",
+    "White", "Harris", "Clark", "Lewis", "Walker", "Young", "Allen", "King"
+]
+
+
+class Generator:
+    r"""Builds the documents of a school, deterministically from a seed."""
+
+    def __init__(self,
+                 students: int = 10000,
+                 teachers: int = 600,
+                 courses: int = 1500,
+                 assignments: int = 50,
+                 submissions: int = 200000,
+                 admins: int = 2,
+                 seed: int = 0,
+                 now: datetime = EPOCH):
+        self.students = students
+        self.teachers = teachers
+        self.courses = courses
+        self.assignments = assignments
+        self.submissions = submissions
+        self.admins = admins
+        self.random = random.Random(seed)
+        self.now = now.replace(microsecond=0)
+        self.start = self.now - TERM / 2
+        self.password = hashpw(PASSWORD.encode("utf-8"),
+                               gensalt(prefix=b"2b"))
+
+    def object_id(self, created: Optional[datetime] = None) -> ObjectId:
+        r"""A random but reproducible id, created at the start of the term by default."""
+        timestamp = int(((created or self.start) - datetime(1970, 1, 1)) /
+                        timedelta(seconds=1))
+        return ObjectId(
+            timestamp.to_bytes(4, "big") +
+            self.random.getrandbits(64).to_bytes(8, "big"))
+
+    def _weighted(self, choices) -> int:
+        values, weights = zip(*choices)
+        return self.random.choices(values, weights)[0]
+
+    def _user(self, kind: str, i: int) -> dict:
+        return {
+            "_id": self.object_id(),
+            "email": f"{kind}{i}@example.com",
+            "first_name": self.random.choice(FIRST_NAMES),
+            "last_name": self.random.choice(LAST_NAMES),
+            "password": self.password,
+            "activated": True,
+        }
+
+    def build_teachers(self) -> List[dict]:
+        return [
+            dict(self._user("teacher", i),
+                 courses=list(),
+                 department=DEPARTMENTS[i % len(DEPARTMENTS)])
+            for i in range(self.teachers)
+        ]
+
+    def build_courses(self, teachers: List[dict]) -> List[dict]:
+        r"""The courses, without students nor assignments yet.
+
+        Every teacher gives courses of their department, each in a slot they are free.
+        """
+        courses = list()
+        busy: Dict[int, set] = {i: set() for i in range(len(teachers))}
+        for i in range(self.courses):
+            index = i % len(teachers)
+            teacher = teachers[index]
+            free = [
+                slot for slot in range(len(SLOTS)) if slot not in busy[index]
+            ] or list(range(len(SLOTS)))
+            slot = self.random.choice(free)
+            busy[index].add(slot)
+
+            days, time = SLOTS[slot]
+            course_id = self.object_id()
+            courses.append({
+                "_id": course_id,
+                "department": teacher["department"],
+                "number": 100 + i,
+                "name": f"{teacher['department']} {100 + i}",
+                "teacher": str(teacher["_id"]),
+                "students": list(),
+                "description": f"Course {100 + i} of the {teacher['department']} department",
+                "schedule_days": days,
+                "schedule_time": time,
+                "assignments": list(),
+                "grade_range": [0, 100],
+                "revision": 0,
+                "calendar_revision": 0,
+                # Not stored: used to generate the rest
+                "slot": slot,
+                "difficulty": self.random.gauss(0, 4),
+            })
+            teacher["courses"].append(str(course_id))
+
+        return courses
+
+    def build_students(self, courses: List[dict]) -> List[dict]:
+        r"""The students, enrolled in courses without timetable conflicts."""
+        # Some courses are a lot more popular than others
+        popularity = [self.random.lognormvariate(0, 0.75) for _ in courses]
+
+        students = list()
+        for i in range(self.students):
+            student = dict(self._user("student", i),
+                           courses=list(),
+                           assignments=list(),
+                           parents=list(),
+                           ability=min(100, self.random.gauss(80, 8)))
+            low, mean, high = COURSES_PER_STUDENT
+            wanted = max(low, min(high, round(self.random.gauss(mean, 1))))
+
+            slots = set()
+            for _ in range(wanted * 4):
+                if len(student["courses"]) >= wanted:
+                    break
+
+                course = courses[self.random.choices(range(len(courses)),
+                                                     popularity)[0]]
+                if course["slot"] not in slots:
+                    slots.add(course["slot"])
+                    student["courses"].append(str(course["_id"]))
+                    course["students"].append(str(student["_id"]))
+
+            students.append(student)
+
+        return students
+
+    def build_parents(self, students: List[dict]) -> List[dict]:
+        r"""The parents of the students, grouped in families."""
+        parents = list()
+        i = 0
+        while i < len(students):
+            family = students[i:i + self._weighted(FAMILY_SIZES)]
+            i += len(family)
+
+            for _ in range(self._weighted(PARENTS)):
+                parent = self._user("parent", len(parents))
+                # `Parent` has no password nor activation
+                del parent["password"], parent["activated"]
+                parent["children"] = [str(child["_id"]) for child in family]
+                for child in family:
+                    child["parents"].append(str(parent["_id"]))
+                parents.append(parent)
+
+        return parents
+
+    def _grade(self, student: dict, course: dict) -> str:
+        if self.random.random() > GRADED:
+            return ""
+
+        grade = student["ability"] - course["difficulty"] + self.random.gauss(
+            0, 6)
+        return str(max(0, min(100, round(grade))))
+
+    def build_assignments(self, courses: List[dict],
+                          students: Dict[str, dict]):
+        r"""Adds the assignments and their submissions to the courses.
+
+        Assignments are due evenly over the term, and only those already due have submissions,
+        with the same chance for all, so that there are about `self.submissions` of them.
+        """
+        due_dates = [[
+            self.start + TERM * (j + self.random.random()) / self.assignments
+            for j in range(self.assignments)
+        ] for _ in courses]
+        possible = sum(
+            len(course["students"]) * sum(1 for due_by in dates
+                                          if due_by < self.now)
+            for course, dates in zip(courses, due_dates))
+        rate = min(1, self.submissions / possible) if possible else 0
+
+        for course, dates in zip(courses, due_dates):
+            for due_by in sorted(dates):
+                assignment_id = self.object_id(due_by - timedelta(days=7))
+                submissions = list()
+                if due_by < self.now:
+                    for student_id in course["students"]:
+                        if self.random.random() >= rate:
+                            continue
+
+                        if self.random.random() < LATE:
+                            submitted = due_by + timedelta(
+                                hours=self.random.expovariate(1 / 12))
+                        else:
+                            submitted = due_by - timedelta(
+                                hours=self.random.expovariate(1 / 24))
+                        submission_id = self.object_id(min(submitted, self.now))
+                        submissions.append({
+                            "_id": submission_id,
+                            "student_id": student_id,
+                            "date_submitted": submitted.replace(
+                                microsecond=0),
+                            "content": "Submission",
+                            "filenames": list(),
+                            "grade": self._grade(students[student_id], course),
+                        })
+                        students[student_id]["assignments"].append(
+                            f"{course['_id']}_{assignment_id}_{submission_id}")
+
+                course["assignments"].append({
+                    "_id": assignment_id,
+                    "title": f"Assignment {len(course['assignments']) + 1}",
+                    "date_assigned": due_by - timedelta(days=7),
+                    "assigned_by": course["teacher"],
+                    "assigned_to": str(course["_id"]),
+                    "due_by": due_by.replace(microsecond=0),
+                    "content": "Read the chapter and answer the questions.",
+                    "filenames": list(),
+                    "estimated_time": self.random.choice((15, 30, 45, 60, 90)),
+                    "submissions": submissions,
+                })
+
+    def build_events(self, users: Iterable[dict]) -> Iterator[dict]:
+        r"""The personal calendar events of some users."""
+        for user in users:
+            # About `EVENTS_PER_USER` on average
+            count = 0
+            threshold = math.exp(-EVENTS_PER_USER)
+            product = self.random.random()
+            while product > threshold:
+                count += 1
+                product *= self.random.random()
+
+            for _ in range(count):
+                start = self.start + timedelta(
+                    minutes=self.random.randrange(int(TERM.total_seconds()) //
+                                                  60))
+                start = start.replace(second=0, microsecond=0)
+                yield {
+                    "_id": self.object_id(),
+                    "owner_id": str(user["_id"]),
+                    "title": self.random.choice(
+                        ("Meeting", "Office hours", "Club", "Practice",
+                         "Appointment", "Study group")),
+                    "start": start,
+                    "end": start + timedelta(minutes=self.random.choice(
+                        (30, 60, 90))),
+                    "color": "",
+                    "url": "",
+                }
+
+    def generate(self) -> Dict[str, List[dict]]:
+        r"""Builds every document of the school, by collection."""
+        teachers = self.build_teachers()
+        courses = self.build_courses(teachers)
+        students = self.build_students(courses)
+        parents = self.build_parents(students)
+        self.build_assignments(
+            courses, {str(student["_id"]): student
+                      for student in students})
+
+        calendar_users = teachers + [
+            student for student in students
+            if self.random.random() < STUDENTS_WITH_EVENTS
+        ]
+        events = list(self.build_events(calendar_users))
+
+        # The fields that were only used to generate the school
+        for teacher in teachers:
+            del teacher["department"]
+        for course in courses:
+            del course["slot"], course["difficulty"]
+        for student in students:
+            del student["ability"]
+
+        return {
+            "admins": [self._user("admin", i) for i in range(self.admins)],
+            "teachers": teachers,
+            "courses": courses,
+            "students": students,
+            "parents": parents,
+            "events": events,
+        }
+
+
+def _batches(documents: List[dict]) -> Iterator[List[dict]]:
+    for i in range(0, len(documents), BATCH_SIZE):
+        yield documents[i:i + BATCH_SIZE]
+
+
+def write(database, school: Dict[str, List[dict]], drop: bool = False):
+    r"""Writes a school to a database, with unordered bulk inserts."""
+    for collection, documents in school.items():
+        if drop:
+            database[collection].drop()
+
+        for batch in _batches(documents):
+            database[collection].insert_many(batch, ordered=False)
+        print(f"{collection}: {len(documents)} documents", flush=True)
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Writes a synthetic school to a database")
+    parser.add_argument("--mongo",
+                        required=True,
+                        help="A MongoDB connection string")
+    parser.add_argument("--database", default="gradder_scale")
+    parser.add_argument("--drop",
+                        action="store_true",
+                        help="Drop the collections before writing to them")
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--teachers", type=int, default=600)
+    parser.add_argument("--courses", type=int, default=1500)
+    parser.add_argument("--assignments",
+                        type=int,
+                        default=50,
+                        help="Assignments per course")
+    parser.add_argument("--submissions",
+                        type=int,
+                        default=200000,
+                        help="About how many submissions in total")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--now",
+        type=datetime.fromisoformat,
+        default=EPOCH,
+        help="The middle of the term, in UTC (e.g. 2021-01-15T12:00:00)")
+    arguments = parser.parse_args(arguments)
+
+    from pymongo import MongoClient
+
+    generator = Generator(
+        students=arguments.students,
+        teachers=arguments.teachers,
+        courses=arguments.courses,
+        assignments=arguments.assignments,
+        submissions=arguments.submissions,
+        admins=arguments.admins,
+        seed=arguments.seed,
+        now=arguments.now,
+    )
+    school = generator.generate()
+    write(
+        MongoClient(arguments.mongo).get_database(arguments.database),
+        school, arguments.drop)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+r"""A small school written straight to the database, for the benchmarks.
+
+Every user has the same password, `PASSWORD`, which is hashed once.
+"""
+import random
+from datetime import datetime
+from datetime import timedelta
+from typing import NamedTuple
+
+from bcrypt import gensalt
+from bcrypt import hashpw
+from bson import ObjectId
+
+PASSWORD = "benchmark-password"
+
+DEPARTMENTS = ["MAT", "SCI", "ENG", "HIS", "ART"]
+SCHEDULES = [("MoWeFr", "09:00-09:50"), ("TuTh", "10:00-11:15"),
+             ("MoWe", "13:00-14:15"), ("Fr", "15:00-16:30")]
+
+
+class School(NamedTuple):
+    r"""The documents of the benchmark school."""
+
+    teachers: list
+    students: list
+    courses: list
+
+
+def _user(kind: str, i: int, password: bytes) -> dict:
+    return {
+        "_id": ObjectId(),
+        "email": f"{kind}{i}@example.com",
+        "first_name": f"First{i}",
+        "last_name": f"{kind.capitalize()}{i}",
+        "password": password,
+        "courses": list(),
+        "activated": True,
+    }
+
+
+def _assignment(teacher_id: str, course_id: str, now: datetime,
+                random_: random.Random, students: list) -> dict:
+    due_by = now + timedelta(days=random_.randint(-30, 30))
+    submissions = [{
+        "_id": ObjectId(),
+        "student_id": str(student["_id"]),
+        "date_submitted": due_by - timedelta(hours=random_.randint(1, 72)),
+        "content": "Submission",
+        "filenames": list(),
+        "grade": str(random_.randint(50, 100)) if random_.random() < 0.7 else "",
+    } for student in students if due_by < now and random_.random() < 0.8]
+
+    return {
+        "_id": ObjectId(),
+        "title": f"Assignment {random_.randint(1, 10 ** 6)}",
+        "date_assigned": due_by - timedelta(days=7),
+        "assigned_by": teacher_id,
+        "assigned_to": course_id,
+        "due_by": due_by,
+        "content": "Read the chapter and answer the questions.",
+        "filenames": list(),
+        "estimated_time": 60,
+        "submissions": submissions,
+    }
+
+
+def build(students: int = 200,
+          teachers: int = 10,
+          courses: int = 20,
+          assignments: int = 10,
+          class_size: int = 25,
+          seed: int = 0) -> School:
+    r"""Builds the documents of a school, the same ones for the same arguments."""
+    random_ = random.Random(seed)
+    password = hashpw(PASSWORD.encode("utf-8"), gensalt(prefix=b"2b"))
+    now = datetime.utcnow().replace(microsecond=0)
+
+    teacher_documents = [
+        _user("teacher", i, password) for i in range(teachers)
+    ]
+    student_documents = [
+        dict(_user("student", i, password), assignments=list(), parents=list())
+        for i in range(students)
+    ]
+
+    course_documents = list()
+    for i in range(courses):
+        teacher = teacher_documents[i % teachers]
+        enrolled = random_.sample(student_documents,
+                                  min(class_size, students))
+        days, time = SCHEDULES[i % len(SCHEDULES)]
+        course_id = ObjectId()
+
+        course_documents.append({
+            "_id": course_id,
+            "department": DEPARTMENTS[i % len(DEPARTMENTS)],
+            "number": 100 + i,
+            "name": f"Course {i}",
+            "teacher": str(teacher["_id"]),
+            "students": [str(student["_id"]) for student in enrolled],
+            "description": "A course of the benchmark school",
+            "schedule_days": days,
+            "schedule_time": time,
+            "assignments": [
+                _assignment(str(teacher["_id"]), str(course_id), now,
+                            random_, enrolled) for _ in range(assignments)
+            ],
+            "grade_range": [0, 100],
+            "revision": 0,
+        })
+
+        teacher["courses"].append(str(course_id))
+        for student in enrolled:
+            student["courses"].append(str(course_id))
+
+    return School(teacher_documents, student_documents, course_documents)
+
+
+def seed(db, school: School):
+    r"""Replaces the users and courses of a database with those of a school."""
+    for collection, documents in ((db.teachers, school.teachers),
+                                  (db.students, school.students),
+                                  (db.courses, school.courses)):
+        collection.delete_many({})
+        if documents:
+            collection.insert_many(documents)
@@ -0,0 +1,571 @@
+r"""Replays the traffic of a busy school day against the app, and reports the latency per endpoint.
+
+Usage, from the backend directory::
+
+    python -m benchmarks.load [--url http://localhost:8000 | --mongo URI]
+                              [--profile everyday] [--mix student=0.7,teacher=0.3]
+                              [--rate 5] [--duration 60] [--think 2] [--concurrency 64]
+                              [--students N] [--teachers N] [--admins N]
+                              [--seed 0] [--output load.json]
+
+Virtual users arrive at random (a Poisson process of `--rate` users per second) for `--duration`
+seconds, and each of them runs the scenario of their role, chosen with the weights of `--mix`:
+
+- `login`: a student logs in and opens the dashboard, as at 8 a.m.;
+- `student`: a student logs in, checks their assignments a few times and submits one;
+- `teacher`: a teacher logs in, opens their courses and a gradebook and grades submissions;
+- `admin`: an admin logs in and imports a few students.
+
+Users wait `--think` seconds on average between two requests. The `--profile` gives the mix,
+the rate and the think time of a typical day (see `PROFILES`), which the other options override.
+
+With `--url`, the requests go over HTTP to a server started separately (e.g. gunicorn with the
+worker and thread counts to size), whose database was filled by :mod:`benchmarks.dataset` with at
+least `--students`, `--teachers` and `--admins` users; its mail should be suppressed
+(`MAIL_SUPPRESS_SEND`), since the admins create accounts. Otherwise the app runs in this process,
+on the small school of :mod:`benchmarks.fixtures` (see :mod:`benchmarks.run` for `--mongo`).
+
+The latency percentiles (p50, p95 and p99, in seconds), the throughput and the errors of every
+endpoint are printed, and written as JSON with `--output`.
+"""
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookies import SimpleCookie
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from urllib.parse import urlencode
+from urllib.parse import urlsplit
+
+from benchmarks import fixtures
+
+FORMAT_VERSION = 1
+
+# The mix of scenarios, users per second and think time (in seconds) of typical days
+PROFILES = {
+    "everyday": {
+        "mix": {
+            "student": 0.7,
+            "teacher": 0.2,
+            "login": 0.08,
+            "admin": 0.02
+        },
+        "rate": 2.0,
+        "think": 5.0,
+    },
+    # Everyone logs in at 8 a.m.
+    "login-storm": {
+        "mix": {
+            "login": 0.9,
+            "teacher": 0.1
+        },
+        "rate": 30.0,
+        "think": 1.0,
+    },
+    # Every student submits before 11:59 p.m.
+    "submission-rush": {
+        "mix": {
+            "student": 1.0
+        },
+        "rate": 15.0,
+        "think": 2.0,
+    },
+    # Teachers grade everything in report card week
+    "report-cards": {
+        "mix": {
+            "teacher": 0.8,
+            "student": 0.2
+        },
+        "rate": 3.0,
+        "think": 3.0,
+    },
+}
+
+# How many times students check their assignments per visit, and teachers grade
+POLLS = (1, 4)
+GRADES = (3, 10)
+IMPORTS = (2, 5)
+
+
+class Recorder:
+    r"""The latency and outcome of every request, by endpoint."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = dict()
+        self.errors: Dict[str, int] = dict()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, latency: float, failed: bool):
+        with self._lock:
+            self.latencies.setdefault(endpoint, list()).append(latency)
+            if failed:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def report(self, duration: float) -> Dict[str, dict]:
+        r"""The percentiles, the throughput and the errors of every endpoint, and of all of them."""
+        with self._lock:
+            latencies = {
+                endpoint: list(values)
+                for endpoint, values in self.latencies.items()
+            }
+            errors = dict(self.errors)
+
+        latencies["all"] = [
+            latency for values in latencies.values() for latency in values
+        ]
+        errors["all"] = sum(errors.values())
+
+        return {
+            endpoint: _summarize(values, errors.get(endpoint, 0), duration)
+            for endpoint, values in sorted(latencies.items())
+        }
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def _summarize(latencies: List[float], errors: int, duration: float) -> dict:
+    latencies = sorted(latencies)
+    summary = {
+        "unit": "seconds",
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / duration if duration else None,
+    }
+    if latencies:
+        summary.update(p50=_percentile(latencies, 0.5),
+                       p95=_percentile(latencies, 0.95),
+                       p99=_percentile(latencies, 0.99),
+                       max=latencies[-1])
+
+    return summary
+
+
+class HTTPClient:
+    r"""Sends requests over a kept-alive connection, with the cookies of one user."""
+
+    def __init__(self, url: str):
+        url = urlsplit(url)
+        connection = (http.client.HTTPSConnection if url.scheme == "https"
+                      else http.client.HTTPConnection)
+        self.connection = connection(url.netloc, timeout=60)
+        self.prefix = url.path.rstrip("/")
+        self.cookies = SimpleCookie()
+
+    def send(self,
+             method: str,
+             path: str,
+             json_body: dict = None,
+             form: dict = None) -> Tuple[int, Optional[dict]]:
+        headers = dict()
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body)
+            headers["Content-Type"] = "application/json"
+        elif form is not None:
+            body = urlencode(form)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                f"{name}={morsel.value}"
+                for name, morsel in self.cookies.items())
+
+        try:
+            self.connection.request(method,
+                                    self.prefix + path,
+                                    body=body,
+                                    headers=headers)
+            reply = self.connection.getresponse()
+            data = reply.read()
+        except (OSError, http.client.HTTPException):
+            # The server closed the connection, it is opened again by the next request
+            self.connection.close()
+            raise
+
+        for header in reply.headers.get_all("Set-Cookie") or []:
+            self.cookies.load(header)
+
+        try:
+            return reply.status, json.loads(data)
+        except ValueError:
+            return reply.status, None
+
+    def close(self):
+        self.connection.close()
+
+
+class AppClient:
+    r"""Sends requests to an app running in this process, with the cookies of one user."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def send(self,
+             method: str,
+             path: str,
+             json_body: dict = None,
+             form: dict = None) -> Tuple[int, Optional[dict]]:
+        reply = self.client.open(path,
+                                 method=method,
+                                 json=json_body,
+                                 data=form)
+        return reply.status_code, reply.get_json(silent=True)
+
+    def close(self):
+        pass
+
+
+class User:
+    r"""A virtual user: their client, and how they wait between requests."""
+
+    def __init__(self, client, recorder: Recorder, random_: random.Random,
+                 think: float):
+        self.client = client
+        self.recorder = recorder
+        self.random = random_
+        self.think = think
+
+    def send(self,
+             endpoint: str,
+             method: str,
+             path: str,
+             json_body: dict = None,
+             form: dict = None) -> Optional[dict]:
+        r"""Sends a request and records its latency under `endpoint`.
+
+        Returns the JSON body of the reply, `None` if the request failed.
+        """
+        start = time.perf_counter()
+        try:
+            status, body = self.client.send(method, path, json_body, form)
+        except (OSError, http.client.HTTPException):
+            status, body = None, None
+        self.recorder.record(endpoint,
+                             time.perf_counter() - start, status is None
+                             or status >= 400)
+
+        return body if status is not None and status < 400 else None
+
+    def wait(self):
+        if self.think:
+            time.sleep(self.random.expovariate(1 / self.think))
+
+    def login(self, email: str) -> bool:
+        return self.send("POST /api/auth/login",
+                         "POST",
+                         "/api/auth/login",
+                         json_body={
+                             "email": email,
+                             "password": fixtures.PASSWORD,
+                             "remember_me": False
+                         }) is not None
+
+
+def _id(document: dict) -> Optional[str]:
+    identifier = document.get("id") or document.get("_id")
+    if isinstance(identifier, dict):
+        # Extended JSON
+        identifier = identifier.get("$oid")
+    return str(identifier) if identifier else None
+
+
+# Every scenario, by name: functions `scenario(user, accounts)` running the visit of one user
+SCENARIOS: Dict[str, Callable] = dict()
+
+
+def scenario(name: str):
+    def decorator(function):
+        SCENARIOS[name] = function
+        return function
+
+    return decorator
+
+
+@scenario("login")
+def login_scenario(user: User, accounts: "Accounts"):
+    if user.login(accounts.student(user.random)):
+        user.wait()
+        user.send("GET /api/student/dashboard", "GET",
+                  "/api/student/dashboard")
+
+
+@scenario("student")
+def student_scenario(user: User, accounts: "Accounts"):
+    if not user.login(accounts.student(user.random)):
+        return
+
+    assignments = list()
+    for _ in range(user.random.randint(*POLLS)):
+        user.wait()
+        body = user.send("GET /api/student/assignments", "GET",
+                         "/api/student/assignments")
+        if body is not None:
+            assignments = body.get("assignments") or list()
+
+    assignments = [
+        assignment for assignment in assignments
+        if _id(assignment) and assignment.get("assigned_to")
+    ]
+    if assignments:
+        assignment = user.random.choice(assignments)
+        user.wait()
+        user.send(
+            "POST /api/student/submit/<course_id>/<assignment_id>",
+            "POST",
+            f"/api/student/submit/{assignment['assigned_to']}/{_id(assignment)}",
+            form={"content": "Load test submission"})
+
+
+@scenario("teacher")
+def teacher_scenario(user: User, accounts: "Accounts"):
+    if not user.login(accounts.teacher(user.random)):
+        return
+
+    user.wait()
+    body = user.send("GET /api/teacher/courses", "GET",
+                     "/api/teacher/courses")
+    courses = [course for course in (body or {}).get("courses") or []
+               if course.get("id")]
+    if not courses:
+        return
+
+    course = user.random.choice(courses)
+    user.wait()
+    user.send("GET /api/teacher/course/<course_id>/gradebook", "GET",
+              f"/api/teacher/course/{course['id']}/gradebook")
+
+    submissions = [(_id(assignment), _id(submission))
+                   for assignment in course.get("assignments") or []
+                   for submission in assignment.get("submissions") or []
+                   if _id(assignment) and _id(submission)]
+    user.random.shuffle(submissions)
+    for assignment_id, submission_id in submissions[:user.random.randint(
+            *GRADES)]:
+        user.wait()
+        user.send(
+            "POST /api/teacher/course/<course_id>/assignments/<assignment_id>"
+            "/submissions/<submission_id>",
+            "POST",
+            f"/api/teacher/course/{course['id']}/assignments/{assignment_id}"
+            f"/submissions/{submission_id}",
+            form={"grade": str(user.random.randint(60, 100))})
+
+
+@scenario("admin")
+def admin_scenario(user: User, accounts: "Accounts"):
+    if not user.login(accounts.admin(user.random)):
+        return
+
+    for _ in range(user.random.randint(*IMPORTS)):
+        user.wait()
+        user.send("POST /api/admin/add-student",
+                  "POST",
+                  "/api/admin/add-student",
+                  form={
+                      "email": f"load-{uuid.uuid4().hex}@example.com",
+                      "first_name": "Load",
+                      "last_name": "Test",
+                      "password": fixtures.PASSWORD,
+                  })
+
+
+class Accounts:
+    r"""The emails of the users to log in as, numbered as in the benchmark schools."""
+
+    def __init__(self, students: int, teachers: int, admins: int):
+        self.students = students
+        self.teachers = teachers
+        self.admins = admins
+
+    def student(self, random_: random.Random) -> str:
+        return f"student{random_.randrange(self.students)}@example.com"
+
+    def teacher(self, random_: random.Random) -> str:
+        return f"teacher{random_.randrange(self.teachers)}@example.com"
+
+    def admin(self, random_: random.Random) -> str:
+        return f"admin{random_.randrange(self.admins)}@example.com"
+
+
+def run(new_client: Callable[[], object],
+        accounts: Accounts,
+        mix: Dict[str, float],
+        rate: float,
+        duration: float,
+        think: float,
+        concurrency: int = 64,
+        seed: int = 0) -> Tuple[Recorder, float]:
+    r"""Starts users at random for `duration` seconds, and waits for all of them to finish.
+
+    Returns what was recorded, and how long it took in seconds.
+    """
+    random_ = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    recorder = Recorder()
+
+    def visit(name: str, user_seed: int):
+        client = new_client()
+        user = User(client, recorder, random.Random(user_seed), think)
+        try:
+            SCENARIOS[name](user, accounts)
+        except Exception as e:
+            recorder.record(f"{name}: {type(e).__name__}", 0, True)
+        finally:
+            client.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        arrival = start
+        while True:
+            arrival += random_.expovariate(rate)
+            if arrival - start >= duration:
+                break
+
+            time.sleep(max(0, arrival - time.perf_counter()))
+            executor.submit(visit,
+                            random_.choices(names, weights)[0],
+                            random_.getrandbits(32))
+
+    return recorder, time.perf_counter() - start
+
+
+def _parse_mix(value: str) -> Dict[str, float]:
+    mix = dict()
+    for pair in value.split(","):
+        name, _, weight = pair.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown scenario {name!r}, choose from {', '.join(SCENARIOS)}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight {weight!r}")
+
+    return mix
+
+
+def _app_clients(mongo: Optional[str], database: str):
+    r"""A testing app on the small benchmark school, with an admin, and the size of the school."""
+    import api
+    from benchmarks.run import setup
+
+    context = setup(mongo, database, quick=False)
+    admin = fixtures._user("admin", 0, context.student["password"])
+    del admin["courses"]
+    api.db.admins.delete_many({})
+    api.db.admins.insert_one(admin)
+
+    accounts = Accounts(len(context.school.students),
+                        len(context.school.teachers), 1)
+    return (lambda: AppClient(context.app)), accounts
+
+
+def _describe(endpoint: str, result: dict) -> str:
+    if not result["requests"] or "p50" not in result:
+        return f"{endpoint:<88} {result['errors']:>6} errors"
+
+    return (f"{endpoint:<88} {result['requests']:>7} {result['errors']:>6} "
+            f"{result['throughput']:>8.2f} "
+            f"{result['p50'] * 1000:>9.1f} {result['p95'] * 1000:>9.1f} "
+            f"{result['p99'] * 1000:>9.1f}")
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Replays the traffic of a busy day against the app")
+    parser.add_argument("--url",
+                        help="The server to load, the app runs in-process if unset")
+    parser.add_argument(
+        "--mongo",
+        help="In-process, a MongoDB connection string (in-memory if unset)")
+    parser.add_argument("--database", default="gradder_benchmark")
+    parser.add_argument("--profile", choices=PROFILES, default="everyday")
+    parser.add_argument("--mix",
+                        type=_parse_mix,
+                        help="Weights of the scenarios, e.g. student=0.7,teacher=0.3")
+    parser.add_argument("--rate",
+                        type=float,
+                        help="Users arriving per second")
+    parser.add_argument("--think",
+                        type=float,
+                        help="Mean time between the requests of a user, in seconds")
+    parser.add_argument("--duration",
+                        type=float,
+                        default=60,
+                        help="How long users keep arriving, in seconds")
+    parser.add_argument("--concurrency",
+                        type=int,
+                        default=64,
+                        help="The most users at the same time")
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--teachers", type=int, default=600)
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Where to write the results as JSON")
+    arguments = parser.parse_args(arguments)
+
+    profile = PROFILES[arguments.profile]
+    mix = arguments.mix or profile["mix"]
+    rate = arguments.rate if arguments.rate is not None else profile["rate"]
+    think = arguments.think if arguments.think is not None else profile[
+        "think"]
+
+    if arguments.url:
+        url = arguments.url
+        new_client = lambda: HTTPClient(url)
+        accounts = Accounts(arguments.students, arguments.teachers,
+                            arguments.admins)
+    else:
+        new_client, accounts = _app_clients(arguments.mongo,
+                                            arguments.database)
+
+    recorder, duration = run(new_client, accounts, mix, rate,
+                             arguments.duration, think, arguments.concurrency,
+                             arguments.seed)
+    results = recorder.report(duration)
+
+    print(f"{'endpoint':<88} {'requests':>7} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, result in results.items():
+        print(_describe(endpoint, result))
+
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(
+                {
+                    "format": FORMAT_VERSION,
+                    "meta": {
+                        "date": datetime.utcnow().isoformat() + "Z",
+                        "target": arguments.url or "in-process",
+                        "profile": arguments.profile,
+                        "mix": mix,
+                        "rate": rate,
+                        "think": think,
+                        "duration": duration,
+                        "concurrency": arguments.concurrency,
+                        "seed": arguments.seed,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+                sort_keys=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,542 @@
+r"""Runs the benchmarks, and compares them with a baseline.
+
+Usage, from the backend directory::
+
+    python -m benchmarks.run [--mongo URI] [--output results.json]
+                             [--baseline baseline.json] [--threshold 0.15]
+                             [--quick] [--only PREFIX]
+
+The benchmarks run against an in-memory stand-in of MongoDB (mongomock, which has to be
+installed) unless `--mongo` points to a server, in which case the `gradder_benchmark` database
+(see `--database`) is dropped and filled with a small school (see :mod:`benchmarks.fixtures`).
+
+The results are printed and written as JSON: for every benchmark, the time per operation over
+several rounds (`median`, `min`, `p95`, in seconds), the operations per second and, for the
+endpoints, the database commands issued per request (only counted against a server, `null`
+in-memory). With `--baseline`, the median of every
+benchmark is compared with the one in a previous results file, and the command exits with 1 if
+one of them got slower by more than `--threshold` (a fraction, 0.15 by default), or fails while
+it passed in the baseline.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from datetime import timedelta
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+
+from benchmarks import fixtures
+
+FORMAT_VERSION = 1
+
+
+class Benchmark(NamedTuple):
+    name: str
+    function: Callable
+    # Operations per round, or objects kept for the memory benchmarks
+    iterations: int
+    # "seconds" per operation, or "bytes" per object
+    unit: str = "seconds"
+
+
+# Every benchmark, in the order they run
+BENCHMARKS: List[Benchmark] = list()
+
+
+def benchmark(name: str, iterations: int = 1000, unit: str = "seconds"):
+    r"""Registers a function `function(context)` that returns what to time, as a benchmark.
+
+    With `unit="bytes"`, what it returns creates an object, and the memory kept by `iterations`
+    of them is measured instead.
+    """
+
+    def decorator(function):
+        BENCHMARKS.append(Benchmark(name, function, iterations, unit))
+        return function
+
+    return decorator
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def measure(operation: Callable[[], object], iterations: int,
+            rounds: int) -> dict:
+    r"""Times an operation, `iterations` times per round, after a warm-up round."""
+    for _ in range(max(1, iterations // 10)):
+        operation()
+
+    timings = list()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            operation()
+        timings.append((time.perf_counter() - start) / iterations)
+
+    median = statistics.median(timings)
+    return {
+        "unit": "seconds",
+        "iterations": iterations,
+        "rounds": rounds,
+        "median": median,
+        "min": min(timings),
+        "p95": _percentile(timings, 0.95),
+        "ops_per_second": 1 / median if median else None,
+    }
+
+
+def measure_memory(create: Callable[[], object], count: int,
+                   rounds: int) -> dict:
+    r"""Measures the memory kept by `count` objects, in bytes per object."""
+    sizes = list()
+    for _ in range(rounds):
+        tracemalloc.start()
+        try:
+            objects = [create() for _ in range(count)]
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        sizes.append(size / count)
+        del objects
+
+    return {
+        "unit": "bytes",
+        "objects": count,
+        "rounds": rounds,
+        "median": statistics.median(sizes),
+        "min": min(sizes),
+    }
+
+
+class Context:
+    r"""The app, its test clients and the school the benchmarks run on."""
+
+    def __init__(self,
+                 app,
+                 school: fixtures.School,
+                 counts_queries: bool = True):
+        self.app = app
+        self.school = school
+        # The commands are counted by pymongo listeners, which mongomock does not call
+        self.counts_queries = counts_queries
+        self.student = school.students[0]
+        self.teacher = school.teachers[0]
+
+        self.student_client = self.login(self.student["email"])
+        self.teacher_client = self.login(self.teacher["email"])
+
+    def login(self, email: str):
+        client = self.app.test_client()
+        reply = client.post("/api/auth/login",
+                            json={
+                                "email": email,
+                                "password": fixtures.PASSWORD,
+                                "remember_me": False
+                            })
+        if reply.status_code != 200:
+            raise RuntimeError(
+                f"Could not log in as {email}: {reply.status_code}")
+
+        return client
+
+
+def request(send: Callable[[], object]) -> Callable[[], object]:
+    r"""Wraps a request, so that it fails loudly instead of being timed when it fails."""
+
+    def operation():
+        reply = send()
+        if reply.status_code >= 400:
+            raise RuntimeError(
+                f"{reply.status_code}: {reply.get_data(as_text=True)[:200]}")
+        return reply
+
+    return operation
+
+
+def _queries(reply) -> Optional[int]:
+    from api.tools.queries import HEADER
+
+    stats = dict(
+        pair.strip().split("=", 1)
+        for pair in reply.headers.get(HEADER, "").split(";") if "=" in pair)
+    return int(stats["commands"]) if "commands" in stats else None
+
+
+@benchmark("hydration.student.from_dict", iterations=2000)
+def student_from_dict(context):
+    from api.classes import Student
+
+    document = context.student
+    return lambda: Student.from_dict(dict(document))
+
+
+@benchmark("hydration.teacher.from_dict", iterations=2000)
+def teacher_from_dict(context):
+    from api.classes import Teacher
+
+    document = context.teacher
+    return lambda: Teacher.from_dict(dict(document))
+
+
+@benchmark("hydration.course.from_dict", iterations=50)
+def course_from_dict(context):
+    from api.classes import Course
+
+    document = context.school.courses[0]
+    return lambda: Course.from_dict(dict(document))
+
+
+@benchmark("hydration.student._from_db", iterations=20000)
+def student_from_db(context):
+    from api.classes import Student
+
+    document = context.student
+    return lambda: Student._from_db(document)
+
+
+@benchmark("hydration.teacher._from_db", iterations=20000)
+def teacher_from_db(context):
+    from api.classes import Teacher
+
+    document = context.teacher
+    return lambda: Teacher._from_db(document)
+
+
+@benchmark("hydration.course._from_db", iterations=2000)
+def course_from_db(context):
+    from api.classes import Course
+
+    document = context.school.courses[0]
+    return lambda: Course._from_db(document)
+
+
+@benchmark("memory.student._from_db", iterations=2000, unit="bytes")
+def student_memory(context):
+    from api.classes import Student
+
+    document = context.student
+    return lambda: Student._from_db(document)
+
+
+@benchmark("memory.course._from_db", iterations=200, unit="bytes")
+def course_memory(context):
+    from api.classes import Course
+
+    document = context.school.courses[0]
+    return lambda: Course._from_db(document)
+
+
+@benchmark("validation.course.setters", iterations=20)
+def course_setters(context):
+    from api.classes import Course
+
+    course = Course._from_db(context.school.courses[0])
+    documents = context.school.courses
+
+    def validate():
+        for document in documents:
+            course.name = document["name"]
+            course.description = document.get("description", "Description")
+            course.schedule_time = document.get("schedule_time", "")
+
+    return validate
+
+
+@benchmark("validation.course.errors", iterations=20)
+def course_errors(context):
+    from api.classes import Course
+
+    documents = context.school.courses
+    return lambda: Course.SCHEMA.errors(documents)
+
+
+@benchmark("serialization.student", iterations=2000)
+def student_serialization(context):
+    from api.classes import Student
+    from api.tools.encoder import JSONImproved
+
+    student = Student.from_dict(dict(context.student))
+    return lambda: json.dumps(student.to_dict(), cls=JSONImproved)
+
+
+@benchmark("serialization.course", iterations=200)
+def course_serialization(context):
+    from api.classes import Course
+    from api.tools.encoder import JSONImproved
+
+    course = Course.from_dict(dict(context.school.courses[0]))
+    return lambda: json.dumps(course.to_dict(), cls=JSONImproved)
+
+
+def _submissions(context) -> list:
+    return [
+        submission for course in context.school.courses
+        for assignment in course["assignments"]
+        for submission in assignment["submissions"]
+    ]
+
+
+@benchmark("search.get", iterations=200)
+def search_get(context):
+    from api.tools.search import get
+
+    submissions = _submissions(context)
+    # The last one, so that the whole list is scanned
+    student_id = submissions[-1]["student_id"] if submissions else ""
+    return lambda: get(submissions, student_id=student_id, grade__ne="")
+
+
+@benchmark("search.get_all", iterations=200)
+def search_get_all(context):
+    from api.tools.search import get_all
+
+    submissions = _submissions(context)
+    return lambda: get_all(submissions,
+                           order_by=["-grade", "date_submitted"],
+                           grade__ne="")
+
+
+@benchmark("query.due_this_week", iterations=50)
+def due_this_week(context):
+    from api.tools.deadlines import due_between
+
+    now = datetime.utcnow()
+    return lambda: due_between(now, now + timedelta(days=7))
+
+
+@benchmark("query.submitted_late", iterations=20)
+def submitted_late(context):
+    from api.tools.deadlines import submitted_between
+
+    now = datetime.utcnow()
+    return lambda: submitted_between(now - timedelta(days=30), now, late=True)
+
+
+@benchmark("endpoint.auth.login", iterations=5)
+def login(context):
+    body = {
+        "email": context.student["email"],
+        "password": fixtures.PASSWORD,
+        "remember_me": False,
+    }
+    # A new client every time, since logged in clients are not checked again
+    return request(lambda: context.app.test_client().post("/api/auth/login",
+                                                          json=body))
+
+
+@benchmark("endpoint.student.assignments", iterations=20)
+def student_assignments(context):
+    client = context.student_client
+    return request(lambda: client.get("/api/student/assignments"))
+
+
+@benchmark("endpoint.teacher.courses", iterations=10)
+def teacher_courses(context):
+    client = context.teacher_client
+    return request(lambda: client.get("/api/teacher/courses"))
+
+
+@benchmark("endpoint.student.submit", iterations=20)
+def student_submit(context):
+    client = context.student_client
+    course = next(course for course in context.school.courses
+                  if str(context.student["_id"]) in course["students"])
+    url = (f"/api/student/submit/{course['_id']}/"
+           f"{course['assignments'][0]['_id']}")
+    return request(lambda: client.post(url, data={"content": "Benchmark"}))
+
+
+def _database(mongo: Optional[str], name: str):
+    if mongo is None:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit(
+                "The in-memory database needs mongomock (pip install mongomock), "
+                "or run against a server with --mongo")
+
+        return mongomock.MongoClient().get_database(name)
+
+    from api.tools.metrics import command_metrics
+    from api.tools.queries import query_counter
+    from pymongo import MongoClient
+
+    client = MongoClient(mongo,
+                         event_listeners=[query_counter, command_metrics])
+    client.drop_database(name)
+    return client.get_database(name)
+
+
+def setup(mongo: Optional[str], database: str, quick: bool) -> Context:
+    r"""Creates a testing app on the benchmark database, filled with a small school."""
+    from api import create_app
+
+    app = create_app("testing")
+    # The benchmarks measure the N+1 queries, they do not fail on them
+    app.config["QUERY_BUDGET_STRICT"] = False
+    app.config["QUERY_STATS_HEADER"] = True
+    app.config["LOCAL_STORAGE_PATH"] = tempfile.mkdtemp(
+        prefix="gradder-benchmark-")
+    app.app_context().push()
+
+    import api
+
+    api.db.bind(_database(mongo, database))
+    api.db.create_indexes()
+
+    school = fixtures.build(students=50 if quick else 200,
+                            courses=10 if quick else 20)
+    fixtures.seed(api.db, school)
+
+    return Context(app, school, counts_queries=mongo is not None)
+
+
+def run(context: Context,
+        rounds: int,
+        only: Optional[str] = None) -> Dict[str, dict]:
+    results = dict()
+    for name, function, iterations, unit in BENCHMARKS:
+        if only and not name.startswith(only):
+            continue
+
+        try:
+            operation = function(context)
+            if unit == "bytes":
+                results[name] = result = measure_memory(
+                    operation, iterations, rounds)
+                print(_describe(name, result), flush=True)
+                continue
+
+            result = measure(operation, iterations, rounds)
+            if name.startswith("endpoint."):
+                result["queries"] = (_queries(operation())
+                                     if context.counts_queries else None)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+
+        results[name] = result
+        print(_describe(name, result), flush=True)
+
+    return results
+
+
+def _describe(name: str, result: dict) -> str:
+    if "error" in result:
+        return f"{name:<36} ERROR {result['error']}"
+    if result["unit"] == "bytes":
+        return f"{name:<36} {result['median']:>12.1f} bytes/object"
+
+    queries = (f"  {result['queries']} queries"
+               if result.get("queries") is not None else "")
+    return (f"{name:<36} {result['median'] * 1e6:>12.1f} us/op "
+            f"{result['ops_per_second']:>12.1f} op/s{queries}")
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict],
+            threshold: float) -> List[str]:
+    r"""The benchmarks whose median got slower than in the baseline by more than `threshold`, or
+    that fail but did not in the baseline."""
+    regressions = list()
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or "median" not in previous:
+            continue
+
+        if "error" in result:
+            regressions.append(name)
+            print(f"{name:<36} {'ERROR':>8}  REGRESSION")
+            continue
+
+        if "median" not in result or not previous["median"]:
+            continue
+
+        change = result["median"] / previous["median"] - 1
+        line = f"{name:<36} {change:>+8.1%}"
+        if change > threshold:
+            regressions.append(name)
+            line += "  REGRESSION"
+        print(line)
+
+    return regressions
+
+
+def _revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"],
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the models and the hot endpoints")
+    parser.add_argument("--mongo",
+                        help="A MongoDB connection string, in-memory if unset")
+    parser.add_argument("--database", default="gradder_benchmark")
+    parser.add_argument("--output", help="Where to write the results as JSON")
+    parser.add_argument("--baseline",
+                        help="Previous results to compare these with")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--quick",
+                        action="store_true",
+                        help="A smaller school and fewer rounds")
+    parser.add_argument("--only",
+                        help="Only run the benchmarks with this prefix")
+    arguments = parser.parse_args(arguments)
+
+    context = setup(arguments.mongo, arguments.database, arguments.quick)
+    results = run(context, 2 if arguments.quick else arguments.rounds,
+                  arguments.only)
+
+    report = {
+        "format": FORMAT_VERSION,
+        "meta": {
+            "date": datetime.utcnow().isoformat() + "Z",
+            "revision": _revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": "mongodb" if arguments.mongo else "in-memory",
+            "quick": arguments.quick,
+        },
+        "results": results,
+    }
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if arguments.mongo:
+        from api import db
+
+        db.db.client.drop_database(arguments.database)
+
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)["results"]
+
+        regressions = compare(results, baseline, arguments.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): " +
+                  ", ".join(regressions))
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+r"""Profiles the start of a worker: how long importing the app and `create_app` take, per import.
+
+Usage, from the backend directory::
+
+    python -m benchmarks.startup [--config production] [--runs 3] [--top 25]
+                                 [--output startup.json]
+
+Every run starts a new interpreter with `python -X importtime`, imports `api` and calls
+`create_app`. The median time of both phases is printed, followed by the imports of the last run
+that took the longest (including what they imported) and the total time spent importing every
+top-level package. Set `MONGO_CONNECTION_STRING` to a reachable server, or `create_app` waits for
+the server selection timeout when creating the indexes.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+# Run in the new interpreter: prints the time of both phases, in seconds, as JSON
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import api
+imported = time.perf_counter()
+api.create_app(sys.argv[1])
+created = time.perf_counter()
+print(json.dumps({"import": imported - start, "create_app": created - imported}))
+"""
+
+
+class Import(NamedTuple):
+    module: str
+    # In seconds, without and with what the module imported
+    self: float
+    cumulative: float
+    depth: int
+
+
+def parse_importtime(output: str) -> List[Import]:
+    r"""The imports listed by `python -X importtime`, in the order they finished."""
+    imports = list()
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        self_time, cumulative, name = line[len("import time:"):].split("|", 2)
+        # Indented by two spaces per level, after a separating space
+        module = name.rstrip()
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        imports.append(
+            Import(module.strip(),
+                   int(self_time) / 1e6,
+                   int(cumulative) / 1e6, depth))
+
+    return imports
+
+
+def by_package(imports: List[Import]) -> Dict[str, float]:
+    r"""The time spent importing the modules of every top-level package, in seconds."""
+    packages = dict()
+    for module in imports:
+        package = module.module.split(".")[0]
+        packages[package] = packages.get(package, 0) + module.self
+
+    return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+
+def profile(config: str) -> Tuple[Dict[str, float], List[Import]]:
+    r"""The time of both phases of starting the app, and its imports."""
+    reply = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT, config],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if reply.returncode != 0:
+        raise RuntimeError(reply.stderr[-2000:])
+
+    return json.loads(reply.stdout.strip().splitlines()[-1]), parse_importtime(
+        reply.stderr)
+
+
+def main(arguments: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Profiles the imports and the creation of the app")
+    parser.add_argument("--config", default="production")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top",
+                        type=int,
+                        default=25,
+                        help="How many imports and packages to list")
+    parser.add_argument("--output", help="Where to write the profile as JSON")
+    arguments = parser.parse_args(arguments)
+
+    phases = list()
+    for _ in range(arguments.runs):
+        timings, imports = profile(arguments.config)
+        phases.append(timings)
+
+    median = {
+        phase: statistics.median(timings[phase] for timings in phases)
+        for phase in phases[0]
+    }
+    for phase, seconds in median.items():
+        print(f"{phase:<12} {seconds * 1000:>9.1f} ms")
+
+    print(f"\n{'import (with what it imported)':<60} {'self ms':>9} "
+          f"{'total ms':>9}")
+    slowest = sorted(imports, key=lambda module: -module.cumulative)
+    for module in slowest[:arguments.top]:
+        print(f"{'  ' * module.depth + module.module:<60} "
+              f"{module.self * 1000:>9.1f} {module.cumulative * 1000:>9.1f}")
+
+    packages = by_package(imports)
+    print(f"\n{'package':<60} {'total ms':>9}")
+    for package, seconds in list(packages.items())[:arguments.top]:
+        print(f"{package:<60} {seconds * 1000:>9.1f}")
+
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(
+                {
+                    "config": arguments.config,
+                    "runs": phases,
+                    "median": median,
+                    "imports": [module._asdict() for module in imports],
+                    "packages": packages,
+                },
+                f,
+                indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -25,6 +25,56 @@ class Config:
 
     SSL_REDIRECT = False
 
+    # Seconds between two full recomputations of the course analytics, 0 to disable
+    ANALYTICS_RECOMPUTE_INTERVAL = int(
+        os.environ.get("ANALYTICS_RECOMPUTE_INTERVAL", "3600"))
+
+    # Where uploaded files are stored: "gcs" (a Google Cloud Storage bucket) or "local"
+    STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "gcs")
+    STORAGE_BUCKET = os.environ.get("STORAGE_BUCKET", "gradder-storage")
+    LOCAL_STORAGE_PATH = os.environ.get("LOCAL_STORAGE_PATH",
+                                        os.path.join(basedir, "storage"))
+
+    # Seconds between two deletions of unreferenced files, 0 to disable
+    BLOB_GC_INTERVAL = int(os.environ.get("BLOB_GC_INTERVAL", "86400"))
+    # Seconds a file must have been unreferenced for before it is deleted
+    BLOB_GC_GRACE_PERIOD = int(os.environ.get("BLOB_GC_GRACE_PERIOD", "86400"))
+
+    # Seconds between two checks for due date reminders to send, 0 to disable
+    REMINDER_INTERVAL = int(os.environ.get("REMINDER_INTERVAL", "300"))
+    # Seconds before an assignment is due its reminders are sent
+    REMINDER_LEAD_TIME = int(os.environ.get("REMINDER_LEAD_TIME", "86400"))
+
+    # Convert the documents stored in an older format (e.g. dates saved as strings) in the
+    # background when the app starts, see api.tools.migrations
+    MIGRATE_ON_START = os.environ.get("MIGRATE_ON_START",
+                                      "true").lower() in ["true", "on", "1"]
+
+    # The most database commands a request should issue, and the most of the same shape
+    QUERY_BUDGET = int(os.environ.get("QUERY_BUDGET", "50"))
+    QUERY_REPEAT_LIMIT = int(os.environ.get("QUERY_REPEAT_LIMIT", "10"))
+    # Raise instead of logging a warning when a request goes over them
+    QUERY_BUDGET_STRICT = False
+    # Send the database commands of every request in an X-Query-Stats header
+    QUERY_STATS_HEADER = False
+
+    # Keep one in every N info records of some loggers or modules, as "module:N,module:N"
+    LOG_SAMPLE_RATES = {
+        name: int(every)
+        for name, every in (rule.split(":") for rule in os.environ.get(
+            "LOG_SAMPLE_RATES", "").split(",") if rule)
+    }
+
+    # A directory shared by the workers of a server to add up their metrics, see api.tools.metrics
+    METRICS_DIR = os.environ.get("METRICS_DIR")
+    # Seconds between two writes of the metrics of every worker to METRICS_DIR
+    METRICS_FLUSH_INTERVAL = int(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+    # The bearer token /metrics requires, if set
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # The app is created in the gunicorn master before the workers are forked, see gunicorn.conf.py
+    PRELOAD = os.environ.get("PRELOAD", "false").lower() in ["true", "on", "1"]
+
     @staticmethod
     def init_app(app):
         pass
@@ -32,6 +82,7 @@ class Config:
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    QUERY_STATS_HEADER = True
 
     @staticmethod
     def init_app(app):
@@ -41,6 +92,12 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     WTF_CSRF_ENABLED = False
+    ANALYTICS_RECOMPUTE_INTERVAL = 0
+    STORAGE_BACKEND = "local"
+    BLOB_GC_INTERVAL = 0
+    REMINDER_INTERVAL = 0
+    MIGRATE_ON_START = False
+    QUERY_BUDGET_STRICT = True
 
     @staticmethod
     def init_app(app):
@@ -0,0 +1,35 @@
+r"""The gunicorn settings of the backend.
+
+With `PRELOAD` set, the app is created once in the master, and the workers are forked from it:
+they start without importing or building anything, and share the memory of the master
+copy-on-write. The garbage collector is disabled while the app is built and everything it built
+is frozen before forking, so that collections in the workers never write to (and copy) those pages.
+"""
+import gc
+import os
+
+preload_app = os.environ.get("PRELOAD", "false").lower() in ["true", "on", "1"]
+
+if preload_app:
+    gc.disable()
+
+
+def when_ready(server):
+    if preload_app:
+        # The garbage of creating the app is collected, and the rest is never scanned again
+        gc.collect()
+        gc.freeze()
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        # Also what the master allocated since the previous fork
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from api import start_background_jobs
+
+        start_background_jobs(server.app.wsgi())
@@ -0,0 +1,112 @@
+import unittest
+
+from api import create_app
+from bson import ObjectId
+
+
+class CourseAnalyticsTestCase(unittest.TestCase):
+    r"""A testcase on computing course analytics from a gradebook, fully and incrementally."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        from api.tools.gradebook import Gradebook
+
+        self.students = [ObjectId(), ObjectId(), ObjectId()]
+        self.assignments = [ObjectId(), ObjectId()]
+
+        self.gradebook = Gradebook.from_dict({
+            "_id":
+            ObjectId(),
+            "students":
+            self.students,
+            "assignments": [
+                {
+                    "_id":
+                    self.assignments[0],
+                    "title":
+                    "Lab report",
+                    "submissions": [
+                        {
+                            "student_id": str(self.students[0]),
+                            "grade": "90"
+                        },
+                        {
+                            "student_id": str(self.students[1]),
+                            "grade": "80"
+                        },
+                    ],
+                },
+                {
+                    "_id":
+                    self.assignments[1],
+                    "title":
+                    "Quiz",
+                    "submissions": [{
+                        "student_id": str(self.students[0]),
+                        "grade": "17/20"
+                    }],
+                },
+            ],
+        })
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_compute(self):
+        from api.tools.analytics import compute
+
+        analytics = compute(self.gradebook)
+
+        self.assertEqual(analytics["no_students"], 3)
+        # Student averages are 87.5 and 80, the third student has no grades
+        self.assertEqual(analytics["total_average"], 83.75)
+        self.assertEqual(analytics["starting_average"], 85.0)
+        self.assertEqual(
+            [entry["assignment_name"] for entry in analytics["assignment_history"]],
+            ["Lab report", "Quiz"],
+        )
+        self.assertEqual(len(analytics["assignment_history"][0]["assignment_scores"]),
+                         2)
+
+    def test_running_sums_match_recount(self):
+        from api.tools.analytics import compute
+
+        self.gradebook.update_grade(self.students[2], self.assignments[1], "50")
+        self.gradebook.update_grade(self.students[0], self.assignments[0], "")
+        incremental = compute(self.gradebook)
+
+        self.gradebook.recount()
+        full = compute(self.gradebook)
+
+        self.assertEqual(incremental["total_average"], full["total_average"])
+        self.assertEqual(incremental["assignment_history"],
+                         full["assignment_history"])
+
+    def test_grade_distribution(self):
+        from api.tools.analytics import get_grade_distribution
+
+        distribution = get_grade_distribution(self.gradebook,
+                                              self.assignments[0],
+                                              buckets=5)
+
+        self.assertEqual(distribution["count"], 2)
+        self.assertEqual(distribution["mean"], 85.0)
+        self.assertEqual(distribution["stddev"], 5.0)
+        self.assertEqual([b["count"] for b in distribution["buckets"]],
+                         [0, 0, 0, 0, 2])
+        self.assertEqual(
+            [r["percentile"] for r in distribution["percentile_ranks"]],
+            [100.0, 50.0])
+
+        # Cached until a grade of the assignment changes
+        self.assertIs(
+            get_grade_distribution(self.gradebook, self.assignments[0], 5),
+            distribution)
+        self.gradebook.update_grade(self.students[2], self.assignments[0],
+                                    "70")
+        self.assertEqual(
+            get_grade_distribution(self.gradebook, self.assignments[0],
+                                   5)["count"], 3)
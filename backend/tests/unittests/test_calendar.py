@@ -0,0 +1,110 @@
+import unittest
+from datetime import datetime
+
+from api import create_app
+
+
+class CalendarTestCase(unittest.TestCase):
+    r"""A testcase on the calendar interval index and the expansion of course meetings."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        from api.tools.calendar import IntervalIndex
+
+        self.index = IntervalIndex([
+            {
+                "_id": "long",
+                "start": datetime(2020, 9, 1),
+                "end": datetime(2020, 9, 30),
+            },
+            {
+                "_id": "short",
+                "start": datetime(2020, 9, 10, 9),
+                "end": datetime(2020, 9, 10, 10),
+            },
+            {
+                "_id": "instant",
+                "start": datetime(2020, 9, 12),
+                "end": datetime(2020, 9, 12),
+            },
+        ])
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def ids(self, start, end):
+        return [event["_id"] for event in self.index.overlapping(start, end)]
+
+    def test_overlapping(self):
+        self.assertEqual(self.ids(datetime(2020, 9, 10), datetime(2020, 9, 11)),
+                         ["long", "short"])
+        self.assertEqual(self.ids(datetime(2020, 9, 12), datetime(2020, 9, 13)),
+                         ["long", "instant"])
+        # The end of the range is excluded
+        self.assertEqual(self.ids(datetime(2020, 8, 1), datetime(2020, 9, 1)),
+                         [])
+        self.assertEqual(self.ids(datetime(2020, 10, 1), datetime(2020, 11, 1)),
+                         [])
+
+    def test_add_and_remove(self):
+        self.index.add({
+            "_id": "short",
+            "start": datetime(2020, 10, 1),
+            "end": datetime(2020, 10, 2),
+        })
+        self.assertEqual(self.ids(datetime(2020, 9, 10), datetime(2020, 9, 11)),
+                         ["long"])
+        self.assertEqual(self.ids(datetime(2020, 10, 1), datetime(2020, 11, 1)),
+                         ["short"])
+
+        self.index.remove("long")
+        self.assertEqual(self.ids(datetime(2020, 9, 1), datetime(2020, 9, 30)),
+                         ["instant"])
+        self.assertIsNone(self.index.remove("long"))
+
+    def test_clear_end(self):
+        from api import db
+        from api.tools import calendar
+
+        owner_id = "test-clear-end"
+        event = calendar.add_event(owner_id, "Exam", datetime(2020, 9, 10, 9),
+                                   datetime(2020, 9, 10, 10))
+        try:
+            calendar.update_event(owner_id, event["_id"], {"end": None})
+            self.assertEqual(
+                db.events.find_one({"_id": event["_id"]})["end"],
+                datetime(2020, 9, 10, 9))
+
+            # Reloaded from the database
+            calendar._indexes.get().pop(owner_id, None)
+            self.assertEqual([
+                found["_id"] for found in calendar.get_index(
+                    owner_id).overlapping(datetime(2020, 9, 10),
+                                          datetime(2020, 9, 11))
+            ], [event["_id"]])
+        finally:
+            db.events.delete_many({"owner_id": owner_id})
+            db.counters.delete_one({"_id": f"calendar:{owner_id}"})
+
+    def test_meetings(self):
+        from api.tools.calendar import _meetings
+
+        course = {
+            "_id": "c1",
+            "name": "Algebra",
+            "schedule_days": "MoWe",
+            "schedule_time": "23:00-01:00",
+        }
+        # Monday 2020-09-07 to Wednesday 2020-09-09 at noon
+        meetings = _meetings(course, datetime(2020, 9, 7),
+                             datetime(2020, 9, 9, 12))
+
+        self.assertEqual([meeting["id"] for meeting in meetings],
+                         ["c1@20200907"])
+        self.assertEqual(meetings[0]["end"], datetime(2020, 9, 8, 1))
+        self.assertEqual(_meetings({"_id": "c2", "schedule_time": "soon"},
+                                   datetime(2020, 9, 7),
+                                   datetime(2020, 9, 9)), [])
@@ -0,0 +1,83 @@
+import unittest
+from datetime import datetime
+
+from api import create_app
+
+
+class DashboardTestCase(unittest.TestCase):
+    r"""A testcase on the summary of the student dashboard."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_summarize(self):
+        from api.tools.dashboard import summarize
+
+        courses = [{
+            "_id": "c1",
+            "name": "Algebra",
+            "schedule_days": "MoWe",
+            "schedule_time": "09:00-10:00",
+            "assignments": [
+                {
+                    "_id": "due-soon",
+                    "title": "Homework 2",
+                    "due_by": "2020-09-08T23:59:00",
+                },
+                {
+                    "_id": "submitted",
+                    "title": "Homework 1",
+                    "due_by": "2020-09-08T12:00:00",
+                    "submissions": [{
+                        "grade": "",
+                        "date_submitted": "2020-09-01 10:00:00"
+                    }],
+                },
+                {
+                    "_id": "graded",
+                    "title": "Quiz",
+                    "due_by": datetime(2020, 9, 1),
+                    "submissions": [{
+                        "grade": "17/20",
+                        "date_submitted": "2020-08-31 10:00:00"
+                    }],
+                },
+                {
+                    "_id": "overdue",
+                    "title": "Essay",
+                    "due_by": "2020-09-06T12:00:00",
+                },
+            ],
+        }]
+
+        # Monday morning
+        dashboard = summarize(courses, now=datetime(2020, 9, 7, 8))
+
+        self.assertEqual([entry["id"] for entry in dashboard["upcoming"]],
+                         ["due-soon"])
+        self.assertEqual(dashboard["upcoming"][0]["due_by"],
+                         "2020-09-08T23:59:00Z")
+        self.assertEqual(dashboard["today"], [{
+            "course_id": "c1",
+            "name": "Algebra",
+            "start": "2020-09-07T09:00:00Z",
+            "end": "2020-09-07T10:00:00Z",
+        }])
+        self.assertEqual(
+            [entry["grade"] for entry in dashboard["recent_grades"]],
+            ["17/20"])
+        self.assertEqual(dashboard["ungraded"], {
+            "total": 1,
+            "courses": {
+                "c1": 1
+            }
+        })
+
+        # Tuesday, no classes
+        self.assertEqual(
+            summarize(courses, now=datetime(2020, 9, 8, 8))["today"], [])
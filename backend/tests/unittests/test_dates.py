@@ -0,0 +1,82 @@
+import unittest
+from datetime import datetime
+
+from api import create_app
+from bson import ObjectId
+
+
+class DatesTestCase(unittest.TestCase):
+    r"""A testcase on storing dates in UTC, showing them in the school's timezone and migrating."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_timezone(self):
+        from api.tools.dates import format_datetime
+        from api.tools.dates import get_timezone
+        from api.tools.dates import parse_datetime
+
+        new_york = get_timezone("America/New_York")
+
+        # Typed in the timezone of the school, stored in UTC
+        self.assertEqual(parse_datetime("2020-09-08T23:59", new_york),
+                         datetime(2020, 9, 9, 3, 59))
+        self.assertEqual(parse_datetime("2020-09-08T23:59Z", new_york),
+                         datetime(2020, 9, 8, 23, 59))
+        self.assertEqual(
+            format_datetime(datetime(2020, 9, 9, 3, 59), new_york),
+            "2020-09-08T23:59:00-04:00")
+        self.assertEqual(format_datetime(datetime(2020, 9, 9, 3, 59)),
+                         "2020-09-09T03:59:00Z")
+
+    def test_clean(self):
+        from api.classes import Assignment
+        from api.tools.exceptions import InvalidFormatException
+
+        assignment = Assignment("Essay", datetime(2020, 9, 1), "t", "c",
+                                "2020-09-08T12:00:00+02:00", "", [], 60)
+        self.assertEqual(assignment.due_by, datetime(2020, 9, 8, 10))
+        self.assertEqual(assignment.to_dict()["due_by"],
+                         datetime(2020, 9, 8, 10))
+
+        with self.assertRaises(InvalidFormatException):
+            assignment.due_by = "next week"
+
+    def test_migration(self):
+        from api.tools.migrations import date_updates
+
+        assignment_id, submission_id = ObjectId(), ObjectId()
+        updates, array_filters = date_updates({
+            "assignments": [{
+                "_id": assignment_id,
+                "due_by": "2020-09-08T23:59:00",
+                "date_assigned": datetime(2020, 9, 1),
+                "submissions": [{
+                    "_id": submission_id,
+                    "date_submitted": "2020-09-01 10:00:00"
+                }, {
+                    "_id": ObjectId(),
+                    "date_submitted": datetime(2020, 9, 2)
+                }],
+            }]
+        })
+
+        self.assertEqual(
+            updates, {
+                "assignments.$[due0].due_by":
+                datetime(2020, 9, 8, 23, 59),
+                "assignments.$[a0].submissions.$[s0x0].date_submitted":
+                datetime(2020, 9, 1, 10),
+            })
+        # Only if they still hold the same strings
+        self.assertIn(
+            {
+                "s0x0._id": submission_id,
+                "s0x0.date_submitted": "2020-09-01 10:00:00"
+            }, array_filters)
+        self.assertIn({"a0._id": assignment_id}, array_filters)
@@ -0,0 +1,106 @@
+import unittest
+
+from api import create_app
+
+
+class SearchIndexTestCase(unittest.TestCase):
+    r"""A testcase on the school-wide full-text search index."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        from api.tools.fulltext import SearchIndex
+
+        self.index = SearchIndex()
+        self.index.add_course({
+            "_id":
+            "c1",
+            "department":
+            "SCI",
+            "number":
+            101,
+            "name":
+            "Biology",
+            "description":
+            "Cells and tissues",
+            "teacher":
+            "t1",
+            "students": ["s1"],
+            "assignments": [
+                {
+                    "_id": "a1",
+                    "title": "Lab report",
+                    # Rich text content is indexed too
+                    "content": {
+                        "ops": [{
+                            "insert": "Write up the mitosis experiment"
+                        }]
+                    },
+                },
+                {
+                    "_id": "a2",
+                    "title": "Quiz",
+                    "content": "Cells"
+                },
+            ],
+        })
+        self.index.add_course({
+            "_id": "c2",
+            "department": "MAT",
+            "number": 200,
+            "name": "Algebra",
+            "teacher": "t2",
+            "students": ["s2"],
+            "assignments": [{
+                "_id": "a3",
+                "title": "Matrices",
+                "content": "Lab report on matrices"
+            }],
+        })
+        self.index.add_person("Teacher", "t1", "Laura", "Smith")
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_ranking(self):
+        results = self.index.search("lab report")["results"]
+
+        # Title matches outrank content matches
+        self.assertEqual([result["id"] for result in results], ["a1", "a3"])
+        self.assertEqual(results[0]["course"], "SCI 101 Biology")
+        self.assertEqual(
+            [r["id"] for r in self.index.search("mitos")["results"]], ["a1"])
+
+    def test_visibility_and_facets(self):
+        found = self.index.search("lab report", viewer={"s2"})
+        self.assertEqual([result["id"] for result in found["results"]],
+                         ["a3"])
+
+        found = self.index.search("cells", viewer={"t1"}, types=["course"])
+        self.assertEqual([result["id"] for result in found["results"]],
+                         ["c1"])
+        self.assertEqual(found["facets"], {
+            "person": 0,
+            "course": 1,
+            "assignment": 1
+        })
+
+    def test_incremental_updates(self):
+        self.index.add_course({
+            "_id": "c1",
+            "name": "Biology",
+            "teacher": "t1",
+            "students": ["s1"],
+            "assignments": [{
+                "_id": "a2",
+                "title": "Quiz"
+            }],
+        })
+        self.assertEqual(self.index.search("lab")["facets"]["assignment"], 1)
+
+        self.index.remove_course("c2")
+        self.index.remove("person", "t1")
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search("smith")["total"], 0)
@@ -0,0 +1,98 @@
+import math
+import unittest
+
+import numpy as np
+from api import create_app
+from bson import ObjectId
+
+
+class GradebookTestCase(unittest.TestCase):
+    r"""A testcase on building gradebooks from course documents and updating them cell by cell."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        self.students = [ObjectId(), ObjectId(), ObjectId()]
+        self.assignments = [ObjectId(), ObjectId()]
+
+        self.course = {
+            "_id": ObjectId(),
+            "students": self.students,
+            "revision": 4,
+            "assignments": [
+                {
+                    "_id":
+                    self.assignments[0],
+                    "title":
+                    "Lab report",
+                    "submissions": [
+                        {
+                            "student_id": str(self.students[0]),
+                            "grade": "90"
+                        },
+                        {
+                            "student_id": str(self.students[1]),
+                            "grade": ""
+                        },
+                        # A later resubmission overrides the earlier grade
+                        {
+                            "student_id": str(self.students[0]),
+                            "grade": "95%"
+                        },
+                    ],
+                },
+                {
+                    "_id": self.assignments[1],
+                    "title": "Quiz",
+                    "submissions": [{
+                        "student_id": str(self.students[2]),
+                        "grade": "17/20"
+                    }],
+                },
+            ],
+        }
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_parse_grade(self):
+        from api.tools.gradebook import parse_grade
+
+        self.assertEqual(parse_grade("87.5"), 87.5)
+        self.assertEqual(parse_grade(" 87% "), 87.0)
+        self.assertEqual(parse_grade("17/20"), 85.0)
+        self.assertTrue(math.isnan(parse_grade("")))
+        self.assertTrue(math.isnan(parse_grade("A+")))
+        self.assertTrue(math.isnan(parse_grade(None)))
+
+    def test_from_dict(self):
+        from api.tools.gradebook import Gradebook
+
+        gradebook = Gradebook.from_dict(self.course)
+
+        self.assertEqual(gradebook.scores.shape, (3, 2))
+        self.assertEqual(gradebook.revision, 4)
+        self.assertEqual(gradebook.row(self.students[0])[0], 95.0)
+        self.assertTrue(math.isnan(gradebook.row(self.students[1])[0]))
+        self.assertEqual(gradebook.column(self.assignments[1])[2], 85.0)
+        self.assertEqual(gradebook.to_dict()["scores"],
+                         [[95.0, None], [None, None], [None, 85.0]])
+
+    def test_update_grade(self):
+        from api.tools.gradebook import Gradebook
+
+        gradebook = Gradebook.from_dict(self.course)
+        before = gradebook.scores.copy()
+
+        gradebook.update_grade(self.students[1], self.assignments[0], "70")
+
+        changed = ~np.isclose(before, gradebook.scores, equal_nan=True)
+        self.assertEqual(int(changed.sum()), 1)
+        self.assertEqual(gradebook.row(self.students[1])[0], 70.0)
+        self.assertEqual(gradebook.assignment_revision(self.assignments[0]),
+                         1)
+
+        with self.assertRaises(KeyError):
+            gradebook.update_grade(ObjectId(), self.assignments[0], "70")
@@ -0,0 +1,56 @@
+import unittest
+
+from bson import ObjectId
+
+from api import create_app
+
+
+class HydrationTestCase(unittest.TestCase):
+    r"""A testcase on building the models straight from stored documents."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_defaults(self):
+        from api.classes import Student
+
+        _id = ObjectId()
+        student = Student._from_db({
+            "_id": _id,
+            "email": "student@example.com",
+            "first_name": "Ada",
+            "last_name": "Lovelace",
+        })
+
+        self.assertEqual(student.id, str(_id))
+        self.assertEqual(student.email, "student@example.com")
+        self.assertEqual(student.courses, [])
+        self.assertEqual(student.parents, [])
+        self.assertFalse(student.activated)
+        self.assertFalse(hasattr(student, "__dict__"))
+        self.assertIsNone(Student._from_db(None))
+
+    def test_matches_constructor(self):
+        import bcrypt
+
+        from api.classes import Teacher
+
+        document = {
+            "_id": ObjectId(),
+            "email": "teacher@example.com",
+            "first_name": "Alan",
+            "last_name": "Turing",
+            "password": bcrypt.hashpw(b"password", bcrypt.gensalt()),
+            "bio": "Computing",
+            "courses": ["5f0c4a5b2c9b4f3a1e0d6c7b"],
+            "activated": True,
+        }
+
+        self.assertEqual(
+            Teacher._from_db(document).to_dict(),
+            Teacher.from_dict(dict(document)).to_dict())
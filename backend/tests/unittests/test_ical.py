@@ -0,0 +1,121 @@
+import unittest
+from datetime import datetime
+
+from api import create_app
+
+
+class ICalendarTestCase(unittest.TestCase):
+    r"""A testcase on the formatting of iCalendar feeds."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_fold(self):
+        from api.tools.ical import _fold
+        from api.tools.ical import MAX_LINE_LENGTH
+
+        line = "SUMMARY:" + "é" * 100
+        folded = list(_fold(line))
+
+        self.assertGreater(len(folded), 1)
+        self.assertTrue(
+            all(
+                len(part.encode()) <= MAX_LINE_LENGTH for part in folded))
+        self.assertTrue(all(part.startswith(" ") for part in folded[1:]))
+        self.assertEqual(folded[0] + "".join(part[1:] for part in folded[1:]),
+                         line)
+        self.assertEqual(list(_fold("VERSION:2.0")), ["VERSION:2.0"])
+
+    def test_event(self):
+        from api.tools.ical import _event
+
+        lines = list(
+            _event("assignment-1", datetime(2020, 9, 1),
+                   datetime(2020, 9, 7, 23, 59), None, "Essay; draft, v2"))
+
+        self.assertIn("DTSTART:20200907T235900Z", lines)
+        self.assertIn(r"SUMMARY:Essay\; draft\, v2", lines)
+        self.assertFalse(any(line.startswith("DTEND") for line in lines))
+
+    def test_get_feed(self):
+        from types import SimpleNamespace
+
+        from api import db
+        from api.tools import calendar
+        from api.tools import ical
+
+        course_id = db.courses.insert_one({
+            "name": "Feed test",
+            "calendar_revision": 0
+        }).inserted_id
+        teacher_id = db.teachers.insert_one({
+            "courses": [str(course_id)]
+        }).inserted_id
+        user = SimpleNamespace(id=teacher_id, _type="Teacher")
+        fresh, _ = ical._caches.get()
+
+        try:
+            token = ical.get_token(user)
+            feed = ical.get_feed(token)
+            self.assertTrue(feed.body.startswith(b"BEGIN:VCALENDAR"))
+
+            # Shared by the workers
+            subscription = db.feeds.find_one({"_id": token})
+            self.assertEqual(subscription["etag"], feed.etag)
+            self.assertEqual(subscription["last_modified"], feed.last_modified)
+            self.assertEqual(ical.get_feed(token), feed)
+
+            # Not modified
+            self.assertEqual(ical.get_feed(token, [feed.etag]),
+                             (feed.etag, feed.last_modified, None))
+
+            # The course changed, checked once the feed is no longer fresh
+            db.courses.update_one({"_id": course_id},
+                                  {"$inc": {
+                                      "calendar_revision": 1
+                                  }})
+            fresh.clear()
+            changed = ical.get_feed(token, [feed.etag])
+            self.assertNotEqual(changed.etag, feed.etag)
+            self.assertIsNotNone(changed.body)
+
+            # The personal calendar changed
+            calendar.add_event(str(teacher_id), "Meeting",
+                               datetime(2020, 9, 10, 9))
+            fresh.clear()
+            self.assertNotIn(ical.get_feed(token).etag,
+                             [feed.etag, changed.etag])
+        finally:
+            db.courses.delete_one({"_id": course_id})
+            db.teachers.delete_one({"_id": teacher_id})
+            db.feeds.delete_many({"user_id": str(teacher_id)})
+            db.events.delete_many({"owner_id": str(teacher_id)})
+            db.counters.delete_one({"_id": f"calendar:{teacher_id}"})
+
+    def test_rotate_token(self):
+        from types import SimpleNamespace
+
+        from api import db
+        from api.tools import ical
+        from bson import ObjectId
+
+        user = SimpleNamespace(id=ObjectId(), _type="Teacher")
+
+        try:
+            token = ical.get_token(user)
+            self.assertEqual(ical.get_token(user), token)
+            self.assertIsNotNone(ical.get_feed(token))
+
+            rotated = ical.rotate_token(user)
+            self.assertNotEqual(rotated, token)
+            # Once the previous feed is no longer fresh
+            ical._caches.get()[0].clear()
+            self.assertIsNone(ical.get_feed(token))
+            self.assertIsNotNone(ical.get_feed(rotated))
+        finally:
+            db.feeds.delete_many({"user_id": str(user.id)})
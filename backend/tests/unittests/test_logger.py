@@ -0,0 +1,68 @@
+import logging
+import unittest
+
+from api import create_app
+
+
+class LoggerTestCase(unittest.TestCase):
+    r"""A testcase on the setup and sampling of the loggers."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_idempotent(self):
+        from api.tools.logger import AsyncHandler
+
+        create_app("testing")
+
+        self.assertEqual(
+            len([
+                handler for handler in logging.getLogger().handlers
+                if isinstance(handler, AsyncHandler)
+            ]), 1)
+
+    def test_sampling(self):
+        from api.tools.logger import SamplingFilter
+
+        sampling = SamplingFilter({"uploads": 3})
+
+        def record(level, module="uploads"):
+            return logging.LogRecord("root", level, f"/api/{module}.py", 1,
+                                     "message", None, None)
+
+        self.assertEqual(
+            [sampling.filter(record(logging.INFO)) for i in range(6)],
+            [True, False, False, True, False, False])
+        self.assertTrue(sampling.filter(record(logging.WARNING)))
+        self.assertTrue(sampling.filter(record(logging.INFO, "routes")))
+
+    def test_lazy_handler(self):
+        from api.tools.logger import LazyHandler
+
+        records = list()
+        created = list()
+
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                records.append(record.getMessage())
+
+        def factory():
+            created.append(True)
+            return ListHandler()
+
+        handler = LazyHandler(factory)
+        self.assertEqual(created, [])
+
+        for message in ("first", "second"):
+            handler.handle(
+                logging.LogRecord("root", logging.INFO, "/api/routes.py", 1,
+                                  message, None, None))
+        handler.close()
+
+        self.assertEqual(created, [True])
+        self.assertEqual(records, ["first", "second"])
@@ -0,0 +1,65 @@
+import json
+import os
+import tempfile
+import unittest
+
+from api import create_app
+
+
+class MetricsTestCase(unittest.TestCase):
+    r"""A testcase on the metrics registry and its exposition."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        from api.tools import metrics
+
+        self.metrics = metrics
+        self.histogram = metrics.Histogram("test_duration_seconds",
+                                           "A test histogram", ("kind", ),
+                                           buckets=(0.1, 1.0))
+        self.counter = metrics.Counter("test_total", "A test counter")
+
+    def tearDown(self):
+        del self.metrics.REGISTRY["test_duration_seconds"]
+        del self.metrics.REGISTRY["test_total"]
+        self.app_context.pop()
+
+    def test_histogram(self):
+        for value in (0.05, 0.1, 0.5, 3):
+            self.histogram.observe(value, "a")
+
+        text = self.metrics.render()
+        self.assertIn('test_duration_seconds_bucket{kind="a",le="0.1"} 2',
+                      text)
+        self.assertIn('test_duration_seconds_bucket{kind="a",le="1"} 3', text)
+        self.assertIn('test_duration_seconds_bucket{kind="a",le="+Inf"} 4',
+                      text)
+        self.assertIn('test_duration_seconds_count{kind="a"} 4', text)
+        self.assertIn("# TYPE test_duration_seconds histogram", text)
+
+    def test_workers(self):
+        self.counter.inc(amount=2)
+        self.histogram.observe(0.5, "a")
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Another worker, which exited since
+            with open(os.path.join(directory, "999999999-1.json"), "w") as f:
+                json.dump(
+                    {
+                        "test_total": [[[], 3]],
+                        "test_duration_seconds": [[["a"], [1, 0, 0, 0.05]]],
+                    }, f)
+
+            text = self.metrics.render(directory)
+
+            # Its file was folded into the archive, and is not counted twice
+            self.assertNotIn("999999999-1.json", os.listdir(directory))
+            self.assertIn("test_total 5", self.metrics.render(directory))
+
+        self.assertIn("test_total 5", text)
+        self.assertIn('test_duration_seconds_count{kind="a"} 2', text)
+        self.assertIn('test_duration_seconds_bucket{kind="a",le="0.1"} 1',
+                      text)
@@ -0,0 +1,58 @@
+import unittest
+
+from api import create_app
+
+
+class NameIndexTestCase(unittest.TestCase):
+    r"""A testcase on the in-process name autocomplete index."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        from api.tools.names import NameIndex
+
+        self.index = NameIndex.build([
+            ("Student", {
+                "_id": "s1",
+                "first_name": "Jo",
+                "last_name": "Smithers"
+            }),
+            ("Student", {
+                "_id": "s2",
+                "first_name": "Joanna",
+                "last_name": "Doe"
+            }),
+            ("Teacher", {
+                "_id": "t1",
+                "first_name": "José",
+                "last_name": "Smith"
+            }),
+        ])
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_search(self):
+        ids = lambda results: [result["id"] for result in results]
+
+        # Exact matches first, then first names, then last names
+        self.assertEqual(ids(self.index.search("jo")), ["s1", "s2", "t1"])
+        self.assertEqual(ids(self.index.search("smith")), ["t1", "s1"])
+        # Accents and case are ignored, full names match in both orders
+        self.assertEqual(ids(self.index.search("JOSE SM")), ["t1"])
+        self.assertEqual(ids(self.index.search("doe jo")), ["s2"])
+        self.assertEqual(ids(self.index.search("jo", ["Teacher"])), ["t1"])
+        self.assertEqual(self.index.search("  "), [])
+
+    def test_add_and_remove(self):
+        ids = lambda results: [result["id"] for result in results]
+
+        self.index.add("Teacher", "t1", "Joseph", "Brown")
+        self.assertEqual(ids(self.index.search("smith")), ["s1"])
+        self.assertEqual(ids(self.index.search("brown")), ["t1"])
+
+        self.index.remove("Student", "s1")
+        self.assertEqual(ids(self.index.search("jo")), ["s2", "t1"])
+        self.assertEqual(len(self.index), 2)
@@ -0,0 +1,82 @@
+import unittest
+
+from api import create_app
+
+
+class QueryShapeTestCase(unittest.TestCase):
+    r"""A testcase on the detection of repeated queries."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_same_shape(self):
+        from api.tools.queries import shape
+
+        first = shape("find", {
+            "find": "courses",
+            "filter": {
+                "_id": "5f5b5e8f2c1a4b0d8c9e1a01"
+            }
+        })
+        second = shape("find", {
+            "find": "courses",
+            "filter": {
+                "_id": "5f5b5e8f2c1a4b0d8c9e1a02"
+            }
+        })
+        other = shape("find", {
+            "find": "courses",
+            "filter": {
+                "_id": {
+                    "$in": ["5f5b5e8f2c1a4b0d8c9e1a01"]
+                }
+            }
+        })
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(first[:2], ("find", "courses"))
+
+    def test_update_shape(self):
+        from api.tools.queries import shape
+
+        self.assertEqual(
+            shape("update", {
+                "update": "courses",
+                "updates": [{
+                    "q": {
+                        "$or": [{
+                            "a": 1
+                        }, {
+                            "b": 2
+                        }]
+                    },
+                    "u": {}
+                }]
+            }),
+            ("update", "courses", ((("$or", (
+                (("a", "?"), ), (("b", "?"), ))), ), )),
+        )
+
+    def test_problems(self):
+        from api.tools.queries import RequestStats
+        from api.tools.queries import shape
+
+        stats = RequestStats()
+        for i in range(12):
+            stats.commands += 1
+            stats.shapes[shape("find", {
+                "find": "courses",
+                "filter": {
+                    "_id": i
+                }
+            })] += 1
+
+        self.assertEqual(stats.problems(50, 20), [])
+        self.assertEqual(len(stats.problems(10, 20)), 1)
+        self.assertIn("N+1", stats.problems(50, 10)[0])
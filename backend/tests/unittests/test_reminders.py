@@ -0,0 +1,137 @@
+import unittest
+from datetime import datetime
+from datetime import timedelta
+
+from api import create_app
+
+
+class ReminderQueueTestCase(unittest.TestCase):
+    r"""A testcase on the min-heap of upcoming deadlines."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        from api.tools.reminders import ReminderQueue
+
+        self.queue = ReminderQueue(timedelta(hours=24))
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_pop_due(self):
+        self.queue.push("c1", "late", datetime(2020, 9, 10, 12))
+        self.queue.push("c1", "soon", datetime(2020, 9, 8, 12))
+        self.queue.push("c2", "sooner", datetime(2020, 9, 8, 9))
+
+        self.assertEqual(self.queue.pop_due(datetime(2020, 9, 7, 8)), [])
+        self.assertEqual([
+            entry[3] for entry in self.queue.pop_due(datetime(2020, 9, 7, 12))
+        ], ["sooner", "soon"])
+        self.assertEqual(len(self.queue), 1)
+
+    def test_rescheduled(self):
+        self.queue.push("c1", "a1", datetime(2020, 9, 8, 12))
+        # Postponed: the first deadline is skipped
+        self.queue.push("c1", "a1", datetime(2020, 9, 12, 12))
+
+        self.assertEqual(self.queue.pop_due(datetime(2020, 9, 10)), [])
+        self.assertEqual(
+            [entry[1] for entry in self.queue.pop_due(datetime(2020, 9, 12))],
+            [datetime(2020, 9, 12, 12)])
+
+
+class SendDueTestCase(unittest.TestCase):
+    r"""A testcase on the claims of the reminders sent by several workers."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+        from api import db
+        from bson import ObjectId
+
+        self.due_by = datetime(2020, 9, 10, 12)
+        self.lead = timedelta(hours=24)
+        self.now = self.due_by - self.lead
+
+        self.student_ids = [
+            db.students.insert_one({
+                "email": f"{name}@example.com",
+                "first_name": name
+            }).inserted_id for name in ["ada", "alan"]
+        ]
+        self.assignment_id = ObjectId()
+        self.course_id = db.courses.insert_one({
+            "name": "Biology",
+            "students": [str(student_id) for student_id in self.student_ids],
+            "assignments": [{
+                "_id": self.assignment_id,
+                "title": "Lab report",
+                "due_by": self.due_by,
+                "submissions": [],
+            }],
+        }).inserted_id
+
+    def tearDown(self):
+        from api import db
+        from api.tools import reminders
+
+        db.courses.delete_one({"_id": self.course_id})
+        db.students.delete_many({"_id": {"$in": self.student_ids}})
+        db.reminders.delete_many(
+            {"_id": {
+                "$regex": f"^{self.assignment_id}:"
+            }})
+        # Reloaded on next use
+        reminders._pid = None
+
+        self.app_context.pop()
+
+    def pair(self, i):
+        return (str(self.assignment_id), str(self.student_ids[i]), self.due_by)
+
+    def test_claim(self):
+        from api.tools.reminders import _claim
+
+        self.assertEqual(_claim([self.pair(0)]), [0])
+        # Already claimed by another worker
+        self.assertEqual(_claim([self.pair(0), self.pair(1)]), [1])
+        self.assertEqual(_claim([self.pair(1), self.pair(0)]), [])
+
+    def test_claimed_elsewhere(self):
+        from unittest import mock
+
+        from api.tools import reminders
+
+        reminders._claim([self.pair(0)])
+
+        with mock.patch("api.tools.email.send_email_now") as send_email_now:
+            self.assertEqual(reminders.run_once(self.lead, self.now), 1)
+
+        send_email_now.assert_called_once()
+        self.assertEqual(send_email_now.call_args[0][0], ["alan@example.com"])
+
+    def test_release(self):
+        from unittest import mock
+
+        from api import db
+        from api.tools import reminders
+
+        with mock.patch("api.tools.email.send_email_now",
+                        side_effect=RuntimeError):
+            self.assertEqual(reminders.run_once(self.lead, self.now), 0)
+
+        # Released and pushed back onto the heap
+        self.assertEqual(
+            db.reminders.count_documents(
+                {"_id": {
+                    "$regex": f"^{self.assignment_id}:"
+                }}), 0)
+        self.assertEqual(len(reminders._queue), 1)
+
+        with mock.patch("api.tools.email.send_email_now") as send_email_now:
+            self.assertEqual(reminders.send_due(self.now), 2)
+        self.assertEqual(send_email_now.call_count, 2)
@@ -0,0 +1,88 @@
+import unittest
+
+from api import create_app
+
+
+class ScheduleTestCase(unittest.TestCase):
+    r"""A testcase on the parsing of course schedules and the detection of conflicts."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_parse(self):
+        from api.tools.schedule import parse
+
+        schedule = parse("WeMo", "09:00-10:15")
+        self.assertEqual(schedule.days, (0, 2))
+        self.assertEqual((schedule.start, schedule.end), (540, 615))
+        self.assertEqual(schedule.by_day(), "MO,WE")
+
+        # Overnight
+        self.assertEqual(parse("Fr", "23:30-00:30").end, 24 * 60 + 30)
+        self.assertIsNone(parse("", "09:00-10:00"))
+
+        for days, time in [("MWF", "09:00-10:00"), ("Mo", "9-10"),
+                           ("Mo", "10:00-10:00"), ("Mo", "25:00-26:00")]:
+            with self.assertRaises(ValueError):
+                parse(days, time)
+
+    def test_conflicts(self):
+        from api.tools.schedule import find_conflicts
+        from api.tools.schedule import parse
+
+        conflicts = find_conflicts([
+            ("math", parse("MoWe", "09:00-10:00")),
+            ("art", parse("We", "09:30-11:00")),
+            ("music", parse("We", "10:00-10:30")),
+            ("late", parse("Su", "23:00-01:00")),
+            ("early", parse("Mo", "00:30-02:00")),
+            ("none", None),
+        ])
+
+        self.assertEqual([conflict.to_dict() for conflict in conflicts], [
+            {
+                "courses": ["early", "late"],
+                "day": "Mo",
+                "start": "00:30",
+                "end": "01:00"
+            },
+            {
+                "courses": ["art", "math"],
+                "day": "We",
+                "start": "09:30",
+                "end": "10:00"
+            },
+            {
+                "courses": ["art", "music"],
+                "day": "We",
+                "start": "10:00",
+                "end": "10:30"
+            },
+        ])
+
+    def test_occurrences(self):
+        from datetime import datetime
+
+        import pytz
+        from api.tools.schedule import parse
+
+        tz = pytz.timezone("America/New_York")
+        schedule = parse("Mo", "09:00-10:00")
+
+        # The clocks go back on Sunday, November 1st 2020: same local time, an hour later in UTC
+        meetings = list(
+            schedule.occurrences(datetime(2020, 10, 25), datetime(2020, 11, 8),
+                                 tz))
+        self.assertEqual(meetings, [
+            (datetime(2020, 10, 26, 13), datetime(2020, 10, 26, 14)),
+            (datetime(2020, 11, 2, 14), datetime(2020, 11, 2, 15)),
+        ])
+
+        # Local time
+        self.assertEqual(schedule.first_after(datetime(2020, 10, 27, 2), tz),
+                         datetime(2020, 10, 26, 9))
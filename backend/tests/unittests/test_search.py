@@ -0,0 +1,47 @@
+import unittest
+
+from api.tools.search import get
+from api.tools.search import get_all
+from api.tools.search import sort
+
+
+class SearchTestCase(unittest.TestCase):
+    r"""A testcase on querying in-memory collections of models and dictionaries."""
+
+    def setUp(self):
+        self.submissions = [{
+            "_id": str(i),
+            "student_id": f"student{i % 3}",
+            "grade": i * 10 if i % 4 else None,
+        } for i in range(10)]
+
+    def test_get(self):
+        self.assertIs(get(self.submissions, _id="4"), self.submissions[4])
+        self.assertIsNone(get(self.submissions, _id="42"))
+        self.assertIsNone(get(self.submissions, missing="4"))
+
+    def test_get_all(self):
+        self.assertEqual(
+            [s["_id"] for s in get_all(self.submissions, student_id="student1")],
+            ["1", "4", "7"],
+        )
+        # None grades never match a range
+        self.assertEqual(
+            [s["_id"] for s in get_all(self.submissions, grade__range=(20, 60))],
+            ["2", "3", "5", "6"],
+        )
+        self.assertEqual(
+            [
+                s["_id"] for s in get_all(self.submissions,
+                                          student_id__in=["student0"],
+                                          order_by=["-grade"])
+            ],
+            ["9", "6", "3", "0"],
+        )
+
+    def test_sort(self):
+        self.assertEqual(
+            [s["_id"] for s in sort(self.submissions, "student_id", "-grade")],
+            ["9", "6", "3", "0", "7", "1", "4", "5", "2", "8"],
+        )
+
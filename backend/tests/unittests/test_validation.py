@@ -0,0 +1,79 @@
+import unittest
+
+from api import create_app
+
+
+class ValidationTestCase(unittest.TestCase):
+    r"""A testcase on the declarative validation of the fields of the models."""
+
+    def setUp(self):
+        self.app = create_app("testing")
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+
+    def tearDown(self):
+        self.app_context.pop()
+
+    def test_clean(self):
+        from api.classes import Course
+        from api.classes import User
+        from api.tools.exceptions import InvalidFormatException
+        from api.tools.exceptions import InvalidTypeException
+
+        self.assertEqual(User.SCHEMA.clean("bio", ""), "A short bio.")
+        self.assertEqual(Course.SCHEMA.clean("schedule_time", "23:30-00:45"),
+                         "23:30-00:45")
+
+        with self.assertRaises(InvalidTypeException):
+            User.SCHEMA.clean("email", 42)
+        with self.assertRaises(InvalidFormatException):
+            User.SCHEMA.clean("email", "not an email")
+        with self.assertRaises(InvalidFormatException):
+            Course.SCHEMA.clean("schedule_time", "10:00-09:00")
+        with self.assertRaises(InvalidFormatException):
+            Course.SCHEMA.clean("name", "x" * 51)
+
+    def test_errors(self):
+        from api.classes import Course
+
+        documents = [
+            {
+                "name": "Algebra",
+                "schedule_time": "09:00-10:15"
+            },
+            {
+                "name": "",
+                "schedule_time": "10:00-09:00"
+            },
+            {
+                "description": "No name"
+            },
+        ]
+
+        # Every problem, not only the first one
+        self.assertEqual([(error.index, error.field)
+                          for error in Course.SCHEMA.errors(documents)],
+                         [(1, "name"), (2, "name"), (1, "schedule_time")])
+
+        # Updates only have the fields they change
+        self.assertEqual(Course.SCHEMA.errors([{
+            "description": "Updated"
+        }], partial=True), [])
+
+    def test_update_payload(self):
+        from api.classes import Course
+
+        # Every field of an update is checked, before anything is written
+        payload = {
+            "department": "Mathematics",
+            "number": "101",
+            "teacher": "not an id",
+            "schedule_days": "MoXx",
+        }
+        self.assertEqual([
+            error.field
+            for error in Course.SCHEMA.errors([payload], partial=True)
+        ], ["number", "schedule_days", "teacher"])
+
+        payload.update(number=101, teacher="", schedule_days="MoWe")
+        self.assertEqual(Course.SCHEMA.errors([payload], partial=True), [])